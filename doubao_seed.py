@@ -6,12 +6,22 @@ Doubao-Seed 节点
 
 import os
 import json
+import asyncio
 import requests
 import time
 import random
+import math
 import base64
+import hashlib
 import io
 import subprocess
+import threading
+import atexit
+import logging
+import sys
+import contextvars
+import email.utils
+from contextlib import contextmanager
 from PIL import Image
 import torch
 import numpy as np
@@ -24,19 +34,96 @@ import tempfile
 import shutil
 from urllib.parse import urlparse
 from fractions import Fraction
+from collections import OrderedDict, deque, namedtuple
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+
+# ==================== 日志 ====================
+
+LOGGER = logging.getLogger("SeedReam4API")
+_LEVEL_LABELS = {logging.DEBUG: "调试", logging.INFO: "信息", logging.WARNING: "警告", logging.ERROR: "错误"}
+_LOG_LEVELS = {"debug": logging.DEBUG, "info": logging.INFO, "warning": logging.WARNING,
+               "error": logging.ERROR, "off": logging.CRITICAL + 1}
+
+# 日志配置，可在配置文件的 "logging" 中覆盖，环境变量 SEEDREAM4_LOG_LEVEL 优先于配置的level
+LOGGING_DEFAULTS = {
+    "level": "info",      # debug/info/warning/error/off
+    "quiet": False,       # 生产环境静默模式：只输出警告和错误
+    "format": "text",     # text：原有的 "[SeedReam4API] 信息：..." 格式；json：每行一个JSON对象
+}
+
+
+class _SeedReamLogFormatter(logging.Formatter):
+    """保持原有的 "[SeedReam4API] 信息：消息" 输出格式，结构化字段以 key=value 追加在消息后"""
+
+    def __init__(self, fmt="text"):
+        super().__init__()
+        self.fmt = fmt
+
+    def format(self, record):
+        message = record.getMessage()
+        fields = getattr(record, "fields", None) or {}
+        if self.fmt == "json":
+            entry = {"time": round(record.created, 3), "level": record.levelname.lower(), "message": message}
+            entry.update(fields)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+        if fields:
+            message = f"{message} " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return f"[SeedReam4API] {_LEVEL_LABELS.get(record.levelno, record.levelname)}：{message}"
+
+
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.setFormatter(_SeedReamLogFormatter())
+LOGGER.addHandler(_log_handler)
+LOGGER.setLevel(logging.INFO)
+LOGGER.propagate = False  # 不重复输出到ComfyUI的根日志
+
+
+def configure_logging(settings=None):
+    """按配置设置日志级别和输出格式（模块加载时按配置文件调用一次）"""
+    settings = dict(LOGGING_DEFAULTS, **(settings or {}))
+    level_name = os.environ.get("SEEDREAM4_LOG_LEVEL") or str(settings["level"])
+    level = _LOG_LEVELS.get(level_name.lower(), logging.INFO)
+    if settings["quiet"]:
+        level = max(level, logging.WARNING)
+    LOGGER.setLevel(level)
+    _log_handler.setFormatter(_SeedReamLogFormatter(str(settings["format"]).lower()))
+
+
+def _log(level, message, args, fields):
+    """日志级别被过滤时直接返回：可调用的message不会被调用，%格式化参数不会被格式化"""
+    if not LOGGER.isEnabledFor(level):
+        return
+    if callable(message):
+        message = message()
+    LOGGER.log(level, message, *args, extra={"fields": fields} if fields else None)
+
+
+def _log_debug(message, *args, **fields):
+    _log(logging.DEBUG, message, args, fields)
+
+def _log_info(message, *args, **fields):
+    _log(logging.INFO, message, args, fields)
+
+def _log_warning(message, *args, **fields):
+    _log(logging.WARNING, message, args, fields)
+
+def _log_error(message, *args, **fields):
+    _log(logging.ERROR, message, args, fields)
+
 
 # 导入ComfyUI的视频类型 - 使用官方标准
 try:
     from comfy_api.input_impl import VideoFromFile
     HAS_COMFYUI_VIDEO = True
-    print("[SeedReam4API] 信息：✅ ComfyUI官方视频类型导入成功")
+    _log_info("✅ ComfyUI官方视频类型导入成功")
 except ImportError as e:
     try:
         # 尝试旧版本路径
         from comfy_api.latest._input_impl.video_types import VideoFromComponents
         from comfy_api.latest._util import VideoComponents
         HAS_COMFYUI_VIDEO = True
-        print("[SeedReam4API] 信息：✅ ComfyUI视频类型导入成功（旧版本）")
+        _log_info("✅ ComfyUI视频类型导入成功（旧版本）")
         # 创建VideoFromFile的兼容类
         class VideoFromFile:
             def __init__(self, file_or_components):
@@ -56,7 +143,7 @@ except ImportError as e:
                     return (512, 512)  # 默认尺寸
     except ImportError:
         HAS_COMFYUI_VIDEO = False
-        print(f"[SeedReam4API] 警告：⚠️ ComfyUI视频类型导入失败: {e}")
+        _log_warning(f"⚠️ ComfyUI视频类型导入失败: {e}")
         # 创建简单的替代类
         class VideoFromFile:
             def __init__(self, file_path):
@@ -78,54 +165,190 @@ try:
 except ImportError:
     HAS_IMAGEIO = False
 
+# 可选的异步HTTP客户端
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
 # 禁用SSL警告
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-def create_ssl_compatible_session():
-    """创建SSL兼容的requests session"""
-    session = requests.Session()
+def _remember_tls_session(tls):
+    """把连接（SSLObject/SSLSocket）的TLS会话存入上下文的会话缓存，存好后不再检查
 
-    # 配置重试策略
-    retry_strategy = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
-    )
+    TLS 1.3的会话票据在握手之后才到达，没有票据的会话无法恢复，因此在之后的读取中继续检查。
+    """
+    try:
+        session = tls.session
+        if session is not None and (session.has_ticket or tls.version() != "TLSv1.3"):
+            tls.context._tls_sessions[tls._tls_host] = session
+            tls._tls_host = None
+    except Exception:
+        pass
 
-    # 创建自定义的HTTPAdapter
-    class SSLAdapter(HTTPAdapter):
-        def init_poolmanager(self, *args, **kwargs):
-            # 创建更宽松的SSL上下文
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
 
-            # 支持更多SSL协议版本和密码套件
-            try:
-                ssl_context.minimum_version = ssl.TLSVersion.TLSv1
-                ssl_context.maximum_version = ssl.TLSVersion.TLSv1_3
-            except AttributeError:
-                # 兼容旧版本Python
-                pass
+class _ResumingSSLObject(ssl.SSLObject):
+    """内存BIO上的TLS连接（asyncio/httpx使用）：握手完成后记录会话，供同一主机的新连接恢复"""
+
+    _tls_host = None
+
+    def do_handshake(self):
+        super().do_handshake()
+        if self._tls_host:
+            _remember_tls_session(self)
+
+    def read(self, len=1024, buffer=None):
+        data = super().read(len, buffer)
+        if self._tls_host:
+            _remember_tls_session(self)
+        return data
+
+
+class _ResumingSSLSocket(ssl.SSLSocket):
+    """requests/urllib3使用的TLS socket：与 _ResumingSSLObject 一样在读取中等待TLS 1.3会话票据"""
+
+    _tls_host = None
+
+    def read(self, len=1024, buffer=None):
+        data = super().read(len, buffer)
+        if self._tls_host:
+            _remember_tls_session(self)
+        return data
+
+
+class _ResumingSSLContext(ssl.SSLContext):
+    """支持TLS会话复用的SSL上下文：按主机缓存会话，新建连接时尝试恢复，省去完整握手
+
+    requests/urllib3 通过 wrap_socket 建立连接，httpx（asyncio）通过 wrap_bio，两条路径共用同一个会话缓存。
+    """
+
+    sslobject_class = _ResumingSSLObject
+    sslsocket_class = _ResumingSSLSocket
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        if isinstance(server_hostname, bytes):
+            server_hostname = server_hostname.decode("ascii")  # anyio以bytes传入主机名
+        if session is None and server_hostname and not server_side:
+            session = self._tls_sessions.get(server_hostname)
+        try:
+            ssl_obj = super().wrap_bio(incoming, outgoing, server_side=server_side,
+                                       server_hostname=server_hostname, session=session)
+        except ValueError:
+            # 会话不可用（例如已失效），退回完整握手
+            self._tls_sessions.pop(server_hostname, None)
+            ssl_obj = super().wrap_bio(incoming, outgoing, server_side=server_side, server_hostname=server_hostname)
+        if server_hostname and not server_side:
+            ssl_obj._tls_host = server_hostname
+        return ssl_obj
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True,
+                    suppress_ragged_eofs=True, server_hostname=None, session=None):
+        if session is None and server_hostname and not server_side:
+            session = self._tls_sessions.get(server_hostname)
+        try:
+            ssl_sock = super().wrap_socket(
+                sock, server_side=server_side, do_handshake_on_connect=do_handshake_on_connect,
+                suppress_ragged_eofs=suppress_ragged_eofs, server_hostname=server_hostname, session=session
+            )
+        except ValueError:
+            # 会话不可用（例如已失效），退回完整握手
+            self._tls_sessions.pop(server_hostname, None)
+            ssl_sock = super().wrap_socket(
+                sock, server_side=server_side, do_handshake_on_connect=do_handshake_on_connect,
+                suppress_ragged_eofs=suppress_ragged_eofs, server_hostname=server_hostname
+            )
+        if server_hostname and not server_side:
+            ssl_sock._tls_host = server_hostname
+            _remember_tls_session(ssl_sock)  # TLS 1.2在握手后即可记录，TLS 1.3在读取中等待票据
+        return ssl_sock
+
+
+def _create_ssl_context():
+    """创建更宽松的SSL上下文（禁用证书校验、放宽协议和密码套件）"""
+    ssl_context = _ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ssl_context._tls_sessions = {}
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+
+    # 支持更多SSL协议版本和密码套件
+    try:
+        ssl_context.minimum_version = ssl.TLSVersion.TLSv1
+        ssl_context.maximum_version = ssl.TLSVersion.TLSv1_3
+    except (AttributeError, ValueError):
+        # 兼容旧版本Python
+        pass
+
+    # 设置更宽松的密码套件
+    try:
+        ssl_context.set_ciphers('DEFAULT:@SECLEVEL=1')
+    except ssl.SSLError:
+        try:
+            ssl_context.set_ciphers('ALL:!aNULL:!eNULL:!EXPORT:!DES:!RC4:!MD5:!PSK:!SRP:!CAMELLIA')
+        except ssl.SSLError:
+            pass  # 使用默认密码套件
+
+    return ssl_context
+
+
+_shared_ssl_context = None
+_shared_ssl_context_lock = threading.Lock()
+
+
+def get_shared_ssl_context():
+    """获取进程内共享的SSL上下文，所有连接池共用以便复用TLS会话"""
+    global _shared_ssl_context
+    if _shared_ssl_context is None:
+        with _shared_ssl_context_lock:
+            if _shared_ssl_context is None:
+                _shared_ssl_context = _create_ssl_context()
+    return _shared_ssl_context
+
+
+class SSLAdapter(HTTPAdapter):
+    """使用共享SSL上下文的HTTPAdapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = get_shared_ssl_context()
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        kwargs['ssl_context'] = get_shared_ssl_context()
+        return super().proxy_manager_for(*args, **kwargs)
+
+
+# HTTP连接池默认配置，可在配置文件的 "http_pool" 中覆盖
+HTTP_POOL_DEFAULTS = {
+    "pool_connections": 10,   # 每个session缓存的主机连接池数量
+    "pool_maxsize": 32,       # 每个主机连接池的最大keep-alive连接数
+    "pool_block": False,      # 连接池耗尽时是否阻塞等待
+}
 
-            # 设置更宽松的密码套件
-            try:
-                ssl_context.set_ciphers('DEFAULT:@SECLEVEL=1')
-            except ssl.SSLError:
-                try:
-                    ssl_context.set_ciphers('ALL:!aNULL:!eNULL:!EXPORT:!DES:!RC4:!MD5:!PSK:!SRP:!CAMELLIA')
-                except ssl.SSLError:
-                    pass  # 使用默认密码套件
 
-            # 禁用各种SSL检查
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
+def create_ssl_compatible_session(pool_connections=None, pool_maxsize=None, pool_block=None):
+    """创建SSL兼容的requests session"""
+    pool_config = get_http_pool_config()
+    session = requests.Session()
 
-            kwargs['ssl_context'] = ssl_context
-            return super().init_poolmanager(*args, **kwargs)
+    # 连接池层只重试建立连接失败（请求尚未发出）；状态码和读取错误的重试都交给RetryPolicy，
+    # 这样每次请求都经过熔断器和限流器
+    retry_strategy = BudgetedRetry(
+        total=None,
+        connect=int(get_cached_config_section("retry_policy", RETRY_POLICY_DEFAULTS)["pool_retries"]),
+        read=False,
+        status=0,
+        other=0,
+        backoff_factor=1,
+    )
 
     # 应用适配器
-    adapter = SSLAdapter(max_retries=retry_strategy)
+    adapter = SSLAdapter(
+        pool_connections=pool_connections or pool_config["pool_connections"],
+        pool_maxsize=pool_maxsize or pool_config["pool_maxsize"],
+        pool_block=pool_config["pool_block"] if pool_block is None else pool_block,
+        max_retries=retry_strategy
+    )
     session.mount("https://", adapter)
     session.mount("http://", adapter)
 
@@ -134,18 +357,46 @@ def create_ssl_compatible_session():
 
     return session
 
-# 全局常量和配置
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-SEEDREAM4_CONFIG_FILE = 'SeedReam4_config.json'
 
-def _log_info(message):
-    print(f"[SeedReam4API] 信息：{message}")
+# 进程级HTTP客户端注册表：按镜像站主机复用session和keep-alive连接池
+_http_sessions = {}
+_http_sessions_lock = threading.Lock()
+
+
+def _host_key(url):
+    """URL所在主机的键（scheme://host[:port]）"""
+    parsed = urlparse(url or "")
+    return f"{parsed.scheme or 'https'}://{(parsed.netloc or '').lower()}"
+
+
+def get_http_session(url):
+    """获取指定URL所在主机的共享session（同一主机的所有图像、视频、轮询和文本请求共用连接池）"""
+    host_key = _host_key(url)
+
+    session = _http_sessions.get(host_key)
+    if session is None:
+        with _http_sessions_lock:
+            session = _http_sessions.get(host_key)
+            if session is None:
+                session = create_ssl_compatible_session()
+                _http_sessions[host_key] = session
+    return session
+
 
-def _log_warning(message):
-    print(f"[SeedReam4API] 警告：{message}")
+def close_http_sessions():
+    """关闭所有共享session并清空注册表"""
+    with _http_sessions_lock:
+        sessions = list(_http_sessions.values())
+        _http_sessions.clear()
+    for session in sessions:
+        try:
+            session.close()
+        except Exception:
+            pass
 
-def _log_error(message):
-    print(f"[SeedReam4API] 错误：{message}")
+# 全局常量和配置
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+SEEDREAM4_CONFIG_FILE = 'SeedReam4_config.json'
 
 def get_seedream4_config():
     """获取SeedReam4配置文件"""
@@ -249,6 +500,18 @@ def save_seedream4_config(config):
     except Exception as e:
         _log_error(f"保存SeedReam4配置失败: {e}")
 
+def get_config_section(section_name, defaults):
+    """读取配置文件中的某个配置段，并用默认值补全缺失的键"""
+    merged = dict(defaults)
+    section = get_seedream4_config().get(section_name)
+    if isinstance(section, dict):
+        merged.update(section)
+    return merged
+
+def get_http_pool_config():
+    """获取HTTP连接池配置"""
+    return get_config_section("http_pool", HTTP_POOL_DEFAULTS)
+
 def get_mirror_site_config(mirror_site_name: str) -> Dict[str, str]:
     """根据镜像站名称或URL获取对应的配置"""
     config = get_seedream4_config()
@@ -392,6 +655,86 @@ def pil2tensor(image):
     # 返回tensor，格式为[1, H, W, 3] - 这是ComfyUI的标准格式
     return torch.from_numpy(img_array)[None,]
 
+def _letterbox(image, size):
+    """按比例缩放到不超过size并居中放在白色画布上，不改变图像的宽高比"""
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    scale = min(size[0] / image.width, size[1] / image.height)
+    scaled = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    if scaled != image.size:
+        image = image.resize(scaled, Image.Resampling.LANCZOS)
+    if scaled == size:
+        return image
+    canvas = Image.new('RGB', size, (255, 255, 255))
+    canvas.paste(image, ((size[0] - scaled[0]) // 2, (size[1] - scaled[1]) // 2))
+    return canvas
+
+
+def _decode_into_slot(image, slot, size):
+    """把一张图像解码并直接写入批次tensor中的对应位置（uint8→float的转换和归一化一步完成）"""
+    if image.size != size:
+        image = _letterbox(image, size)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    pixels = np.asarray(image)
+    target = slot.numpy()
+    if slot.dtype.is_floating_point:
+        np.divide(pixels, np.float32(255.0), out=target, casting="unsafe")
+    else:
+        np.copyto(target, pixels)
+
+
+def decode_images_to_batch(images, dtype=torch.float32):
+    """把PIL图像（可以是只解析了文件头的懒加载图像）直接解码进预分配的 [B, H, W, 3] tensor
+
+    批次尺寸取文件头中最多的图像尺寸，尺寸不同的图像保持宽高比缩放并填充白边；
+    各图像在下载线程池中并行解码，每张只产生一份临时uint8像素。
+    """
+    sizes = [image.size for image in images]
+    width, height = max(sizes, key=sizes.count)
+    if len(set(sizes)) > 1:
+        _log_warning(f"⚠️ 批次中的图像尺寸不一致 {sorted(set(sizes))}，按 {width}x{height} 保持比例缩放并填充白边")
+    batch = torch.empty((len(images), height, width, 3), dtype=dtype)
+
+    def decode(index):
+        try:
+            _decode_into_slot(images[index], batch[index], (width, height))
+            return True
+        except Exception as e:
+            _log_error(f"❌ 图像 {index + 1} 解码失败，使用空白图像: {e}")
+            batch[index].fill_(1.0 if dtype.is_floating_point else 255)
+            return False
+
+    if len(images) > 1:
+        decoded = list(get_download_executor().map(decode, range(len(images))))
+    else:
+        decoded = [decode(0)]
+    if not all(decoded):
+        mark_result_incomplete(f"{decoded.count(False)} 张图像解码失败")
+    return batch
+
+
+# SeedReam节点 "output_dtype" 选项对应的批次存储类型
+# float16输出是真正的float16 IMAGE tensor（取值 [0, 1]），下游节点收到的dtype即为torch.float16
+OUTPUT_DTYPES = {"float32": torch.float32, "float16": torch.float16}
+
+
+def _format_bytes(num_bytes):
+    """把字节数格式化为 MB/GB"""
+    if num_bytes >= 1024 ** 3:
+        return f"{num_bytes / 1024 ** 3:.2f} GB"
+    return f"{num_bytes / 1024 ** 2:.1f} MB"
+
+
+def describe_tensor_memory(tensor):
+    """估算图像批次占用的内存，非float32存储时附带float32下的大小以便比较"""
+    stored = tensor.numel() * tensor.element_size()
+    text = f"output memory ≈ {_format_bytes(stored)} ({str(tensor.dtype).replace('torch.', '')}"
+    if tensor.dtype != torch.float32:
+        text += f"; float32 would be {_format_bytes(tensor.numel() * 4)}"
+    return text + ")"
+
+
 def create_blank_tensor(width=1024, height=1024):
     """创建正确格式的空白tensor - 参考ComfyUI_Comfly的实现"""
     blank_image = Image.new('RGB', (width, height), color='white')
@@ -399,227 +742,786 @@ def create_blank_tensor(width=1024, height=1024):
     # 返回tensor，格式为[1, H, W, 3] - 这是ComfyUI的标准格式
     return torch.from_numpy(np_image)[None,]
 
-def ensure_tensor_format(tensor):
-    """确保tensor格式完全符合ComfyUI要求 - 格式为[1, H, W, 3]"""
+# 输出图像检查配置，可在配置文件的 "output_validation" 中覆盖
+#   off  - 只检查/修复形状，不扫描像素
+#   fast - 再做一次融合的 min/max 归约：NaN会传播到结果中，Inf表现为越界；发现问题时逐像素修复，批次大小不变
+#   full - fast + 逐图像的 min/max/mean 统计（调试用）
+VALIDATION_DEFAULTS = {
+    "validation_level": "fast",
+}
+VALIDATION_LEVELS = ("off", "fast", "full")
+
+
+def get_validation_level():
+    """获取配置的输出图像检查级别"""
+    level = str(get_cached_config_section("output_validation", VALIDATION_DEFAULTS)["validation_level"]).lower()
+    return level if level in VALIDATION_LEVELS else "fast"
+
+
+def _normalize_image_shape(tensor):
+    """把tensor整理为 [B, H, W, 3]，无法整理时返回None（只改视图，不扫描像素）"""
+    if tensor.dim() == 3:
+        # 处理特殊情况：如果tensor形状是 (1, 1, 2048) 或类似格式
+        if tensor.shape[1] == 1 and tensor.shape[2] > 1000:
+            _log_warning(f"⚠️ 检测到异常tensor形状: {tensor.shape}，可能是1D数据被错误reshape")
+            return None
+        if tensor.shape[-1] != 3:
+            return None
+        tensor = tensor.unsqueeze(0)
+        _log_info(f"🔧 添加batch维度: {tensor.shape}")
+    if tensor.dim() != 4:
+        return None
+    if tensor.shape[-1] != 3:
+        if tensor.shape[1] != 3:
+            return None
+        tensor = tensor.permute(0, 2, 3, 1)  # (batch, channels, height, width) -> (batch, height, width, channels)
+        _log_info(f"🔧 重新排列tensor维度: {tensor.shape}")
+    return tensor
+
+
+def validate_image_batch(tensor, level=None, owned=False):
+    """检查并修复ComfyUI图像批次，返回 [B, H, W, 3] tensor，无法修复时返回空白tensor
+
+    形状检查只改视图；像素检查在一次 aminmax 归约中同时得到取值范围和NaN/Inf，
+    float16批次保持原有存储类型，不会整批转换为float32。
+    NaN替换为0、越界值限制到 [0, 1]；owned=True（tensor由调用方新建）时原地修复，否则修复副本，不改动调用方的tensor。
+    """
     if tensor is None:
         return create_blank_tensor()
-    
-    original_shape = tensor.shape
-    _log_info(f"🔍 输入tensor形状: {original_shape}")
-    
-    # 处理特殊情况：如果tensor形状是 (1, 1, 2048) 或类似格式
-    if len(tensor.shape) == 3 and tensor.shape[1] == 1 and tensor.shape[2] > 1000:
-        _log_warning(f"⚠️ 检测到异常tensor形状: {tensor.shape}，可能是1D数据被错误reshape")
+    level = level or get_validation_level()
+
+    original_shape = tuple(tensor.shape)
+    tensor = _normalize_image_shape(tensor)
+    if tensor is None:
+        _log_error(f"❌ 无法修复tensor维度: {original_shape}")
         return create_blank_tensor()
-    
-    # 确保是4维tensor，格式为[1, H, W, 3]
-    if len(tensor.shape) != 4:
-        if len(tensor.shape) == 3:
-            # 检查是否是 (H, W, 3) 格式
-            if tensor.shape[-1] == 3:
-                tensor = tensor.unsqueeze(0)
-                _log_info(f"🔧 添加batch维度: {tensor.shape}")
-            else:
-                _log_error(f"❌ 无法修复tensor维度: {original_shape}")
-                return create_blank_tensor()
-        else:
-            _log_error(f"❌ 无法修复tensor维度: {original_shape}")
-            return create_blank_tensor()
-    
-    # 确保是 (batch, height, width, channels) 格式
-    if tensor.shape[-1] != 3:
-        if tensor.shape[1] == 3:  # 如果是 (batch, channels, height, width) 格式
-            tensor = tensor.permute(0, 2, 3, 1)
-            _log_info(f"🔧 重新排列tensor维度: {tensor.shape}")
-        else:
-            _log_error(f"❌ 无法修复tensor通道维度: {tensor.shape}")
-            return create_blank_tensor()
-    
-    # 确保数据类型正确
-    if tensor.dtype != torch.float32:
-        tensor = tensor.float()
+
+    # 确保数据类型正确：float32/float16保持不变，其余转换为float32
+    if tensor.dtype not in (torch.float32, torch.float16):
+        tensor = tensor.float().div_(255.0) if tensor.dtype == torch.uint8 else tensor.float()
+        owned = True
         _log_info(f"🔧 转换tensor数据类型: {tensor.dtype}")
-    
-    # 确保值范围正确 (0-1)
-    if tensor.min() < 0 or tensor.max() > 1:
-        tensor = torch.clamp(tensor, 0, 1)
-        _log_info(f"🔧 限制tensor值范围: {tensor.min().item():.3f} 到 {tensor.max().item():.3f}")
-    
-    # 确保没有异常值
-    if torch.isnan(tensor).any() or torch.isinf(tensor).any():
-        _log_error("❌ tensor包含异常值，使用空白tensor替代")
-        return create_blank_tensor()
-    
-    # 最终验证 - 确保是[1, H, W, 3]格式
-    if len(tensor.shape) != 4 or tensor.shape[-1] != 3:
-        _log_error(f"❌ 最终tensor格式仍然不正确: {tensor.shape}")
-        return create_blank_tensor()
-    
-    _log_info(f"✅ tensor格式验证通过: {tensor.shape}")
+
+    if level == "off" or tensor.numel() == 0:
+        return tensor
+
+    low, high = (value.item() for value in torch.aminmax(tensor))
+    has_nan = math.isnan(low) or math.isnan(high)
+    if has_nan or low < 0 or high > 1:
+        if not owned:
+            tensor = tensor.clone()
+        if has_nan:
+            bad = torch.isnan(tensor.reshape(tensor.shape[0], -1)).any(dim=1).nonzero().flatten().tolist()
+            _log_error(f"❌ 图像 {[i + 1 for i in bad]} 包含NaN值，已替换为0")
+            tensor.nan_to_num_(nan=0.0)
+            low, high = (value.item() for value in torch.aminmax(tensor))
+        if low < 0 or high > 1:
+            tensor.clamp_(0, 1)  # 同时处理±Inf
+            _log_info(f"🔧 限制tensor值范围: {low:.3f} 到 {high:.3f} -> [0, 1]")
+
+    if level == "full":
+        flat = tensor.reshape(tensor.shape[0], -1)
+        mins, maxs = torch.aminmax(flat, dim=1)
+        means = flat.float().mean(dim=1)
+        for i in range(flat.shape[0]):
+            _log_info(f"🔍 图像{i}: min {mins[i].item():.3f}, max {maxs[i].item():.3f}, mean {means[i].item():.3f}")
+
+    _log_info(f"✅ tensor格式验证通过: {tuple(tensor.shape)} {tensor.dtype} (检查级别: {level})")
     return tensor
 
-def image_to_base64(image_tensor, max_size=2048, return_data_url=True):
-    """将tensor转换为base64字符串，支持自动压缩和多图拼接
 
-    Args:
-        image_tensor: 输入的图像tensor
-        max_size: 最大尺寸限制
-        return_data_url: 是否返回完整的data URL格式，False则只返回base64字符串
+def ensure_tensor_format(tensor):
+    """确保tensor格式完全符合ComfyUI要求 - 格式为[B, H, W, 3]（按配置的检查级别，见validate_image_batch）"""
+    return validate_image_batch(tensor)
+
+
+class EncodedImage:
+    """已编码的上传图像：保存JPEG/PNG原始字节，发送请求时才以base64分块写入请求体
+
+    在载荷中可以代替data URL字符串使用：len() 返回data URL的长度，str() 返回完整的data URL。
     """
-    if image_tensor is None:
-        return None
 
-    # 如果是batch，将多张图像水平拼接成一张大图
-    if len(image_tensor.shape) == 4 and image_tensor.shape[0] > 1:
-        _log_info(f"🔍 检测到多图batch输入 {image_tensor.shape}，将拼接成一张大图")
+    __slots__ = ("data", "mime_type")
 
-        # 将每张图像转换为PIL图像
-        pil_images = []
-        for i in range(image_tensor.shape[0]):
-            single_tensor = image_tensor[i:i+1]  # 保持4D格式
-            pil_img = tensor2pil(single_tensor)
-            if pil_img is not None:
-                pil_images.append(pil_img)
+    def __init__(self, data, mime_type):
+        self.data = data
+        self.mime_type = mime_type
 
-        if not pil_images:
-            return None
+    @property
+    def prefix(self):
+        return f"data:{self.mime_type};base64,"
 
-        # 水平拼接图像
-        total_width = sum(img.width for img in pil_images)
-        max_height = max(img.height for img in pil_images)
+    @property
+    def base64_length(self):
+        return 4 * ((len(self.data) + 2) // 3)
 
-        # 创建拼接后的大图
-        combined_image = Image.new('RGB', (total_width, max_height), (255, 255, 255))
-        x_offset = 0
-        for img in pil_images:
-            combined_image.paste(img, (x_offset, 0))
-            x_offset += img.width
+    def __len__(self):
+        return len(self.prefix) + self.base64_length
 
-        pil_image = combined_image
-        _log_info(f"🔧 多图拼接完成: {len(pil_images)}张图 -> {pil_image.size}")
-    else:
-        pil_image = tensor2pil(image_tensor)
-        if pil_image is None:
-            return None
+    def __bool__(self):
+        return bool(self.data)
 
-    # 检查图像尺寸，如果过大则压缩
-    original_size = pil_image.size
-    if max(original_size) > max_size:
-        # 计算新尺寸，保持宽高比
-        ratio = max_size / max(original_size)
-        new_size = (int(original_size[0] * ratio), int(original_size[1] * ratio))
-        pil_image = pil_image.resize(new_size, Image.Resampling.LANCZOS)
-        _log_info(f"🔧 图像压缩: {original_size} -> {new_size}")
+    def base64(self):
+        return base64.b64encode(self.data).decode('utf-8')
+
+    def data_url(self):
+        return f"{self.prefix}{self.base64()}"
+
+    __str__ = data_url
+
+    def __repr__(self):
+        return f"EncodedImage({self.mime_type}, {len(self.data):,} bytes)"
+
+
+# 已编码参考图像缓存配置，可在配置文件的 "encode_cache" 中覆盖
+ENCODE_CACHE_DEFAULTS = {
+    "enabled": True,
+    "max_bytes": 256 * 1024 * 1024,  # 缓存的编码后图像总字节数上限
+}
 
-    buffered = io.BytesIO()
-    # 使用JPEG格式压缩大图像，PNG格式保留小图像
-    if max(pil_image.size) > 1024:
-        # 对于图像编辑，使用更高质量的JPEG
-        quality = 90 if max(original_size) > max_size else 85
-        pil_image.save(buffered, format="JPEG", quality=quality, optimize=True)
-        format_prefix = "data:image/jpeg;base64,"
-    else:
-        pil_image.save(buffered, format="PNG", optimize=True)
-        format_prefix = "data:image/png;base64,"
 
-    image_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+class EncodedImageCache:
+    """按tensor内容和编码参数寻址的LRU缓存，按编码后字节数限制容量，所有节点共享"""
 
-    # 验证base64字符串的有效性
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return encoded
+
+    def put(self, key, encoded, max_bytes):
+        size = len(encoded.data)
+        if size > max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous.data)
+            self._entries[key] = encoded
+            self._bytes += size
+            while self._bytes > max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+ENCODED_IMAGE_CACHE = EncodedImageCache()
+
+
+def tensor_content_key(image_tensor, *params):
+    """tensor内容（形状、类型、数据）加编码参数的快速哈希，无法读取数据时返回None"""
     try:
-        # 尝试解码验证
-        base64.b64decode(image_base64)
-    except Exception as e:
-        _log_warning(f"⚠️ Base64编码验证失败: {e}")
+        tensor = image_tensor.detach().cpu() if hasattr(image_tensor, "detach") else image_tensor
+        array = np.ascontiguousarray(tensor.numpy() if hasattr(tensor, "numpy") else tensor)
+    except Exception:
         return None
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((array.shape, str(array.dtype), params)).encode("utf-8"))
+    digest.update(array)
+    return digest.hexdigest()
+
+
+# 上传图像编码器配置，可在配置文件的 "image_encoder" 中覆盖
+IMAGE_ENCODER_DEFAULTS = {
+    "codec": "auto",            # auto: 大图JPEG、小图PNG；也可指定 png / jpeg / webp
+    "png_compress_level": 1,    # PNG压缩级别（0-9），越低越快
+    "jpeg_quality": 90,         # JPEG质量
+    "webp_quality": 90,         # WebP质量
+    "target_bytes": 0,          # 单张图像目标字节数，超出时降低有损编码质量（0表示不限制）
+    "max_workers": 4,           # 并行编码的线程数
+}
 
-    if return_data_url:
-        return f"{format_prefix}{image_base64}"
-    else:
-        return image_base64
+_IMAGE_CODECS = {
+    "png": ("PNG", "image/png"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+}
+_MIN_LOSSY_QUALITY = 40
 
-def download_video_from_url(video_url: str, output_dir: str = None) -> str:
-    """从URL下载视频文件"""
-    try:
-        if not video_url or not video_url.strip():
-            raise ValueError("视频URL为空")
+# 请求载荷预算：顶层 "payload_budget" 为默认值，镜像站配置中的 "payload_budget" 和各自的 "models" 可以进一步收紧
+PAYLOAD_BUDGET_DEFAULTS = {
+    "max_request_bytes": 0,   # 整个请求体的字节上限（0表示不限制）
+    "max_image_bytes": 0,     # 单张图像编码后的字节上限（0表示不限制）
+    "max_image_side": 2048,   # 上传图像的最长边（模型用不到更大的尺寸）
+}
 
-        # 解析URL获取文件名
-        parsed_url = urlparse(video_url)
-        filename = os.path.basename(parsed_url.path)
-        if not filename or '.' not in filename:
-            filename = f"video_{int(time.time())}.mp4"
+PayloadBudget = namedtuple("PayloadBudget", list(PAYLOAD_BUDGET_DEFAULTS))
 
-        # 确定输出目录
-        if output_dir is None:
-            # 使用ComfyUI的输出目录
-            try:
-                import folder_paths
-                output_dir = folder_paths.get_output_directory()
-            except:
-                output_dir = tempfile.gettempdir()
+_PAYLOAD_ENVELOPE_RESERVE = 16 * 1024  # 为提示词等非图像字段预留的字节数
+_MIN_UPLOAD_SIDE = 256                 # 为满足预算缩图时的最短边下限
+_DOWNSCALE_STEP = 0.75                 # 每次缩图的比例
 
-        # 确保输出目录存在
-        os.makedirs(output_dir, exist_ok=True)
 
-        # 完整的输出路径
-        output_path = os.path.join(output_dir, filename)
+def _tighten_budget(budget, section):
+    if not isinstance(section, dict):
+        return
+    for key in budget:
+        value = section.get(key)
+        if value:
+            budget[key] = min(budget[key], value) if budget[key] else value
 
-        _log_info(f"🔽 开始下载视频: {video_url}")
-        _log_info(f"📁 保存路径: {output_path}")
 
-        # 下载视频
-        response = requests.get(video_url, stream=True, timeout=300)
-        response.raise_for_status()
+def get_payload_budget(mirror_names, model):
+    """合并候选镜像站和模型的载荷预算；多个候选镜像站时取最严格的限制"""
+    config = get_seedream4_config()
+    defaults = config.get("payload_budget") if isinstance(config.get("payload_budget"), dict) else {}
+    budget = {key: defaults.get(key, value) for key, value in PAYLOAD_BUDGET_DEFAULTS.items()}
+    _tighten_budget(budget, defaults.get("models", {}).get(model))
+
+    mirror_sites = config.get("mirror_sites", {})
+    for name in mirror_names:
+        site_budget = mirror_sites.get(name, {}).get("payload_budget")
+        if isinstance(site_budget, dict):
+            _tighten_budget(budget, site_budget)
+            _tighten_budget(budget, site_budget.get("models", {}).get(model))
+    return PayloadBudget(**budget)
+
+
+def image_byte_target(budget, image_count):
+    """按载荷预算计算每张图像编码后的目标字节数（按data URL的base64膨胀估算），0表示不限制"""
+    targets = []
+    if budget.max_image_bytes:
+        targets.append(int(budget.max_image_bytes))
+    if budget.max_request_bytes and image_count:
+        available = max(0, int(budget.max_request_bytes) - _PAYLOAD_ENVELOPE_RESERVE)
+        targets.append(available * 3 // (4 * image_count))
+    return min(targets) if targets else 0
+
+
+def fast_downscale(pil_image, max_side):
+    """缩小到最长边不超过max_side：先用reduce()做整数倍盒式降采样，再用LANCZOS做最后一步"""
+    longest = max(pil_image.size)
+    if longest <= max_side:
+        return pil_image
+    factor = longest // max_side
+    if factor >= 2:
+        pil_image = pil_image.reduce(factor)
+        longest = max(pil_image.size)
+    if longest > max_side:
+        ratio = max_side / longest
+        new_size = (max(1, int(pil_image.width * ratio)), max(1, int(pil_image.height * ratio)))
+        pil_image = pil_image.resize(new_size, Image.Resampling.LANCZOS)
+    return pil_image
 
-        # 写入文件
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
 
-        file_size = os.path.getsize(output_path)
-        _log_info(f"✅ 视频下载完成: {filename} ({file_size / 1024 / 1024:.2f} MB)")
+_encode_executor = None
+_encode_executor_lock = threading.Lock()
 
-        return output_path
 
+def get_image_encoder_config():
+    return get_cached_config_section("image_encoder", IMAGE_ENCODER_DEFAULTS)
+
+
+def get_encode_executor():
+    """获取进程共享的图像编码线程池（PIL编码和缩放时释放GIL）"""
+    global _encode_executor
+    if _encode_executor is None:
+        with _encode_executor_lock:
+            if _encode_executor is None:
+                max_workers = int(get_image_encoder_config()["max_workers"])
+                _encode_executor = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                                      thread_name_prefix="DoubaoSeedEncode")
+    return _encode_executor
+
+
+def tensor_batch_to_uint8(image_tensor):
+    """一次性把 [B,H,W,C]（或 [H,W,C]）的图像tensor量化为uint8 RGB数组，无法转换时返回None"""
+    if image_tensor is None:
+        return None
+    try:
+        tensor = image_tensor.detach()
+        if tensor.dim() == 3:
+            tensor = tensor.unsqueeze(0)
+        if tensor.dim() != 4:
+            _log_warning(f"⚠️ 无法编码的图像tensor形状: {tuple(tensor.shape)}")
+            return None
+        if tensor.shape[-1] not in (1, 3, 4) and tensor.shape[1] in (1, 3, 4):
+            tensor = tensor.permute(0, 2, 3, 1)  # [B, C, H, W] -> [B, H, W, C]
+        if tensor.shape[-1] == 1:
+            tensor = tensor.expand(-1, -1, -1, 3)
+        elif tensor.shape[-1] == 4:
+            tensor = tensor[..., :3]
+        if tensor.dtype != torch.uint8:
+            tensor = tensor.float().clamp(0.0, 1.0).mul(255.0).round().to(torch.uint8)
+        return np.ascontiguousarray(tensor.cpu().numpy())
     except Exception as e:
-        _log_error(f"视频下载失败: {e}")
+        _log_warning(f"⚠️ 图像tensor量化失败: {e}")
         return None
 
-def video_to_comfyui_video(video_path: str):
-    """将视频文件转换为ComfyUI VIDEO对象 - 使用官方标准VideoFromFile"""
-    try:
-        if not video_path or not os.path.exists(video_path):
-            raise ValueError(f"视频文件不存在: {video_path}")
 
-        _log_info(f"🎬 开始创建ComfyUI VideoFromFile对象: {video_path}")
+def _stitch_frames_horizontally(frames):
+    """把多帧uint8图像水平拼接成一张大图（高度不足处填充白色）"""
+    max_height = max(frame.shape[0] for frame in frames)
+    padded = []
+    for frame in frames:
+        if frame.shape[0] < max_height:
+            pad = np.full((max_height - frame.shape[0], frame.shape[1], 3), 255, dtype=np.uint8)
+            frame = np.concatenate([frame, pad], axis=0)
+        padded.append(frame)
+    return np.concatenate(padded, axis=1)
 
-        # 使用ComfyUI官方标准：直接从文件路径创建VideoFromFile对象
-        video_obj = VideoFromFile(video_path)
 
-        _log_info("✅ 创建ComfyUI标准VideoFromFile对象成功")
+def _resolve_codec(codec, pil_image, downscaled):
+    """解析编码格式；auto沿用原规则：1024px以上用JPEG（缩放过的大图质量90，否则85），以下用PNG"""
+    codec = str(codec).lower()
+    if codec in _IMAGE_CODECS:
+        return codec, None
+    if max(pil_image.size) > 1024:
+        return "jpeg", 90 if downscaled else 85
+    return "png", None
 
-        # 测试get_dimensions方法
-        try:
-            dimensions = video_obj.get_dimensions()
-            _log_info(f"📊 视频尺寸: {dimensions}")
-        except Exception as e:
-            _log_warning(f"⚠️ 无法获取视频尺寸: {e}")
 
-        return video_obj
+def _save_image(pil_image, codec, quality, config):
+    buffered = io.BytesIO()
+    pil_format, _ = _IMAGE_CODECS[codec]
+    if codec == "png":
+        pil_image.save(buffered, format=pil_format, compress_level=int(config["png_compress_level"]))
+    else:
+        pil_image.save(buffered, format=pil_format, quality=int(quality))
+    return buffered.getvalue()
+
+
+def encode_pil_image(pil_image, codec, quality, config, target_bytes=0):
+    """按编码格式保存PIL图像；设置了目标字节数时二分搜索有损编码质量（PNG超出时改用JPEG）"""
+    data = _save_image(pil_image, codec, quality, config)
+    if not target_bytes or len(data) <= target_bytes:
+        return data, codec, quality
+    if codec == "png":
+        codec, quality = "jpeg", config["jpeg_quality"]
+        data = _save_image(pil_image, codec, quality, config)
+        if len(data) <= target_bytes:
+            return data, codec, quality
+
+    best = None
+    low, high = _MIN_LOSSY_QUALITY, int(quality) - 1
+    while low <= high:
+        mid = (low + high) // 2
+        candidate = _save_image(pil_image, codec, mid, config)
+        if len(candidate) <= target_bytes:
+            best = (candidate, codec, mid)
+            low = mid + 1
+        else:
+            high = mid - 1
+            if best is None:
+                data, quality = candidate, mid
+    return best or (data, codec, quality)
 
-    except Exception as e:
-        _log_error(f"创建VideoFromFile对象失败: {e}")
-        return None
 
-def create_video_path_wrapper(file_path):
-    """创建一个视频路径包装器，用于UtilNodes兼容性"""
-    # 直接返回文件路径字符串，让UtilNodes的os.path.basename()能正常工作
-    return file_path
+def encode_frame(frame, max_size=2048, config=None, target_bytes=None):
+    """把单帧uint8 RGB数组缩放并编码为EncodedImage
 
-def extract_video_last_frame(video_path, output_path=None):
+    设置了目标字节数时先搜索编码质量，最低质量仍超出则逐步缩小图像，直到满足目标或达到最小尺寸。
     """
-    提取视频的最后一帧图像
+    config = config or get_image_encoder_config()
+    if target_bytes is None:
+        target_bytes = int(config["target_bytes"] or 0)
+    pil_image = Image.fromarray(frame, mode="RGB")
+
+    # 检查图像尺寸，如果过大则压缩
+    original_size = pil_image.size
+    downscaled = max(original_size) > max_size
+    if downscaled:
+        pil_image = fast_downscale(pil_image, max_size)
+        _log_info(f"🔧 图像压缩: {original_size} -> {pil_image.size}")
+
+    start_codec, start_quality = _resolve_codec(config["codec"], pil_image, downscaled)
+    if start_quality is None:
+        start_quality = config["webp_quality"] if start_codec == "webp" else config["jpeg_quality"]
+    data, codec, quality = encode_pil_image(pil_image, start_codec, start_quality, config, target_bytes)
+    while target_bytes and len(data) > target_bytes and min(pil_image.size) > _MIN_UPLOAD_SIDE:
+        # 每个新尺寸都从配置的质量重新搜索：缩小后往往可以用更高的质量满足预算
+        pil_image = fast_downscale(pil_image, int(max(pil_image.size) * _DOWNSCALE_STEP))
+        data, codec, quality = encode_pil_image(pil_image, start_codec, start_quality, config, target_bytes)
+    if target_bytes and pil_image.size != original_size:
+        _log_info(f"🎯 按载荷预算编码: {original_size} -> {pil_image.size}, {len(data):,}/{target_bytes:,} 字节, 质量 {quality}")
+    return EncodedImage(data, _IMAGE_CODECS[codec][1])
+
+
+def _encoder_params(max_size, config, target_bytes):
+    return (max_size, config["codec"], config["png_compress_level"], config["jpeg_quality"],
+            config["webp_quality"], target_bytes)
+
+
+def _tensor_frame_count(image_tensor):
+    """[B,H,W,C]（或 [H,W,C]）图像tensor的帧数，无法编码的输入返回0"""
+    if image_tensor is None:
+        return 0
+    dim = image_tensor.dim() if hasattr(image_tensor, "dim") else len(getattr(image_tensor, "shape", ()))
+    if dim == 3:
+        return 1
+    if dim == 4:
+        return int(image_tensor.shape[0])
+    _log_warning(f"⚠️ 无法编码的图像tensor形状: {tuple(getattr(image_tensor, 'shape', ()))}")
+    return 0
+
+
+def _quantize_upload_frames(image_tensor, indices, stitch):
+    """把一个tensor中需要编码的帧一次性量化为uint8；stitch时所有帧拼接成一张，返回帧列表（失败时为None）"""
+    if stitch or list(indices) == list(range(_tensor_frame_count(image_tensor))):
+        batch = tensor_batch_to_uint8(image_tensor)
+    else:
+        if image_tensor.dim() == 3:
+            image_tensor = image_tensor.unsqueeze(0)
+        batch = tensor_batch_to_uint8(image_tensor[list(indices)])
+    if batch is None or len(batch) == 0:
+        return None
+    if stitch:
+        if len(batch) > 1:
+            _log_info(f"🔍 检测到多图batch输入 {tuple(batch.shape)}，将拼接成一张大图")
+        return [_stitch_frames_horizontally(batch) if len(batch) > 1 else batch[0]]
+    return list(batch)
+
+
+def _encode_and_cache(frame, key, max_size, config, cache_config, target_bytes):
+    encoded = encode_frame(frame, max_size, config, target_bytes)
+    if encoded and key is not None:
+        ENCODED_IMAGE_CACHE.put(key, encoded, int(cache_config["max_bytes"]))
+    return encoded
+
+
+def encode_images_for_upload(image_tensors, max_size=2048, stitch_batches=False, budget=None):
+    """批量编码上传图像：每个tensor一次性量化为uint8，各帧在线程池中并行编码，按输入顺序返回
+
+    stitch_batches=False 时batch中的每一帧各得到一个EncodedImage；
+    为True时每个tensor的多帧先水平拼接，每个tensor得到一个EncodedImage（与encode_image_for_upload一致）。
+    budget（PayloadBudget）限制上传尺寸，并把请求体/单图字节上限分摊为每张图像的目标字节数。
+    编码缓存按源tensor的内容查找，命中的图像不再量化和拼接。编码失败的位置为None。
+    """
+    config = get_image_encoder_config()
+    cache_config = get_cached_config_section("encode_cache", ENCODE_CACHE_DEFAULTS)
+
+    # 每项编码为一张上传图像：(源tensor, 帧下标)，拼接时帧下标为None（整个tensor拼成一张）
+    sources = []
+    for image_tensor in image_tensors:
+        count = _tensor_frame_count(image_tensor)
+        if stitch_batches:
+            sources.append((image_tensor, None) if count else None)
+        else:
+            sources.extend((image_tensor, index) for index in range(count))
+
+    image_count = sum(source is not None for source in sources)
+    target_bytes = int(config["target_bytes"] or 0)
+    if budget is not None:
+        if budget.max_image_side:
+            max_size = min(max_size, int(budget.max_image_side))
+        budget_target = image_byte_target(budget, image_count)
+        if budget_target:
+            target_bytes = min(target_bytes, budget_target) if target_bytes else budget_target
+
+    results = [None] * len(sources)
+    pending = {}  # 分组 -> (源tensor, [(输出位置, 帧下标, 缓存键)])；同一tensor中未命中的帧一起量化
+    params = _encoder_params(max_size, config, target_bytes)
+    for slot, source in enumerate(sources):
+        if source is None:
+            continue
+        image_tensor, index = source
+        key = None
+        if cache_config.get("enabled", True):
+            frame_tensor = image_tensor[index] if index is not None and image_tensor.dim() == 4 else image_tensor
+            key = tensor_content_key(frame_tensor, *params)
+            encoded = ENCODED_IMAGE_CACHE.get(key) if key is not None else None
+            if encoded is not None:
+                _log_info(f"♻️ 复用已编码图像: {encoded!r}")
+                results[slot] = encoded
+                continue
+        group = slot if index is None else id(image_tensor)
+        pending.setdefault(group, (image_tensor, []))[1].append((slot, index, key))
+
+    jobs = []
+    for image_tensor, entries in pending.values():
+        frames = _quantize_upload_frames(image_tensor, [index for _, index, _ in entries], stitch_batches)
+        if frames is not None:
+            jobs.extend((slot, frame, key) for (slot, _, key), frame in zip(entries, frames))
+
+    if len(jobs) > 1:
+        executor = get_encode_executor()
+        futures = [(slot, executor.submit(_encode_and_cache, frame, key, max_size, config, cache_config,
+                                          target_bytes)) for slot, frame, key in jobs]
+        for slot, future in futures:
+            results[slot] = future.result()
+    else:
+        for slot, frame, key in jobs:
+            results[slot] = _encode_and_cache(frame, key, max_size, config, cache_config, target_bytes)
+    return results
+
+
+def encode_image_for_upload(image_tensor, max_size=2048):
+    """将tensor编码为上传用的EncodedImage，支持自动压缩和多图拼接，失败返回None
+
+    相同内容、相同参数的图像只编码一次，结果缓存在进程级的 ENCODED_IMAGE_CACHE 中。
+    """
+    if image_tensor is None:
+        return None
+    return encode_images_for_upload([image_tensor], max_size, stitch_batches=True)[0]
+
+
+def image_to_base64(image_tensor, max_size=2048, return_data_url=True):
+    """将tensor转换为base64字符串，支持自动压缩和多图拼接
+
+    Args:
+        image_tensor: 输入的图像tensor
+        max_size: 最大尺寸限制
+        return_data_url: 是否返回完整的data URL格式，False则只返回base64字符串
+    """
+    encoded = encode_image_for_upload(image_tensor, max_size)
+    if not encoded:
+        return None
+    if return_data_url:
+        return encoded.data_url()
+    return encoded.base64()
+
+def _probe_download(session, url, timeout):
+    """用 Range: bytes=0-0 探测文件大小和服务器是否支持分段下载，返回 (总字节数或None, 是否支持Range)"""
+    with session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        if response.status_code == 206:
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            return (int(total) if total.isdigit() else None), True
+        length = response.headers.get("Content-Length", "")
+        accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+        return (int(length) if length.isdigit() else None), accepts_ranges
+
+
+def _split_ranges(total, parts):
+    """把 [0, total) 平均分为parts段，每段为 [起始, 结束(含), 已下载字节数]"""
+    size = -(-total // parts)
+    return [[start, min(start + size, total) - 1, 0] for start in range(0, total, size)]
+
+
+def _load_download_state(state_path, url, total):
+    """读取上次未完成下载的分段进度，URL或文件大小不一致时返回None（重新下载）"""
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("url") != url or state.get("total") != total:
+        return None
+    return state
+
+
+_DOWNLOAD_STATE_INTERVAL = 2.0  # 分段下载过程中保存进度文件的间隔（秒）
+
+
+def _save_download_state(state_path, state, lock):
+    """原子地写入进度文件（先写临时文件再替换），进程被强制结束时也不会留下半个JSON"""
+    with lock:
+        temp_path = f"{state_path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(temp_path, state_path)
+        except OSError as e:
+            _log_warning(f"⚠️ 保存下载进度失败: {e}")
+
+
+def _record_range_progress(state_path, state, index, done, lock):
+    """记录一段已写入文件的字节数并保存进度文件"""
+    with lock:
+        state["ranges"][index][2] = done
+    _save_download_state(state_path, state, lock)
+
+
+def _download_range(session, url, part_path, state_path, state, index, lock, timeout, config):
+    """下载一段字节范围并写入预分配文件的对应位置，连接中断时从已下载的位置重试
+
+    进度只记录已经写入文件的字节：每隔 _DOWNLOAD_STATE_INTERVAL 秒先flush再保存，分段结束时再保存一次，
+    因此进程被强制结束后最多重新下载每段最后几秒的数据。
+    """
+    start, end, done = state["ranges"][index]
+    length = end - start + 1
+    attempts = 0
+    while done < length:
+        try:
+            headers = {"Range": f"bytes={start + done}-{end}"}
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code != 206:
+                    raise IOError(f"分段请求未返回206: HTTP {response.status_code}")
+                with open(part_path, 'r+b') as f:
+                    f.seek(start + done)
+                    saved_at = time.monotonic()
+                    for chunk in response.iter_content(chunk_size=int(config["chunk_size"])):
+                        chunk = chunk[:length - done]
+                        if not chunk:
+                            continue
+                        f.write(chunk)
+                        done += len(chunk)
+                        if time.monotonic() - saved_at >= _DOWNLOAD_STATE_INTERVAL:
+                            f.flush()
+                            _record_range_progress(state_path, state, index, done, lock)
+                            saved_at = time.monotonic()
+        except Exception as e:
+            attempts += 1
+            if attempts > int(config["range_retries"]):
+                raise
+            _log_warning(f"⚠️ 分段 {index + 1} 下载中断（已完成 {done:,}/{length:,} 字节），重试 {attempts}: {e}")
+            time.sleep(min(2 ** attempts, 10))
+        finally:
+            # 文件已关闭（缓冲区已写出），done即为文件中已有的字节数
+            _record_range_progress(state_path, state, index, done, lock)
+
+
+def _download_single(session, url, part_path, timeout, chunk_size):
+    """服务器不支持Range时的单连接下载"""
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        with open(part_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    f.write(chunk)
+
+
+def download_file(url, output_path):
+    """下载URL到output_path，失败时抛出异常
+
+    服务器支持Range时按 Content-Range 预分配 <output_path>.part 并分段并行下载，各段进度保存在
+    <output_path>.part.json 中，中断后再次调用会从断点续传；完成后校验文件大小再重命名为output_path。
+    """
+    config = get_cached_config_section("downloads", DOWNLOAD_DEFAULTS)
+    timeout = config["video_timeout"]
+    session = get_http_session(url)
+    part_path = f"{output_path}.part"
+    state_path = f"{part_path}.json"
+
+    total, ranged = _probe_download(session, url, timeout)
+    if not ranged or not total:
+        _download_single(session, url, part_path, timeout, int(config["chunk_size"]))
+    else:
+        state = _load_download_state(state_path, url, total) if os.path.exists(part_path) else None
+        if state is None:
+            parts = max(1, min(int(config["range_parts"]), total // max(1, int(config["min_part_bytes"]))))
+            state = {"url": url, "total": total, "ranges": _split_ranges(total, parts)}
+            with open(part_path, 'wb') as f:
+                f.truncate(total)  # 预分配，各段直接写入自己的位置
+            _save_download_state(state_path, state, threading.Lock())
+            _log_info(f"📦 分段下载: {total / 1024 / 1024:.2f} MB，{len(state['ranges'])} 段")
+        else:
+            downloaded = sum(done for _, _, done in state["ranges"])
+            _log_info(f"⏯️ 续传未完成的下载: 已完成 {downloaded / 1024 / 1024:.2f}/{total / 1024 / 1024:.2f} MB")
+
+        lock = threading.Lock()
+        pending = [i for i, (start, end, done) in enumerate(state["ranges"]) if done < end - start + 1]
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(pending)), thread_name_prefix="DoubaoSeedRange") as executor:
+                futures = [executor.submit(_download_range, session, url, part_path, state_path, state, index, lock,
+                                           timeout, config)
+                           for index in pending]
+                for future in futures:
+                    future.result()
+        finally:
+            _save_download_state(state_path, state, lock)
+
+    size = os.path.getsize(part_path)
+    if total and size != total:
+        raise IOError(f"下载文件大小不一致: {size:,} != {total:,} 字节")
+    os.replace(part_path, output_path)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return output_path
+
+
+def download_video_from_url(video_url: str, output_dir: str = None) -> str:
+    """从URL下载视频文件"""
+    try:
+        if not video_url or not video_url.strip():
+            raise ValueError("视频URL为空")
+
+        # 解析URL获取文件名
+        parsed_url = urlparse(video_url)
+        filename = os.path.basename(parsed_url.path)
+        if not filename or '.' not in filename:
+            filename = f"video_{int(time.time())}.mp4"
+
+        # 确定输出目录
+        if output_dir is None:
+            # 使用ComfyUI的输出目录
+            try:
+                import folder_paths
+                output_dir = folder_paths.get_output_directory()
+            except:
+                output_dir = tempfile.gettempdir()
+
+        # 确保输出目录存在
+        os.makedirs(output_dir, exist_ok=True)
+
+        # 完整的输出路径
+        output_path = os.path.join(output_dir, filename)
+
+        # 有效期内下载过的URL直接从下载缓存取出（同一文件已在输出目录时不再复制）
+        cache = get_download_cache()
+        cached = cache.get(download_cache_key(video_url)) if cache else None
+        if cached:
+            cached_path = cached[0]
+            if not (os.path.exists(output_path) and os.path.getsize(output_path) == os.path.getsize(cached_path)):
+                link_or_copy(cached_path, output_path)
+            _log_info(f"♻️ 命中下载缓存: {video_url} -> {output_path}")
+            return output_path
+
+        _log_info(f"🔽 开始下载视频: {video_url}")
+        _log_info(f"📁 保存路径: {output_path}")
+
+        # 下载视频（使用共享连接池，支持Range时分段并行下载并可续传）
+        download_file(video_url, output_path)
+
+        write_download_cache(video_url, path=output_path)
+        file_size = os.path.getsize(output_path)
+        _log_info(f"✅ 视频下载完成: {filename} ({file_size / 1024 / 1024:.2f} MB)")
+
+        return output_path
+
+    except Exception as e:
+        _log_error(f"视频下载失败: {e}")
+        return None
+
+def video_to_comfyui_video(video_path: str):
+    """将视频文件转换为ComfyUI VIDEO对象 - 使用官方标准VideoFromFile"""
+    try:
+        if not video_path or not os.path.exists(video_path):
+            raise ValueError(f"视频文件不存在: {video_path}")
+
+        _log_info(f"🎬 开始创建ComfyUI VideoFromFile对象: {video_path}")
+
+        # 使用ComfyUI官方标准：直接从文件路径创建VideoFromFile对象
+        video_obj = VideoFromFile(video_path)
+
+        _log_info("✅ 创建ComfyUI标准VideoFromFile对象成功")
+
+        # 测试get_dimensions方法
+        try:
+            dimensions = video_obj.get_dimensions()
+            _log_info(f"📊 视频尺寸: {dimensions}")
+        except Exception as e:
+            _log_warning(f"⚠️ 无法获取视频尺寸: {e}")
+
+        return video_obj
+
+    except Exception as e:
+        _log_error(f"创建VideoFromFile对象失败: {e}")
+        return None
+
+def create_video_path_wrapper(file_path):
+    """创建一个视频路径包装器，用于UtilNodes兼容性"""
+    # 直接返回文件路径字符串，让UtilNodes的os.path.basename()能正常工作
+    return file_path
+
+def extract_video_last_frame(video_path, output_path=None):
+    """
+    提取视频的最后一帧图像
 
     Args:
         video_path: 视频文件路径
@@ -922,596 +1824,2884 @@ def create_blank_video_object(frames=30, height=512, width=512):
         # 最后的回退：创建一个简单的VideoFromFile对象
         return VideoFromFile("blank_video.mp4")
 
-def call_comfly_api(api_url, api_key, payload, timeout=900):
-    """调用Comfly API"""
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
+# ==================== 统一重试策略与截止时间 ====================
+# RetryPolicy 携带一次节点执行的总时间预算（截止时间），通过 contextvar 在各层之间传递：
+# 连环画场景重试、节点重试循环、单次请求超时和连接池层的urllib3重试共享同一个截止时间。
+# 429/503 响应的 Retry-After 会被遵守；剩余预算放不下下一次尝试时立即停止重试。
+
+RETRY_POLICY_DEFAULTS = {
+    "max_attempts": 3,          # 默认最大尝试次数（节点的 max_retries 会覆盖）
+    "total_budget": 1800,       # 一次调用（含所有层级的重试）的总时间预算（秒）
+    "attempt_timeout": 900,     # 单次请求超时上限（秒）
+    "backoff_base": 1,          # 指数退避基数（秒）：base * 2 ** attempt
+    "backoff_max": 60,          # 单次退避等待上限（秒）
+    "min_attempt_time": 10,     # 剩余预算少于该值时不再发起新的尝试（秒）
+    "pool_retries": 1,          # 连接池层（urllib3）对建立连接失败的重试次数（不重试状态码和读取错误）
+}
 
-    # 调试信息
-    _log_info(f"🔍 Comfly API调用:")
-    _log_info(f"   - 端点: {api_url}/images/generations")
-    _log_info(f"   - 模型: {payload.get('model', 'N/A')}")
-    _log_info(f"   - 包含图像: {'image' in payload and bool(payload.get('image'))}")
-    if 'image' in payload and payload.get('image'):
-        _log_info(f"   - 图像数量: {len(payload['image'])}")
-        _log_info(f"   - 第一张图像长度: {len(payload['image'][0]) if payload['image'] else 0}")
+RETRY_AFTER_STATUS_CODES = (429, 503)
 
-    try:
-        # 使用SSL兼容的session
-        session = create_ssl_compatible_session()
-        response = session.post(
-            f"{api_url}/images/generations",
-            headers=headers,
-            json=payload,
-            timeout=timeout
-        )
-        return response
-    except Exception as e:
-        _log_error(f"Comfly API调用失败: {e}")
-        return None
 
-def call_openai_compatible_api(api_url, api_key, payload, timeout=900):
-    """调用OpenAI兼容API - 支持T8图像编辑"""
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
+class RetryBudgetExceeded(Exception):
+    """总时间预算已用完"""
 
-    try:
-        # 检查是否是T8镜像站
-        if "t8star.cn" in api_url or "ai.t8star.cn" in api_url:
-            # 检查是否有图像输入
-            has_images = "image" in payload and payload["image"]
-
-            # 对于T8，图生图也使用images/generations端点，而不是chat/completions
-            # 只有特定的图像编辑任务才使用chat/completions
-            use_chat_endpoint = False  # 暂时禁用chat端点，统一使用images/generations
-
-            if has_images and use_chat_endpoint:
-                # 图像编辑：使用chat/completions端点（暂时禁用）
-                url = "https://ai.t8star.cn/v1/chat/completions"
-                _log_info(f"🎨 T8图像编辑端点: {url}")
-
-                # 构建T8图像编辑的payload格式
-                messages = [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": payload.get("prompt", "")
-                            }
-                        ]
-                    }
-                ]
 
-                # 添加图像到消息中
-                image_urls = payload.get("image", [])
-                if isinstance(image_urls, str):
-                    image_urls = [image_urls]
+class RetryPolicy:
+    """重试/截止时间策略：限制尝试次数，并让所有尝试共享一个总截止时间"""
 
-                for image_url in image_urls:
-                    messages[0]["content"].append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": image_url
-                        }
-                    })
+    def __init__(self, max_attempts=3, total_budget=1800, attempt_timeout=900, backoff_base=1,
+                 backoff_max=60, min_attempt_time=10, deadline=None):
+        self.max_attempts = max(1, int(max_attempts))
+        self.attempt_timeout = float(attempt_timeout)
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self.min_attempt_time = float(min_attempt_time)
+        self.deadline = deadline if deadline is not None else time.monotonic() + float(total_budget)
 
-                t8_payload = {
-                    "model": payload.get("model", "doubao-seedream-4-0-250828"),
-                    "messages": messages,
-                    "max_tokens": 4096,
-                    "temperature": 0.7
-                }
+    @classmethod
+    def from_config(cls, max_attempts=None, attempt_timeout=None):
+        """按配置文件 "retry_policy" 段创建新策略（新的截止时间）"""
+        config = get_cached_config_section("retry_policy", RETRY_POLICY_DEFAULTS)
+        return cls(
+            max_attempts=max_attempts or config["max_attempts"],
+            total_budget=config["total_budget"],
+            attempt_timeout=attempt_timeout or config["attempt_timeout"],
+            backoff_base=config["backoff_base"],
+            backoff_max=config["backoff_max"],
+            min_attempt_time=config["min_attempt_time"],
+        )
 
-                _log_info(f"🎨 T8图像编辑请求: 模型={t8_payload.get('model')}, 消息数={len(t8_payload.get('messages', []))}")
+    def derive(self, max_attempts=None, attempt_timeout=None):
+        """派生内层策略：可以有自己的尝试次数和单次超时，但共享同一个截止时间"""
+        return RetryPolicy(
+            max_attempts=max_attempts or self.max_attempts,
+            attempt_timeout=min(float(attempt_timeout or self.attempt_timeout), self.attempt_timeout),
+            backoff_base=self.backoff_base,
+            backoff_max=self.backoff_max,
+            min_attempt_time=self.min_attempt_time,
+            deadline=self.deadline,
+        )
 
-            else:
-                # 图像生成：使用images/generations端点
-                url = "https://ai.t8star.cn/v1/images/generations"
-                _log_info(f"🖼️ T8图像生成端点: {url}")
-
-                # 构建T8图像生成的payload格式
-                t8_payload = {
-                    "prompt": payload.get("prompt", ""),
-                    "model": payload.get("model", "doubao-seedream-4-0-250828"),
-                    "response_format": payload.get("response_format", "url")
-                }
+    def remaining(self):
+        """剩余预算（秒）"""
+        return self.deadline - time.monotonic()
+
+    def has_time_for_attempt(self):
+        return self.remaining() >= self.min_attempt_time
+
+    def timeout_for_attempt(self, timeout=None):
+        """本次尝试可用的超时：请求自身的超时、单次上限和剩余预算三者取最小"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise RetryBudgetExceeded("重试预算已用完")
+        return min(float(timeout or self.attempt_timeout), self.attempt_timeout, remaining)
+
+    def retry_delay(self, attempt, response=None, base_delay=None):
+        """下一次重试前的等待时间：优先使用429/503的Retry-After，否则使用固定间隔或指数退避"""
+        retry_after = parse_retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        if base_delay is not None:
+            return base_delay
+        return min(self.backoff_base * (2 ** attempt), self.backoff_max)
+
+    def should_retry(self, attempt, delay=0):
+        """第attempt次（从0开始）尝试失败后，是否还值得再试一次"""
+        if attempt + 1 >= self.max_attempts:
+            return False
+        if self.remaining() - delay < self.min_attempt_time:
+            _log_warning(f"⏱️ 剩余时间预算 {max(0.0, self.remaining()):.0f}s 不足以再尝试一次，停止重试")
+            return False
+        return True
 
-                # 添加可选参数
-                if "size" in payload:
-                    t8_payload["size"] = payload["size"]
-                if "n" in payload:
-                    t8_payload["n"] = payload["n"]
-                if "seed" in payload and payload["seed"] != -1:
-                    t8_payload["seed"] = payload["seed"]
-                if "watermark" in payload:
-                    t8_payload["watermark"] = payload["watermark"]
-                if "tail_on_partial" in payload:
-                    t8_payload["tail_on_partial"] = payload["tail_on_partial"]
-
-                # 添加图像输入支持（图生图）
-                if has_images:
-                    t8_payload["image"] = payload["image"]
-                    _log_info(f"🖼️ T8图生图请求: 包含 {len(payload['image'])} 张输入图像")
-                    _log_info(f"🔍 图像数据类型: {type(payload['image'])}")
-                    if payload['image']:
-                        _log_info(f"🔍 第一张图像数据长度: {len(payload['image'][0]) if payload['image'][0] else 0} 字符")
-
-                _log_info(f"🖼️ T8图像生成请求: 模型={t8_payload.get('model')}, 提示词长度={len(t8_payload.get('prompt', ''))}")
-
-        elif api_url.endswith('/v1/chat/completions'):
-            url = api_url.replace('/v1/chat/completions', '/v1/images/generations')
-            _log_info(f"🔗 转换聊天端点为图像生成端点: {url}")
-            t8_payload = payload
-        else:
-            # 其他OpenAI兼容API
-            url = f"{api_url}/v1/images/generations"
-            _log_info(f"🔗 使用标准OpenAI端点: {url}")
-            t8_payload = payload
 
-        # 尝试多种连接方式解决SSL问题
-        response = None
-        last_error = None
+def parse_retry_after(response):
+    """解析429/503响应的Retry-After头（秒数或HTTP日期），没有时返回None"""
+    if response is None or getattr(response, "status_code", None) not in RETRY_AFTER_STATUS_CODES:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
 
-        # 方法1：禁用所有SSL验证的简单方式
-        try:
-            import urllib3
-            urllib3.disable_warnings()
 
-            # 设置环境变量禁用SSL验证
-            import os
-            os.environ['PYTHONHTTPSVERIFY'] = '0'
-            os.environ['CURL_CA_BUNDLE'] = ''
+_retry_policy_var = contextvars.ContextVar("doubao_retry_policy", default=None)
 
-            response = requests.post(
-                url,
-                headers=headers,
-                json=t8_payload,
-                timeout=timeout,
-                verify=False,
-                stream=False
-            )
-            _log_info(f"✅ 简单SSL禁用方式成功")
 
-        except Exception as simple_error:
-            last_error = simple_error
-            _log_warning(f"简单SSL禁用失败: {simple_error}")
+def current_retry_policy():
+    """当前上下文中生效的重试策略，没有时返回None"""
+    return _retry_policy_var.get()
 
-            # 方法2：使用SSL兼容的session
-            try:
-                session = create_ssl_compatible_session()
-                response = session.post(
-                    url,
-                    headers=headers,
-                    json=t8_payload,
-                    timeout=timeout
-                )
-                _log_info(f"✅ SSL兼容session成功")
 
-            except Exception as ssl_error:
-                last_error = ssl_error
-                _log_warning(f"SSL兼容session失败: {ssl_error}")
+def get_retry_policy(max_attempts=None, attempt_timeout=None):
+    """获取本层使用的重试策略：外层已有策略时共享其截止时间，否则按配置新建"""
+    policy = current_retry_policy()
+    if policy is None:
+        return RetryPolicy.from_config(max_attempts, attempt_timeout)
+    return policy.derive(max_attempts, attempt_timeout)
 
-                # 方法3：使用curl作为备用方案
-                try:
-                    import subprocess
-                    import tempfile
 
-                    # 将payload写入临时文件
-                    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
-                        json.dump(t8_payload, f)
-                        temp_file = f.name
+@contextmanager
+def retry_budget(policy):
+    """在with块内让所有下层调用共享该策略的截止时间"""
+    token = _retry_policy_var.set(policy)
+    try:
+        yield policy
+    finally:
+        _retry_policy_var.reset(token)
 
-                    # 构建curl命令
-                    curl_cmd = [
-                        'curl', '-k', '-X', 'POST',
-                        '-H', 'Content-Type: application/json',
-                        '-H', f'Authorization: Bearer {headers["Authorization"].split(" ")[1]}',
-                        '-d', f'@{temp_file}',
-                        '--connect-timeout', '30',
-                        '--max-time', str(timeout),
-                        url
-                    ]
 
-                    result = subprocess.run(curl_cmd, capture_output=True, text=True, timeout=timeout)
+def budgeted_timeout(timeout):
+    """按当前策略的剩余预算收紧请求超时"""
+    policy = current_retry_policy()
+    if policy is None:
+        return timeout
+    return policy.timeout_for_attempt(timeout)
 
-                    # 清理临时文件
-                    os.unlink(temp_file)
 
-                    if result.returncode == 0:
-                        # 创建模拟response对象
-                        class MockResponse:
-                            def __init__(self, text, status_code=200):
-                                self.text = text
-                                self.status_code = status_code
-                            def json(self):
-                                return json.loads(self.text)
+class BudgetedRetry(Retry):
+    """连接池层的urllib3重试：与当前RetryPolicy共享截止时间，预算不足时不再重试"""
 
-                        response = MockResponse(result.stdout)
-                        _log_info(f"✅ curl备用方案成功")
-                    else:
-                        raise Exception(f"curl失败: {result.stderr}")
+    def increment(self, *args, **kwargs):
+        policy = current_retry_policy()
+        if policy is not None and not policy.has_time_for_attempt():
+            return Retry.increment(self.new(total=0), *args, **kwargs)
+        return super().increment(*args, **kwargs)
 
-                except Exception as curl_error:
-                    _log_warning(f"curl备用方案失败: {curl_error}")
-                    raise last_error  # 抛出最后一个错误
 
-        _log_info(f"🔍 T8 API响应状态: {response.status_code}")
-        if response.status_code != 200:
+class RetryAttempts:
+    """一次调用的尝试序列，同步和协程版本的重试循环共用
+
+    迭代时按 policy 的尝试次数依次产出候选（失败后轮换到下一个）；available 判定为不可用的候选
+    （如熔断中的镜像站）直接跳过，不占用尝试次数，所有候选都不可用时提前结束。
+    """
+
+    def __init__(self, policy, candidates, available=None, base_delay=None, label="API调用"):
+        self.policy = policy
+        self.candidates = list(candidates)
+        self.attempt = -1
+        self._available = available
+        self._base_delay = base_delay
+        self._label = label
+        self._next = 0
+
+    def _usable(self, candidate):
+        return self._available is None or self._available(candidate)
+
+    def __iter__(self):
+        previous = None
+        while self.attempt + 1 < self.policy.max_attempts:
+            count = len(self.candidates)
+            for offset in range(count):
+                index = (self._next + offset) % count
+                if self._usable(self.candidates[index]):
+                    break
+            else:
+                _log_error("❌ 所有候选镜像站均不可用（熔断中或请求构建失败），快速失败")
+                return
+            self._next = index + 1
+            candidate = self.candidates[index]
+            if previous is not None and candidate is not previous:
+                _log_info(f"🔁 切换到备用镜像站: {getattr(candidate, 'name', candidate)}")
+            previous = candidate
+            self.attempt += 1
+            yield candidate
+
+    def retract(self):
+        """本次产出的候选实际上没有发出请求（如请求构建失败），归还这次尝试"""
+        self.attempt -= 1
+
+    def following(self, candidate):
+        """candidate之后的下一个可用候选（对冲请求的目标），没有时返回None"""
+        start = self.candidates.index(candidate)
+        for offset in range(1, len(self.candidates)):
+            other = self.candidates[(start + offset) % len(self.candidates)]
+            if self._usable(other):
+                return other
+        return None
+
+    def backoff(self, response=None, error=None):
+        """本次尝试失败后下一次尝试前的等待时间，不再重试时返回None"""
+        if isinstance(error, RetryBudgetExceeded):
+            _log_warning("⏱️ 重试时间预算已用完，停止重试")
+            return None
+        if error is not None:
+            _log_warning(f"{self._label}异常 (尝试 {self.attempt + 1}/{self.policy.max_attempts}): {error}")
+        delay = self.policy.retry_delay(self.attempt, response, self._base_delay)
+        if not self.policy.should_retry(self.attempt, delay):
+            return None
+        return delay
+
+
+# ==================== 异步传输层 ====================
+# 所有镜像站API调用都经过 http_request / async_http_request。
+# 安装了httpx时，请求在一个后台事件循环上通过异步客户端并发执行，
+# 同步的节点方法通过 run_in_transport_loop 这个同步门面等待结果。
+
+TRANSPORT_DEFAULTS = {
+    "backend": "auto",                # auto: 安装httpx时使用异步httpx，否则使用requests；也可指定 httpx / requests
+    "max_connections": 64,            # 每个主机异步客户端的最大并发连接数
+    "max_keepalive_connections": 32,  # 每个主机保留的keep-alive连接数
+    "keepalive_expiry": 60,           # keep-alive连接空闲过期时间（秒）
+    "http2": False,                   # 是否启用HTTP/2（需要安装h2）
+}
+
+_config_section_cache = {}
+_transport_loop = None
+_transport_loop_thread = None
+_transport_loop_lock = threading.Lock()
+_async_clients = {}
+
+
+def get_cached_config_section(section_name, defaults):
+    """读取并缓存配置段，供每次请求都会访问的热路径使用"""
+    section = _config_section_cache.get(section_name)
+    if section is None:
+        section = get_config_section(section_name, defaults)
+        _config_section_cache[section_name] = section
+    return section
+
+
+configure_logging(get_cached_config_section("logging", LOGGING_DEFAULTS))
+
+
+def get_transport_config():
+    """获取传输层配置"""
+    return get_cached_config_section("transport", TRANSPORT_DEFAULTS)
+
+
+def use_async_transport():
+    """判断是否使用httpx异步传输后端"""
+    backend = str(get_transport_config().get("backend", "auto")).lower()
+    if backend == "requests":
+        return False
+    if not HAS_HTTPX:
+        if backend == "httpx" and not _config_section_cache.get("_httpx_warned"):
+            _config_section_cache["_httpx_warned"] = True
+            _log_warning("配置要求使用httpx传输，但httpx未安装，回退到requests")
+        return False
+    return True
+
+
+def _run_transport_loop(loop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_transport_loop():
+    """获取（必要时启动）后台传输事件循环"""
+    global _transport_loop, _transport_loop_thread
+    if _transport_loop is None or _transport_loop.is_closed():
+        with _transport_loop_lock:
+            if _transport_loop is None or _transport_loop.is_closed():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=_run_transport_loop, args=(loop,),
+                    name="DoubaoSeedTransportLoop", daemon=True
+                )
+                thread.start()
+                _transport_loop, _transport_loop_thread = loop, thread
+    return _transport_loop
+
+
+def in_transport_loop_thread():
+    """当前线程是否为后台传输事件循环线程"""
+    return _transport_loop_thread is not None and threading.current_thread() is _transport_loop_thread
+
+
+async def _with_retry_policy(coro, policy):
+    """在传输事件循环的任务中恢复调用方的重试策略（run_coroutine_threadsafe不会复制contextvars）"""
+    _retry_policy_var.set(policy)
+    return await coro
+
+
+def _submit_to_transport_loop(coro, loop):
+    policy = current_retry_policy()
+    if policy is not None:
+        coro = _with_retry_policy(coro, policy)
+    return asyncio.run_coroutine_threadsafe(coro, loop)
+
+
+def run_in_transport_loop(coro, timeout=None):
+    """同步门面：在后台传输事件循环中执行协程并阻塞等待结果"""
+    loop = get_transport_loop()
+    if in_transport_loop_thread():
+        coro.close()
+        raise RuntimeError("不能在传输事件循环线程内同步等待协程")
+    return _submit_to_transport_loop(coro, loop).result(timeout)
+
+
+async def await_in_transport_loop(coro):
+    """异步门面：从任意事件循环等待一个在后台传输事件循环上执行的协程"""
+    loop = get_transport_loop()
+    if in_transport_loop_thread():
+        return await coro
+    return await asyncio.wrap_future(_submit_to_transport_loop(coro, loop))
+
+
+def _get_async_client(url):
+    """获取URL所在主机的httpx异步客户端（只能在传输事件循环中调用）"""
+    host_key = _host_key(url)
+    client = _async_clients.get(host_key)
+    if client is None or client.is_closed:
+        config = get_transport_config()
+        limits = httpx.Limits(
+            max_connections=int(config["max_connections"]),
+            max_keepalive_connections=int(config["max_keepalive_connections"]),
+            keepalive_expiry=float(config["keepalive_expiry"]),
+        )
+        try:
+            client = httpx.AsyncClient(verify=get_shared_ssl_context(), limits=limits,
+                                       http2=bool(config["http2"]), timeout=None)
+        except ImportError:
+            _log_warning("HTTP/2需要安装h2，已回退到HTTP/1.1")
+            client = httpx.AsyncClient(verify=get_shared_ssl_context(), limits=limits, timeout=None)
+        _async_clients[host_key] = client
+    return client
+
+
+_JSON_STREAM_CHUNK = 3 * 64 * 1024  # 每次base64编码的原始字节数（3的倍数，保证分块编码结果可直接拼接）
+
+
+def _json_pieces(obj):
+    """按顺序产出JSON片段：普通值直接序列化为bytes，EncodedImage原样产出以便分块编码"""
+    if isinstance(obj, EncodedImage):
+        yield obj
+    elif isinstance(obj, dict):
+        yield b"{"
+        for index, (key, value) in enumerate(obj.items()):
+            if index:
+                yield b","
+            yield json.dumps(str(key), ensure_ascii=False).encode("utf-8") + b":"
+            yield from _json_pieces(value)
+        yield b"}"
+    elif isinstance(obj, (list, tuple)):
+        yield b"["
+        for index, value in enumerate(obj):
+            if index:
+                yield b","
+            yield from _json_pieces(value)
+        yield b"]"
+    else:
+        yield json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def iter_json_body(obj, chunk_size=_JSON_STREAM_CHUNK):
+    """把载荷编码为JSON字节块，图像数据边编码边产出，不会在内存中拼出完整的请求体"""
+    for piece in _json_pieces(obj):
+        if isinstance(piece, EncodedImage):
+            yield b'"' + piece.prefix.encode("ascii")
+            data = memoryview(piece.data)
+            for start in range(0, len(data), chunk_size):
+                yield base64.b64encode(data[start:start + chunk_size])
+            yield b'"'
+        else:
+            yield piece
+
+
+def json_body_length(obj):
+    """计算JSON请求体的字节数（不做base64编码）"""
+    return sum(len(piece) + 2 if isinstance(piece, EncodedImage) else len(piece) for piece in _json_pieces(obj))
+
+
+class StreamingBody:
+    """流式请求体基类：requests按文件对象读取，httpx按异步迭代器读取，长度预先计算以发送Content-Length"""
+
+    content_type = None
+
+    def __init__(self, length):
+        self._length = length
+        self.seek(0)
+
+    def _iter_chunks(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return self._iter_chunks()
+
+    async def aiter_chunks(self):
+        for chunk in self._iter_chunks():
+            yield chunk
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=0):
+        """只支持回到开头或跳到指定位置（重试/重定向时urllib3和requests会回绕请求体）"""
+        if whence != 0:
+            raise io.UnsupportedOperation("流式请求体只支持绝对位置seek")
+        self._chunks = self._iter_chunks()
+        self._buffer = b""
+        self._offset = 0
+        self._position = 0
+        if offset:
+            self.read(offset)
+        return self._position
+
+    def read(self, size=-1):
+        unbounded = size is None or size < 0
+        parts = []
+        while unbounded or size > 0:
+            if self._offset >= len(self._buffer):
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    break
+                self._buffer, self._offset = chunk, 0
+            end = len(self._buffer) if unbounded else self._offset + size
+            piece = self._buffer[self._offset:end]
+            self._offset += len(piece)
+            parts.append(piece)
+            if not unbounded:
+                size -= len(piece)
+        data = b"".join(parts)
+        self._position += len(data)
+        return data
+
+
+class JsonBodyStream(StreamingBody):
+    """流式JSON请求体，图像数据边base64编码边发送"""
+
+    content_type = "application/json"
+
+    def __init__(self, obj):
+        self._obj = obj
+        super().__init__(json_body_length(obj))
+
+    def _iter_chunks(self):
+        return iter_json_body(self._obj)
+
+
+class MultipartBodyStream(StreamingBody):
+    """流式multipart/form-data请求体，图像以原始字节上传，不做base64编码"""
+
+    def __init__(self, fields, files):
+        self.boundary = f"----DoubaoSeed{os.urandom(12).hex()}"
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self._parts = []
+        for name, value in fields:
+            header = f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+            self._parts.append(header.encode("utf-8") + str(value).encode("utf-8") + b"\r\n")
+        for name, filename, mime_type, data in files:
+            header = (f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                      f'Content-Type: {mime_type}\r\n\r\n')
+            self._parts.extend([header.encode("utf-8"), data, b"\r\n"])
+        self._parts.append(f"--{self.boundary}--\r\n".encode("ascii"))
+        super().__init__(sum(len(part) for part in self._parts))
+
+    def _iter_chunks(self):
+        return iter(self._parts)
+
+
+def _requests_request(method, url, headers=None, json_body=None, data=None, timeout=None, stream=False):
+    """通过共享requests session发送请求，JSON请求体以流的方式写出"""
+    if json_body is not None:
+        data = JsonBodyStream(json_body)
+    return get_http_session(url).request(method, url, headers=headers, data=data, timeout=timeout, stream=stream)
+
+
+def _as_requests_exception(error):
+    """把httpx的传输异常转换为对应的requests异常，调用方不论使用哪个后端都按requests.exceptions处理"""
+    if not HAS_HTTPX or not isinstance(error, httpx.HTTPError):
+        return error
+    if isinstance(error, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(str(error))
+    if isinstance(error, httpx.ReadTimeout):
+        return requests.exceptions.ReadTimeout(str(error))
+    if isinstance(error, httpx.TimeoutException):
+        return requests.exceptions.Timeout(str(error))
+    cause = error
+    while cause is not None:
+        if isinstance(cause, ssl.SSLError):
+            return requests.exceptions.SSLError(str(error))
+        cause = cause.__cause__ or cause.__context__
+    if isinstance(error, (httpx.NetworkError, httpx.RemoteProtocolError)):
+        return requests.exceptions.ConnectionError(str(error))
+    if isinstance(error, httpx.TooManyRedirects):
+        return requests.exceptions.TooManyRedirects(str(error))
+    return requests.exceptions.RequestException(str(error))
+
+
+async def _async_http_request(method, url, headers=None, json_body=None, data=None, timeout=None):
+    breaker = _acquire_circuit(method, url)
+    started = time.monotonic()
+    try:
+        if use_async_transport():
+            client = _get_async_client(url)
+            if json_body is not None:
+                data = JsonBodyStream(json_body)
+            if isinstance(data, StreamingBody):
+                headers = dict(headers or {}, **{"Content-Length": str(len(data))})
+                data = data.aiter_chunks()
+            response = await client.request(method, url, headers=headers, content=data, timeout=timeout)
+        else:
+            response = await asyncio.to_thread(_requests_request, method, url, headers, json_body, data, timeout)
+    except asyncio.CancelledError:
+        if breaker:
+            breaker.release_trial()
+        raise
+    except Exception as e:
+        _record_request_outcome(method, url, started)
+        translated = _as_requests_exception(e)
+        if translated is e:
+            raise
+        raise translated from e
+    _record_request_outcome(method, url, started, response)
+    return response
+
+
+async def async_http_request(method, url, headers=None, json_body=None, data=None, timeout=None):
+    """异步发送HTTP请求，可在任意事件循环中await"""
+    buckets = await RATE_LIMITER.async_acquire(_request_api_key(headers), url)
+    response = None
+    try:
+        timeout = budgeted_timeout(timeout)  # 排队时间也计入重试预算
+        response = await await_in_transport_loop(
+            _async_http_request(method, url, headers=headers, json_body=json_body, data=data, timeout=timeout)
+        )
+        return response
+    finally:
+        RATE_LIMITER.release(buckets, response)
+
+
+def http_request(method, url, headers=None, json_body=None, data=None, timeout=None):
+    """同步发送HTTP请求：异步后端可用时经由后台事件循环执行，否则直接使用共享requests session"""
+    buckets = RATE_LIMITER.acquire(_request_api_key(headers), url)
+    response = None
+    try:
+        timeout = budgeted_timeout(timeout)  # 排队时间也计入重试预算
+        if use_async_transport() and not in_transport_loop_thread():
+            response = run_in_transport_loop(
+                _async_http_request(method, url, headers=headers, json_body=json_body, data=data, timeout=timeout)
+            )
+            return response
+        _acquire_circuit(method, url)
+        started = time.monotonic()
+        try:
+            response = _requests_request(method, url, headers=headers, json_body=json_body, data=data, timeout=timeout)
+        except Exception:
+            _record_request_outcome(method, url, started)
+            raise
+        _record_request_outcome(method, url, started, response)
+        return response
+    finally:
+        RATE_LIMITER.release(buckets, response)
+
+
+@contextmanager
+def http_stream_request(method, url, headers=None, json_body=None, data=None, timeout=None):
+    """流式发送HTTP请求（用于SSE），在with块内逐步读取响应体；始终使用共享requests session"""
+    buckets = RATE_LIMITER.acquire(_request_api_key(headers), url)
+    response = None
+    try:
+        timeout = budgeted_timeout(timeout)
+        _acquire_circuit(method, url)
+        started = time.monotonic()
+        try:
+            response = _requests_request(method, url, headers=headers, json_body=json_body, data=data,
+                                         timeout=timeout, stream=True)
+        except Exception:
+            _record_request_outcome(method, url, started)
+            raise
+        _record_request_outcome(method, url, started, response)  # 以收到响应头的时间计入延迟统计
+        yield response
+    finally:
+        if response is not None:
+            response.close()
+        RATE_LIMITER.release(buckets, response)
+
+
+# ==================== 镜像站健康度与自动选择 ====================
+# 每次经过 http_request / async_http_request 的镜像站API调用都会记录耗时和成败，
+# 按 (主机, 接口类型) 维护滚动窗口。mirror_site 选择 "auto" 时，
+# 节点按健康度和延迟分位数给支持该模型的镜像站排序，并在重试时依次切换到下一个候选。
+
+AUTO_MIRROR = "auto"
+
+MIRROR_HEALTH_DEFAULTS = {
+    "window": 50,               # 每个镜像站每类接口保留的最近样本数
+    "sample_ttl": 900,          # 样本有效期（秒），过期样本不再参与统计，故障镜像站可逐渐恢复
+    "min_samples": 3,           # 少于该样本数时视为"未知"，排在已知健康的镜像站之后
+    "max_error_rate": 0.5,      # 错误率超过该值视为不健康
+    "latency_percentile": 90,   # 排序使用的延迟分位数
+}
+
+MirrorTarget = namedtuple("MirrorTarget", ["name", "api_url", "api_format", "api_key"])
+
+
+def get_mirror_health_config():
+    """获取镜像站健康度统计配置"""
+    return get_cached_config_section("mirror_health", MIRROR_HEALTH_DEFAULTS)
+
+
+def classify_endpoint(method, url):
+    """根据请求路径判断接口类型：image / video / video_status / chat，无法识别时返回None"""
+    path = urlparse(url).path
+    if "/images/" in path:
+        return "image"
+    if path.endswith("/chat/completions"):
+        return "chat"
+    if "videos/generations" in path or "contents/generations/tasks" in path:
+        return "video_status" if method.upper() == "GET" else "video"
+    return None
+
+
+def _percentile(sorted_values, percentile):
+    """最近秩法计算分位数"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(percentile * len(sorted_values) / 100.0) - 1))
+    return sorted_values[rank]
+
+
+class MirrorHealthTracker:
+    """按 (主机, 接口类型) 记录最近请求的延迟和成败，线程安全"""
+
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, host, kind, latency, ok):
+        config = get_mirror_health_config()
+        with self._lock:
+            samples = self._samples.get((host, kind))
+            if samples is None:
+                samples = self._samples[(host, kind)] = deque(maxlen=int(config["window"]))
+            samples.append((time.monotonic(), latency, ok))
+
+    def stats(self, host, kind):
+        """返回 {"count", "error_rate", "latency"}，latency为配置分位数下成功请求的延迟"""
+        config = get_mirror_health_config()
+        cutoff = time.monotonic() - float(config["sample_ttl"])
+        with self._lock:
+            samples = [s for s in self._samples.get((host, kind), ()) if s[0] >= cutoff]
+        if not samples:
+            return {"count": 0, "error_rate": 0.0, "latency": None}
+        errors = sum(1 for _, _, ok in samples if not ok)
+        latencies = sorted(latency for _, latency, ok in samples if ok)
+        return {
+            "count": len(samples),
+            "error_rate": errors / len(samples),
+            "latency": _percentile(latencies, float(config["latency_percentile"])),
+        }
+
+    def latency_percentile(self, host, kind, percentile):
+        """成功请求延迟的任意分位数，没有样本时返回None"""
+        config = get_mirror_health_config()
+        cutoff = time.monotonic() - float(config["sample_ttl"])
+        with self._lock:
+            latencies = sorted(latency for ts, latency, ok in self._samples.get((host, kind), ())
+                               if ok and ts >= cutoff)
+        return _percentile(latencies, percentile)
+
+    def rank(self, candidates, kind):
+        """给候选 (名称, URL) 排序：已知健康按延迟升序，其次未知，最后不健康按错误率升序"""
+        config = get_mirror_health_config()
+        min_samples = int(config["min_samples"])
+        max_error_rate = float(config["max_error_rate"])
+        healthy, unknown, unhealthy = [], [], []
+        for index, (name, url) in enumerate(candidates):
+            stats = self.stats(_host_key(url), kind)
+            if not circuit_allows(url, kind):
+                unhealthy.append((1.0, index, name))
+            elif stats["count"] < min_samples:
+                unknown.append((index, name))
+            elif stats["error_rate"] > max_error_rate or stats["latency"] is None:
+                unhealthy.append((stats["error_rate"], index, name))
+            else:
+                healthy.append((stats["latency"], index, name))
+        return ([name for _, _, name in sorted(healthy)] +
+                [name for _, name in unknown] +
+                [name for _, _, name in sorted(unhealthy)])
+
+
+MIRROR_HEALTH = MirrorHealthTracker()
+
+
+# ==================== 镜像站熔断器 ====================
+# 每个 (主机, 接口类型) 一个熔断器：连续失败达到阈值后打开，打开期间请求直接抛出
+# CircuitOpenError 而不发往镜像站；冷却时间过后进入半开状态放行少量试探请求，
+# 试探成功则关闭，失败则重新打开。
+
+CIRCUIT_BREAKER_DEFAULTS = {
+    "failure_threshold": 3,     # 连续失败多少次后打开熔断器
+    "reset_timeout": 30,        # 打开后多少秒进入半开状态
+    "half_open_max_calls": 1,   # 半开状态下同时放行的试探请求数
+}
+
+
+class CircuitOpenError(Exception):
+    """镜像站熔断器处于打开状态，请求被直接拒绝"""
+
+
+class CircuitBreaker:
+    """单个镜像站接口的熔断器，线程安全"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=30, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self._lock = threading.Lock()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trials = 0
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def retry_after(self):
+        """距离进入半开状态还剩多少秒"""
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def available(self):
+        """不占用试探名额地判断当前是否可能放行请求"""
+        with self._lock:
+            state = self._current_state()
+            return state == self.CLOSED or (state == self.HALF_OPEN and self._trials < self.half_open_max_calls)
+
+    def allow_request(self):
+        """请求发出前调用；半开状态下会占用一个试探名额"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._trials < self.half_open_max_calls:
+                self._trials += 1
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                _log_info(f"✅ 熔断器关闭: {self.name}")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trials = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    _log_warning(f"⚡ 熔断器打开: {self.name} (连续失败 {self._failures} 次，{self.reset_timeout}s 内快速失败)")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trials = 0
+
+    def release_trial(self):
+        """请求被取消、没有产生结果时归还半开状态的试探名额"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(url, kind):
+    """获取URL所在镜像站指定接口类型的熔断器"""
+    key = (_host_key(url), kind)
+    breaker = _circuit_breakers.get(key)
+    if breaker is None:
+        with _circuit_breakers_lock:
+            breaker = _circuit_breakers.get(key)
+            if breaker is None:
+                config = get_cached_config_section("circuit_breaker", CIRCUIT_BREAKER_DEFAULTS)
+                breaker = CircuitBreaker(
+                    f"{key[0]} [{kind}]",
+                    failure_threshold=int(config["failure_threshold"]),
+                    reset_timeout=float(config["reset_timeout"]),
+                    half_open_max_calls=int(config["half_open_max_calls"]),
+                )
+                _circuit_breakers[key] = breaker
+    return breaker
+
+
+def circuit_allows(url, kind):
+    """镜像站接口当前是否可用（熔断器未打开）"""
+    return get_circuit_breaker(url, kind).available()
+
+
+def _acquire_circuit(method, url):
+    """请求发出前检查熔断器，打开时抛出CircuitOpenError；非镜像站API请求返回None"""
+    kind = classify_endpoint(method, url)
+    if kind is None:
+        return None
+    breaker = get_circuit_breaker(url, kind)
+    if not breaker.allow_request():
+        raise CircuitOpenError(f"镜像站熔断中: {breaker.name}，{breaker.retry_after():.0f}s 后重试")
+    return breaker
+
+
+def _record_request_outcome(method, url, started, response=None):
+    """把一次镜像站API调用的结果计入健康度统计和熔断器；5xx、429和异常计为失败"""
+    kind = classify_endpoint(method, url)
+    if kind is None:
+        return
+    ok = response is not None and response.status_code < 500 and response.status_code != 429
+    MIRROR_HEALTH.record(_host_key(url), kind, time.monotonic() - started, ok)
+    breaker = get_circuit_breaker(url, kind)
+    if ok:
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+
+
+# ==================== 进程级限流 ====================
+# 同一进程内所有节点的API调用（图像/视频提交、任务状态轮询、文本生成）共享令牌桶：
+# 按API Key和按镜像站分别限制每秒请求数和同时在途请求数。超出限额的请求在本地排队（先到先得），
+# 而不是发出去再被服务端429拒绝；收到429时对应的桶按Retry-After暂停发放令牌。
+
+RATE_LIMIT_DEFAULTS = {
+    "enabled": True,
+    "key_requests_per_second": 0,     # 每个API Key每秒请求数（0表示不限制）
+    "key_burst": 4,                   # 每个API Key允许的突发请求数
+    "key_max_in_flight": 0,           # 每个API Key同时在途的最大请求数（0表示不限制）
+    "mirror_requests_per_second": 0,  # 每个镜像站每秒请求数（0表示不限制）
+    "mirror_burst": 10,               # 每个镜像站允许的突发请求数
+    "mirror_max_in_flight": 0,        # 每个镜像站同时在途的最大请求数（0表示不限制）
+    "max_queue_wait": 600,            # 本地排队的最长等待时间（秒）
+}
+# 默认不设主动限额，只有收到429后才按Retry-After暂停对应的桶；需要主动限速时在配置中设置上面的限额
+
+
+class RateLimitTimeout(Exception):
+    """本地限流排队超时"""
+
+
+class TokenBucket:
+    """令牌桶 + 在途请求计数 + 排队队列；由 RateLimiter 在其锁内操作"""
+
+    def __init__(self, rate, burst, max_in_flight):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.max_in_flight = int(max_in_flight)
+        self.tokens = self.burst
+        self.in_flight = 0
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.queue = deque()
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """还需要等待多久才能发出请求，0表示可以立即发出，inf表示要等在途请求结束"""
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.max_in_flight > 0 and self.in_flight >= self.max_in_flight:
+            return math.inf
+        if self.rate > 0 and self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        return 0.0
+
+    def take(self):
+        if self.rate > 0:
+            self.tokens -= 1
+        self.in_flight += 1
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = min(self.tokens, 0.0)
+
+    def wake_head(self):
+        if self.queue:
+            self.queue[0].wake()
+
+
+class _RateLimitWaiter:
+    """排队中的一个请求；只有排在它所有桶队首时才会被唤醒检查"""
+
+    def __init__(self, buckets, loop=None):
+        self.buckets = buckets
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else threading.Event()
+        self.granted = False
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            pass  # 事件循环已关闭，等待方也已不在
+
+
+class RateLimiter:
+    """进程级限流器：一次请求同时占用其API Key和镜像站两个桶，排队按先来后到放行
+
+    每个桶维护自己的排队队列，只有队首的请求会被唤醒：release 归还槽位、
+    放行一个请求或排队请求离开时唤醒相应桶的新队首，而不是让所有排队请求轮询。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def _config(self):
+        return get_cached_config_section("rate_limits", RATE_LIMIT_DEFAULTS)
+
+    def _bucket(self, scope, ident, config):
+        key = (scope, ident)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(config[f"{scope}_requests_per_second"], config[f"{scope}_burst"],
+                                 config[f"{scope}_max_in_flight"])
+            self._buckets[key] = bucket
+        return bucket
+
+    def buckets_for(self, api_key, url):
+        config = self._config()
+        if not config.get("enabled", True):
+            return ()
+        with self._lock:
+            buckets = [self._bucket("mirror", _host_key(url), config)]
+            if api_key:
+                key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+                buckets.append(self._bucket("key", key_id, config))
+        return tuple(buckets)
+
+    def _enqueue(self, waiter):
+        with self._lock:
+            for bucket in waiter.buckets:
+                bucket.queue.append(waiter)
+
+    def _dequeue(self, waiter):
+        """排队超时或被取消的请求离开队列，轮到的下一个请求被唤醒"""
+        if waiter.granted:
+            return
+        with self._lock:
+            for bucket in waiter.buckets:
+                was_head = bucket.queue and bucket.queue[0] is waiter
+                try:
+                    bucket.queue.remove(waiter)
+                except ValueError:
+                    continue
+                if was_head:
+                    bucket.wake_head()
+
+    def _try_acquire(self, waiter):
+        """尝试放行排队中的请求，返回需要继续等待的秒数（0表示已放行，inf表示等待被唤醒）"""
+        with self._lock:
+            if any(bucket.queue[0] is not waiter for bucket in waiter.buckets):
+                return math.inf  # 前面还有排队的请求，轮到时会被唤醒
+            now = time.monotonic()
+            wait = max(bucket.wait_time(now) for bucket in waiter.buckets)
+            if wait > 0:
+                return wait
+            waiter.granted = True
+            for bucket in waiter.buckets:
+                bucket.take()
+                bucket.queue.popleft()
+            for bucket in waiter.buckets:
+                bucket.wake_head()
+            return 0.0
+
+    def _max_wait(self):
+        max_wait = float(self._config()["max_queue_wait"])
+        policy = current_retry_policy()
+        if policy is not None:
+            max_wait = min(max_wait, policy.remaining())
+        return max_wait
+
+    def acquire(self, api_key, url):
+        """阻塞排队直到可以发出请求，返回需要在请求结束后 release 的桶"""
+        buckets = self.buckets_for(api_key, url)
+        if not buckets:
+            return buckets
+        waiter = _RateLimitWaiter(buckets)
+        self._enqueue(waiter)
+        deadline = time.monotonic() + self._max_wait()
+        try:
+            waited = False
+            while True:
+                waiter.event.clear()
+                wait = self._try_acquire(waiter)
+                if wait == 0:
+                    if waited:
+                        _log_info(f"🚦 限流排队结束: {_host_key(url)}")
+                    return buckets
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RateLimitTimeout(f"本地限流排队超时: {_host_key(url)}")
+                if not waited:
+                    waited = True
+                    _log_info(f"🚦 请求已在本地排队等待限流: {_host_key(url)}")
+                waiter.event.wait(min(wait, remaining))
+        finally:
+            self._dequeue(waiter)
+
+    async def async_acquire(self, api_key, url):
+        """acquire的协程版本，排队期间不占用线程"""
+        buckets = self.buckets_for(api_key, url)
+        if not buckets:
+            return buckets
+        waiter = _RateLimitWaiter(buckets, asyncio.get_running_loop())
+        self._enqueue(waiter)
+        deadline = time.monotonic() + self._max_wait()
+        try:
+            waited = False
+            while True:
+                waiter.event.clear()
+                wait = self._try_acquire(waiter)
+                if wait == 0:
+                    if waited:
+                        _log_info(f"🚦 限流排队结束: {_host_key(url)}")
+                    return buckets
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RateLimitTimeout(f"本地限流排队超时: {_host_key(url)}")
+                if not waited:
+                    waited = True
+                    _log_info(f"🚦 请求已在本地排队等待限流: {_host_key(url)}")
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), min(wait, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._dequeue(waiter)
+
+    def release(self, buckets, response=None):
+        """请求结束后归还在途槽位并唤醒排队的请求；429响应会按Retry-After暂停这些桶"""
+        if not buckets:
+            return
+        pause = None
+        if response is not None and response.status_code == 429:
+            pause = parse_retry_after(response)
+            if pause is None:
+                pause = 1.0
+        with self._lock:
+            for bucket in buckets:
+                bucket.in_flight = max(0, bucket.in_flight - 1)
+                if pause:
+                    bucket.pause(pause)
+                bucket.wake_head()
+        if pause:
+            _log_warning(f"🚦 收到429，本地限流暂停 {pause:.0f} 秒")
+
+
+RATE_LIMITER = RateLimiter()
+
+
+def _request_api_key(headers):
+    """从请求头中取出API Key（Bearer token）"""
+    authorization = (headers or {}).get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        return authorization[len("Bearer "):].strip()
+    return ""
+
+
+_MODEL_LIST_KEYS = {"image": "models", "video": "video_models", "chat": "text_models"}
+
+
+def _mirror_serves_model(site_config, kind, model):
+    models = site_config.get(_MODEL_LIST_KEYS[kind])
+    if kind == "video" and models is None:
+        return True  # 未声明视频模型的镜像站沿用默认的Seedance模型列表
+    return bool(models) and model in models
+
+
+def resolve_mirror_candidates(mirror_site, kind, model):
+    """把节点选择的镜像站解析为按优先级排列的候选名称列表；固定镜像站只返回它本身"""
+    if mirror_site != AUTO_MIRROR:
+        return [mirror_site]
+
+    mirror_sites = get_seedream4_config().get("mirror_sites", {})
+    configured = [(name, site.get("url", "")) for name, site in mirror_sites.items() if site.get("url")]
+    candidates = [(name, url) for name, url in configured if _mirror_serves_model(mirror_sites[name], kind, model)]
+    if not candidates:
+        _log_warning(f"⚠️ 没有镜像站声明支持模型 {model}，自动模式将尝试所有镜像站")
+        candidates = configured
+    if not candidates:
+        return ["comfly"]
+
+    ranked = MIRROR_HEALTH.rank(candidates, kind)
+    best_url = dict(candidates)[ranked[0]]
+    stats = MIRROR_HEALTH.stats(_host_key(best_url), kind)
+    if stats["latency"] is not None:
+        _log_info(f"🧭 自动选择镜像站: {ranked[0]} (延迟 {stats['latency']:.1f}s, 错误率 {stats['error_rate']:.0%}), 候选顺序: {ranked}")
+    else:
+        _log_info(f"🧭 自动选择镜像站: {ranked[0]} (暂无统计), 候选顺序: {ranked}")
+    return ranked
+
+
+def candidate_api_key(mirror_name, api_key, auto_mode):
+    """自动模式下各镜像站优先使用配置文件中自己的API Key，节点填写的Key作为兜底"""
+    if auto_mode:
+        site_key = get_mirror_site_config(mirror_name).get("api_key", "")
+        if site_key:
+            return site_key
+    return api_key
+
+
+class MirrorFailover:
+    """在候选镜像站之间按重试次数轮换，每个候选的请求只在首次用到时构建一次"""
+
+    def __init__(self, mirror_names, prepare):
+        self.mirror_names = list(mirror_names)
+        self._prepare = prepare
+        self._prepared = {}
+
+    def request(self, name):
+        """返回候选镜像站name的 (request, error_result)"""
+        if name not in self._prepared:
+            self._prepared[name] = self._prepare(name)
+        return self._prepared[name]
+
+    def request_for(self, attempt):
+        """返回第attempt次尝试使用的 (request, error_result)"""
+        return self.request(self.mirror_names[attempt % len(self.mirror_names)])
+
+    def usable(self, name, kind):
+        """候选是否可能可用：请求还没构建时视为可用，请求构建失败或镜像站熔断中时不可用"""
+        prepared = self._prepared.get(name)
+        if prepared is None:
+            return True
+        request, error_result = prepared
+        return not error_result and circuit_allows(request[0], kind)
+
+
+def build_mirror_failover(prepare_request, request_kwargs, kind):
+    """为节点的 _prepare_request 构建镜像站故障转移器，request_kwargs 为节点输入参数"""
+    mirror_site = request_kwargs["mirror_site"]
+    auto_mode = mirror_site == AUTO_MIRROR
+    api_key = request_kwargs.get("api_key", "")
+
+    def prepare(name):
+        return prepare_request(**dict(request_kwargs, mirror_site=name,
+                                      api_key=candidate_api_key(name, api_key, auto_mode)))
+
+    return MirrorFailover(resolve_mirror_candidates(mirror_site, kind, request_kwargs["model"]), prepare)
+
+
+def _json_headers(api_key, user_agent=None):
+    """构建JSON请求头"""
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    if user_agent:
+        headers["User-Agent"] = user_agent
+    return headers
+
+
+def _build_comfly_request(api_url, payload):
+    """构建Comfly图像生成请求"""
+    # 调试信息
+    _log_info(f"🔍 Comfly API调用:")
+    _log_info(f"   - 端点: {api_url}/images/generations")
+    _log_info(f"   - 模型: {payload.get('model', 'N/A')}")
+    _log_info(f"   - 包含图像: {'image' in payload and bool(payload.get('image'))}")
+    if 'image' in payload and payload.get('image'):
+        _log_info(f"   - 图像数量: {len(payload['image'])}")
+        _log_info(f"   - 第一张图像长度: {len(payload['image'][0]) if payload['image'] else 0}")
+    return f"{api_url}/images/generations", payload
+
+
+def _build_openai_compatible_request(api_url, payload):
+    """构建OpenAI兼容图像生成请求 - 支持T8图像编辑"""
+    # 检查是否是T8镜像站
+    if "t8star.cn" in api_url or "ai.t8star.cn" in api_url:
+        # 检查是否有图像输入
+        has_images = "image" in payload and payload["image"]
+
+        # 对于T8，图生图也使用images/generations端点，而不是chat/completions
+        # 只有特定的图像编辑任务才使用chat/completions
+        use_chat_endpoint = False  # 暂时禁用chat端点，统一使用images/generations
+
+        if has_images and use_chat_endpoint:
+            # 图像编辑：使用chat/completions端点（暂时禁用）
+            url = "https://ai.t8star.cn/v1/chat/completions"
+            _log_info(f"🎨 T8图像编辑端点: {url}")
+
+            # 构建T8图像编辑的payload格式
+            messages = [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": payload.get("prompt", "")
+                        }
+                    ]
+                }
+            ]
+
+            # 添加图像到消息中
+            image_urls = payload.get("image", [])
+            if isinstance(image_urls, str):
+                image_urls = [image_urls]
+
+            for image_url in image_urls:
+                messages[0]["content"].append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": image_url
+                    }
+                })
+
+            t8_payload = {
+                "model": payload.get("model", "doubao-seedream-4-0-250828"),
+                "messages": messages,
+                "max_tokens": 4096,
+                "temperature": 0.7
+            }
+
+            _log_info(f"🎨 T8图像编辑请求: 模型={t8_payload.get('model')}, 消息数={len(t8_payload.get('messages', []))}")
+
+        else:
+            # 图像生成：使用images/generations端点
+            url = "https://ai.t8star.cn/v1/images/generations"
+            _log_info(f"🖼️ T8图像生成端点: {url}")
+
+            # 构建T8图像生成的payload格式
+            t8_payload = {
+                "prompt": payload.get("prompt", ""),
+                "model": payload.get("model", "doubao-seedream-4-0-250828"),
+                "response_format": payload.get("response_format", "url")
+            }
+
+            # 添加可选参数
+            if "size" in payload:
+                t8_payload["size"] = payload["size"]
+            if "n" in payload:
+                t8_payload["n"] = payload["n"]
+            if "seed" in payload and payload["seed"] != -1:
+                t8_payload["seed"] = payload["seed"]
+            if "watermark" in payload:
+                t8_payload["watermark"] = payload["watermark"]
+            if "tail_on_partial" in payload:
+                t8_payload["tail_on_partial"] = payload["tail_on_partial"]
+
+            # 添加图像输入支持（图生图）
+            if has_images:
+                t8_payload["image"] = payload["image"]
+                _log_info(f"🖼️ T8图生图请求: 包含 {len(payload['image'])} 张输入图像")
+                _log_info(f"🔍 图像数据类型: {type(payload['image'])}")
+                if payload['image']:
+                    _log_info(f"🔍 第一张图像数据长度: {len(payload['image'][0]) if payload['image'][0] else 0} 字符")
+
+            _log_info(f"🖼️ T8图像生成请求: 模型={t8_payload.get('model')}, 提示词长度={len(t8_payload.get('prompt', ''))}")
+
+    elif api_url.endswith('/v1/chat/completions'):
+        url = api_url.replace('/v1/chat/completions', '/v1/images/generations')
+        _log_info(f"🔗 转换聊天端点为图像生成端点: {url}")
+        t8_payload = payload
+    else:
+        # 其他OpenAI兼容API
+        url = f"{api_url}/v1/images/generations"
+        _log_info(f"🔗 使用标准OpenAI端点: {url}")
+        t8_payload = payload
+
+    return url, t8_payload
+
+
+def _build_api4gpt_request(api_url, payload):
+    """构建API4GPT图像生成请求"""
+    return f"{api_url}/v1/images/generations", payload
+
+
+def _build_openrouter_request(api_url, payload):
+    """构建OpenRouter图像生成请求"""
+    return f"{api_url}/images/generations", payload
+
+
+def _build_volcengine_request(api_url, payload):
+    """构建火山引擎图像生成请求"""
+    # 火山引擎的图像生成API端点
+    endpoint = f"{api_url}/images/generations"
+
+    # 构建火山引擎特定的请求载荷
+    volcengine_payload = {
+        "model": payload.get("model", "doubao-seedream-4-0-250828"),
+        "prompt": payload.get("prompt", ""),
+        "size": payload.get("size", "1024x1024"),
+        "n": payload.get("n", 1),
+        "response_format": payload.get("response_format", "url"),
+        "quality": "hd",  # 火山引擎支持hd质量
+        "style": "vivid"  # 火山引擎支持vivid风格
+    }
+
+    # 添加可选参数
+    if "seed" in payload and payload["seed"] != -1:
+        volcengine_payload["seed"] = payload["seed"]
+
+    if "watermark" in payload:
+        volcengine_payload["watermark"] = payload["watermark"]
+
+    if "tail_on_partial" in payload:
+        volcengine_payload["tail_on_partial"] = payload["tail_on_partial"]
+
+    # 处理图像输入（用于图像编辑）
+    if "image" in payload and payload["image"]:
+        volcengine_payload["image"] = payload["image"]
+        _log_info(f"🔍 火山引擎图像输入: 数量={len(payload['image'])}, 第一张长度={len(payload['image'][0]) if payload['image'] else 0}")
+
+    _log_info(f"🔗 调用火山引擎API: {endpoint}")
+    _log_info(f"🔍 火山引擎请求: 模型={volcengine_payload.get('model')}, 提示词长度={len(volcengine_payload.get('prompt', ''))}")
+    _log_info(f"🔍 火山引擎payload包含图像: {'image' in volcengine_payload}")
+    return endpoint, volcengine_payload
+
+
+# API格式 -> (请求构建函数, User-Agent, 显示名称)
+IMAGE_API_FORMATS = {
+    "comfly": (_build_comfly_request, None, "Comfly"),
+    "openai": (_build_openai_compatible_request, None, "OpenAI兼容"),
+    "api4gpt": (_build_api4gpt_request, None, "API4GPT"),
+    "openrouter": (_build_openrouter_request, None, "OpenRouter"),
+    "volcengine": (_build_volcengine_request, "ComfyUI-SeedReam4API/1.0", "火山引擎"),
+}
+
+
+# 镜像站图像上传方式，可在 mirror_sites 的各镜像站配置中覆盖
+IMAGE_UPLOAD_DEFAULTS = {
+    "image_upload": "json",          # json: 图像以data URL内嵌在JSON中；multipart: 以multipart/form-data上传原始字节
+    "multipart_endpoint": "",        # multipart上传使用的端点路径（如 /images/edits），留空则使用原端点
+    "multipart_image_field": "image",  # multipart中图像文件的字段名
+}
+
+
+def get_mirror_upload_config(api_url):
+    """按API地址查找镜像站的图像上传方式配置"""
+    normalized = (api_url or "").strip().rstrip("/")
+    for site_config in get_seedream4_config().get("mirror_sites", {}).values():
+        if isinstance(site_config, dict) and site_config.get("url", "").strip().rstrip("/") == normalized:
+            return {key: site_config.get(key, default) for key, default in IMAGE_UPLOAD_DEFAULTS.items()}
+    return dict(IMAGE_UPLOAD_DEFAULTS)
+
+
+def _form_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def build_multipart_image_body(body, image_field="image"):
+    """把图像请求载荷转换为multipart请求体；载荷中没有已编码图像时返回None"""
+    images = body.get("image")
+    if isinstance(images, EncodedImage):
+        images = [images]
+    if not isinstance(images, (list, tuple)) or not any(isinstance(img, EncodedImage) for img in images):
+        return None
+
+    fields = [(key, _form_value(value)) for key, value in body.items() if key != "image" and value is not None]
+    files = []
+    for index, img in enumerate(images):
+        if isinstance(img, EncodedImage):
+            extension = img.mime_type.split("/")[-1]
+            files.append((image_field, f"image_{index + 1}.{extension}", img.mime_type, img.data))
+        elif img:
+            fields.append((image_field, str(img)))  # 图像URL按普通字段发送
+    return MultipartBodyStream(fields, files)
+
+
+def image_request_args(api_url, api_key, endpoint, body, user_agent=None):
+    """根据镜像站的上传方式构建图像请求，返回 (端点, http_request关键字参数)"""
+    headers = _json_headers(api_key, user_agent)
+    upload_config = get_mirror_upload_config(api_url)
+    if str(upload_config["image_upload"]).lower() == "multipart":
+        multipart = build_multipart_image_body(body, upload_config["multipart_image_field"])
+        if multipart is not None:
+            if upload_config["multipart_endpoint"]:
+                endpoint = f"{api_url.rstrip('/')}/{upload_config['multipart_endpoint'].lstrip('/')}"
+            headers["Content-Type"] = multipart.content_type
+            _log_info(f"📦 使用multipart上传图像: {endpoint} ({len(multipart):,} 字节)")
+            return endpoint, {"headers": headers, "data": multipart}
+    return endpoint, {"headers": headers, "json_body": body}
+
+
+def _send_image_request(api_format, api_url, api_key, payload, timeout):
+    builder, user_agent, _ = IMAGE_API_FORMATS.get(api_format, IMAGE_API_FORMATS["comfly"])
+    endpoint, body = builder(api_url, payload)
+    endpoint, request_args = image_request_args(api_url, api_key, endpoint, body, user_agent)
+    return http_request("POST", endpoint, timeout=timeout, **request_args)
+
+
+def call_comfly_api(api_url, api_key, payload, timeout=900):
+    """调用Comfly API"""
+    try:
+        return _send_image_request("comfly", api_url, api_key, payload, timeout)
+    except Exception as e:
+        _log_error(f"Comfly API调用失败: {e}")
+        return None
+
+def call_openai_compatible_api(api_url, api_key, payload, timeout=900):
+    """调用OpenAI兼容API - 支持T8图像编辑"""
+    headers = _json_headers(api_key)
+
+    try:
+        url, t8_payload = _build_openai_compatible_request(api_url, payload)
+
+        # 尝试多种连接方式解决SSL问题
+        response = None
+        last_error = None
+
+        # 方法1：使用共享传输层（连接池已禁用SSL验证）
+        try:
+            upload_url, request_args = image_request_args(api_url, api_key, url, t8_payload)
+            response = http_request("POST", upload_url, timeout=timeout, **request_args)
+            _log_info(f"✅ 简单SSL禁用方式成功")
+
+        except (CircuitOpenError, RateLimitTimeout, RetryBudgetExceeded):
+            raise  # 熔断、限流排队超时和预算用尽不走下面绕过传输层限制的备用方案
+        except Exception as simple_error:
+            last_error = simple_error
+            _log_warning(f"简单SSL禁用失败: {simple_error}")
+
+            # 方法2：使用新建的SSL兼容session（避开可能已损坏的共享连接）
+            try:
+                session = create_ssl_compatible_session()
+                response = session.post(
+                    url,
+                    headers=headers,
+                    data=JsonBodyStream(t8_payload),
+                    timeout=timeout
+                )
+                _log_info(f"✅ SSL兼容session成功")
+
+            except Exception as ssl_error:
+                last_error = ssl_error
+                _log_warning(f"SSL兼容session失败: {ssl_error}")
+
+                # 方法3：使用curl作为备用方案
+                try:
+                    # 将payload写入临时文件
+                    with tempfile.NamedTemporaryFile(mode='wb', suffix='.json', delete=False) as f:
+                        for chunk in iter_json_body(t8_payload):
+                            f.write(chunk)
+                        temp_file = f.name
+
+                    # 构建curl命令
+                    curl_cmd = [
+                        'curl', '-k', '-X', 'POST',
+                        '-H', 'Content-Type: application/json',
+                        '-H', f'Authorization: Bearer {headers["Authorization"].split(" ")[1]}',
+                        '-d', f'@{temp_file}',
+                        '--connect-timeout', '30',
+                        '--max-time', str(timeout),
+                        url
+                    ]
+
+                    result = subprocess.run(curl_cmd, capture_output=True, text=True, timeout=timeout)
+
+                    # 清理临时文件
+                    os.unlink(temp_file)
+
+                    if result.returncode == 0:
+                        # 创建模拟response对象
+                        class MockResponse:
+                            def __init__(self, text, status_code=200):
+                                self.text = text
+                                self.status_code = status_code
+                            def json(self):
+                                return json.loads(self.text)
+
+                        response = MockResponse(result.stdout)
+                        _log_info(f"✅ curl备用方案成功")
+                    else:
+                        raise Exception(f"curl失败: {result.stderr}")
+
+                except Exception as curl_error:
+                    _log_warning(f"curl备用方案失败: {curl_error}")
+                    raise last_error  # 抛出最后一个错误
+
+        _log_info(f"🔍 T8 API响应状态: {response.status_code}")
+        if response.status_code != 200:
             _log_error(f"❌ T8 API错误: {response.status_code} - {response.text}")
 
         return response
 
-    except Exception as e:
-        _log_error(f"OpenAI兼容API调用失败: {e}")
+    except Exception as e:
+        _log_error(f"OpenAI兼容API调用失败: {e}")
+        return None
+
+def call_api4gpt_api(api_url, api_key, payload, timeout=900):
+    """调用API4GPT API"""
+    try:
+        return _send_image_request("api4gpt", api_url, api_key, payload, timeout)
+    except Exception as e:
+        _log_error(f"API4GPT API调用失败: {e}")
+        return None
+
+def call_openrouter_api(api_url, api_key, payload, timeout=900):
+    """调用OpenRouter API"""
+    try:
+        return _send_image_request("openrouter", api_url, api_key, payload, timeout)
+    except Exception as e:
+        _log_error(f"OpenRouter API调用失败: {e}")
+        return None
+
+
+def call_volcengine_api(api_url, api_key, payload, timeout=900):
+    """调用火山引擎API"""
+    try:
+        response = _send_image_request("volcengine", api_url, api_key, payload, timeout)
+
+        _log_info(f"🔍 火山引擎API响应状态: {response.status_code}")
+        if response.status_code != 200:
+            _log_error(f"❌ 火山引擎API错误: {response.text}")
+
+        return response
+    except Exception as e:
+        _log_error(f"火山引擎API调用异常: {e}")
+        return None
+
+def call_image_api(api_format, api_url, api_key, payload, timeout=900):
+    """根据API格式调用相应的图像生成API"""
+    if api_format == "openai":
+        return call_openai_compatible_api(api_url, api_key, payload, timeout)
+    elif api_format == "api4gpt":
+        return call_api4gpt_api(api_url, api_key, payload, timeout)
+    elif api_format == "openrouter":
+        return call_openrouter_api(api_url, api_key, payload, timeout)
+    elif api_format == "volcengine":
+        return call_volcengine_api(api_url, api_key, payload, timeout)
+    return call_comfly_api(api_url, api_key, payload, timeout)
+
+async def async_call_image_api(api_format, api_url, api_key, payload, timeout=900):
+    """异步调用图像生成API（call_image_api的协程版本）"""
+    builder, user_agent, display_name = IMAGE_API_FORMATS.get(api_format, IMAGE_API_FORMATS["comfly"])
+    try:
+        endpoint, body = builder(api_url, payload)
+        endpoint, request_args = image_request_args(api_url, api_key, endpoint, body, user_agent)
+        response = await async_http_request("POST", endpoint, timeout=timeout, **request_args)
+        _log_info(f"🔍 {display_name} API响应状态: {response.status_code}")
+        if response.status_code != 200:
+            _log_error(f"❌ {display_name} API错误: {response.text}")
+        return response
+    except Exception as e:
+        _log_error(f"{display_name} API调用失败: {e}")
+        return None
+
+def _video_generation_endpoint(api_url, api_format):
+    """根据API格式确定视频生成端点 - 使用各镜像站的实际端点"""
+    if api_format == "comfly":
+        # Comfly的视频端点，使用v2/videos/generations
+        if api_url.endswith('/v1'):
+            return f"{api_url[:-3]}/v2/videos/generations"  # 使用 /v2/videos/generations
+        return f"{api_url}/v2/videos/generations"
+    elif api_format == "openai":
+        # T8镜像站使用v2端点
+        if "t8star.cn" in api_url:
+            # T8的视频端点，处理URL版本号
+            if api_url.endswith('/v1'):
+                return f"{api_url[:-3]}/v2/videos/generations"  # 替换v1为v2
+            return f"{api_url}/v2/videos/generations"
+        return f"{api_url}/v1/videos/generations"
+
+    elif api_format == "volcengine":
+        # 火山引擎官方API、T8镜像站和Comfly镜像站
+        if "t8star.cn" in api_url:
+            # T8镜像站使用特殊的端点路径
+            return f"{api_url}/seedance/v3/contents/generations/tasks"
+        elif "comfly.chat" in api_url:
+            # Comfly镜像站使用火山引擎格式端点
+            return f"{api_url.replace('/v1', '').replace('/v2', '')}/seedance/v3/contents/generations/tasks"
+        # 火山引擎官方API
+        return f"{api_url}/contents/generations/tasks"
+
+    # 默认处理：T8和Comfly都使用v2端点
+    if api_url.endswith('/v1'):
+        return f"{api_url[:-3]}/v2/videos/generations"
+    return f"{api_url}/v2/videos/generations"
+
+def _multi_ref_video_endpoint(api_url, api_format):
+    """多图参考功能统一使用火山引擎格式的端点"""
+    if api_format == "volcengine":
+        # 火山引擎官方API
+        return f"{api_url}/contents/generations/tasks"
+    elif api_format == "comfly":
+        # Comfly镜像站使用火山引擎官方格式端点
+        if "comfly.chat" in api_url:
+            # Comfly的火山引擎格式端点
+            return f"{api_url.replace('/v1', '').replace('/v2', '')}/seedance/v3/contents/generations/tasks"
+        return f"{api_url}/seedance/v3/contents/generations/tasks"
+    # 其他格式默认使用火山引擎格式
+    return f"{api_url}/contents/generations/tasks"
+
+def _video_task_status_endpoint(api_url, task_id, api_format):
+    """视频任务查询端点：与生成端点相同路径，后接任务ID"""
+    return f"{_video_generation_endpoint(api_url, api_format)}/{task_id}"
+
+def _log_video_payload(payload, label="视频"):
+    """打印视频请求payload的结构（不打印图像数据）"""
+    # 根据不同格式提取提示词长度
+    prompt_length = 0
+    if "prompt" in payload:
+        prompt_length = len(payload.get('prompt', ''))
+    elif "content" in payload:
+        # 火山引擎格式：从content数组中提取text
+        for item in payload.get('content', []):
+            if item.get('type') == 'text':
+                prompt_length = len(item.get('text', ''))
+                break
+
+    _log_info(f"🔍 {label}请求: 模型={payload.get('model')}, 提示词长度={prompt_length}")
+
+    if "image" in payload and payload["image"]:
+        _log_info(f"🔍 视频输入图像: 数量={len(payload['image'])}")
+    elif "first_frame" in payload and "last_frame" in payload:
+        _log_info(f"🔍 视频首尾帧模式")
+    elif "content" in payload:
+        _log_info(f"🔍 {label}content模式: 内容数量={len(payload['content'])}")
+
+    # 调试：打印实际发送的payload结构
+    _log_info(f"🔍 实际发送的payload键: {list(payload.keys())}")
+    if "content" in payload:
+        _log_info(f"🔍 content数组长度: {len(payload['content'])}")
+        for i, item in enumerate(payload['content']):
+            _log_info(f"🔍 content[{i}]: type={item.get('type')}, role={item.get('role', 'N/A')}")
+
+def call_video_api(api_url, api_key, payload, api_format="comfly", timeout=900):
+    """调用视频生成API"""
+    try:
+        headers = _json_headers(api_key, "ComfyUI-SeedanceAPI/1.0")
+        endpoint = _video_generation_endpoint(api_url, api_format)
+
+        _log_info(f"🎬 调用视频生成API: {endpoint}")
+        _log_info(f"🔍 视频API格式: {api_format}")
+        _log_video_payload(payload)
+
+        _log_info(f"🔍 请求体大小: {json_body_length(payload):,} 字节")
+
+        response = http_request("POST", endpoint, headers=headers, json_body=payload, timeout=timeout)
+
+        _log_info(f"🔍 视频API响应状态: {response.status_code}")
+        if response.status_code != 200:
+            _log_error(f"❌ 视频API错误: {response.text}")
+
+        return response
+
+    except Exception as e:
+        _log_error(f"视频生成API调用失败: {e}")
+        return None
+
+async def async_call_video_api(api_url, api_key, payload, api_format="comfly", timeout=900):
+    """异步调用视频生成API"""
+    try:
+        endpoint = _video_generation_endpoint(api_url, api_format)
+        _log_info(f"🎬 调用视频生成API: {endpoint}")
+        _log_video_payload(payload)
+
+        response = await async_http_request("POST", endpoint, headers=_json_headers(api_key, "ComfyUI-SeedanceAPI/1.0"),
+                                            json_body=payload, timeout=timeout)
+
+        _log_info(f"🔍 视频API响应状态: {response.status_code}")
+        if response.status_code != 200:
+            _log_error(f"❌ 视频API错误: {response.text}")
+        return response
+
+    except Exception as e:
+        _log_error(f"视频生成API调用失败: {e}")
+        return None
+
+def call_multi_ref_video_api(api_url, api_key, payload, api_format="comfly", timeout=900):
+    """调用多图参考视频生成API - 统一使用火山引擎格式端点"""
+    try:
+        headers = _json_headers(api_key, "ComfyUI-SeedanceAPI/1.0")
+        endpoint = _multi_ref_video_endpoint(api_url, api_format)
+
+        _log_info(f"🎬 调用多图参考视频生成API: {endpoint}")
+        _log_info(f"🔍 多图参考API格式: {api_format}")
+        _log_video_payload(payload, label="多图参考")
+
+        response = http_request("POST", endpoint, headers=headers, json_body=payload, timeout=timeout)
+
+        _log_info(f"🔍 多图参考API响应状态: {response.status_code}")
+        if response.status_code != 200:
+            _log_error(f"❌ 多图参考API错误: {response.text}")
+
+        return response
+
+    except Exception as e:
+        _log_error(f"多图参考视频生成API调用失败: {e}")
+        return None
+
+async def async_call_multi_ref_video_api(api_url, api_key, payload, api_format="comfly", timeout=900):
+    """异步调用多图参考视频生成API"""
+    try:
+        endpoint = _multi_ref_video_endpoint(api_url, api_format)
+        _log_info(f"🎬 调用多图参考视频生成API: {endpoint}")
+        _log_video_payload(payload, label="多图参考")
+
+        response = await async_http_request("POST", endpoint, headers=_json_headers(api_key, "ComfyUI-SeedanceAPI/1.0"),
+                                            json_body=payload, timeout=timeout)
+
+        _log_info(f"🔍 多图参考API响应状态: {response.status_code}")
+        if response.status_code != 200:
+            _log_error(f"❌ 多图参考API错误: {response.text}")
+        return response
+
+    except Exception as e:
+        _log_error(f"多图参考视频生成API调用失败: {e}")
+        return None
+
+def call_video_task_status(api_url, api_key, task_id, api_format="comfly", timeout=60):
+    """查询视频生成任务状态"""
+    endpoint = None
+    headers = _json_headers(api_key, "ComfyUI-SeedanceAPI/1.0")
+    try:
+        # 根据API格式确定查询端点
+        endpoint = _video_task_status_endpoint(api_url, task_id, api_format)
+
+        _log_debug("🔍 查询视频任务状态", endpoint=endpoint)
+
+        return http_request("GET", endpoint, headers=headers, timeout=timeout)
+
+    except requests.exceptions.SSLError as e:
+        _log_warning(f"SSL错误，使用新连接重试: {e}")
+        try:
+            # 共享连接可能已失效，使用新建的SSL兼容session重试一次
+            response = create_ssl_compatible_session().get(
+                endpoint,
+                headers=headers,
+                timeout=timeout
+            )
+            return response
+        except Exception as e2:
+            _log_error(f"查询视频任务状态失败（SSL重试后）: {e2}")
+            return None
+    except Exception as e:
+        _log_error(f"查询视频任务状态失败: {e}")
+        return None
+
+async def async_call_video_task_status(api_url, api_key, task_id, api_format="comfly", timeout=60):
+    """异步查询视频生成任务状态"""
+    try:
+        endpoint = _video_task_status_endpoint(api_url, task_id, api_format)
+        _log_debug("🔍 查询视频任务状态", endpoint=endpoint)
+        return await async_http_request("GET", endpoint, headers=_json_headers(api_key, "ComfyUI-SeedanceAPI/1.0"),
+                                        timeout=timeout)
+    except Exception as e:
+        _log_error(f"查询视频任务状态失败: {e}")
+        return None
+
+def _chat_completions_endpoint(api_url, api_format):
+    """按API格式构建文本生成（chat/completions）端点"""
+    if api_format == "volcengine":
+        # 火山引擎官方: 基础是 /api/v3
+        # chat 走 /chat/completions
+        if api_url.endswith('/'):
+            return api_url + 'chat/completions'
+        elif api_url.endswith('/api/v3'):
+            return api_url + '/chat/completions'
+        elif not api_url.endswith('/chat/completions'):
+            return api_url.rstrip('/') + '/chat/completions'
+        return api_url
+    # 其它镜像按其自身（如 comfly 的 /v1/chat/completions）
+    if not api_url.endswith('/chat/completions'):
+        return api_url.rstrip('/') + '/chat/completions'
+    return api_url
+
+def _chat_headers(api_key):
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "User-Agent": "ComfyUI-Doubao-Seed/2.0.0"
+    }
+
+def call_chat_api(api_url, api_key, request_data, api_format="volcengine", timeout=300):
+    """调用豆包大模型chat/completions接口，返回原始响应"""
+    endpoint = _chat_completions_endpoint(api_url, api_format)
+    _log_info(f"🌐 调用API: {endpoint}")
+    _log_info(f"📊 请求参数: model={request_data['model']}, max_tokens={request_data['max_tokens']}")
+    _log_info(f"🔧 API格式: {api_format}")
+    return http_request("POST", endpoint, headers=_chat_headers(api_key), json_body=request_data, timeout=timeout)
+
+async def async_call_chat_api(api_url, api_key, request_data, api_format="volcengine", timeout=300):
+    """异步调用豆包大模型chat/completions接口"""
+    endpoint = _chat_completions_endpoint(api_url, api_format)
+    _log_info(f"🌐 调用API: {endpoint}")
+    _log_info(f"📊 请求参数: model={request_data['model']}, max_tokens={request_data['max_tokens']}")
+    return await async_http_request("POST", endpoint, headers=_chat_headers(api_key), json_body=request_data,
+                                    timeout=timeout)
+
+
+# ==================== 异步节点执行 ====================
+
+def _comfyui_supports_async_nodes():
+    """检测当前ComfyUI执行器是否支持协程节点函数"""
+    try:
+        import sys
+        import inspect
+        execution = sys.modules.get("execution")
+        if execution is None:
+            return False
+        if hasattr(execution, "_async_map_node_over_list"):
+            return True
+        return inspect.iscoroutinefunction(getattr(execution, "get_output_data", None))
+    except Exception:
+        return False
+
+
+def _resolve_async_node_execution():
+    """根据配置 "async_nodes"（auto/true/false）决定API节点是否注册协程版本的节点函数"""
+    setting = get_seedream4_config().get("async_nodes", "auto")
+    if isinstance(setting, str):
+        setting = setting.strip().lower()
+        if setting == "auto":
+            return _comfyui_supports_async_nodes()
+        return setting in ("true", "1", "yes", "on")
+    return bool(setting)
+
+
+ASYNC_NODE_EXECUTION = _resolve_async_node_execution()
+if ASYNC_NODE_EXECUTION:
+    _log_info("⚡ 已启用异步节点执行：独立的API节点将并发运行")
+
+
+# ==================== SeedReam图像节点公共逻辑 ====================
+
+def _image_target(mirror_site, api_key, auto_mode=False):
+    """解析单个镜像站的图像API地址、格式和Key，返回 (MirrorTarget, None) 或 (None, 错误信息)"""
+    # 获取镜像站配置
+    site_config = get_mirror_site_config(mirror_site)
+    api_url = site_config.get("url", "").strip()
+    api_url = api_url.replace("`", "").strip()
+    if api_url.endswith(")"):
+        api_url = api_url[:-1].strip()
+    api_format = site_config.get("api_format", "comfly")
+
+    # 使用镜像站的API key（如果提供了的话）
+    api_key = candidate_api_key(mirror_site, api_key, auto_mode)
+    if site_config.get("api_key") and not api_key.strip():
+        api_key = site_config["api_key"]
+        _log_info(f"🔑 自动使用镜像站API Key: {api_key[:8]}...")
+
+    if not api_key.strip():
+        return None, "API key not found"
+
+    if not validate_api_url(api_url):
+        return None, "Invalid API URL"
+
+    return MirrorTarget(mirror_site, api_url, api_format, api_key), None
+
+
+def resolve_image_site(mirror_site, api_key, model, resolution, hedge=False):
+    """解析镜像站配置和API Key，返回 ((候选MirrorTarget列表, model), None) 或 (None, 错误结果)
+
+    固定镜像站只有一个候选；"auto" 模式下候选按健康度和延迟排序，重试时依次切换。
+    开启对冲时，固定镜像站之后追加配置了自己API Key的其他镜像站作为对冲目标。
+    """
+    # 清理模型名称中的提示信息
+    if " (" in model:
+        model = model.split(" (")[0]
+
+    auto_mode = mirror_site == AUTO_MIRROR
+    targets = []
+    error_message = None
+    for name in resolve_mirror_candidates(mirror_site, "image", model):
+        target, error = _image_target(name, api_key, auto_mode)
+        if target:
+            targets.append(target)
+        else:
+            error_message = error_message or error
+            if auto_mode:
+                _log_warning(f"⚠️ 跳过镜像站 {name}: {error}")
+
+    if not targets:
+        _log_error(error_message)
+        return None, (create_blank_tensor(), error_message, "")
+
+    if hedge and not auto_mode:
+        for name in resolve_mirror_candidates(AUTO_MIRROR, "image", model):
+            if name != mirror_site:
+                target, _ = _image_target(name, "", auto_mode=True)
+                if target:
+                    targets.append(target)
+        if len(targets) < 2:
+            _log_warning("⚠️ 没有其他配置了API Key的镜像站，对冲请求不会生效")
+
+    # 检查模型和分辨率兼容性
+    if model == "doubao-seedream-4-5-251128" and resolution == "1K":
+        warning_message = "⚠️ 警告：模型 doubao-seedream-4-5-251128 不支持 1K 分辨率，可能会导致生成失败或自动调整。"
+        _log_warning(warning_message)
+        # 这里我们不阻止执行，因为API可能会自动处理，但我们给出了提示
+
+    _log_info(f"🔗 使用镜像站: {targets[0].name} ({targets[0].api_url})")
+    return (targets, model), None
+
+
+def resolve_image_size(size_mapping, resolution_factors, resolution, aspect_ratio, width, height):
+    """计算最终请求尺寸字符串，如 1024x1024"""
+    if aspect_ratio == "Custom":
+        scale_factor = resolution_factors.get(resolution, 1)
+        scaled_width = int(width * scale_factor)
+        scaled_height = int(height * scale_factor)
+        final_size = f"{scaled_width}x{scaled_height}"
+        _log_info(f"使用自定义尺寸: {final_size}")
+    else:
+        if resolution in size_mapping and aspect_ratio in size_mapping[resolution]:
+            final_size = size_mapping[resolution][aspect_ratio]
+        else:
+            final_size = "1024x1024"
+            _log_warning(f"未找到 {resolution} 和 {aspect_ratio} 的组合，使用 {final_size}")
+    return final_size
+
+
+def build_seedream_payload(model, prompt, response_format, final_size, watermark, stream, tail_on_partial,
+                           max_images, seed, sequential_image_generation):
+    """构建SeedReam图像生成请求载荷（不含输入图像）"""
+    payload = {
+        "model": model,
+        "prompt": prompt,
+        "response_format": response_format,
+        "size": final_size,
+        "watermark": watermark,
+        "stream": stream,
+        "tail_on_partial": tail_on_partial
+    }
+
+    if sequential_image_generation == "auto":
+        payload["sequential_image_generation"] = sequential_image_generation
+        payload["sequential_image_generation_options"] = {"max_images": max_images}
+        payload["n"] = max_images
+
+    if seed != -1:
+        payload["seed"] = seed
+    return payload
+
+
+def _log_image_api_failure(response, attempt, max_retries):
+    if response:
+        error_text = response.text[:500] if response.text else "无错误信息"
+        _log_warning(f"API调用失败 (尝试 {attempt + 1}/{max_retries}): {response.status_code}")
+        _log_warning(f"错误详情: {error_text}")
+
+        # 检查是否是图像过大的错误
+        if "too large" in error_text.lower() or "payload too large" in error_text.lower():
+            _log_error("❌ 图像数据过大，请尝试使用较小的图像")
+        elif "invalid" in error_text.lower() and "image" in error_text.lower():
+            _log_error("❌ 图像格式无效，请检查输入图像")
+    else:
+        _log_warning(f"API调用失败 (尝试 {attempt + 1}/{max_retries}): 无响应")
+
+
+HEDGING_DEFAULTS = {
+    "latency_percentile": 95,   # 主镜像站超过该延迟分位数仍未返回时发出对冲请求
+    "min_delay": 5,             # 对冲等待时间下限（秒）
+    "default_delay": 60,        # 主镜像站还没有延迟统计时的对冲等待时间（秒）
+}
+
+
+def get_hedging_config():
+    """获取对冲请求配置"""
+    return get_cached_config_section("hedging", HEDGING_DEFAULTS)
+
+
+def hedge_delay(target):
+    """根据主镜像站的历史延迟分位数计算发出对冲请求前的等待时间"""
+    config = get_hedging_config()
+    observed = MIRROR_HEALTH.latency_percentile(_host_key(target.api_url), "image",
+                                                float(config["latency_percentile"]))
+    delay = observed if observed is not None else float(config["default_delay"])
+    return max(float(config["min_delay"]), delay)
+
+
+async def async_call_image_api_hedged(primary, backup, payload, timeout=900):
+    """对冲请求：主镜像站超过延迟分位数仍未返回时，向备用镜像站发送同一请求，先成功者胜出，另一个被取消"""
+    delay = hedge_delay(primary)
+    primary_task = asyncio.ensure_future(
+        async_call_image_api(primary.api_format, primary.api_url, primary.api_key, payload, timeout))
+    done, _ = await asyncio.wait({primary_task}, timeout=delay)
+    if done:
+        return primary_task.result()
+
+    _log_info(f"🪁 {primary.name} 超过 {delay:.1f}s 未响应，向 {backup.name} 发送对冲请求")
+    backup_task = asyncio.ensure_future(
+        async_call_image_api(backup.api_format, backup.api_url, backup.api_key, payload, timeout))
+    pending = {primary_task, backup_task}
+    response = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    response = task.result()
+                except Exception as e:
+                    if pending:  # 另一个请求仍在进行，等待它的结果
+                        _log_warning(f"⚠️ 对冲请求中的一个失败: {e}")
+                        continue
+                    raise
+                if response is not None and response.status_code == 200:
+                    winner = primary if task is primary_task else backup
+                    _log_info(f"🏁 对冲请求由 {winner.name} 胜出")
+                    return response
+        return response
+    finally:
+        # 取消仍在等待的请求（requests后端的工作线程无法中断，其结果会被丢弃）
+        for task in pending:
+            task.cancel()
+
+
+def _image_target_available(target):
+    if circuit_allows(target.api_url, "image"):
+        return True
+    _log_warning(f"⚡ 镜像站 {target.name} 熔断中，跳过")
+    return False
+
+
+def image_attempts(policy, targets, label="API调用"):
+    """图像生成的尝试序列：失败后轮换到下一个候选镜像站，熔断中的镜像站跳过且不占用尝试次数"""
+    return RetryAttempts(policy, targets, _image_target_available, label=label)
+
+
+def call_image_api_with_retries(targets, payload, timeout=900, max_retries=3, hedge=False):
+    """带指数退避重试地调用图像生成API，失败时在候选镜像站间轮换，返回最后一次的响应"""
+    policy = get_retry_policy(max_retries, timeout)
+    attempts = image_attempts(policy, targets)
+    response = None
+    with retry_budget(policy):
+        for target in attempts:
+            backup = attempts.following(target) if hedge else None
+            error = None
+            try:
+                if backup is not None:
+                    response = run_in_transport_loop(async_call_image_api_hedged(target, backup, payload, timeout))
+                else:
+                    response = call_image_api(target.api_format, target.api_url, target.api_key, payload, timeout)
+                if response and response.status_code == 200:
+                    break
+                _log_image_api_failure(response, attempts.attempt, policy.max_attempts)
+            except Exception as e:
+                error = e
+            delay = attempts.backoff(response, error)  # 指数退避或Retry-After
+            if delay is None:
+                break
+            time.sleep(delay)
+    return response
+
+
+async def async_call_image_api_with_retries(targets, payload, timeout=900, max_retries=3, hedge=False):
+    """call_image_api_with_retries的协程版本，重试等待不占用线程"""
+    policy = get_retry_policy(max_retries, timeout)
+    attempts = image_attempts(policy, targets)
+    response = None
+    with retry_budget(policy):
+        for target in attempts:
+            backup = attempts.following(target) if hedge else None
+            error = None
+            try:
+                if backup is not None:
+                    response = await await_in_transport_loop(async_call_image_api_hedged(target, backup, payload, timeout))
+                else:
+                    response = await async_call_image_api(target.api_format, target.api_url, target.api_key, payload, timeout)
+                if response and response.status_code == 200:
+                    break
+                _log_image_api_failure(response, attempts.attempt, policy.max_attempts)
+            except Exception as e:
+                error = e
+            delay = attempts.backoff(response, error)  # 指数退避或Retry-After
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+    return response
+
+
+def image_generation_failed_result(error):
+    """生成过程异常时的节点输出"""
+    error_message = f"Generation failed: {str(error)}"
+    _log_error(error_message)
+    blank_tensor = ensure_tensor_format(create_blank_tensor())
+    _log_info(f"🔍 错误处理tensor形状: {blank_tensor.shape}")
+    return (blank_tensor, error_message, "")
+
+
+# 结果图像下载配置，可在配置文件的 "downloads" 中覆盖
+DOWNLOAD_DEFAULTS = {
+    "max_workers": 6,           # 同时下载的结果图像数量上限
+    "timeout": 60,              # 单张图像下载超时（秒）
+    "video_timeout": 300,       # 视频下载的连接/读取超时（秒）
+    "chunk_size": 1048576,      # 视频下载的读写缓冲大小（字节）
+    "range_parts": 4,           # 支持Range时分段并行下载的最大段数
+    "min_part_bytes": 4194304,  # 每段的最小字节数，小文件只用一段（仍可续传）
+    "range_retries": 3,         # 每段失败后从断点重试的次数
+}
+
+_download_executor = None
+_download_executor_lock = threading.Lock()
+
+
+def get_download_executor():
+    """获取进程共享的结果下载线程池（并发数上限来自配置）"""
+    global _download_executor
+    if _download_executor is None:
+        with _download_executor_lock:
+            if _download_executor is None:
+                max_workers = int(get_cached_config_section("downloads", DOWNLOAD_DEFAULTS)["max_workers"])
+                _download_executor = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                                        thread_name_prefix="DoubaoSeedDownload")
+    return _download_executor
+
+
+def open_result_image(data):
+    """解析结果图像的文件头（像素在写入批次tensor时才解码，见decode_images_to_batch），并保留原始字节供结果缓存使用"""
+    image = Image.open(io.BytesIO(data))
+    image.source_bytes = data
+    return image
+
+
+def _download_result_image(image_url, timeout):
+    """下载单张结果图像并解析文件头，失败返回None"""
+    try:
+        data = read_download_cache(image_url)
+        if data is None:
+            img_response = get_http_session(image_url).get(image_url, timeout=timeout)
+            if img_response.status_code != 200:
+                _log_warning(f"下载图像失败: HTTP {img_response.status_code} - {image_url}")
+                return None
+            data = img_response.content
+            write_download_cache(image_url, data)
+        return open_result_image(data)
+    except Exception as e:
+        _log_warning(f"下载图像失败: {e}")
+        return None
+
+
+def download_result_images(image_urls):
+    """并发下载多张结果图像（复用连接池），按原始顺序返回 [(url, PIL图像或None), ...]"""
+    if not image_urls:
+        return []
+    timeout = get_cached_config_section("downloads", DOWNLOAD_DEFAULTS)["timeout"]
+    if len(image_urls) == 1:
+        return [(image_urls[0], _download_result_image(image_urls[0], timeout))]
+    _log_info(f"⬇️ 并发下载 {len(image_urls)} 张结果图像")
+    executor = get_download_executor()
+    futures = [executor.submit(_download_result_image, url, timeout) for url in image_urls]
+    return [(url, future.result()) for url, future in zip(image_urls, futures)]
+
+
+# ==================== 结果缓存 ====================
+
+class DiskLRUCache:
+    """磁盘上的键值缓存：每个键一个文件，index.json 记录大小、元数据和最近访问时间，按总大小LRU淘汰
+
+    ttl 为0表示不过期；所有方法线程安全。写入和淘汰后索引立即落盘，命中只更新内存中的访问时间，
+    每隔 INDEX_FLUSH_INTERVAL 秒（以及进程退出时）才落盘一次。加载时按目录内容校正索引，
+    索引丢失或损坏时已有的缓存文件仍会计入容量并参与淘汰。
+    """
+
+    INDEX_FILE = "index.json"
+    INDEX_FLUSH_INTERVAL = 30
+
+    def __init__(self, directory, max_bytes, ttl=0):
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self.ttl = float(ttl or 0)
+        self._lock = threading.Lock()
+        self._index = None
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        atexit.register(self.flush)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _load_index(self):
+        if self._index is None:
+            entries = {}
+            try:
+                with open(os.path.join(self.directory, self.INDEX_FILE), 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+                if not isinstance(entries, dict):
+                    raise ValueError("索引不是JSON对象")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                entries = {}
+                _log_warning(f"⚠️ 缓存索引损坏，按目录内容重建: {e}")
+            changed = self._reconcile(entries)
+            self._index = OrderedDict(sorted(entries.items(), key=lambda item: item[1].get("accessed", 0)))
+            if changed:
+                self._evict()
+                self._save_index()
+        return self._index
+
+    def _reconcile(self, entries):
+        """按目录中实际存在的文件校正索引：去掉文件已丢失的条目，补上索引中没有的文件，返回是否有改动"""
+        files = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    if item.is_file() and item.name != self.INDEX_FILE and not item.name.endswith(".tmp"):
+                        files[item.name] = item.stat()
+        except FileNotFoundError:
+            pass
+        changed = False
+        for key in [key for key in entries if key not in files]:
+            del entries[key]
+            changed = True
+        for key, stat in files.items():
+            if key not in entries:
+                entries[key] = {"size": stat.st_size, "created": stat.st_mtime, "accessed": stat.st_mtime, "meta": {}}
+                changed = True
+        return changed
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        index_path = os.path.join(self.directory, self.INDEX_FILE)
+        temp_path = f"{index_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, ensure_ascii=False)
+        os.replace(temp_path, index_path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def flush(self):
+        """把命中时更新的访问时间写入索引"""
+        with self._lock:
+            if self._dirty:
+                try:
+                    self._save_index()
+                except OSError as e:
+                    _log_warning(f"⚠️ 保存缓存索引失败: {e}")
+
+    def _drop(self, key):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def get(self, key):
+        """返回 (文件路径, 元数据)，未命中、过期或文件丢失时返回None"""
+        with self._lock:
+            index = self._load_index()
+            entry = index.get(key)
+            if entry is None:
+                return None
+            now = time.time()
+            if (self.ttl and now - entry["created"] > self.ttl) or not os.path.exists(self._path(key)):
+                self._drop(key)
+                self._save_index()
+                return None
+            entry["accessed"] = now
+            index.move_to_end(key)
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.INDEX_FLUSH_INTERVAL:
+                self._save_index()
+            return self._path(key), entry.get("meta", {})
+
+    def put(self, key, data, meta=None):
+        """写入一个条目（先写临时文件再原子替换），返回文件路径；超过容量上限的条目不缓存"""
+        if len(data) > self.max_bytes:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return self._commit(key, len(data), meta)
+
+    def put_file(self, key, source_path, meta=None):
+        """把已有文件复制进缓存，返回缓存中的文件路径
+
+        复制而不是硬链接：源文件（例如输出目录中的视频）之后被修改或覆盖时，缓存内容不受影响。
+        """
+        size = os.path.getsize(source_path)
+        if size > self.max_bytes:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, path)
+        return self._commit(key, size, meta)
+
+    def _commit(self, key, size, meta):
+        with self._lock:
+            index = self._load_index()
+            now = time.time()
+            index.pop(key, None)
+            index[key] = {"size": size, "created": now, "accessed": now, "meta": meta or {}}
+            self._evict()
+            self._save_index()
+        return self._path(key)
+
+    def _evict(self):
+        total = sum(entry["size"] for entry in self._index.values())
+        while total > self.max_bytes and self._index:
+            key, entry = next(iter(self._index.items()))
+            total -= entry["size"]
+            self._drop(key)
+
+
+def link_or_copy(source_path, target_path):
+    """把缓存文件放到输出位置：同一文件系统上创建硬链接，否则复制文件"""
+    try:
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copyfile(source_path, target_path)
+
+
+# 生成结果（图像/视频）下载缓存配置，可在配置文件的 "download_cache" 中覆盖
+DOWNLOAD_CACHE_DEFAULTS = {
+    "enabled": True,
+    "directory": "",              # 留空时使用插件目录下的 cache/downloads
+    "max_bytes": 4294967296,      # 缓存总大小上限（字节）
+    "ttl": 86400,                 # 条目有效期（秒），与结果URL签名的有效期一致
+}
+
+_download_cache = None
+_download_cache_lock = threading.Lock()
+
+
+def get_download_cache():
+    """获取按URL寻址的下载缓存，未启用时返回None"""
+    global _download_cache
+    config = get_cached_config_section("download_cache", DOWNLOAD_CACHE_DEFAULTS)
+    if not config["enabled"]:
+        return None
+    if _download_cache is None:
+        with _download_cache_lock:
+            if _download_cache is None:
+                directory = config["directory"] or os.path.join(CURRENT_DIR, "cache", "downloads")
+                _download_cache = DiskLRUCache(directory, config["max_bytes"], config["ttl"])
+    return _download_cache
+
+
+def download_cache_key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def read_download_cache(url):
+    """在有效期内下载过的URL直接返回缓存的内容，否则返回None"""
+    cache = get_download_cache()
+    entry = cache.get(download_cache_key(url)) if cache else None
+    if entry is None:
+        return None
+    try:
+        with open(entry[0], 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    _log_info(f"♻️ 命中下载缓存: {url}")
+    return data
+
+
+def write_download_cache(url, data=None, path=None):
+    """把下载的内容（data）或已下载的文件（path）按URL写入下载缓存"""
+    cache = get_download_cache()
+    if cache is None:
+        return
+    try:
+        if path is not None:
+            cache.put_file(download_cache_key(url), path, {"url": url})
+        else:
+            cache.put(download_cache_key(url), data, {"url": url})
+    except Exception as e:
+        _log_warning(f"⚠️ 写入下载缓存失败: {e}")
+
+
+# 图像生成结果缓存配置，可在配置文件的 "result_cache" 中覆盖（默认关闭）
+RESULT_CACHE_DEFAULTS = {
+    "enabled": False,
+    "directory": "",              # 留空时使用插件目录下的 cache/results
+    "max_bytes": 2147483648,      # 缓存总大小上限（字节）
+}
+
+# 不影响生成结果的载荷字段，不参与缓存键
+_RESULT_CACHE_IGNORED_FIELDS = ("image", "stream", "response_format", "tail_on_partial")
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+_result_cache_scope_var = contextvars.ContextVar("seedream_result_cache_scope", default=None)
+
+
+def get_result_cache():
+    """获取图像生成结果缓存，未启用时返回None"""
+    global _result_cache
+    config = get_cached_config_section("result_cache", RESULT_CACHE_DEFAULTS)
+    if not config["enabled"]:
         return None
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                directory = config["directory"] or os.path.join(CURRENT_DIR, "cache", "results")
+                _result_cache = DiskLRUCache(directory, config["max_bytes"])
+    return _result_cache
 
-def call_api4gpt_api(api_url, api_key, payload, timeout=900):
-    """调用API4GPT API"""
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-    
-    try:
-        response = requests.post(
-            f"{api_url}/v1/images/generations",
-            headers=headers,
-            json=payload,
-            timeout=timeout,
-            verify=False
-        )
-        return response
-    except Exception as e:
-        _log_error(f"API4GPT API调用失败: {e}")
+
+def _reference_image_digest(image):
+    """参考图像内容的哈希（EncodedImage按原始字节，字符串按URL/data URL文本）"""
+    data = image.data if isinstance(image, EncodedImage) else str(image).encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def result_cache_key(payload):
+    """按规范化请求（模型、提示词、尺寸、种子、水印、组图参数、参考图像哈希）计算缓存键
+
+    未启用缓存或未固定种子（seed=-1时每次结果不同）时返回None。
+    """
+    if "seed" not in payload or get_result_cache() is None:
         return None
+    canonical = {key: value for key, value in payload.items() if key not in _RESULT_CACHE_IGNORED_FIELDS}
+    canonical["image"] = [_reference_image_digest(image) for image in payload.get("image") or []]
+    encoded = json.dumps(canonical, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
 
-def call_openrouter_api(api_url, api_key, payload, timeout=900):
-    """调用OpenRouter API"""
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-    
+
+def load_cached_result(cache_key, output_dtype="float32"):
+    """命中结果缓存时直接返回节点输出（不调用API），未命中返回None"""
+    cache = get_result_cache() if cache_key else None
+    entry = cache.get(cache_key) if cache else None
+    if entry is None:
+        return None
+    path, meta = entry
     try:
-        response = requests.post(
-            f"{api_url}/images/generations",
-            headers=headers,
-            json=payload,
-            timeout=timeout,
-            verify=False
-        )
-        return response
+        with open(path, 'rb') as f:
+            data = f.read()
+        images, offset = [], 0
+        for size in meta["sizes"]:
+            images.append(open_result_image(data[offset:offset + size]))
+            offset += size
     except Exception as e:
-        _log_error(f"OpenRouter API调用失败: {e}")
+        _log_warning(f"⚠️ 读取结果缓存失败，重新生成: {e}")
         return None
+    _log_info(f"♻️ 命中结果缓存: {len(images)} 张图像 ({cache_key[:12]})")
+    token = _result_cache_scope_var.set(None)  # 命中时不再回写
+    try:
+        return images_to_outputs(images, meta.get("urls", []), output_dtype)
+    finally:
+        _result_cache_scope_var.reset(token)
 
 
-def call_volcengine_api(api_url, api_key, payload, timeout=900):
-    """调用火山引擎API"""
+class _ResultCacheScope:
+    """一次生成请求的结果缓存状态：缓存键、请求的图像数量（exact为False时是上限），以及生成过程中是否出现过错误"""
+
+    __slots__ = ("key", "expected", "exact", "incomplete")
+
+    def __init__(self, key, expected, exact=True):
+        self.key = key
+        self.expected = expected
+        self.exact = exact
+        self.incomplete = None
+
+    def complete(self, count):
+        if self.exact:
+            return count == self.expected
+        return 1 <= count <= self.expected
+
+
+@contextmanager
+def caching_results(cache_key, expected=1, exact=True):
+    """在此范围内成功生成的完整结果（expected 张图像的原始下载字节）写入结果缓存
+
+    exact为False时 expected 只是上限（组图生成由模型决定实际张数），数量不足不视为不完整。
+    """
+    scope = _ResultCacheScope(cache_key, int(expected or 1), exact) if cache_key else None
+    token = _result_cache_scope_var.set(scope)
     try:
-        # 火山引擎API使用特定的认证方式
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-            "User-Agent": "ComfyUI-SeedReam4API/1.0"
-        }
-        
-        # 火山引擎的图像生成API端点
-        endpoint = f"{api_url}/images/generations"
-        
-        # 构建火山引擎特定的请求载荷
-        volcengine_payload = {
-            "model": payload.get("model", "doubao-seedream-4-0-250828"),
-            "prompt": payload.get("prompt", ""),
-            "size": payload.get("size", "1024x1024"),
-            "n": payload.get("n", 1),
-            "response_format": payload.get("response_format", "url"),
-            "quality": "hd",  # 火山引擎支持hd质量
-            "style": "vivid"  # 火山引擎支持vivid风格
-        }
-        
-        # 添加可选参数
-        if "seed" in payload and payload["seed"] != -1:
-            volcengine_payload["seed"] = payload["seed"]
-        
-        if "watermark" in payload:
-            volcengine_payload["watermark"] = payload["watermark"]
+        yield
+    finally:
+        _result_cache_scope_var.reset(token)
 
-        if "tail_on_partial" in payload:
-            volcengine_payload["tail_on_partial"] = payload["tail_on_partial"]
-        
-        # 处理图像输入（用于图像编辑）
-        if "image" in payload and payload["image"]:
-            volcengine_payload["image"] = payload["image"]
-            _log_info(f"🔍 火山引擎图像输入: 数量={len(payload['image'])}, 第一张长度={len(payload['image'][0]) if payload['image'] else 0}")
-
-        _log_info(f"🔗 调用火山引擎API: {endpoint}")
-        _log_info(f"🔍 火山引擎请求: 模型={volcengine_payload.get('model')}, 提示词长度={len(volcengine_payload.get('prompt', ''))}")
-        _log_info(f"🔍 火山引擎payload包含图像: {'image' in volcengine_payload}")
-        
-        response = requests.post(
-            endpoint,
-            headers=headers,
-            json=volcengine_payload,
-            timeout=timeout,
-            verify=False
-        )
-        
-        _log_info(f"🔍 火山引擎API响应状态: {response.status_code}")
-        if response.status_code != 200:
-            _log_error(f"❌ 火山引擎API错误: {response.text}")
-        
-        return response
-    except Exception as e:
-        _log_error(f"火山引擎API调用异常: {e}")
-        return None
 
-def call_video_api(api_url, api_key, payload, api_format="comfly", timeout=900):
-    """调用视频生成API"""
+def mark_result_incomplete(reason):
+    """记录当前请求的结果不完整（部分图像失败、流中出现错误事件等），此次结果不写入缓存"""
+    scope = _result_cache_scope_var.get()
+    if scope is not None and scope.incomplete is None:
+        scope.incomplete = reason
+
+
+def store_result_images(images, image_urls):
+    """当前请求启用了结果缓存时，把所有结果图像的原始字节作为一个条目写入缓存
+
+    只缓存完整的结果：图像数量等于请求的数量（组图生成时不超过上限）且生成过程中没有记录错误，
+    否则以后相同的请求会一直重放不完整的批次。
+    """
+    scope = _result_cache_scope_var.get()
+    cache = get_result_cache() if scope is not None else None
+    if cache is None:
+        return
+    if scope.incomplete is not None or not scope.complete(len(images)):
+        _log_info(f"ℹ️ 结果不完整，不写入结果缓存: {scope.incomplete or f'{len(images)}/{scope.expected} 张图像'}")
+        return
+    chunks = [getattr(image, "source_bytes", None) for image in images]
+    if not all(chunks):
+        return
+    cache_key = scope.key
     try:
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-            "User-Agent": "ComfyUI-SeedanceAPI/1.0"
-        }
+        cache.put(cache_key, b"".join(chunks), {"sizes": [len(chunk) for chunk in chunks], "urls": list(image_urls)})
+        _log_info(f"💾 已写入结果缓存: {len(chunks)} 张图像 ({cache_key[:12]})")
+    except Exception as e:
+        _log_warning(f"⚠️ 写入结果缓存失败: {e}")
 
-        # 根据API格式确定端点 - 使用各镜像站的实际端点
-        if api_format == "comfly":
-            # Comfly的视频端点，使用v2/videos/generations
-            if api_url.endswith('/v1'):
-                endpoint = f"{api_url[:-3]}/v2/videos/generations"  # 使用 /v2/videos/generations
-            else:
-                endpoint = f"{api_url}/v2/videos/generations"
-        elif api_format == "openai":
-            # T8镜像站使用v2端点
-            if "t8star.cn" in api_url:
-                # T8的视频端点，处理URL版本号
-                if api_url.endswith('/v1'):
-                    endpoint = f"{api_url[:-3]}/v2/videos/generations"  # 替换v1为v2
-                else:
-                    endpoint = f"{api_url}/v2/videos/generations"
-            else:
-                endpoint = f"{api_url}/v1/videos/generations"
 
-        elif api_format == "volcengine":
-            # 火山引擎官方API、T8镜像站和Comfly镜像站
-            if "t8star.cn" in api_url:
-                # T8镜像站使用特殊的端点路径
-                endpoint = f"{api_url}/seedance/v3/contents/generations/tasks"
-            elif "comfly.chat" in api_url:
-                # Comfly镜像站使用火山引擎格式端点
-                endpoint = f"{api_url.replace('/v1', '').replace('/v2', '')}/seedance/v3/contents/generations/tasks"
-            else:
-                # 火山引擎官方API
-                endpoint = f"{api_url}/contents/generations/tasks"
-        else:
-            # 默认处理：检查是否是T8或Comfly
-            if "t8star.cn" in api_url:
-                # T8使用v2端点
-                if api_url.endswith('/v1'):
-                    endpoint = f"{api_url[:-3]}/v2/videos/generations"
-                else:
-                    endpoint = f"{api_url}/v2/videos/generations"
-            else:
-                # 默认使用Comfly格式
-                if api_url.endswith('/v1'):
-                    endpoint = f"{api_url[:-3]}/v2/videos/generations"
-                else:
-                    endpoint = f"{api_url}/v2/videos/generations"
+def seedream_response_to_outputs(response, response_format, output_dtype="float32"):
+    """解析图像生成响应，下载/解码图像并转换为ComfyUI图像tensor，返回 (image, response_text, image_url)"""
+    result = response.json()
+    # 只记录响应的基本结构，避免显示大量base64数据
+    if "choices" in result:
+        _log_info("🔍 API响应格式: T8图像编辑格式 (choices)")
+    elif "data" in result:
+        _log_info(f"🔍 API响应格式: 标准图像生成格式 (data, {len(result['data'])} 项)")
+    else:
+        _log_info(f"🔍 API响应格式: 未知格式，包含键: {list(result.keys())}")
 
-        _log_info(f"🎬 调用视频生成API: {endpoint}")
-        _log_info(f"🔍 视频API格式: {api_format}")
+    # 检查是否是T8图像编辑响应（chat/completions格式）
+    if "choices" in result and result["choices"]:
+        # T8图像编辑响应格式
+        _log_info("🎨 检测到T8图像编辑响应格式")
+        choice = result["choices"][0]
+        content = choice.get("message", {}).get("content", "")
 
-        # 根据不同格式提取提示词长度
-        prompt_length = 0
-        if "prompt" in payload:
-            prompt_length = len(payload.get('prompt', ''))
-        elif "content" in payload:
-            # 火山引擎格式：从content数组中提取text
-            for item in payload.get('content', []):
-                if item.get('type') == 'text':
-                    prompt_length = len(item.get('text', ''))
-                    break
+        # 从响应中提取图像URL（T8图像编辑会在文本中返回图像URL）
+        import re
 
-        _log_info(f"🔍 视频请求: 模型={payload.get('model')}, 提示词长度={prompt_length}")
+        # 尝试多种URL提取模式
+        image_urls_found = []
 
-        if "image" in payload and payload["image"]:
-            _log_info(f"🔍 视频输入图像: 数量={len(payload['image'])}")
-        elif "first_frame" in payload and "last_frame" in payload:
-            _log_info(f"🔍 视频首尾帧模式")
-        elif "content" in payload:
-            _log_info(f"🔍 视频content模式: 内容数量={len(payload['content'])}")
+        # 模式1：Markdown格式 ![alt](url)
+        markdown_pattern = r'!\[.*?\]\((https?://[^\s\)]+)\)'
+        markdown_urls = re.findall(markdown_pattern, content)
+        image_urls_found.extend(markdown_urls)
 
-        # 调试：打印实际发送的payload结构
-        _log_info(f"🔍 实际发送的payload键: {list(payload.keys())}")
-        if "content" in payload:
-            _log_info(f"🔍 content数组长度: {len(payload['content'])}")
-            for i, item in enumerate(payload['content']):
-                _log_info(f"🔍 content[{i}]: type={item.get('type')}, role={item.get('role', 'N/A')}")
+        # 模式2：直接的图像URL
+        direct_pattern = r'https?://[^\s<>"]+\.(?:jpg|jpeg|png|gif|webp)'
+        direct_urls = re.findall(direct_pattern, content)
+        image_urls_found.extend(direct_urls)
 
-        # 调试：测试JSON序列化
-        try:
-            import json
-            json_str = json.dumps(payload, ensure_ascii=False)
-            _log_info(f"🔍 JSON序列化成功，长度: {len(json_str)}")
-            # 重新解析验证
-            parsed_payload = json.loads(json_str)
-            _log_info(f"🔍 JSON解析后的键: {list(parsed_payload.keys())}")
-            if "content" in parsed_payload:
-                _log_info(f"🔍 解析后content数组长度: {len(parsed_payload['content'])}")
-        except Exception as json_e:
-            _log_error(f"❌ JSON序列化失败: {json_e}")
-
-        response = requests.post(
-            endpoint,
-            headers=headers,
-            json=payload,
-            timeout=timeout,
-            verify=False
-        )
+        # 模式3：任何包含图像相关域名的URL（更宽泛的匹配）
+        domain_pattern = r'https?://[^\s<>"\)]+(?:tos-cn-beijing\.volces\.com|ark-content-generation)[^\s<>"\)]*'
+        domain_urls = re.findall(domain_pattern, content)
+        image_urls_found.extend(domain_urls)
 
-        _log_info(f"🔍 视频API响应状态: {response.status_code}")
-        if response.status_code != 200:
-            _log_error(f"❌ 视频API错误: {response.text}")
+        # 去重
+        image_urls_found = list(set(image_urls_found))
 
-        return response
+        _log_info(f"🔍 提取到的图像URL: {image_urls_found}")
 
-    except Exception as e:
-        _log_error(f"视频生成API调用失败: {e}")
-        return None
+        generated_images = []
+        image_urls = []
 
-def call_multi_ref_video_api(api_url, api_key, payload, api_format="comfly", timeout=900):
-    """调用多图参考视频生成API - 统一使用火山引擎格式端点"""
-    try:
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-            "User-Agent": "ComfyUI-SeedanceAPI/1.0"
-        }
+        for image_url, image in download_result_images(image_urls_found):
+            if image is not None:
+                generated_images.append(image)
+                image_urls.append(image_url)
+                _log_info(f"✅ 成功下载T8编辑图像: {image_url}")
 
-        # 多图参考功能统一使用火山引擎格式的端点
-        if api_format == "volcengine":
-            # 火山引擎官方API
-            endpoint = f"{api_url}/contents/generations/tasks"
-        elif api_format == "comfly":
-            # Comfly镜像站使用火山引擎官方格式端点
-            if "comfly.chat" in api_url:
-                # Comfly的火山引擎格式端点
-                endpoint = f"{api_url.replace('/v1', '').replace('/v2', '')}/seedance/v3/contents/generations/tasks"
-            else:
-                endpoint = f"{api_url}/seedance/v3/contents/generations/tasks"
-        else:
-            # 其他格式默认使用火山引擎格式
-            endpoint = f"{api_url}/contents/generations/tasks"
+        if not generated_images:
+            error_message = f"T8图像编辑响应中未找到有效图像URL。响应内容: {content}"
+            _log_error(error_message)
+            blank_tensor = create_blank_tensor()
+            return (blank_tensor, error_message, content)
+
+    elif "data" in result and result["data"]:
+        # 标准图像生成响应格式
+        _log_info("🖼️ 检测到标准图像生成响应格式")
+        generated_images = []
+        image_urls = []
+
+        if response_format == "url":
+            # 所有结果图像并发下载，按原始顺序组装
+            result_urls = [item.get("url") for item in result["data"] if item.get("url")]
+            for image_url, image in download_result_images(result_urls):
+                if image is not None:
+                    generated_images.append(image)
+                    image_urls.append(image_url)
+
+        elif response_format == "b64_json":
+            for item in result["data"]:
+                b64_data = item.get("b64_json")
+                if not b64_data:
+                    continue
 
-        _log_info(f"🎬 调用多图参考视频生成API: {endpoint}")
-        _log_info(f"🔍 多图参考API格式: {api_format}")
+                try:
+                    image = open_result_image(base64.b64decode(b64_data))
+                    generated_images.append(image)
+                    image_urls.append("base64_data")
+                except Exception as e:
+                    _log_warning(f"解码base64图像失败: {e}")
+                    continue
+    else:
+        error_message = "响应格式不支持或无图像数据"
+        _log_error(error_message)
+        blank_tensor = create_blank_tensor()
+        return (blank_tensor, error_message, "")
 
-        # 根据不同格式提取提示词长度
-        prompt_length = 0
-        if "content" in payload:
-            # 火山引擎格式：从content数组中提取text
-            for item in payload.get('content', []):
-                if item.get('type') == 'text':
-                    prompt_length = len(item.get('text', ''))
-                    break
+    return images_to_outputs(generated_images, image_urls, output_dtype)
 
-        _log_info(f"🔍 多图参考请求: 模型={payload.get('model')}, 提示词长度={prompt_length}")
-        _log_info(f"🔍 多图参考content模式: 内容数量={len(payload.get('content', []))}")
-
-        # 调试：打印实际发送的payload结构
-        _log_info(f"🔍 实际发送的payload键: {list(payload.keys())}")
-        if "content" in payload:
-            _log_info(f"🔍 content数组长度: {len(payload['content'])}")
-            for i, item in enumerate(payload['content']):
-                _log_info(f"🔍 content[{i}]: type={item.get('type')}, role={item.get('role', 'N/A')}")
-
-        response = requests.post(
-            endpoint,
-            headers=headers,
-            json=payload,
-            timeout=timeout,
-            verify=False
-        )
 
-        _log_info(f"🔍 多图参考API响应状态: {response.status_code}")
-        if response.status_code != 200:
-            _log_error(f"❌ 多图参考API错误: {response.text}")
+def images_to_outputs(generated_images, image_urls, output_dtype="float32"):
+    """把解码后的PIL图像列表转换为节点输出 (image, response_text, image_url)
 
-        return response
+    output_dtype 为 "float16" 时直接解码为float16批次（内存减半），
+    用于4K组图等大批次，避免在内存较小的机器上OOM。
+    """
+    if not generated_images:
+        error_message = "No valid images generated"
+        _log_error(error_message)
+        blank_tensor = create_blank_tensor()
+        return (blank_tensor, error_message, "")
 
+    # 转换为tensor：按文件头尺寸预分配 [batch, H, W, 3]，各图像直接解码到对应位置
+    for i, img in enumerate(generated_images):
+        _log_info(f"🔍 处理图像 {i+1}: 原始尺寸 {img.size}, 模式 {img.mode}")
+    storage_dtype = OUTPUT_DTYPES.get(output_dtype, torch.float32)
+    final_tensor = decode_images_to_batch(generated_images, storage_dtype)
+    _log_info(f"🔍 堆叠后tensor形状: {final_tensor.shape}")
+
+    # 一次融合检查（形状、取值范围、NaN/Inf），float16输出保持原有存储类型
+    final_tensor = validate_image_batch(final_tensor, owned=True)
+
+    memory_text = describe_tensor_memory(final_tensor)
+    response_text = f"Successfully generated {len(generated_images)} image(s), {memory_text}"
+    image_url_text = image_urls[0] if image_urls else ""
+
+    _log_info(f"✅ 成功生成 {len(generated_images)} 张图像，{memory_text}")
+    store_result_images(generated_images, image_urls)
+    return (final_tensor, response_text, image_url_text)
+
+
+def _decode_b64_result_image(b64_data):
+    """解码单张base64结果图像的数据并解析文件头，失败返回None"""
+    try:
+        return open_result_image(base64.b64decode(b64_data))
     except Exception as e:
-        _log_error(f"多图参考视频生成API调用失败: {e}")
+        _log_warning(f"解码base64图像失败: {e}")
         return None
 
-def call_video_task_status(api_url, api_key, task_id, api_format="comfly", timeout=60):
-    """查询视频生成任务状态"""
+
+def iter_sse_events(response):
+    """逐个解析服务端事件流（SSE），产出 (event, data)"""
+    response.encoding = "utf-8"  # text/event-stream 固定为UTF-8，不使用requests对text/*的默认编码
+    event, data_lines = None, []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if not line:
+            if data_lines:
+                yield event, "\n".join(data_lines)
+            event, data_lines = None, []
+            continue
+        if line.startswith(":"):
+            continue  # 注释/心跳
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "event":
+            event = value
+        elif field == "data":
+            data_lines.append(value)
+    if data_lines:
+        yield event, "\n".join(data_lines)
+
+
+def _create_progress_bar(total):
+    """创建ComfyUI进度条，不在ComfyUI环境中运行时返回None"""
     try:
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-            "User-Agent": "ComfyUI-SeedanceAPI/1.0"
-        }
+        import comfy.utils
+        return comfy.utils.ProgressBar(total)
+    except Exception:
+        return None
 
-        # 根据API格式确定查询端点
-        if api_format == "comfly":
-            # Comfly的查询端点，使用v2/videos/generations
-            if api_url.endswith('/v1'):
-                endpoint = f"{api_url[:-3]}/v2/videos/generations/{task_id}"
-            else:
-                endpoint = f"{api_url}/v2/videos/generations/{task_id}"
-        elif api_format == "openai":
-            # T8镜像站使用v2端点
-            if "t8star.cn" in api_url:
-                # T8的查询端点，处理URL版本号
-                if api_url.endswith('/v1'):
-                    endpoint = f"{api_url[:-3]}/v2/videos/generations/{task_id}"  # 替换v1为v2
-                else:
-                    endpoint = f"{api_url}/v2/videos/generations/{task_id}"
-            else:
-                endpoint = f"{api_url}/v1/videos/generations/{task_id}"
 
-        elif api_format == "volcengine":
-            # 火山引擎官方API、T8镜像站和Comfly镜像站
-            if "t8star.cn" in api_url:
-                # T8镜像站使用特殊的查询端点路径
-                endpoint = f"{api_url}/seedance/v3/contents/generations/tasks/{task_id}"
-            elif "comfly.chat" in api_url:
-                # Comfly镜像站使用火山引擎格式查询端点
-                endpoint = f"{api_url.replace('/v1', '').replace('/v2', '')}/seedance/v3/contents/generations/tasks/{task_id}"
-            else:
-                # 火山引擎官方API
-                endpoint = f"{api_url}/contents/generations/tasks/{task_id}"
-        else:
-            # 默认处理：检查是否是T8或Comfly
-            if "t8star.cn" in api_url:
-                # T8使用v2端点
-                if api_url.endswith('/v1'):
-                    endpoint = f"{api_url[:-3]}/v2/videos/generations/{task_id}"
-                else:
-                    endpoint = f"{api_url}/v2/videos/generations/{task_id}"
-            else:
-                # 默认使用Comfly格式
-                if api_url.endswith('/v1'):
-                    endpoint = f"{api_url[:-3]}/v2/videos/generations/{task_id}"
-                else:
-                    endpoint = f"{api_url}/v2/videos/generations/{task_id}"
+class _StreamProgress:
+    """流式组图生成的逐张进度（在下载线程的回调中更新）"""
 
-        _log_info(f"🔍 查询视频任务状态: {endpoint}")
+    def __init__(self, expected):
+        self.expected = max(1, int(expected or 1))
+        self.ready = 0
+        self._lock = threading.Lock()
+        self._bar = _create_progress_bar(self.expected)
 
-        response = requests.get(
-            endpoint,
-            headers=headers,
-            timeout=timeout,
-            verify=False
-        )
+    def image_ready(self, future):
+        with self._lock:
+            self.ready += 1
+            ready, total = self.ready, max(self.expected, self.ready)
+        status = "✅" if future.result() is not None else "⚠️"
+        _log_info(f"{status} 流式图像 {ready}/{total} 已处理")
+        if self._bar is not None:
+            try:
+                self._bar.update_absolute(ready, total)
+            except Exception:
+                pass
 
-        return response
 
-    except requests.exceptions.SSLError as e:
-        _log_warning(f"SSL错误，尝试忽略SSL验证: {e}")
+def collect_streamed_images(response, response_format, expected=1, output_dtype="float32"):
+    """消费图像生成事件流：每张图像的事件一到就提交下载/解码，结束后按image_index顺序组装节点输出"""
+    executor = get_download_executor()
+    timeout = get_cached_config_section("downloads", DOWNLOAD_DEFAULTS)["timeout"]
+    progress = _StreamProgress(expected)
+    pending = {}
+    errors = []
+    first_event_at = None
+    started = time.monotonic()
+
+    for event, data in iter_sse_events(response):
+        if data.strip() == "[DONE]":
+            break
         try:
-            # 尝试使用更宽松的SSL设置
-            import urllib3
-            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-            response = requests.get(
-                endpoint,
-                headers=headers,
-                timeout=timeout,
-                verify=False
-            )
-            return response
-        except Exception as e2:
-            _log_error(f"查询视频任务状态失败（SSL重试后）: {e2}")
-            return None
+            message = json.loads(data)
+        except ValueError:
+            _log_warning(f"⚠️ 无法解析的流式事件: {data[:200]}")
+            continue
+
+        event_type = str(message.get("type") or event or "")
+        if message.get("url") or message.get("b64_json"):
+            index = message.get("image_index", len(pending))
+            if message.get("url"):
+                label, future = message["url"], executor.submit(_download_result_image, message["url"], timeout)
+            else:
+                label, future = "base64_data", executor.submit(_decode_b64_result_image, message["b64_json"])
+            pending[index] = (label, future)
+            future.add_done_callback(progress.image_ready)
+            if first_event_at is None:
+                first_event_at = time.monotonic()
+                _log_info(f"🖼️ 首张图像事件在 {first_event_at - started:.1f}s 后到达")
+            _log_info(f"🖼️ 收到第 {len(pending)} 张图像事件 (image_index={index})，开始下载/解码")
+        elif "failed" in event_type or message.get("error"):
+            error = message.get("error", message)
+            errors.append(error)
+            _log_warning(f"⚠️ 流式生成中有图像失败: {error}")
+        elif "completed" in event_type:
+            _log_info(f"🏁 流式生成完成: {message.get('usage', {})}")
+
+    generated_images = []
+    image_urls = []
+    for index in sorted(pending):
+        label, future = pending[index]
+        image = future.result()
+        if image is not None:
+            generated_images.append(image)
+            image_urls.append(label)
+
+    if not generated_images and errors:
+        error_message = f"流式生成失败: {errors[0]}"
+        _log_error(error_message)
+        return (create_blank_tensor(), error_message, "")
+    if errors:
+        mark_result_incomplete(f"流式生成中有 {len(errors)} 张图像失败")
+    return images_to_outputs(generated_images, image_urls, output_dtype)
+
+
+def _stream_image_attempt(target, payload, response_format, timeout, output_dtype="float32"):
+    """对单个镜像站发起一次流式图像生成，返回 (节点输出或None, 响应)"""
+    builder, user_agent, _ = IMAGE_API_FORMATS.get(target.api_format, IMAGE_API_FORMATS["comfly"])
+    endpoint, body = builder(target.api_url, payload)
+    body = dict(body, stream=True)  # 部分格式的请求构建函数不会保留stream参数
+    endpoint, request_args = image_request_args(target.api_url, target.api_key, endpoint, body, user_agent)
+    request_args["headers"]["Accept"] = "text/event-stream"
+
+    with http_stream_request("POST", endpoint, timeout=timeout, **request_args) as response:
+        if response.status_code != 200:
+            response.content  # 读取错误响应体，连接关闭后仍可用于日志
+            return None, response
+        if "text/event-stream" not in response.headers.get("Content-Type", ""):
+            _log_info("ℹ️ 镜像站未返回事件流，按普通响应处理")
+            return seedream_response_to_outputs(response, response_format, output_dtype), response
+        _log_info(f"📡 开始接收流式图像: {target.name}")
+        return collect_streamed_images(response, response_format, payload.get("n", 1), output_dtype), response
+
+
+def stream_image_generation(targets, payload, response_format, timeout=900, max_retries=3, output_dtype="float32"):
+    """以流式模式（stream=True）调用图像生成API；收到事件流之前的失败按重试策略重试并轮换镜像站"""
+    policy = get_retry_policy(max_retries, timeout)
+    attempts = image_attempts(policy, targets, "流式API调用")
+    response = None
+    with retry_budget(policy):
+        for target in attempts:
+            error = None
+            try:
+                outputs, response = _stream_image_attempt(target, payload, response_format, timeout, output_dtype)
+                if outputs is not None:
+                    return outputs
+                _log_image_api_failure(response, attempts.attempt, policy.max_attempts)
+            except Exception as e:
+                error = e
+            delay = attempts.backoff(response, error)
+            if delay is None:
+                break
+            time.sleep(delay)
+    return finish_image_generation(response, response_format, output_dtype)
+
+
+def finish_image_generation(response, response_format, output_dtype="float32"):
+    """将图像API的最终响应转换为节点输出，失败时返回空白图像和错误信息"""
+    try:
+        if not response or response.status_code != 200:
+            error_message = f"API Error: {response.status_code if response else 'No response'} - {response.text if response else 'Connection failed'}"
+            _log_error(error_message)
+            return (create_blank_tensor(), error_message, "")
+        return seedream_response_to_outputs(response, response_format, output_dtype)
     except Exception as e:
-        _log_error(f"查询视频任务状态失败: {e}")
-        return None
+        return image_generation_failed_result(e)
+
+
+def _sequential_generation(payload):
+    """组图生成（sequential_image_generation=auto）时 n/max_images 只是上限，模型可能返回更少的图像"""
+    return payload.get("sequential_image_generation") == "auto"
+
+
+def run_image_generation(request, response_format, timeout=900, max_retries=3, hedge=False, output_dtype="float32"):
+    """SeedReam图像节点在 _prepare_request 之后的公共流程：查结果缓存，以流式或普通方式（带重试）调用API，
+    把结果转换为节点输出"""
+    targets, payload = request
+    cache_key = result_cache_key(payload)
+    cached = load_cached_result(cache_key, output_dtype)
+    if cached is not None:
+        return cached
+    with caching_results(cache_key, payload.get("n", 1), exact=not _sequential_generation(payload)):
+        if payload.get("stream"):
+            return stream_image_generation(targets, payload, response_format, timeout, max_retries, output_dtype)
+        response = call_image_api_with_retries(targets, payload, timeout, max_retries, hedge)
+        return finish_image_generation(response, response_format, output_dtype)
+
+
+async def async_run_image_generation(request, response_format, timeout=900, max_retries=3, hedge=False,
+                                     output_dtype="float32"):
+    """run_image_generation的协程版本：缓存读写和图像解码在工作线程中进行，等待API和重试退避时不占用执行线程"""
+    targets, payload = request
+    cache_key = result_cache_key(payload)
+    cached = await asyncio.to_thread(load_cached_result, cache_key, output_dtype)
+    if cached is not None:
+        return cached
+    with caching_results(cache_key, payload.get("n", 1), exact=not _sequential_generation(payload)):
+        if payload.get("stream"):
+            return await asyncio.to_thread(stream_image_generation, targets, payload, response_format, timeout,
+                                           max_retries, output_dtype)
+        response = await async_call_image_api_with_retries(targets, payload, timeout, max_retries, hedge)
+        return await asyncio.to_thread(finish_image_generation, response, response_format, output_dtype)
+
 
 class SeedReam4APINode:
     """SeedReam4API 节点类"""
@@ -1527,6 +4717,7 @@ class SeedReam4APINode:
         
         # 保留前三个镜像站选项（包括火山引擎）
         mirror_options = [opt for opt in mirror_options if opt in ["comfly", "t8_mirror", "volcengine"]]
+        mirror_options.append(AUTO_MIRROR)
         
         return {
             "required": {
@@ -1561,376 +4752,95 @@ class SeedReam4APINode:
                 "image13": ("IMAGE",),
                 "image14": ("IMAGE",),
                 "sequential_image_generation": (["disabled", "auto"], {"default": "disabled"}),
+                "hedge_requests": ("BOOLEAN", {"default": False}),
+                "output_dtype": (list(OUTPUT_DTYPES), {"default": "float32"}),
             }
         }
     
     RETURN_TYPES = ("IMAGE", "STRING", "STRING")
     RETURN_NAMES = ("image", "response", "image_url")
-    FUNCTION = "generate_image"
+    FUNCTION = "generate_image_async" if ASYNC_NODE_EXECUTION else "generate_image"
     CATEGORY = "Ken-Chen/Doubao"
     
     def __init__(self):
         self.config = get_seedream4_config()
         self.timeout = self.config.get('timeout', 900)
-        self.max_retries = self.config.get('max_retries', 3)
-        self.size_mapping = self.config.get('size_mapping', {})
-        self.resolution_factors = self.config.get('resolution_factors', {})
-    
-    def get_headers(self, api_key):
-        """获取请求头"""
-        return {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
-    
-    def generate_image(self, prompt, mirror_site, model, response_format="url", resolution="1K",
-                      aspect_ratio="1:1", width=1024, height=1024, api_key="",
-                      max_images=1, seed=-1, watermark=True, stream=False, tail_on_partial=True,
-                      image1=None, image2=None, image3=None, image4=None, image5=None,
-                      image6=None, image7=None, image8=None, image9=None, image10=None,
-                      image11=None, image12=None, image13=None, image14=None,
-                      sequential_image_generation="disabled"):
-        """生成图像"""
-        
-        # 获取镜像站配置
-        site_config = get_mirror_site_config(mirror_site)
-        api_url = site_config.get("url", "").strip()
-        api_url = api_url.replace("`", "").strip()
-        if api_url.endswith(")"):
-            api_url = api_url[:-1].strip()
-        api_url = api_url.replace("`", "").strip()
-        if api_url.endswith(")"):
-            api_url = api_url[:-1].strip()
-        api_format = site_config.get("api_format", "comfly")
-        
-        # 使用镜像站的API key（如果提供了的话）
-        if site_config.get("api_key") and not api_key.strip():
-            api_key = site_config["api_key"]
-            _log_info(f"🔑 自动使用镜像站API Key: {api_key[:8]}...")
-        
-        if not api_key.strip():
-            error_message = "API key not found"
-            _log_error(error_message)
-            blank_tensor = create_blank_tensor()
-            return (blank_tensor, error_message, "")
-        
-        if not validate_api_url(api_url):
-            error_message = "Invalid API URL"
-            _log_error(error_message)
-            blank_tensor = create_blank_tensor()
-            return (blank_tensor, error_message, "")
-        
-        # 清理模型名称中的提示信息
-        if " (" in model:
-            model = model.split(" (")[0]
-
-
-        # 检查模型和分辨率兼容性
-        if model == "doubao-seedream-4-5-251128" and resolution == "1K":
-            warning_message = "⚠️ 警告：模型 doubao-seedream-4-5-251128 不支持 1K 分辨率，可能会导致生成失败或自动调整。"
-            _log_warning(warning_message)
-            # 这里我们不阻止执行，因为API可能会自动处理，但我们给出了提示
-            
-        _log_info(f"🔗 使用镜像站: {mirror_site} ({api_url})")
-        
-        try:
-            # 计算最终尺寸
-            if aspect_ratio == "Custom":
-                scale_factor = self.resolution_factors.get(resolution, 1)
-                scaled_width = int(width * scale_factor)
-                scaled_height = int(height * scale_factor)
-                final_size = f"{scaled_width}x{scaled_height}"
-                _log_info(f"使用自定义尺寸: {final_size}")
-            else:
-                if resolution in self.size_mapping and aspect_ratio in self.size_mapping[resolution]:
-                    final_size = self.size_mapping[resolution][aspect_ratio]
-                else:
-                    final_size = "1024x1024"
-                    _log_warning(f"未找到 {resolution} 和 {aspect_ratio} 的组合，使用 {final_size}")
-            
-            # 构建请求载荷
-            payload = {
-                "model": model,
-                "prompt": prompt,
-                "response_format": response_format,
-                "size": final_size,
-                "watermark": watermark,
-                "stream": stream,
-                "tail_on_partial": tail_on_partial
-            }
-            
-            if sequential_image_generation == "auto":
-                payload["sequential_image_generation"] = sequential_image_generation
-                payload["sequential_image_generation_options"] = {"max_images": max_images}
-                payload["n"] = max_images
-                
-            if seed != -1:
-                payload["seed"] = seed
-            
-            # 处理输入图像
-            image_urls = []
-            for img in [image1, image2, image3, image4, image5, image6, image7, image8, image9, image10, image11, image12, image13, image14]:
-                if img is not None:
-                    batch_size = img.shape[0]
-                    for i in range(batch_size):
-                        single_image = img[i:i+1]
-                        image_base64 = image_to_base64(single_image)
-                        if image_base64:
-                            image_urls.append(image_base64)
-            
-            if image_urls:
-                payload["image"] = image_urls
-                if sequential_image_generation == "auto":
-                    remaining = max(0, 15 - len(image_urls))
-                    if remaining < max_images:
-                        payload["sequential_image_generation_options"] = {"max_images": remaining}
-                        payload["n"] = remaining
-            
-            # 根据API格式调用相应的API
-            response = None
-            for attempt in range(self.max_retries):
-                try:
-                    if api_format == "comfly":
-                        response = call_comfly_api(api_url, api_key, payload, self.timeout)
-                    elif api_format == "openai":
-                        response = call_openai_compatible_api(api_url, api_key, payload, self.timeout)
-                    elif api_format == "api4gpt":
-                        response = call_api4gpt_api(api_url, api_key, payload, self.timeout)
-                    elif api_format == "openrouter":
-                        response = call_openrouter_api(api_url, api_key, payload, self.timeout)
-                    elif api_format == "volcengine":
-                        response = call_volcengine_api(api_url, api_key, payload, self.timeout)
-                    else:
-                        response = call_comfly_api(api_url, api_key, payload, self.timeout)
-                    
-                    if response and response.status_code == 200:
-                        break
-                    elif response:
-                        _log_warning(f"API调用失败 (尝试 {attempt + 1}/{self.max_retries}): {response.status_code} - {response.text}")
-                    else:
-                        _log_warning(f"API调用失败 (尝试 {attempt + 1}/{self.max_retries}): 无响应")
-                    
-                    if attempt < self.max_retries - 1:
-                        time.sleep(2 ** attempt)  # 指数退避
-                        
-                except Exception as e:
-                    _log_warning(f"API调用异常 (尝试 {attempt + 1}/{self.max_retries}): {e}")
-                    if attempt < self.max_retries - 1:
-                        time.sleep(2 ** attempt)
-            
-            if not response or response.status_code != 200:
-                error_message = f"API Error: {response.status_code if response else 'No response'} - {response.text if response else 'Connection failed'}"
-                _log_error(error_message)
-                blank_tensor = create_blank_tensor()
-                return (blank_tensor, error_message, "")
-            
-            result = response.json()
-            # 只记录响应的基本结构，避免显示大量base64数据
-            if "choices" in result:
-                _log_info("🔍 API响应格式: T8图像编辑格式 (choices)")
-            elif "data" in result:
-                _log_info(f"🔍 API响应格式: 标准图像生成格式 (data, {len(result['data'])} 项)")
-            else:
-                _log_info(f"🔍 API响应格式: 未知格式，包含键: {list(result.keys())}")
-
-            # 检查是否是T8图像编辑响应（chat/completions格式）
-            if "choices" in result and result["choices"]:
-                # T8图像编辑响应格式
-                _log_info("🎨 检测到T8图像编辑响应格式")
-                choice = result["choices"][0]
-                content = choice.get("message", {}).get("content", "")
-
-                # 从响应中提取图像URL（T8图像编辑会在文本中返回图像URL）
-                import re
-
-                # 尝试多种URL提取模式
-                image_urls_found = []
-
-                # 模式1：Markdown格式 ![alt](url)
-                markdown_pattern = r'!\[.*?\]\((https?://[^\s\)]+)\)'
-                markdown_urls = re.findall(markdown_pattern, content)
-                image_urls_found.extend(markdown_urls)
-
-                # 模式2：直接的图像URL
-                direct_pattern = r'https?://[^\s<>"]+\.(?:jpg|jpeg|png|gif|webp)'
-                direct_urls = re.findall(direct_pattern, content)
-                image_urls_found.extend(direct_urls)
-
-                # 模式3：任何包含图像相关域名的URL（更宽泛的匹配）
-                domain_pattern = r'https?://[^\s<>"\)]+(?:tos-cn-beijing\.volces\.com|ark-content-generation)[^\s<>"\)]*'
-                domain_urls = re.findall(domain_pattern, content)
-                image_urls_found.extend(domain_urls)
-
-                # 去重
-                image_urls_found = list(set(image_urls_found))
-
-                _log_info(f"🔍 提取到的图像URL: {image_urls_found}")
+        self.max_retries = self.config.get('max_retries', 3)
+        self.size_mapping = self.config.get('size_mapping', {})
+        self.resolution_factors = self.config.get('resolution_factors', {})
+    
+    def get_headers(self, api_key):
+        """获取请求头"""
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        }
+    
+    def _prepare_request(self, prompt, mirror_site, model, response_format="url", resolution="1K",
+                         aspect_ratio="1:1", width=1024, height=1024, api_key="",
+                         max_images=1, seed=-1, watermark=True, stream=False, tail_on_partial=True,
+                         image1=None, image2=None, image3=None, image4=None, image5=None,
+                         image6=None, image7=None, image8=None, image9=None, image10=None,
+                         image11=None, image12=None, image13=None, image14=None,
+                         sequential_image_generation="disabled", hedge_requests=False):
+        """解析镜像站并构建请求载荷，返回 ((候选镜像站列表, payload), None) 或 (None, 错误结果)"""
+        site, error_result = resolve_image_site(mirror_site, api_key, model, resolution, hedge_requests)
+        if error_result:
+            return None, error_result
+        targets, model = site
 
-                generated_images = []
-                image_urls = []
+        try:
+            # 计算最终尺寸
+            final_size = resolve_image_size(self.size_mapping, self.resolution_factors,
+                                            resolution, aspect_ratio, width, height)
 
-                if image_urls_found:
-                    for image_url in image_urls_found:
-                        try:
-                            img_response = requests.get(image_url, timeout=60)
-                            if img_response.status_code == 200:
-                                image = Image.open(io.BytesIO(img_response.content))
-                                generated_images.append(image)
-                                image_urls.append(image_url)
-                                _log_info(f"✅ 成功下载T8编辑图像: {image_url}")
-                        except Exception as e:
-                            _log_warning(f"下载T8编辑图像失败: {e}")
-                            continue
+            # 构建请求载荷
+            payload = build_seedream_payload(model, prompt, response_format, final_size, watermark, stream,
+                                             tail_on_partial, max_images, seed, sequential_image_generation)
 
-                if not generated_images:
-                    error_message = f"T8图像编辑响应中未找到有效图像URL。响应内容: {content}"
-                    _log_error(error_message)
-                    blank_tensor = create_blank_tensor()
-                    return (blank_tensor, error_message, content)
-
-            elif "data" in result and result["data"]:
-                # 标准图像生成响应格式
-                _log_info("🖼️ 检测到标准图像生成响应格式")
-                generated_images = []
-                image_urls = []
-
-                for item in result["data"]:
-                    if response_format == "url":
-                        image_url = item.get("url")
-                        if not image_url:
-                            continue
+            # 处理输入图像：所有输入（含batch中的每一帧）一次性量化并行编码
+            input_images = [img for img in [image1, image2, image3, image4, image5, image6, image7, image8, image9, image10, image11, image12, image13, image14] if img is not None]
+            budget = get_payload_budget([target.name for target in targets], model)
+            image_urls = [encoded for encoded in encode_images_for_upload(input_images, budget=budget) if encoded]
 
-                        try:
-                            img_response = requests.get(image_url, timeout=60)
-                            if img_response.status_code == 200:
-                                image = Image.open(io.BytesIO(img_response.content))
-                                generated_images.append(image)
-                                image_urls.append(image_url)
-                        except Exception as e:
-                            _log_warning(f"下载图像失败: {e}")
-                            continue
+            if image_urls:
+                payload["image"] = image_urls
+                if sequential_image_generation == "auto":
+                    remaining = max(0, 15 - len(image_urls))
+                    if remaining < max_images:
+                        payload["sequential_image_generation_options"] = {"max_images": remaining}
+                        payload["n"] = remaining
+        except Exception as e:
+            return None, image_generation_failed_result(e)
 
-                    elif response_format == "b64_json":
-                        b64_data = item.get("b64_json")
-                        if not b64_data:
-                            continue
+        return (targets, payload), None
 
-                        try:
-                            image_data = base64.b64decode(b64_data)
-                            image = Image.open(io.BytesIO(image_data))
-                            generated_images.append(image)
-                            image_urls.append("base64_data")
-                        except Exception as e:
-                            _log_warning(f"解码base64图像失败: {e}")
-                            continue
-            else:
-                error_message = "响应格式不支持或无图像数据"
-                _log_error(error_message)
-                blank_tensor = create_blank_tensor()
-                return (blank_tensor, error_message, "")
-            
-            if not generated_images:
-                error_message = "No valid images generated"
-                _log_error(error_message)
-                blank_tensor = create_blank_tensor()
-                return (blank_tensor, error_message, "")
-            
-            # 转换为tensor - 使用ComfyUI_Comfly的方式
-            image_tensors = []
-            for i, img in enumerate(generated_images):
-                _log_info(f"🔍 处理图像 {i+1}: 原始尺寸 {img.size}, 模式 {img.mode}")
-                
-                # 使用pil2tensor函数，格式为[1, H, W, 3]
-                tensor = pil2tensor(img)
-                _log_info(f"🔍 tensor形状: {tensor.shape}, 值范围: {tensor.min().item():.3f} 到 {tensor.max().item():.3f}")
-                
-                # 检查tensor是否有异常
-                if len(tensor.shape) != 4 or tensor.shape[-1] != 3:
-                    _log_error(f"❌ 图像 {i+1} tensor形状异常: {tensor.shape}")
-                    continue
-                
-                image_tensors.append(tensor)
-            
-            # 检查是否有有效的图像tensor
-            if not image_tensors:
-                _log_error("❌ 没有有效的图像tensor，使用空白tensor")
-                final_tensor = create_blank_tensor()
-            else:
-                # 堆叠所有图像，格式为 [batch, H, W, 3] - 参考ComfyUI_Comfly
-                if len(image_tensors) == 1:
-                    final_tensor = image_tensors[0]
-                else:
-                    final_tensor = torch.cat(image_tensors, dim=0)
-                _log_info(f"🔍 堆叠后tensor形状: {final_tensor.shape}")
-            
-            # 调试信息
-            _log_info(f"🔍 最终tensor形状: {final_tensor.shape}")
-            _log_info(f"🔍 最终tensor数据类型: {final_tensor.dtype}")
-            _log_info(f"🔍 最终tensor值范围: {final_tensor.min().item():.3f} 到 {final_tensor.max().item():.3f}")
-            
-            # 检查tensor是否有异常值
-            if torch.isnan(final_tensor).any():
-                _log_error("❌ tensor包含NaN值")
-            if torch.isinf(final_tensor).any():
-                _log_error("❌ tensor包含无穷值")
-            
-            # 检查每个维度的值
-            for i in range(min(final_tensor.shape[0], 2)):  # 限制输出数量
-                for j in range(min(final_tensor.shape[1], 3)):  # 限制输出数量
-                    _log_info(f"🔍 图像{i}通道{j}形状: {final_tensor[i,j].shape}, 值范围: {final_tensor[i,j].min().item():.3f} 到 {final_tensor[i,j].max().item():.3f}")
-            
-            # 特别检查是否有异常的维度
-            if final_tensor.shape[1] == 1 and final_tensor.shape[2] > 1000:
-                _log_error(f"❌ 检测到异常tensor形状: {final_tensor.shape} - 这可能导致PIL错误")
-                _log_error(f"❌ 通道数: {final_tensor.shape[1]}, 高度: {final_tensor.shape[2]}, 宽度: {final_tensor.shape[3]}")
-                # 强制修复
-                _log_info("🔧 强制修复tensor格式...")
-                final_tensor = create_blank_tensor()
-            
-            # 确保tensor格式正确
-            if len(final_tensor.shape) != 4:
-                _log_error(f"❌ tensor维度错误: {final_tensor.shape}, 应该是4维 (batch, channels, height, width)")
-                # 尝试修复
-                if len(final_tensor.shape) == 3:
-                    final_tensor = final_tensor.unsqueeze(0)
-                    _log_info(f"🔧 修复后tensor形状: {final_tensor.shape}")
-            
-            # 使用ensure_tensor_format确保tensor格式完全正确
-            final_tensor = ensure_tensor_format(final_tensor)
-            _log_info(f"🔧 最终tensor格式验证完成: {final_tensor.shape}")
-            
-            # 最终强制检查 - 确保tensor格式为[batch, H, W, 3]
-            if (len(final_tensor.shape) != 4 or 
-                final_tensor.shape[-1] != 3):
-                _log_error(f"❌ 最终检查失败，tensor格式仍然不正确: {final_tensor.shape}")
-                _log_info("🔧 使用空白tensor替代")
-                final_tensor = create_blank_tensor()
-            
-            # 最终验证tensor是否可以被PIL处理
-            try:
-                # 尝试转换为numpy数组来验证 - 格式为[H, W, 3]
-                test_array = final_tensor[0].cpu().numpy()
-                test_array = np.clip(test_array, 0, 1)
-                test_array = (test_array * 255).astype(np.uint8)
-                _log_info(f"🔍 PIL兼容性测试通过: {test_array.shape}")
-            except Exception as e:
-                _log_error(f"❌ PIL兼容性测试失败: {e}")
-                _log_info("🔧 使用空白tensor替代")
-                final_tensor = create_blank_tensor()
-            
-            response_text = f"Successfully generated {len(generated_images)} image(s)"
-            image_url_text = image_urls[0] if image_urls else ""
-            
-            _log_info(f"✅ 成功生成 {len(generated_images)} 张图像")
-            return (final_tensor, response_text, image_url_text)
-            
-        except Exception as e:
-            error_message = f"Generation failed: {str(e)}"
-            _log_error(error_message)
-            blank_tensor = ensure_tensor_format(create_blank_tensor())
-            _log_info(f"🔍 错误处理tensor形状: {blank_tensor.shape}")
-            
-            return (blank_tensor, error_message, "")
+    def generate_image(self, prompt, mirror_site, model, response_format="url", resolution="1K",
+                      aspect_ratio="1:1", width=1024, height=1024, api_key="",
+                      max_images=1, seed=-1, watermark=True, stream=False, tail_on_partial=True,
+                      image1=None, image2=None, image3=None, image4=None, image5=None,
+                      image6=None, image7=None, image8=None, image9=None, image10=None,
+                      image11=None, image12=None, image13=None, image14=None,
+                      sequential_image_generation="disabled", hedge_requests=False, output_dtype="float32"):
+        """生成图像"""
+        request, error_result = self._prepare_request(
+            prompt, mirror_site, model, response_format, resolution, aspect_ratio, width, height, api_key,
+            max_images, seed, watermark, stream, tail_on_partial,
+            image1, image2, image3, image4, image5, image6, image7, image8, image9, image10,
+            image11, image12, image13, image14, sequential_image_generation, hedge_requests)
+        if error_result:
+            return error_result
+        return run_image_generation(request, response_format, self.timeout, self.max_retries, hedge_requests,
+                                    output_dtype)
+
+    async def generate_image_async(self, **kwargs):
+        """generate_image的协程版本：图像编码和解码在工作线程中进行，等待API和重试退避时不占用执行线程"""
+        output_dtype = kwargs.pop("output_dtype", "float32")
+        request, error_result = await asyncio.to_thread(self._prepare_request, **kwargs)
+        if error_result:
+            return error_result
+        return await async_run_image_generation(request, kwargs.get("response_format", "url"), self.timeout,
+                                                self.max_retries, kwargs.get("hedge_requests", False), output_dtype)
 
 class SeedReam4APISingleNode:
     """SeedReam4API 单图像生成及编辑节点类"""
@@ -1946,6 +4856,7 @@ class SeedReam4APISingleNode:
         
         # 保留前三个镜像站选项（包括火山引擎）
         mirror_options = [opt for opt in mirror_options if opt in ["comfly", "t8_mirror", "volcengine"]]
+        mirror_options.append(AUTO_MIRROR)
         
         return {
             "required": {
@@ -1967,12 +4878,14 @@ class SeedReam4APISingleNode:
             "optional": {
                 "image": ("IMAGE",),  # 单图像输入，用于图像编辑
                 "sequential_image_generation": (["disabled", "auto"], {"default": "disabled"}),
+                "hedge_requests": ("BOOLEAN", {"default": False}),
+                "output_dtype": (list(OUTPUT_DTYPES), {"default": "float32"}),
             }
         }
     
     RETURN_TYPES = ("IMAGE", "STRING", "STRING")
     RETURN_NAMES = ("image", "response", "image_url")
-    FUNCTION = "generate_image"
+    FUNCTION = "generate_image_async" if ASYNC_NODE_EXECUTION else "generate_image"
     CATEGORY = "Ken-Chen/Doubao"
     
     def __init__(self):
@@ -1989,84 +4902,30 @@ class SeedReam4APISingleNode:
             "Authorization": f"Bearer {api_key}"
         }
     
-    def generate_image(self, prompt, mirror_site, model, response_format="url", resolution="1K",
-                      aspect_ratio="1:1", width=1024, height=1024, api_key="",
-                      max_images=1, seed=-1, watermark=True, stream=False, tail_on_partial=True,
-                      image=None, sequential_image_generation="disabled"):
-        """生成图像 - 单图像版本"""
-        
-        # 获取镜像站配置
-        site_config = get_mirror_site_config(mirror_site)
-        api_url = site_config.get("url", "").strip()
-        api_format = site_config.get("api_format", "comfly")
-        
-        # 使用镜像站的API key（如果提供了的话）
-        if site_config.get("api_key") and not api_key.strip():
-            api_key = site_config["api_key"]
-            _log_info(f"🔑 自动使用镜像站API Key: {api_key[:8]}...")
-        
-        if not api_key.strip():
-            error_message = "API key not found"
-            _log_error(error_message)
-            blank_tensor = create_blank_tensor()
-            return (blank_tensor, error_message, "")
-        
-        if not validate_api_url(api_url):
-            error_message = "Invalid API URL"
-            _log_error(error_message)
-            blank_tensor = create_blank_tensor()
-            return (blank_tensor, error_message, "")
-        
-        # 清理模型名称中的提示信息
-        if " (" in model:
-            model = model.split(" (")[0]
-
+    def _prepare_request(self, prompt, mirror_site, model, response_format="url", resolution="1K",
+                         aspect_ratio="1:1", width=1024, height=1024, api_key="",
+                         max_images=1, seed=-1, watermark=True, stream=False, tail_on_partial=True,
+                         image=None, sequential_image_generation="disabled", hedge_requests=False):
+        """解析镜像站并构建请求载荷，返回 ((候选镜像站列表, payload), None) 或 (None, 错误结果)"""
+        site, error_result = resolve_image_site(mirror_site, api_key, model, resolution, hedge_requests)
+        if error_result:
+            return None, error_result
+        targets, model = site
 
-        # 检查模型和分辨率兼容性
-        if model == "doubao-seedream-4-5-251128" and resolution == "1K":
-            warning_message = "⚠️ 警告：模型 doubao-seedream-4-5-251128 不支持 1K 分辨率，可能会导致生成失败或自动调整。"
-            _log_warning(warning_message)
-        
-        _log_info(f"🔗 使用镜像站: {mirror_site} ({api_url})")
-        
         try:
             # 计算最终尺寸
-            if aspect_ratio == "Custom":
-                scale_factor = self.resolution_factors.get(resolution, 1)
-                scaled_width = int(width * scale_factor)
-                scaled_height = int(height * scale_factor)
-                final_size = f"{scaled_width}x{scaled_height}"
-                _log_info(f"使用自定义尺寸: {final_size}")
-            else:
-                if resolution in self.size_mapping and aspect_ratio in self.size_mapping[resolution]:
-                    final_size = self.size_mapping[resolution][aspect_ratio]
-                else:
-                    final_size = "1024x1024"
-                    _log_warning(f"未找到 {resolution} 和 {aspect_ratio} 的组合，使用 {final_size}")
-            
+            final_size = resolve_image_size(self.size_mapping, self.resolution_factors,
+                                            resolution, aspect_ratio, width, height)
+
             # 构建请求载荷
-            payload = {
-                "model": model,
-                "prompt": prompt,
-                "response_format": response_format,
-                "size": final_size,
-                "watermark": watermark,  # 始终添加watermark参数
-                "stream": stream,  # 始终添加stream参数
-                "tail_on_partial": tail_on_partial  # 始终添加tail_on_partial参数
-            }
-            
-            if sequential_image_generation == "auto":
-                payload["sequential_image_generation"] = sequential_image_generation
-                payload["sequential_image_generation_options"] = {"max_images": max_images}
-                payload["n"] = max_images
-                
-            if seed != -1:
-                payload["seed"] = seed
-            
+            payload = build_seedream_payload(model, prompt, response_format, final_size, watermark, stream,
+                                             tail_on_partial, max_images, seed, sequential_image_generation)
+
             # 处理单图像输入
             if image is not None:
                 _log_info(f"🔍 处理输入图像: {image.shape}")
-                image_base64 = image_to_base64(image)
+                budget = get_payload_budget([target.name for target in targets], model)
+                image_base64 = encode_images_for_upload([image], stitch_batches=True, budget=budget)[0]
                 if image_base64:
                     base64_size_mb = len(image_base64) / (1024 * 1024)
                     _log_info(f"🔧 添加图像到请求载荷 (base64: {len(image_base64):,} 字符, {base64_size_mb:.2f}MB)")
@@ -2074,268 +4933,636 @@ class SeedReam4APISingleNode:
                     _log_info(f"🔍 单图节点图像数据: 数组长度={len(payload['image'])}, base64长度={len(image_base64)}")
                 else:
                     _log_error("❌ 图像转换为base64失败")
-            
-            # 根据API格式调用相应的API
+
             _log_info(f"🔍 单图节点API调用详情:")
-            _log_info(f"   - API格式: {api_format}")
-            _log_info(f"   - API地址: {api_url}")
+            _log_info(f"   - API格式: {targets[0].api_format}")
+            _log_info(f"   - API地址: {targets[0].api_url}")
             _log_info(f"   - 模型: {payload.get('model', 'N/A')}")
             _log_info(f"   - 是否包含图像: {'image' in payload and bool(payload.get('image'))}")
             if 'image' in payload and payload.get('image'):
                 _log_info(f"   - 图像数量: {len(payload['image'])}")
+        except Exception as e:
+            return None, image_generation_failed_result(e)
 
-            response = None
-            for attempt in range(self.max_retries):
-                try:
-                    if api_format == "comfly":
-                        response = call_comfly_api(api_url, api_key, payload, self.timeout)
-                    elif api_format == "openai":
-                        response = call_openai_compatible_api(api_url, api_key, payload, self.timeout)
-                    elif api_format == "api4gpt":
-                        response = call_api4gpt_api(api_url, api_key, payload, self.timeout)
-                    elif api_format == "openrouter":
-                        response = call_openrouter_api(api_url, api_key, payload, self.timeout)
-                    elif api_format == "volcengine":
-                        response = call_volcengine_api(api_url, api_key, payload, self.timeout)
-                    else:
-                        response = call_comfly_api(api_url, api_key, payload, self.timeout)
-                    
-                    if response and response.status_code == 200:
-                        break
-                    elif response:
-                        error_text = response.text[:500] if response.text else "无错误信息"
-                        _log_warning(f"API调用失败 (尝试 {attempt + 1}/{self.max_retries}): {response.status_code}")
-                        _log_warning(f"错误详情: {error_text}")
-
-                        # 检查是否是图像过大的错误
-                        if "too large" in error_text.lower() or "payload too large" in error_text.lower():
-                            _log_error("❌ 图像数据过大，请尝试使用较小的图像")
-                        elif "invalid" in error_text.lower() and "image" in error_text.lower():
-                            _log_error("❌ 图像格式无效，请检查输入图像")
-                    else:
-                        _log_warning(f"API调用失败 (尝试 {attempt + 1}/{self.max_retries}): 无响应")
-                    
-                    if attempt < self.max_retries - 1:
-                        time.sleep(2 ** attempt)  # 指数退避
-                        
-                except Exception as e:
-                    _log_warning(f"API调用异常 (尝试 {attempt + 1}/{self.max_retries}): {e}")
-                    if attempt < self.max_retries - 1:
-                        time.sleep(2 ** attempt)
-            
-            if not response or response.status_code != 200:
-                error_message = f"API Error: {response.status_code if response else 'No response'} - {response.text if response else 'Connection failed'}"
-                _log_error(error_message)
-                blank_tensor = create_blank_tensor()
-                return (blank_tensor, error_message, "")
-            
-            result = response.json()
-            # 只记录响应的基本结构，避免显示大量base64数据
-            if "choices" in result:
-                _log_info("🔍 API响应格式: T8图像编辑格式 (choices)")
-            elif "data" in result:
-                _log_info(f"🔍 API响应格式: 标准图像生成格式 (data, {len(result['data'])} 项)")
-            else:
-                _log_info(f"🔍 API响应格式: 未知格式，包含键: {list(result.keys())}")
+        return (targets, payload), None
+
+    def generate_image(self, prompt, mirror_site, model, response_format="url", resolution="1K",
+                      aspect_ratio="1:1", width=1024, height=1024, api_key="",
+                      max_images=1, seed=-1, watermark=True, stream=False, tail_on_partial=True,
+                      image=None, sequential_image_generation="disabled", hedge_requests=False,
+                      output_dtype="float32"):
+        """生成图像 - 单图像版本"""
+        request, error_result = self._prepare_request(
+            prompt, mirror_site, model, response_format, resolution, aspect_ratio, width, height, api_key,
+            max_images, seed, watermark, stream, tail_on_partial, image, sequential_image_generation, hedge_requests)
+        if error_result:
+            return error_result
+        return run_image_generation(request, response_format, self.timeout, self.max_retries, hedge_requests,
+                                    output_dtype)
+
+    async def generate_image_async(self, **kwargs):
+        """generate_image的协程版本 - 单图像版本"""
+        output_dtype = kwargs.pop("output_dtype", "float32")
+        request, error_result = await asyncio.to_thread(self._prepare_request, **kwargs)
+        if error_result:
+            return error_result
+        return await async_run_image_generation(request, kwargs.get("response_format", "url"), self.timeout,
+                                                self.max_retries, kwargs.get("hedge_requests", False), output_dtype)
+
+# ==================== Seedance视频任务公共逻辑 ====================
+
+VIDEO_SUCCEEDED_STATUSES = {"completed", "success", "finished", "succeeded"}
+VIDEO_FAILED_STATUSES = {"failed", "error"}
+VIDEO_RUNNING_STATUSES = {"running", "processing", "pending", "queued", "not_start", "in_progress"}
+
+
+def blank_video_result(response_text, video_url="", video_info=""):
+    """视频节点失败时的输出：空白视频 + 提示信息"""
+    blank_video = create_blank_video_object()
+    blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
+    return (blank_video, video_url, response_text, video_info, blank_video_path)
+
+
+def extract_video_task_id(result):
+    """从任务创建响应中提取任务ID，同步返回结果时返回None"""
+    if "task_id" in result:
+        return result["task_id"]
+    if "id" in result:
+        return result["id"]
+    data = result.get("data")
+    if isinstance(data, dict):
+        return data.get("task_id") or data.get("id")
+    return None
+
+
+def extract_video_url(status_result):
+    """从任务完成的状态响应中提取视频URL，兼容火山引擎、Comfly和T8的多种响应格式"""
+    video_url = ""
+
+    # data字段（列表取第一项）
+    data = status_result.get("data")
+    if isinstance(data, list) and data:
+        data = data[0]
+    if isinstance(data, dict):
+        for key in ("url", "video_url", "output_url", "output"):
+            if data.get(key):
+                video_url = data[key]
+                break
+        # data.content.video_url (Comfly多图参考格式)
+        if not video_url and isinstance(data.get("content"), dict):
+            video_url = data["content"].get("video_url", "")
+
+    # content字段（火山引擎/T8镜像站格式）
+    content = status_result.get("content")
+    if not video_url and isinstance(content, dict):
+        video_url = content.get("video_url") or content.get("url") or ""
+
+    # video_result数组格式
+    video_result = status_result.get("video_result")
+    if not video_url and video_result:
+        first_result = video_result[0] if isinstance(video_result, list) else video_result
+        if isinstance(first_result, dict):
+            video_url = first_result.get("url", "")
+
+    # 直接在根级别查找URL
+    if not video_url:
+        for key in ("url", "video_url", "output_url", "result_url"):
+            if status_result.get(key):
+                video_url = status_result[key]
+                break
+
+    # result.video_url格式
+    result = status_result.get("result")
+    if not video_url and isinstance(result, dict):
+        video_url = result.get("video_url", "")
+
+    return video_url
+
+
+def _classify_video_status_response(status_response):
+    """解析一次任务状态查询，返回 (状态类别, 状态响应)，类别为 succeeded/failed/running/unknown"""
+    if not status_response or status_response.status_code != 200:
+        _log_warning(f"⚠️ 查询任务状态失败")
+        return "unknown", None
+
+    status_result = status_response.json()
+    _log_debug(lambda: f"🔍 任务状态响应: {str(status_result)[:200]}...")
+
+    status = status_result.get("status", "unknown")
+    _log_debug("🔍 当前任务状态", status=status)
+
+    normalized = str(status).lower()
+    if normalized in VIDEO_SUCCEEDED_STATUSES:
+        return "succeeded", status_result
+    if normalized in VIDEO_FAILED_STATUSES:
+        return "failed", status_result
+    if normalized in VIDEO_RUNNING_STATUSES:
+        _log_debug("⏳ 任务进行中", status=status)
+        return "running", status_result
+
+    _log_warning(f"⚠️ 未知任务状态: {status}")
+    return "unknown", status_result
+
+
+# 视频任务状态轮询配置，可在配置文件的 "video_polling" 中覆盖
+VIDEO_POLLING_DEFAULTS = {
+    "initial_interval": 5,        # 首次查询后仍在进行中时的查询间隔（秒）
+    "max_interval": 15,           # 间隔逐步放宽的上限（秒）
+    "backoff": 1.5,               # 每次查询仍在进行中时间隔的增长倍数
+    "max_concurrent_checks": 8,   # 所有任务同时进行的状态查询数量上限
+    "eta_enabled": True,          # 按历史耗时预估完成时间安排查询
+    "eta_min_samples": 3,         # 同类任务至少有这么多条历史记录才使用预估
+    "eta_history": 20,            # 每类任务保留的最近耗时记录数
+    "dense_interval": 2,          # 预估完成时间附近的最短查询间隔（秒）
+    "dense_polls": 6,             # 预估完成时间附近的窗口内最多查询次数（波动大时相应放宽间隔）
+    "stats_file": "",             # 留空时使用插件目录下的 cache/video_task_stats.json
+}
 
-            # 检查是否是T8图像编辑响应（chat/completions格式）
-            if "choices" in result and result["choices"]:
-                # T8图像编辑响应格式
-                _log_info("🎨 检测到T8图像编辑响应格式")
-                choice = result["choices"][0]
-                content = choice.get("message", {}).get("content", "")
 
-                # 从响应中提取图像URL（T8图像编辑会在文本中返回图像URL）
-                import re
+def _video_task_mode(payload):
+    """根据载荷中的图像输入判断视频任务模式"""
+    images = [item for item in payload.get("content") or [] if item.get("type") == "image_url"]
+    if any(item.get("role") in ("first_frame", "last_frame") for item in images) or "first_frame" in payload:
+        return "first_last_frame"
+    count = len(images) or len(payload.get("images") or payload.get("image") or [])
+    if count > 1:
+        return "multi_ref"
+    return "image_to_video" if count == 1 else "text_to_video"
+
+
+def video_task_profile(api_url, payload):
+    """任务耗时统计的分类键：镜像站|模型|分辨率|时长|模式（火山引擎格式从文本中的 --rs/--dur 参数解析）"""
+    import re
+    resolution = payload.get("resolution", "")
+    duration = payload.get("duration", "")
+    for item in payload.get("content") or []:
+        if item.get("type") == "text":
+            text = item.get("text", "")
+            resolution = resolution or next(iter(re.findall(r"--rs\s+(\S+)", text)), "")
+            duration = duration or next(iter(re.findall(r"--dur\s+(\d+)", text)), "")
+    duration = str(duration).rstrip("s")
+    return "|".join([_host_key(api_url), str(payload.get("model", "")), str(resolution), duration,
+                     _video_task_mode(payload)])
+
+
+class VideoTaskStats:
+    """本地保存的视频任务历史耗时，按 video_task_profile 分类，用于预估同类任务的完成时间"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._durations = None
+
+    def _load(self):
+        if self._durations is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._durations = json.load(f)
+            except (OSError, ValueError):
+                self._durations = {}
+        return self._durations
+
+    def record(self, profile, seconds, history):
+        with self._lock:
+            durations = self._load().setdefault(profile, [])
+            durations.append(round(seconds, 1))
+            del durations[:-history]
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._durations, f, ensure_ascii=False)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                _log_warning(f"⚠️ 保存任务耗时统计失败: {e}")
+
+    def estimate(self, profile, min_samples):
+        """返回 (预估耗时, 波动范围)（秒），历史记录不足时返回None"""
+        with self._lock:
+            durations = sorted(self._load().get(profile, []))
+        if len(durations) < max(1, min_samples):
+            return None
+        last = len(durations) - 1
+        median = durations[last // 2]
+        spread = (durations[round(last * 0.8)] - durations[round(last * 0.2)]) / 2  # P20~P80 的一半
+        return median, max(spread, median * 0.1)
 
-                # 尝试多种URL提取模式
-                image_urls_found = []
 
-                # 模式1：Markdown格式 ![alt](url)
-                markdown_pattern = r'!\[.*?\]\((https?://[^\s\)]+)\)'
-                markdown_urls = re.findall(markdown_pattern, content)
-                image_urls_found.extend(markdown_urls)
+_video_task_stats = None
 
-                # 模式2：直接的图像URL
-                direct_pattern = r'https?://[^\s<>"]+\.(?:jpg|jpeg|png|gif|webp)'
-                direct_urls = re.findall(direct_pattern, content)
-                image_urls_found.extend(direct_urls)
 
-                # 模式3：任何包含图像相关域名的URL（更宽泛的匹配）
-                domain_pattern = r'https?://[^\s<>"\)]+(?:tos-cn-beijing\.volces\.com|ark-content-generation)[^\s<>"\)]*'
-                domain_urls = re.findall(domain_pattern, content)
-                image_urls_found.extend(domain_urls)
+def get_video_task_stats():
+    global _video_task_stats
+    if _video_task_stats is None:
+        path = get_cached_config_section("video_polling", VIDEO_POLLING_DEFAULTS)["stats_file"]
+        _video_task_stats = VideoTaskStats(path or os.path.join(CURRENT_DIR, "cache", "video_task_stats.json"))
+    return _video_task_stats
 
-                # 去重
-                image_urls_found = list(set(image_urls_found))
 
-                _log_info(f"🔍 提取到的图像URL: {image_urls_found}")
+_TASK_FINISHED_FIELDS = ("finished_at", "finish_time", "completed_at", "updated_at")
+_TASK_CREATED_FIELDS = ("created_at", "create_time", "submit_time")
 
-                generated_images = []
-                image_urls = []
 
-                if image_urls_found:
-                    for image_url in image_urls_found:
-                        try:
-                            img_response = requests.get(image_url, timeout=60)
-                            if img_response.status_code == 200:
-                                image = Image.open(io.BytesIO(img_response.content))
-                                generated_images.append(image)
-                                image_urls.append(image_url)
-                                _log_info(f"✅ 成功下载T8编辑图像: {image_url}")
-                        except Exception as e:
-                            _log_warning(f"下载T8编辑图像失败: {e}")
-                            continue
+def _task_timestamp(status_result, fields):
+    """从任务状态响应（或其data字段）中取Unix时间戳（秒或毫秒），没有时返回None"""
+    data = status_result.get("data")
+    for source in (status_result, data if isinstance(data, dict) else {}):
+        for field in fields:
+            try:
+                value = float(source.get(field))
+            except (TypeError, ValueError):
+                continue
+            if value > 0:
+                return value / 1000.0 if value > 1e11 else value
+    return None
+
+
+def video_task_duration(status_result, submitted_at, checked_at, previous_check_at=None):
+    """任务的实际耗时：优先使用服务商返回的完成时间戳；没有时用发现完成的那次查询时间，
+    并扣除与上一次查询间隔的一半（完成时刻在两次查询之间的期望值）"""
+    elapsed = checked_at - submitted_at
+    if isinstance(status_result, dict):
+        finished = _task_timestamp(status_result, _TASK_FINISHED_FIELDS)
+        if finished is not None:
+            created = _task_timestamp(status_result, _TASK_CREATED_FIELDS) or submitted_at
+            duration = finished - created
+            if 0 < duration <= elapsed:  # 时间戳明显不合理（时钟偏差等）时不采用
+                return duration
+    if previous_check_at is not None:
+        elapsed -= (checked_at - previous_check_at) / 2
+    return max(0.0, elapsed)
+
+
+class _PolledTask:
+    """VideoTaskPoller中登记的一个在途任务"""
+
+    def __init__(self, api_url, api_key, task_id, api_format, deadline, interval, profile, submitted_at, eta):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.task_id = task_id
+        self.api_format = api_format
+        self.deadline = deadline
+        self.interval = interval
+        self.profile = profile
+        self.submitted_at = submitted_at  # 提交时间（time.time()），用于统计耗时
+        self.eta = eta                    # (预估耗时, 波动范围) 或 None
+        self.next_check = time.monotonic()  # 没有预估时登记后立即查询一次
+        if eta is not None:
+            # 第一次查询安排在预估完成时间之前一个波动范围处
+            expected, spread = eta
+            self.next_check += max(0.0, submitted_at + expected - spread - time.time())
+            _log_info(f"🔮 预估任务 {task_id} 约 {expected:.0f}s 完成 (±{spread:.0f}s)，"
+                      f"{self.next_check - time.monotonic():.0f}s 后开始查询")
+        self.next_check = min(self.next_check, deadline)
+        self.checks = 0
+        self.checking = False
+        self.last_checked_at = None  # 上一次发出状态查询的时间（time.time()）
+        self.futures = []
+
+    def in_dense_window(self, now):
+        """当前是否处于预估完成时间附近（之前一个波动范围到之后两个波动范围）"""
+        if self.eta is None:
+            return False
+        expected, spread = self.eta
+        return now - self.submitted_at <= expected + 2 * spread
 
-                if not generated_images:
-                    error_message = f"T8图像编辑响应中未找到有效图像URL。响应内容: {content}"
-                    _log_error(error_message)
-                    blank_tensor = create_blank_tensor()
-                    return (blank_tensor, error_message, content)
-
-            elif "data" in result and result["data"]:
-                # 标准图像生成响应格式
-                _log_info("🖼️ 检测到标准图像生成响应格式")
-                generated_images = []
-                image_urls = []
-
-                for item in result["data"]:
-                    if response_format == "url":
-                        image_url = item.get("url")
-                        if not image_url:
-                            continue
 
-                        try:
-                            img_response = requests.get(image_url, timeout=60)
-                            if img_response.status_code == 200:
-                                image = Image.open(io.BytesIO(img_response.content))
-                                generated_images.append(image)
-                                image_urls.append(image_url)
-                        except Exception as e:
-                            _log_warning(f"下载图像失败: {e}")
-                            continue
+class VideoTaskPoller:
+    """进程内共享的视频任务状态轮询服务，运行在后台传输事件循环中
 
-                    elif response_format == "b64_json":
-                        b64_data = item.get("b64_json")
-                        if not b64_data:
-                            continue
+    所有节点的在途任务都登记在这里，由一个调度协程统一排期：同一时刻到期的任务一起并发查询
+    （数量受 max_concurrent_checks 限制，复用共享连接池），每个任务按自己的自适应间隔排期，
+    完成、失败或超时时解析等待它的Future。同一任务被多个调用方等待时只轮询一次。
+    """
 
-                        try:
-                            image_data = base64.b64decode(b64_data)
-                            image = Image.open(io.BytesIO(image_data))
-                            generated_images.append(image)
-                            image_urls.append("base64_data")
-                        except Exception as e:
-                            _log_warning(f"解码base64图像失败: {e}")
-                            continue
-            else:
-                error_message = "响应格式不支持或无图像数据"
-                _log_error(error_message)
-                blank_tensor = create_blank_tensor()
-                return (blank_tensor, error_message, "")
-            
-            if not generated_images:
-                error_message = "No valid images generated"
-                _log_error(error_message)
-                blank_tensor = create_blank_tensor()
-                return (blank_tensor, error_message, "")
-            
-            # 转换为tensor - 使用ComfyUI_Comfly的方式
-            image_tensors = []
-            for i, img in enumerate(generated_images):
-                _log_info(f"🔍 处理图像 {i+1}: 原始尺寸 {img.size}, 模式 {img.mode}")
-                
-                # 使用pil2tensor函数，格式为[1, H, W, 3]
-                tensor = pil2tensor(img)
-                _log_info(f"🔍 tensor形状: {tensor.shape}, 值范围: {tensor.min().item():.3f} 到 {tensor.max().item():.3f}")
-                
-                # 检查tensor是否有异常
-                if len(tensor.shape) != 4 or tensor.shape[-1] != 3:
-                    _log_error(f"❌ 图像 {i+1} tensor形状异常: {tensor.shape}")
-                    continue
-                
-                image_tensors.append(tensor)
-            
-            # 检查是否有有效的图像tensor
-            if not image_tensors:
-                _log_error("❌ 没有有效的图像tensor，使用空白tensor")
-                final_tensor = create_blank_tensor()
-            else:
-                # 堆叠所有图像，格式为 [batch, H, W, 3] - 参考ComfyUI_Comfly
-                if len(image_tensors) == 1:
-                    final_tensor = image_tensors[0]
-                else:
-                    final_tensor = torch.cat(image_tensors, dim=0)
-                _log_info(f"🔍 堆叠后tensor形状: {final_tensor.shape}")
-            
-            # 调试信息
-            _log_info(f"🔍 最终tensor形状: {final_tensor.shape}")
-            _log_info(f"🔍 最终tensor数据类型: {final_tensor.dtype}")
-            _log_info(f"🔍 最终tensor值范围: {final_tensor.min().item():.3f} 到 {final_tensor.max().item():.3f}")
-            
-            # 检查tensor是否有异常值
-            if torch.isnan(final_tensor).any():
-                _log_error("❌ tensor包含NaN值")
-            if torch.isinf(final_tensor).any():
-                _log_error("❌ tensor包含无穷值")
-            
-            # 检查每个维度的值
-            for i in range(min(final_tensor.shape[0], 2)):  # 限制输出数量
-                for j in range(min(final_tensor.shape[1], 3)):  # 限制输出数量
-                    _log_info(f"🔍 图像{i}通道{j}形状: {final_tensor[i,j].shape}, 值范围: {final_tensor[i,j].min().item():.3f} 到 {final_tensor[i,j].max().item():.3f}")
-            
-            # 特别检查是否有异常的维度
-            if final_tensor.shape[1] == 1 and final_tensor.shape[2] > 1000:
-                _log_error(f"❌ 检测到异常tensor形状: {final_tensor.shape} - 这可能导致PIL错误")
-                _log_error(f"❌ 通道数: {final_tensor.shape[1]}, 高度: {final_tensor.shape[2]}, 宽度: {final_tensor.shape[3]}")
-                # 强制修复
-                _log_info("🔧 强制修复tensor格式...")
-                final_tensor = create_blank_tensor()
-            
-            # 确保tensor格式正确
-            if len(final_tensor.shape) != 4:
-                _log_error(f"❌ tensor维度错误: {final_tensor.shape}, 应该是4维 (batch, height, width, channels)")
-                # 尝试修复
-                if len(final_tensor.shape) == 3:
-                    final_tensor = final_tensor.unsqueeze(0)
-                    _log_info(f"🔧 修复后tensor形状: {final_tensor.shape}")
-            
-            # 使用ensure_tensor_format确保tensor格式完全正确
-            final_tensor = ensure_tensor_format(final_tensor)
-            _log_info(f"🔧 最终tensor格式验证完成: {final_tensor.shape}")
-            
-            # 最终强制检查 - 确保tensor格式为[batch, H, W, 3]
-            if (len(final_tensor.shape) != 4 or 
-                final_tensor.shape[-1] != 3):
-                _log_error(f"❌ 最终检查失败，tensor格式仍然不正确: {final_tensor.shape}")
-                _log_info("🔧 使用空白tensor替代")
-                final_tensor = create_blank_tensor()
-            
-            # 最终验证tensor是否可以被PIL处理
-            try:
-                # 尝试转换为numpy数组来验证 - 格式为[H, W, 3]
-                test_array = final_tensor[0].cpu().numpy()
-                test_array = np.clip(test_array, 0, 1)
-                test_array = (test_array * 255).astype(np.uint8)
-                _log_info(f"🔍 PIL兼容性测试通过: {test_array.shape}")
-            except Exception as e:
-                _log_error(f"❌ PIL兼容性测试失败: {e}")
-                _log_info("🔧 使用空白tensor替代")
-                final_tensor = create_blank_tensor()
-            
-            response_text = f"Successfully generated {len(generated_images)} image(s)"
-            image_url_text = image_urls[0] if image_urls else ""
-            
-            _log_info(f"✅ 成功生成 {len(generated_images)} 张图像")
-            return (final_tensor, response_text, image_url_text)
-            
+    def __init__(self):
+        self._tasks = {}
+        self._wakeup = None
+        self._runner = None
+        self._semaphore = None
+
+    def track(self, api_url, api_key, task_id, api_format, max_wait, profile=None, submitted_at=None):
+        """登记任务，返回解析为 (succeeded/failed/timeout, 状态响应) 的 concurrent.futures.Future
+
+        profile 为 video_task_profile 分类键，有足够的同类历史耗时时按预估完成时间安排查询；
+        submitted_at 为任务提交时间（默认为现在），用于稍后才开始等待的任务句柄。
+        """
+        future = concurrent.futures.Future()
+        deadline = time.monotonic() + max_wait
+        policy = current_retry_policy()
+        if policy is not None:
+            deadline = min(deadline, time.monotonic() + max(0.0, policy.remaining()))  # 外层重试预算
+        get_transport_loop().call_soon_threadsafe(self._register, api_url, api_key, task_id, api_format,
+                                                  deadline, future, profile, submitted_at or time.time())
+        return future
+
+    def _register(self, api_url, api_key, task_id, api_format, deadline, future, profile, submitted_at):
+        config = get_cached_config_section("video_polling", VIDEO_POLLING_DEFAULTS)
+        key = (api_url, task_id)
+        task = self._tasks.get(key)
+        if task is None:
+            eta = None
+            if profile and config["eta_enabled"]:
+                eta = get_video_task_stats().estimate(profile, int(config["eta_min_samples"]))
+            task = _PolledTask(api_url, api_key, task_id, api_format, deadline, float(config["initial_interval"]),
+                               profile, submitted_at, eta)
+            self._tasks[key] = task
+        else:
+            task.deadline = max(task.deadline, deadline)
+        task.futures.append(future)
+        if self._runner is None:
+            self._wakeup = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(max(1, int(config["max_concurrent_checks"])))
+            self._runner = asyncio.ensure_future(self._run())
+        self._wakeup.set()
+
+    async def _run(self):
+        checks = set()
+        try:
+            while self._tasks:
+                now = time.monotonic()
+                for key, task in list(self._tasks.items()):
+                    if all(future.done() for future in task.futures):  # 所有调用方都已取消
+                        del self._tasks[key]
+                    elif not task.checking and task.next_check <= now:
+                        task.checking = True
+                        check = asyncio.ensure_future(self._check(key, task))
+                        checks.add(check)
+                        check.add_done_callback(checks.discard)
+                if not self._tasks:
+                    break
+                waiting = [task.next_check for task in self._tasks.values() if not task.checking]
+                delay = max(0.05, min(waiting) - now) if waiting else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._runner = None
+
+    async def _check(self, key, task):
+        try:
+            async with self._semaphore:
+                _log_debug("🔍 轮询任务状态", task_id=task.task_id, check=task.checks + 1)
+                previous_check_at, task.last_checked_at = task.last_checked_at, time.time()
+                response = await async_call_video_task_status(task.api_url, task.api_key, task.task_id,
+                                                              task.api_format)
+            kind, status_result = _classify_video_status_response(response)
         except Exception as e:
-            error_message = f"Generation failed: {str(e)}"
-            _log_error(error_message)
-            blank_tensor = ensure_tensor_format(create_blank_tensor())
-            _log_info(f"🔍 错误处理tensor形状: {blank_tensor.shape}")
-            
-            return (blank_tensor, error_message, "")
+            _log_warning(f"⚠️ 查询任务状态异常: {e}")
+            kind, status_result = "unknown", None
+        finally:
+            task.checking = False
+            task.checks += 1
+            self._wakeup.set()
+
+        now = time.monotonic()
+        if kind not in ("succeeded", "failed") and now >= task.deadline:
+            _log_error(f"❌ 任务轮询超时: {task.task_id}")
+            kind, status_result = "timeout", None
+        config = get_cached_config_section("video_polling", VIDEO_POLLING_DEFAULTS)
+        if kind in ("succeeded", "failed", "timeout"):
+            self._tasks.pop(key, None)
+            for future in task.futures:
+                if not future.done():
+                    future.set_result((kind, status_result))
+            if kind == "succeeded" and task.profile:
+                elapsed = video_task_duration(status_result, task.submitted_at, task.last_checked_at,
+                                              previous_check_at)
+                await asyncio.to_thread(get_video_task_stats().record, task.profile, elapsed,
+                                        int(config["eta_history"]))
+            return
+
+        if task.in_dense_window(time.time()):
+            # 预估完成时间附近密集查询，缩短完成到被发现之间的延迟；
+            # 窗口宽三个波动范围，间隔随之放大，整个窗口最多查询约 dense_polls 次
+            spread = task.eta[1]
+            interval = max(float(config["dense_interval"]), 3 * spread / max(1, int(config["dense_polls"])))
+            task.next_check = min(now + interval, task.deadline)
+            return
+        task.next_check = min(now + task.interval, task.deadline)
+        task.interval = min(task.interval * float(config["backoff"]), float(config["max_interval"]))
+
+
+_video_poller = VideoTaskPoller()
+
+
+def get_video_poller():
+    """获取进程共享的视频任务轮询服务"""
+    return _video_poller
+
+
+def poll_video_task(api_url, api_key, task_id, api_format, max_polls=90, poll_interval=10,
+                    profile=None, submitted_at=None):
+    """等待视频任务完成或失败（由共享的VideoTaskPoller轮询），最多等待 max_polls*poll_interval 秒，
+    返回 (succeeded/failed/timeout, 状态响应)"""
+    _log_info(f"⏳ 开始轮询任务状态...")
+    future = get_video_poller().track(api_url, api_key, task_id, api_format, max_polls * poll_interval,
+                                      profile, submitted_at)
+    return future.result()
+
+
+async def async_poll_video_task(api_url, api_key, task_id, api_format, max_polls=90, poll_interval=10,
+                                profile=None, submitted_at=None):
+    """poll_video_task的协程版本，等待期间不占用线程"""
+    _log_info(f"⏳ 开始轮询任务状态...")
+    future = get_video_poller().track(api_url, api_key, task_id, api_format, max_polls * poll_interval,
+                                      profile, submitted_at)
+    return await asyncio.wrap_future(future)
+
+
+def _video_submit_succeeded(response):
+    return response is not None and response.status_code in [200, 201, 202]
+
+
+def _require_video_request(request):
+    if request is None:
+        raise RuntimeError("视频任务提交失败：所有候选镜像站的请求都构建失败，没有可提交的请求")
+    return request
+
+
+def video_attempts(policy, failover):
+    """视频任务提交的尝试序列：失败后轮换候选镜像站（默认间隔2秒），请求构建失败或熔断中的镜像站跳过"""
+    return RetryAttempts(policy, failover.mirror_names, lambda name: failover.usable(name, "video"),
+                         base_delay=2, label="视频API调用")
+
+
+def _video_request_usable(attempts, name, candidate, error_result):
+    """检查刚构建的视频请求，不可用时归还这次尝试"""
+    if error_result:
+        _log_warning(f"⚠️ 镜像站 {name} 请求构建失败，跳过: {error_result[2]}")
+    elif not circuit_allows(candidate[0], "video"):
+        _log_warning(f"⚡ 镜像站熔断中，跳过: {candidate[0]}")
+    else:
+        return True
+    attempts.retract()
+    return False
+
+
+def submit_video_task_with_retries(failover, timeout=900, max_retries=3, call=call_video_api):
+    """提交视频生成任务，失败时按重试策略重试并轮换候选镜像站，返回 (最后一次的响应, 对应的请求)
+
+    所有候选镜像站的请求都构建失败（没有可提交的请求）时抛出RuntimeError。
+    """
+    policy = get_retry_policy(max_retries, timeout)
+    attempts = video_attempts(policy, failover)
+    response = None
+    request = None
+    for name in attempts:
+        candidate, error_result = failover.request(name)
+        if not _video_request_usable(attempts, name, candidate, error_result):
+            continue
+        request = candidate
+        api_url, api_format, api_key, payload = request[:4]
+        error = None
+        try:
+            with retry_budget(policy):
+                response = call(api_url, api_key, payload, api_format, timeout)
+            if _video_submit_succeeded(response):
+                break
+            error_msg = response.text if response else "无响应"
+            _log_warning(f"视频API调用失败 (尝试 {attempts.attempt + 1}/{policy.max_attempts}): {error_msg}")
+        except Exception as e:
+            error = e
+        delay = attempts.backoff(response, error)  # 默认间隔2秒，429/503时遵守Retry-After
+        if delay is None:
+            break
+        time.sleep(delay)
+    return response, _require_video_request(request)
+
+
+async def async_submit_video_task_with_retries(failover, timeout=900, max_retries=3, call=async_call_video_api):
+    """submit_video_task_with_retries的协程版本，请求构建（图像编码）在工作线程中进行"""
+    policy = get_retry_policy(max_retries, timeout)
+    attempts = video_attempts(policy, failover)
+    response = None
+    request = None
+    for name in attempts:
+        candidate, error_result = await asyncio.to_thread(failover.request, name)
+        if not _video_request_usable(attempts, name, candidate, error_result):
+            continue
+        request = candidate
+        api_url, api_format, api_key, payload = request[:4]
+        error = None
+        try:
+            with retry_budget(policy):
+                response = await call(api_url, api_key, payload, api_format, timeout)
+            if _video_submit_succeeded(response):
+                break
+            error_msg = response.text if response else "无响应"
+            _log_warning(f"视频API调用失败 (尝试 {attempts.attempt + 1}/{policy.max_attempts}): {error_msg}")
+        except Exception as e:
+            error = e
+        delay = attempts.backoff(response, error)  # 默认间隔2秒，429/503时遵守Retry-After
+        if delay is None:
+            break
+        await asyncio.sleep(delay)
+    return response, _require_video_request(request)
+
+
+def download_video_result(video_url, video_info, success_text="✅ 视频生成成功"):
+    """下载视频并转换为节点输出，下载或转换失败时返回空白视频"""
+    _log_info(f"✅ 视频生成成功: {video_url}")
+
+    # 下载视频文件并转换为ComfyUI视频对象
+    video_path = download_video_from_url(video_url)
+    if not video_path:
+        _log_error("❌ 视频下载失败")
+        return blank_video_result("⚠️ 视频生成成功但下载失败", video_url, f"URL: {video_url}")
+
+    _log_info(f"🎬 开始转换视频为ComfyUI对象...")
+    video_obj = video_to_comfyui_video(video_path)
+    if video_obj is None:
+        _log_error("❌ 视频转换失败")
+        return blank_video_result("⚠️ 视频生成成功但转换失败", video_url, f"URL: {video_url}")
+
+    return (video_obj, video_url, success_text, video_info, video_path)
+
+
+def parse_video_submit_response(response):
+    """解析任务创建响应，返回 (任务ID, 同步返回的视频URL, 失败时的节点输出)，三者只有一个非空"""
+    if not _video_submit_succeeded(response):
+        error_msg = f"API Error: {response.text if response else 'No response'} - Connection failed"
+        _log_error(error_msg)
+        return None, None, blank_video_result(f"❌ {error_msg}")
+
+    result = response.json()
+    _log_info(f"🔍 视频API响应格式: {type(result)}")
+    _log_debug(lambda: f"🔍 视频API响应内容: {str(result)[:200]}...")
+
+    # 检查是否是异步任务响应
+    task_id = extract_video_task_id(result)
+    if task_id:
+        _log_info(f"🔍 检测到异步任务，任务ID: {task_id}")
+        return task_id, None, None
+
+    # 同步响应，直接提取视频URL
+    video_url = ""
+    if "data" in result and len(result["data"]) > 0:
+        video_data = result["data"][0]
+        if "url" in video_data:
+            video_url = video_data["url"]
+        elif "video_url" in video_data:
+            video_url = video_data["video_url"]
+
+    if not video_url:
+        _log_error("❌ 响应中未找到视频URL")
+        return None, None, blank_video_result("❌ 响应中未找到视频URL", "", str(result))
+    return None, video_url, None
+
+
+def video_task_outputs(kind, status_result, task_id, video_info):
+    """根据轮询结果下载视频或返回失败信息"""
+    if kind == "succeeded":
+        # 任务完成，提取视频URL
+        _log_info(f"🎉 任务完成！完整响应: {status_result}")
+        video_url = extract_video_url(status_result)
+        _log_info(f"🔍 提取到的视频URL: {video_url}")
+
+        if not video_url:
+            _log_error("❌ 任务完成但未找到视频URL")
+            return blank_video_result("❌ 任务完成但未找到视频URL", "", str(status_result))
+        return download_video_result(video_url, f"{video_info}, 任务ID: {task_id}")
+
+    if kind == "failed":
+        error_msg = status_result.get("error", "任务失败")
+        _log_error(f"❌ 视频生成任务失败: {error_msg}")
+        return blank_video_result(f"❌ 任务失败: {error_msg}", "", str(status_result))
+
+    # 轮询超时
+    return blank_video_result("❌ 视频生成超时，请稍后查看", "", f"任务ID: {task_id}")
+
+
+class VideoJob(namedtuple("VideoJob", "task_id api_url api_format api_key video_info video_url error "
+                                       "profile submitted_at")):
+    """视频生成任务句柄：提交节点立即返回，由等待节点轮询并下载
+
+    镜像站同步返回视频时 video_url 已就绪（无task_id），提交失败时 error 为失败的节点输出。
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_submit(cls, response, request):
+        api_url, api_format, api_key, payload, video_info = request
+        task_id, video_url, error_result = parse_video_submit_response(response)
+        return cls(task_id, api_url, api_format, api_key, video_info, video_url, error_result,
+                   video_task_profile(api_url, payload), time.time())
+
+    @classmethod
+    def failed(cls, error_result):
+        return cls(None, "", "", "", "", None, error_result, None, None)
+
+    def describe(self):
+        if self.task_id:
+            return f"任务ID: {self.task_id} ({self.api_url})"
+        return "已完成" if self.video_url else f"提交失败: {self.error[2]}"
+
+    def __repr__(self):
+        # 不在日志和界面中暴露API Key
+        return f"VideoJob(task_id={self.task_id!r}, api_url={self.api_url!r}, api_format={self.api_format!r})"
+
 
 class DoubaoSeedanceVideoNode:
     """Doubao-Seedance视频生成节点"""
@@ -2345,6 +5572,7 @@ class DoubaoSeedanceVideoNode:
         config = get_seedream4_config()
         mirror_sites = config.get('mirror_sites', {})
         mirror_options = list(mirror_sites.keys())
+        mirror_options.append(AUTO_MIRROR)
 
         return {
             "required": {
@@ -2370,7 +5598,7 @@ class DoubaoSeedanceVideoNode:
 
     RETURN_TYPES = ("VIDEO", "STRING", "STRING", "STRING", "VIDEO")
     RETURN_NAMES = ("video", "video_url", "response_text", "video_info", "AFVIDEO")
-    FUNCTION = "generate_video"
+    FUNCTION = "generate_video_async" if ASYNC_NODE_EXECUTION else "generate_video"
     CATEGORY = "Ken-Chen/Doubao"
 
     def __init__(self):
@@ -2380,7 +5608,53 @@ class DoubaoSeedanceVideoNode:
     def generate_video(self, prompt, mirror_site, model, video_mode, duration, resolution, aspect_ratio, fps, watermark=False, camera_fixed=False, api_key="", seed=-1,
                       input_image=None, first_frame=None, last_frame=None):
         """生成视频"""
+        failover = build_mirror_failover(self._prepare_request, dict(
+            prompt=prompt, mirror_site=mirror_site, model=model, video_mode=video_mode, duration=duration,
+            resolution=resolution, aspect_ratio=aspect_ratio, fps=fps, watermark=watermark,
+            camera_fixed=camera_fixed, api_key=api_key, seed=seed,
+            input_image=input_image, first_frame=first_frame, last_frame=last_frame), "video")
+        request, error_result = failover.request_for(0)
+        if error_result:
+            return error_result
+
+        response, request = submit_video_task_with_retries(failover, self.timeout, self.max_retries)
+        api_url, api_format, api_key, payload, video_info = request
+        try:
+            task_id, final_result = self._handle_submit_response(response, video_info)
+            if final_result:
+                return final_result
+
+            kind, status_result = poll_video_task(api_url, api_key, task_id, api_format,
+                                                  profile=video_task_profile(api_url, payload))
+            return self._handle_task_result(kind, status_result, task_id, video_info)
+
+        except Exception as e:
+            return self._parse_failed_result(e)
+
+    async def generate_video_async(self, **kwargs):
+        """generate_video的协程版本：轮询任务状态期间不占用执行线程，多个视频任务可以并发等待"""
+        failover = build_mirror_failover(self._prepare_request, kwargs, "video")
+        request, error_result = await asyncio.to_thread(failover.request_for, 0)
+        if error_result:
+            return error_result
 
+        response, request = await async_submit_video_task_with_retries(failover, self.timeout, self.max_retries)
+        api_url, api_format, api_key, payload, video_info = request
+        try:
+            task_id, final_result = await asyncio.to_thread(self._handle_submit_response, response, video_info)
+            if final_result:
+                return final_result
+
+            kind, status_result = await async_poll_video_task(api_url, api_key, task_id, api_format,
+                                                              profile=video_task_profile(api_url, payload))
+            return await asyncio.to_thread(self._handle_task_result, kind, status_result, task_id, video_info)
+
+        except Exception as e:
+            return self._parse_failed_result(e)
+
+    def _prepare_request(self, prompt, mirror_site, model, video_mode, duration, resolution, aspect_ratio, fps, watermark=False, camera_fixed=False, api_key="", seed=-1,
+                         input_image=None, first_frame=None, last_frame=None):
+        """解析镜像站并构建视频生成载荷，返回 ((api_url, api_format, api_key, payload, video_info), None) 或 (None, 错误结果)"""
         # 获取镜像站配置
         site_config = get_mirror_site_config(mirror_site)
         api_url = site_config.get("url", "").strip()
@@ -2397,14 +5671,10 @@ class DoubaoSeedanceVideoNode:
             _log_info(f"🔑 自动使用镜像站API Key: {api_key[:8]}...")
 
         if not api_key.strip():
-            blank_video = create_blank_video_object()
-            blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-            return (blank_video, "", "❌ 错误：未提供API Key", "", blank_video_path)
+            return None, blank_video_result("❌ 错误：未提供API Key")
 
         if not api_url:
-            blank_video = create_blank_video_object()
-            blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-            return (blank_video, "", "❌ 错误：未配置API URL", "", blank_video_path)
+            return None, blank_video_result("❌ 错误：未配置API URL")
 
         _log_info(f"🔗 使用镜像站: {mirror_site} ({api_url})")
 
@@ -2448,7 +5718,7 @@ class DoubaoSeedanceVideoNode:
                     _log_info(f"🔍 图生视频模式: 输入图像 {input_image.shape}")
 
                     # 火山引擎API需要完整的Data URL格式（根据官方文档）
-                    image_data_url = image_to_base64(input_image, return_data_url=True)
+                    image_data_url = encode_image_for_upload(input_image)
                     if image_data_url:
                         content.append({
                             "type": "image_url",
@@ -2463,8 +5733,8 @@ class DoubaoSeedanceVideoNode:
                 elif video_mode == "first_last_frame" and first_frame is not None and last_frame is not None:
                     _log_info(f"🔍 首尾帧模式: 首帧 {first_frame.shape}, 尾帧 {last_frame.shape}")
                     # 火山引擎API需要完整的Data URL格式
-                    first_data_url = image_to_base64(first_frame, return_data_url=True)
-                    last_data_url = image_to_base64(last_frame, return_data_url=True)
+                    first_data_url, last_data_url = encode_images_for_upload([first_frame, last_frame], stitch_batches=True,
+                                                                             budget=get_payload_budget([mirror_site], model))
                     if first_data_url and last_data_url:
                         content.append({
                             "type": "image_url",
@@ -2544,12 +5814,12 @@ class DoubaoSeedanceVideoNode:
                     # 根据API格式选择合适的图像编码方式
                     if api_format == "comfly":
                         # Comfly格式：根据API文档，图生视频使用images数组（单张图片）
-                        image_data = image_to_base64(input_image, return_data_url=True)
+                        image_data = encode_image_for_upload(input_image)
                         payload["images"] = [image_data]
                         _log_info(f"🔧 Comfly格式: 添加图生视频图像到images数组 (长度: {len(image_data) if image_data else 0})")
                     else:
                         # T8等其他格式：使用image字段
-                        image_data = image_to_base64(input_image, return_data_url=True)
+                        image_data = encode_image_for_upload(input_image)
                         payload["image"] = [image_data]
                         _log_info(f"🔧 其他格式: 添加Data URL图像到载荷 (长度: {len(image_data) if image_data else 0})")
 
@@ -2562,8 +5832,8 @@ class DoubaoSeedanceVideoNode:
                     # 根据API格式选择合适的图像编码方式
                     if api_format == "comfly":
                         # Comfly格式：使用images数组格式，第一个元素是首帧，第二个元素是尾帧
-                        first_data = image_to_base64(first_frame, return_data_url=True)
-                        last_data = image_to_base64(last_frame, return_data_url=True)
+                        first_data, last_data = encode_images_for_upload([first_frame, last_frame], stitch_batches=True,
+                                                                         budget=get_payload_budget([mirror_site], model))
 
                         if first_data and last_data:
                             # 根据Comfly API文档，首尾帧使用images数组
@@ -2573,8 +5843,8 @@ class DoubaoSeedanceVideoNode:
                             _log_error(f"❌ Comfly首尾帧编码失败")
                     else:
                         # T8等其他格式：使用完整的Data URL格式
-                        first_data = image_to_base64(first_frame, return_data_url=True)
-                        last_data = image_to_base64(last_frame, return_data_url=True)
+                        first_data, last_data = encode_images_for_upload([first_frame, last_frame], stitch_batches=True,
+                                                                         budget=get_payload_budget([mirror_site], model))
                         payload["first_frame"] = first_data
                         payload["last_frame"] = last_data
                         _log_info(f"🔧 其他格式: 添加Data URL首尾帧到载荷")
@@ -2603,214 +5873,132 @@ class DoubaoSeedanceVideoNode:
             else:
                 _log_info(f"⚠️ payload中缺少api_platform参数")
 
-            response = None
-            for attempt in range(self.max_retries):
-                try:
-                    response = call_video_api(api_url, api_key, payload, api_format, self.timeout)
+            video_info = f"模型: {model}, 模式: {video_mode}, 时长: {duration}, 分辨率: {resolution}, 宽高比: {aspect_ratio}, 帧率: {fps}fps"
 
-                    if response and response.status_code in [200, 201, 202]:
-                        break
-                    else:
-                        error_msg = response.text if response else "无响应"
-                        _log_warning(f"视频API调用失败 (尝试 {attempt + 1}/{self.max_retries}): {error_msg}")
+        except Exception as e:
+            error_message = f"Video generation failed: {str(e)}"
+            _log_error(error_message)
+            return None, blank_video_result(f"❌ {error_message}")
 
-                except Exception as e:
-                    _log_warning(f"视频API调用失败 (尝试 {attempt + 1}/{self.max_retries}): {str(e)}")
+        return (api_url, api_format, api_key, payload, video_info), None
 
-                if attempt < self.max_retries - 1:
-                    time.sleep(2)  # 重试前等待2秒
+    def _handle_submit_response(self, response, video_info):
+        """解析任务创建响应，返回 (任务ID, None)；同步返回视频或失败时返回 (None, 节点输出)"""
+        task_id, video_url, error_result = parse_video_submit_response(response)
+        if task_id:
+            return task_id, None
+        if error_result:
+            return None, error_result
+        return None, download_video_result(video_url, video_info)
 
-            if not response or response.status_code not in [200, 201, 202]:
-                error_msg = f"API Error: {response.text if response else 'No response'} - Connection failed"
-                _log_error(error_msg)
-                blank_video = create_blank_video_object()
-                blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                return (blank_video, "", f"❌ {error_msg}", "", blank_video_path)
+    def _handle_task_result(self, kind, status_result, task_id, video_info):
+        """根据轮询结果下载视频或返回失败信息"""
+        return video_task_outputs(kind, status_result, task_id, video_info)
 
-            # 解析响应
-            try:
-                result = response.json()
-                _log_info(f"🔍 视频API响应格式: {type(result)}")
-                _log_info(f"🔍 视频API响应内容: {str(result)[:200]}...")
-
-                # 检查是否是异步任务响应
-                task_id = None
-                if "task_id" in result:
-                    task_id = result["task_id"]
-                elif "id" in result:
-                    task_id = result["id"]
-                elif "data" in result and isinstance(result["data"], dict) and "task_id" in result["data"]:
-                    task_id = result["data"]["task_id"]
-
-                if task_id:
-                    _log_info(f"🔍 检测到异步任务，任务ID: {task_id}")
-                    _log_info(f"⏳ 开始轮询任务状态...")
-
-                    # 轮询任务状态 - 优化轮询策略
-                    max_polls = 90  # 最多轮询90次（15分钟）
-                    poll_interval = 10  # 每10秒查询一次
-
-                    for poll_count in range(max_polls):
-                        _log_info(f"🔍 轮询任务状态 ({poll_count + 1}/{max_polls})")
-
-                        status_response = call_video_task_status(api_url, api_key, task_id, api_format)
-
-                        if status_response and status_response.status_code == 200:
-                            status_result = status_response.json()
-                            _log_info(f"🔍 任务状态响应: {str(status_result)[:200]}...")
-
-                            # 检查任务状态
-                            status = status_result.get("status", "unknown")
-                            _log_info(f"🔍 当前任务状态: '{status}' (类型: {type(status)})")
-
-                            if status.lower() in ["completed", "success", "finished", "succeeded"] or status in ["SUCCESS", "COMPLETED", "FINISHED", "SUCCEEDED"]:
-                                # 任务完成，提取视频URL
-                                _log_info(f"🎉 任务完成！完整响应: {status_result}")
-                                video_url = ""
-
-                                # 尝试多种可能的URL字段位置
-                                if "data" in status_result:
-                                    data = status_result["data"]
-                                    _log_info(f"🔍 data字段内容: {data}")
-                                    if isinstance(data, list) and len(data) > 0:
-                                        video_data = data[0]
-                                    else:
-                                        video_data = data
-
-                                    if "url" in video_data:
-                                        video_url = video_data["url"]
-                                    elif "video_url" in video_data:
-                                        video_url = video_data["video_url"]
-                                    elif "output_url" in video_data:
-                                        video_url = video_data["output_url"]
-                                    elif "output" in video_data:
-                                        video_url = video_data["output"]
-
-                                # 检查content字段（T8镜像站格式）
-                                if not video_url and "content" in status_result:
-                                    content = status_result["content"]
-                                    _log_info(f"🔍 content字段内容: {content}")
-                                    if "video_url" in content:
-                                        video_url = content["video_url"]
-                                    elif "url" in content:
-                                        video_url = content["url"]
-
-                                # 直接在根级别查找URL
-                                if not video_url:
-                                    if "url" in status_result:
-                                        video_url = status_result["url"]
-                                    elif "video_url" in status_result:
-                                        video_url = status_result["video_url"]
-                                    elif "output_url" in status_result:
-                                        video_url = status_result["output_url"]
-                                    elif "result_url" in status_result:
-                                        video_url = status_result["result_url"]
-
-                                _log_info(f"🔍 提取到的视频URL: {video_url}")
-
-                                if video_url:
-                                    _log_info(f"✅ 视频生成成功: {video_url}")
-
-                                    # 下载视频文件并转换为张量
-                                    video_path = download_video_from_url(video_url)
-                                    if video_path:
-                                        _log_info(f"🎬 开始转换视频为ComfyUI对象...")
-                                        video_obj = video_to_comfyui_video(video_path)
-                                        if video_obj is not None:
-                                            video_info = f"模型: {model}, 模式: {video_mode}, 时长: {duration}, 分辨率: {resolution}, 宽高比: {aspect_ratio}, 帧率: {fps}fps, 任务ID: {task_id}"
-                                            return (video_obj, video_url, "✅ 视频生成成功", video_info, video_path)
-                                        else:
-                                            _log_error("❌ 视频转换失败")
-                                            blank_video = create_blank_video_object()
-                                            blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                                            return (blank_video, video_url, "⚠️ 视频生成成功但转换失败", f"URL: {video_url}", blank_video_path)
-                                    else:
-                                        _log_error("❌ 视频下载失败")
-                                        blank_video = create_blank_video_object()
-                                        blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                                        return (blank_video, video_url, "⚠️ 视频生成成功但下载失败", f"URL: {video_url}", blank_video_path)
-                                else:
-                                    _log_error("❌ 任务完成但未找到视频URL")
-                                    blank_video = create_blank_video_object()
-                                    blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                                    return (blank_video, "", "❌ 任务完成但未找到视频URL", str(status_result), blank_video_path)
-
-                            elif status in ["failed", "error"]:
-                                error_msg = status_result.get("error", "任务失败")
-                                _log_error(f"❌ 视频生成任务失败: {error_msg}")
-                                blank_video = create_blank_video_object()
-                                blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                                return (blank_video, "", f"❌ 任务失败: {error_msg}", str(status_result), blank_video_path)
-
-                            elif status.lower() in ["running", "processing", "pending", "queued", "not_start"] or status in ["RUNNING", "PROCESSING", "PENDING", "QUEUED", "NOT_START"]:
-                                _log_info(f"⏳ 任务进行中，状态: {status}")
-                                time.sleep(poll_interval)
-                                continue
+    def _parse_failed_result(self, error):
+        _log_error(f"解析视频响应失败: {error}")
+        return blank_video_result(f"❌ 解析响应失败: {str(error)}")
 
-                            else:
-                                _log_warning(f"⚠️ 未知任务状态: {status}")
-                                time.sleep(poll_interval)
-                                continue
+class DoubaoSeedanceVideoSubmitNode(DoubaoSeedanceVideoNode):
+    """Doubao-Seedance视频任务提交节点：提交后立即返回任务句柄，由等待节点统一收取结果
 
-                        else:
-                            _log_warning(f"⚠️ 查询任务状态失败")
-                            time.sleep(poll_interval)
+    多个提交节点可以先全部提交，再连接到同一个等待节点，N个视频的总耗时接近单个视频的生成时间。
+    """
 
-                    # 轮询超时
-                    _log_error("❌ 任务轮询超时")
-                    blank_video = create_blank_video_object()
-                    blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                    return (blank_video, "", "❌ 视频生成超时，请稍后查看", f"任务ID: {task_id}", blank_video_path)
+    RETURN_TYPES = ("SEEDANCE_JOB", "STRING")
+    RETURN_NAMES = ("job", "task_info")
+    FUNCTION = "submit_video_async" if ASYNC_NODE_EXECUTION else "submit_video"
+    CATEGORY = "Ken-Chen/Doubao"
 
-                else:
-                    # 同步响应，直接提取视频URL
-                    video_url = ""
-                    if "data" in result and len(result["data"]) > 0:
-                        video_data = result["data"][0]
-                        if "url" in video_data:
-                            video_url = video_data["url"]
-                        elif "video_url" in video_data:
-                            video_url = video_data["video_url"]
-
-                    if video_url:
-                        _log_info(f"✅ 视频生成成功: {video_url}")
-
-                        # 下载视频文件并转换为张量
-                        video_path = download_video_from_url(video_url)
-                        if video_path:
-                            _log_info(f"🎬 开始转换视频为张量...")
-                            video_obj = video_to_comfyui_video(video_path)
-                            if video_obj is not None:
-                                video_info = f"模型: {model}, 模式: {video_mode}, 时长: {duration}, 分辨率: {resolution}, 宽高比: {aspect_ratio}, 帧率: {fps}fps"
-                                return (video_obj, video_url, "✅ 视频生成成功", video_info, video_path)
-                            else:
-                                _log_error("❌ 视频转换失败")
-                                blank_video = create_blank_video_object()
-                                blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                                return (blank_video, video_url, "⚠️ 视频生成成功但转换失败", f"URL: {video_url}", blank_video_path)
-                        else:
-                            _log_error("❌ 视频下载失败")
-                            blank_video = create_blank_video_object()
-                            blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                            return (blank_video, video_url, "⚠️ 视频生成成功但下载失败", f"URL: {video_url}", blank_video_path)
-                    else:
-                        _log_error("❌ 响应中未找到视频URL")
-                        blank_video = create_blank_video_object()
-                        blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                        return (blank_video, "", "❌ 响应中未找到视频URL", str(result), blank_video_path)
+    def submit_video(self, **kwargs):
+        """提交视频生成任务，返回 (任务句柄, 任务信息)"""
+        failover = build_mirror_failover(self._prepare_request, kwargs, "video")
+        request, error_result = failover.request_for(0)
+        if error_result:
+            job = VideoJob.failed(error_result)
+        else:
+            job = VideoJob.from_submit(*submit_video_task_with_retries(failover, self.timeout, self.max_retries))
+        _log_info(f"📨 视频任务已提交: {job.describe()}")
+        return (job, job.describe())
+
+    async def submit_video_async(self, **kwargs):
+        """submit_video的协程版本"""
+        failover = build_mirror_failover(self._prepare_request, kwargs, "video")
+        request, error_result = await asyncio.to_thread(failover.request_for, 0)
+        if error_result:
+            job = VideoJob.failed(error_result)
+        else:
+            response, request = await async_submit_video_task_with_retries(failover, self.timeout, self.max_retries)
+            job = await asyncio.to_thread(VideoJob.from_submit, response, request)
+        _log_info(f"📨 视频任务已提交: {job.describe()}")
+        return (job, job.describe())
+
+
+class DoubaoSeedanceVideoAwaitNode:
+    """Doubao-Seedance视频任务等待节点：并发轮询一个或多个任务句柄，完成后下载视频（按输入顺序输出列表）"""
+
+    MAX_JOBS = 8
+    POLL_INTERVAL = 10
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "job": ("SEEDANCE_JOB",),
+                "max_wait": ("INT", {"default": 900, "min": 10, "max": 7200, "step": 10}),
+            },
+            "optional": {f"job_{i}": ("SEEDANCE_JOB",) for i in range(2, cls.MAX_JOBS + 1)},
+        }
+
+    RETURN_TYPES = ("VIDEO", "STRING", "STRING", "STRING", "VIDEO")
+    RETURN_NAMES = ("video", "video_url", "response_text", "video_info", "AFVIDEO")
+    OUTPUT_IS_LIST = (True, True, True, True, True)
+    FUNCTION = "await_videos_async" if ASYNC_NODE_EXECUTION else "await_videos"
+    CATEGORY = "Ken-Chen/Doubao"
+
+    def _collect_jobs(self, job, more_jobs):
+        extra = [more_jobs.get(f"job_{i}") for i in range(2, self.MAX_JOBS + 1)]
+        return [j for j in [job] + extra if j is not None]
+
+    async def _poll_jobs(self, jobs, max_wait):
+        """并发轮询所有异步任务，返回与jobs一一对应的 (状态类别, 状态响应)，无需轮询的任务为None"""
+        max_polls = max(1, int(max_wait) // self.POLL_INTERVAL)
 
-            except Exception as e:
-                _log_error(f"解析视频响应失败: {e}")
-                blank_video = create_blank_video_object()
-                blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                return (blank_video, "", f"❌ 解析响应失败: {str(e)}", "", blank_video_path)
+        async def poll(job):
+            if not job.task_id:
+                return None
+            return await async_poll_video_task(job.api_url, job.api_key, job.task_id, job.api_format,
+                                               max_polls, self.POLL_INTERVAL, job.profile, job.submitted_at)
+
+        return await asyncio.gather(*(poll(job) for job in jobs))
+
+    def _job_outputs(self, job, status):
+        if job.error:
+            return job.error
+        if not job.task_id:
+            return download_video_result(job.video_url, job.video_info)
+        kind, status_result = status
+        return video_task_outputs(kind, status_result, job.task_id, job.video_info)
+
+    def _outputs(self, jobs, statuses):
+        """并行下载已完成的视频，把每个任务的节点输出转置为列表输出"""
+        results = list(get_download_executor().map(self._job_outputs, jobs, statuses))
+        return tuple(list(column) for column in zip(*results))
+
+    def await_videos(self, job, max_wait=900, **more_jobs):
+        """等待任务完成并下载视频"""
+        jobs = self._collect_jobs(job, more_jobs)
+        _log_info(f"⏳ 等待 {len(jobs)} 个视频任务完成")
+        statuses = run_in_transport_loop(self._poll_jobs(jobs, max_wait))
+        return self._outputs(jobs, statuses)
+
+    async def await_videos_async(self, job, max_wait=900, **more_jobs):
+        """await_videos的协程版本"""
+        jobs = self._collect_jobs(job, more_jobs)
+        _log_info(f"⏳ 等待 {len(jobs)} 个视频任务完成")
+        statuses = await self._poll_jobs(jobs, max_wait)
+        return await asyncio.to_thread(self._outputs, jobs, statuses)
 
-        except Exception as e:
-            error_message = f"Video generation failed: {str(e)}"
-            _log_error(error_message)
-            blank_video = create_blank_video_object()
-            blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-            return (blank_video, "", f"❌ {error_message}", "", blank_video_path)
 
 class DoubaoSeedanceContinuousVideoNode:
     """Doubao-Seedance连续视频生成节点"""
@@ -2824,6 +6012,7 @@ class DoubaoSeedanceContinuousVideoNode:
         # 确保mirror_options不为空
         if not mirror_options:
             mirror_options = ["volcengine"]
+        mirror_options.append(AUTO_MIRROR)
 
         return {
             "required": {
@@ -2860,42 +6049,7 @@ class DoubaoSeedanceContinuousVideoNode:
     def generate_continuous_videos(self, base_prompt, prompts_text, video_count, mirror_site, first_video_model, subsequent_video_model, duration,
                                  resolution, aspect_ratio, fps, watermark=False, camera_fixed=False, merge_videos=True, api_key="", seed=-1, initial_image=None):
         """生成连续视频序列"""
-
-        # 获取镜像站配置
-        site_config = get_mirror_site_config(mirror_site)
-        api_url = site_config.get("url", "").strip()
-        api_format = site_config.get("api_format", "comfly")
-
-        # 强制修正T8镜像站的API格式
-        if mirror_site == "t8_mirror" or "t8star.cn" in api_url:
-            api_format = "volcengine"
-            _log_info(f"🔧 强制修正T8镜像站API格式为: {api_format}")
-
-        # 强制修正Comfly镜像站的API格式（支持火山引擎格式）
-        if mirror_site == "comfly_mirror" or "comfly.chat" in api_url:
-            api_format = "volcengine"
-            _log_info(f"🔧 强制修正Comfly镜像站API格式为: {api_format}")
-
-        # 使用镜像站的API key（如果提供了的话）
-        if site_config.get("api_key") and not api_key.strip():
-            api_key = site_config["api_key"]
-            _log_info(f"🔑 自动使用镜像站API Key: {api_key[:8]}...")
-
-        if not api_key.strip():
-            blank_video = create_blank_video_object()
-            blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-            return (blank_video, "", "❌ 错误：未提供API Key", "", blank_video_path)
-
-        if not api_url:
-            blank_video = create_blank_video_object()
-            blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-            return (blank_video, "", "❌ 错误：未配置API URL", "", blank_video_path)
-
-        # 检查API格式支持 - 移除限制，支持所有镜像站
-        _log_info(f"🔍 连续视频API格式: {api_format}")
-
         _log_info(f"🎬 开始生成连续视频序列: {video_count}个视频")
-        _log_info(f"🔗 使用镜像站: {mirror_site} ({api_url})")
 
         try:
             # 解析提示词列表
@@ -2917,6 +6071,7 @@ class DoubaoSeedanceContinuousVideoNode:
             video_infos = []
             response_texts = []
             current_image = initial_image
+            failure_text = "❌ 连续视频生成失败"
 
             for i, prompt in enumerate(prompts):
                 _log_info(f"🎬 生成第{i+1}/{video_count}个视频: {prompt}")
@@ -2925,11 +6080,18 @@ class DoubaoSeedanceContinuousVideoNode:
                 current_model = first_video_model if i == 0 else subsequent_video_model
                 _log_info(f"🔧 使用模型: {current_model} ({'第一个视频' if i == 0 else '后续视频'})")
 
+                # 每段视频单独构建故障转移器：提交失败时轮换候选镜像站，和其他视频节点一致
+                failover = build_mirror_failover(self._prepare_request, dict(
+                    prompt=prompt, mirror_site=mirror_site, model=current_model, duration=duration,
+                    resolution=resolution, aspect_ratio=aspect_ratio, fps=fps, watermark=watermark,
+                    camera_fixed=camera_fixed, api_key=api_key, seed=seed, input_image=current_image), "video")
+                request, error_result = failover.request_for(0)
+                if error_result:
+                    failure_text = error_result[2]
+                    break
+
                 # 调用单个视频生成
-                video_result = self._generate_single_video_with_last_frame(
-                    prompt, api_url, api_key, api_format, current_model, duration, resolution, aspect_ratio,
-                    fps, watermark, camera_fixed, seed, current_image
-                )
+                video_result = self._generate_single_video_with_last_frame(failover)
 
                 if video_result is None:
                     _log_error(f"❌ 第{i+1}个视频生成失败")
@@ -3011,7 +6173,7 @@ class DoubaoSeedanceContinuousVideoNode:
                 blank_video = create_blank_video_object()
                 blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
                 afvideo = create_video_path_wrapper(blank_video_path) if blank_video_path else create_blank_video_object()
-                return (blank_video, "", "❌ 连续视频生成失败", "", afvideo, blank_video)
+                return (blank_video, "", failure_text, "", afvideo, blank_video)
 
         except Exception as e:
             error_message = f"连续视频生成失败: {str(e)}"
@@ -3021,64 +6183,96 @@ class DoubaoSeedanceContinuousVideoNode:
             afvideo = create_video_path_wrapper(blank_video_path) if blank_video_path else create_blank_video_object()
             return (blank_video, "", f"❌ {error_message}", "", afvideo, blank_video)
 
-    def _generate_single_video_with_last_frame(self, prompt, api_url, api_key, api_format, model, duration, resolution,
-                                              aspect_ratio, fps, watermark, camera_fixed, seed, input_image=None):
-        """生成单个视频并返回尾帧URL"""
-        try:
-            _log_info(f"🔧 构建{api_format}格式的连续视频payload")
+    def _prepare_request(self, prompt, mirror_site, model, duration, resolution, aspect_ratio, fps, watermark=False,
+                         camera_fixed=False, api_key="", seed=-1, input_image=None):
+        """解析镜像站并构建一段视频的载荷，返回 ((api_url, api_format, api_key, payload, video_info), None) 或 (None, 错误结果)"""
+        # 获取镜像站配置
+        site_config = get_mirror_site_config(mirror_site)
+        api_url = site_config.get("url", "").strip()
+        api_format = site_config.get("api_format", "comfly")
 
-            if api_format == "volcengine":
-                # 火山引擎格式：使用content数组
-                text_content = f"{prompt} --rt {aspect_ratio} --dur {duration.replace('s', '')} --fps {fps} --rs {resolution}"
-                if seed != -1:
-                    text_content += f" --seed {seed}"
-                text_content += f" --wm {str(watermark).lower()} --cf {str(camera_fixed).lower()}"
+        # 强制修正T8镜像站的API格式
+        if mirror_site == "t8_mirror" or "t8star.cn" in api_url:
+            api_format = "volcengine"
+            _log_info(f"🔧 强制修正T8镜像站API格式为: {api_format}")
 
-                content = [{"type": "text", "text": text_content}]
+        # 强制修正Comfly镜像站的API格式（支持火山引擎格式）
+        if mirror_site == "comfly_mirror" or "comfly.chat" in api_url:
+            api_format = "volcengine"
+            _log_info(f"🔧 强制修正Comfly镜像站API格式为: {api_format}")
 
-                # 添加输入图像（如果有）
-                if input_image is not None:
-                    image_data_url = image_to_base64(input_image, return_data_url=True)
-                    if image_data_url:
-                        content.append({
-                            "type": "image_url",
-                            "image_url": {"url": image_data_url}
-                        })
+        # 使用镜像站的API key（如果提供了的话）
+        if site_config.get("api_key") and not api_key.strip():
+            api_key = site_config["api_key"]
+            _log_info(f"🔑 自动使用镜像站API Key: {api_key[:8]}...")
 
-                payload = {
-                    "model": model,
-                    "content": content,
-                    "return_last_frame": True  # 关键参数：返回尾帧
-                }
+        if not api_key.strip():
+            return None, blank_video_result("❌ 错误：未提供API Key")
 
-            else:
-                # Comfly/T8格式：使用直接参数
-                payload = {
-                    "prompt": prompt,
-                    "model": model,
-                    "duration": int(duration.replace('s', '')),
-                    "resolution": resolution,
-                    "ratio": aspect_ratio,
-                    "watermark": watermark,
-                    "return_last_frame": True  # 关键参数：返回尾帧
-                }
+        if not api_url:
+            return None, blank_video_result("❌ 错误：未配置API URL")
 
-                # 添加种子
-                if seed != -1:
-                    payload["seed"] = seed
+        _log_info(f"🔗 使用镜像站: {mirror_site} ({api_url})")
+        _log_info(f"🔧 构建{api_format}格式的连续视频payload")
 
-                # 添加输入图像（如果有）
-                if input_image is not None:
-                    image_data_url = image_to_base64(input_image, return_data_url=True)
-                    if image_data_url:
-                        payload["images"] = [image_data_url]
+        if api_format == "volcengine":
+            # 火山引擎格式：使用content数组
+            text_content = f"{prompt} --rt {aspect_ratio} --dur {duration.replace('s', '')} --fps {fps} --rs {resolution}"
+            if seed != -1:
+                text_content += f" --seed {seed}"
+            text_content += f" --wm {str(watermark).lower()} --cf {str(camera_fixed).lower()}"
+
+            content = [{"type": "text", "text": text_content}]
+
+            # 添加输入图像（如果有）
+            if input_image is not None:
+                image_data_url = encode_image_for_upload(input_image)
+                if image_data_url:
+                    content.append({
+                        "type": "image_url",
+                        "image_url": {"url": image_data_url}
+                    })
+
+            payload = {
+                "model": model,
+                "content": content,
+                "return_last_frame": True  # 关键参数：返回尾帧
+            }
+
+        else:
+            # Comfly/T8格式：使用直接参数
+            payload = {
+                "prompt": prompt,
+                "model": model,
+                "duration": int(duration.replace('s', '')),
+                "resolution": resolution,
+                "ratio": aspect_ratio,
+                "watermark": watermark,
+                "return_last_frame": True  # 关键参数：返回尾帧
+            }
+
+            # 添加种子
+            if seed != -1:
+                payload["seed"] = seed
+
+            # 添加输入图像（如果有）
+            if input_image is not None:
+                image_data_url = encode_image_for_upload(input_image)
+                if image_data_url:
+                    payload["images"] = [image_data_url]
+
+            # T8镜像站特殊参数
+            if "t8star.cn" in api_url:
+                payload["01K3ZARVMSZ97JPXNWXBCJGG6K"] = ""
 
-                # T8镜像站特殊参数
-                if "t8star.cn" in api_url:
-                    payload["01K3ZARVMSZ97JPXNWXBCJGG6K"] = ""
+        video_info = f"视频尺寸: {resolution}, 时长: {duration}, 宽高比: {aspect_ratio}"
+        return (api_url, api_format, api_key, payload, video_info), None
 
-            # 调用API
-            response = call_video_api(api_url, api_key, payload, api_format, timeout=self.timeout)
+    def _generate_single_video_with_last_frame(self, failover):
+        """提交一段视频（失败时轮换候选镜像站）并等待完成，返回视频和尾帧URL"""
+        try:
+            response, request = submit_video_task_with_retries(failover, self.timeout, self.max_retries)
+            api_url, api_format, api_key, payload, video_info = request
 
             # 处理响应 - call_video_api返回的是requests.Response对象
             if response and response.status_code == 200:
@@ -3093,64 +6287,24 @@ class DoubaoSeedanceContinuousVideoNode:
                 return None
 
             # 检查是否是异步任务响应
-            task_id = None
-            if "task_id" in response_data:
-                task_id = response_data["task_id"]
-            elif "id" in response_data:
-                task_id = response_data["id"]
-            elif "data" in response_data and isinstance(response_data["data"], dict) and "task_id" in response_data["data"]:
-                task_id = response_data["data"]["task_id"]
-
+            task_id = extract_video_task_id(response_data)
             if task_id:
                 _log_info(f"🔍 检测到异步任务，任务ID: {task_id}")
-                _log_info(f"⏳ 开始轮询任务状态...")
 
                 # 轮询任务状态
-                max_polls = 90  # 最多轮询90次（15分钟）
-                poll_interval = 10  # 每10秒查询一次
-
-                for poll_count in range(max_polls):
-                    _log_info(f"🔍 轮询任务状态 ({poll_count + 1}/{max_polls})")
-
-                    status_response = call_video_task_status(api_url, api_key, task_id, api_format)
-
-                    if status_response and status_response.status_code == 200:
-                        status_result = status_response.json()
-                        _log_info(f"🔍 任务状态响应: {str(status_result)[:200]}...")
-
-                        # 检查任务状态
-                        status = status_result.get("status", "unknown")
-                        _log_info(f"🔍 当前任务状态: '{status}' (类型: {type(status)})")
-
-                        if status.lower() in ["completed", "success", "finished", "succeeded"] or status in ["COMPLETED", "SUCCESS", "FINISHED", "SUCCEEDED"]:
-                            _log_info(f"✅ 连续视频任务完成: {status}")
-                            # 使用status_result作为最终响应数据
-                            response_data = status_result
-                            break
-
-                        elif status.lower() in ["failed", "error"] or status in ["FAILED", "ERROR"]:
-                            _log_error(f"❌ 连续视频任务失败: {status}")
-                            return None
-
-                        elif status.lower() in ["running", "processing", "pending", "queued", "not_start"] or status in ["RUNNING", "PROCESSING", "PENDING", "QUEUED", "NOT_START"]:
-                            _log_info(f"⏳ 任务进行中，状态: {status}")
-                            time.sleep(poll_interval)
-                            continue
-
-                        else:
-                            _log_warning(f"⚠️ 未知任务状态: {status}")
-                            time.sleep(poll_interval)
-                            continue
-
-                    else:
-                        _log_warning(f"⚠️ 查询任务状态失败")
-                        time.sleep(poll_interval)
-
-                # 轮询超时
-                if poll_count >= max_polls - 1:
+                kind, status_result = poll_video_task(api_url, api_key, task_id, api_format,
+                                                      profile=video_task_profile(api_url, payload))
+                if kind == "failed":
+                    _log_error(f"❌ 连续视频任务失败: {status_result.get('status')}")
+                    return None
+                if kind == "timeout":
                     _log_error("❌ 连续视频任务轮询超时")
                     return None
 
+                _log_info(f"✅ 连续视频任务完成: {status_result.get('status')}")
+                # 使用status_result作为最终响应数据
+                response_data = status_result
+
             # 检查最终状态
             if response_data and (response_data.get('status', '').lower() in ['completed', 'success', 'finished', 'succeeded'] or response_data.get('status') in ['COMPLETED', 'SUCCESS', 'FINISHED', 'SUCCEEDED']):
                 video_url = None
@@ -3189,7 +6343,6 @@ class DoubaoSeedanceContinuousVideoNode:
                     # 下载并转换视频
                     video_obj = self._download_and_convert_video(video_url)
 
-                    video_info = f"视频尺寸: {resolution}, 时长: {duration}, 宽高比: {aspect_ratio}"
                     response_text = f"✅ 视频生成成功"
 
                     return (video_obj, video_url, response_text, video_info, last_frame_url)
@@ -3207,19 +6360,22 @@ class DoubaoSeedanceContinuousVideoNode:
     def _download_last_frame_as_image(self, last_frame_url):
         """下载尾帧URL并转换为图像tensor"""
         try:
-            import requests
             import numpy as np
             from PIL import Image
             import io
 
             _log_info(f"🔽 下载尾帧图像: {last_frame_url}")
 
-            # 下载图像
-            response = requests.get(last_frame_url, timeout=30)
-            response.raise_for_status()
+            # 下载图像（经过下载缓存）
+            data = read_download_cache(last_frame_url)
+            if data is None:
+                response = get_http_session(last_frame_url).get(last_frame_url, timeout=30)
+                response.raise_for_status()
+                data = response.content
+                write_download_cache(last_frame_url, data)
 
             # 转换为PIL图像
-            image = Image.open(io.BytesIO(response.content))
+            image = Image.open(io.BytesIO(data))
             image = image.convert('RGB')
 
             # 转换为numpy数组
@@ -3262,6 +6418,7 @@ class DoubaoSeedanceMultiRefVideoNode:
         config = get_seedream4_config()
         mirror_sites = config.get('mirror_sites', {})
         mirror_options = list(mirror_sites.keys())
+        mirror_options.append(AUTO_MIRROR)
 
         return {
             "required": {
@@ -3287,7 +6444,7 @@ class DoubaoSeedanceMultiRefVideoNode:
 
     RETURN_TYPES = ("VIDEO", "STRING", "STRING", "STRING", "VIDEO")
     RETURN_NAMES = ("video", "video_url", "response_text", "video_info", "AFVIDEO")
-    FUNCTION = "generate_multi_ref_video"
+    FUNCTION = "generate_multi_ref_video_async" if ASYNC_NODE_EXECUTION else "generate_multi_ref_video"
     CATEGORY = "Ken-Chen/Doubao"
 
     def __init__(self):
@@ -3297,7 +6454,57 @@ class DoubaoSeedanceMultiRefVideoNode:
     def generate_multi_ref_video(self, prompt, mirror_site, model, duration, resolution, aspect_ratio, fps, watermark=False, camera_fixed=False, api_key="", seed=-1,
                                 reference_image_1=None, reference_image_2=None, reference_image_3=None, reference_image_4=None):
         """生成多图参考视频"""
+        failover = build_mirror_failover(self._prepare_request, dict(
+            prompt=prompt, mirror_site=mirror_site, model=model, duration=duration, resolution=resolution,
+            aspect_ratio=aspect_ratio, fps=fps, watermark=watermark, camera_fixed=camera_fixed, api_key=api_key,
+            seed=seed, reference_image_1=reference_image_1, reference_image_2=reference_image_2,
+            reference_image_3=reference_image_3, reference_image_4=reference_image_4), "video")
+        request, error_result = failover.request_for(0)
+        if error_result:
+            return error_result
+
+        try:
+            # 调用多图参考视频生成API（使用火山引擎格式端点），自动模式下每个候选镜像站尝试一次
+            response, request = submit_video_task_with_retries(failover, self.timeout, len(failover.mirror_names),
+                                                               call=call_multi_ref_video_api)
+            api_url, api_format, api_key, payload, video_info = request
+            task_id, error_result = self._handle_submit_response(response)
+            if error_result:
+                return error_result
+
+            # 轮询任务状态
+            kind, status_result = poll_video_task(api_url, api_key, task_id, api_format,
+                                                  profile=video_task_profile(api_url, payload))
+            return self._handle_task_result(kind, status_result, task_id, video_info)
+
+        except Exception as e:
+            return self._generation_failed_result(e)
+
+    async def generate_multi_ref_video_async(self, **kwargs):
+        """generate_multi_ref_video的协程版本，轮询任务状态期间不占用执行线程"""
+        failover = build_mirror_failover(self._prepare_request, kwargs, "video")
+        request, error_result = await asyncio.to_thread(failover.request_for, 0)
+        if error_result:
+            return error_result
+
+        try:
+            response, request = await async_submit_video_task_with_retries(
+                failover, self.timeout, len(failover.mirror_names), call=async_call_multi_ref_video_api)
+            api_url, api_format, api_key, payload, video_info = request
+            task_id, error_result = self._handle_submit_response(response)
+            if error_result:
+                return error_result
 
+            kind, status_result = await async_poll_video_task(api_url, api_key, task_id, api_format,
+                                                              profile=video_task_profile(api_url, payload))
+            return await asyncio.to_thread(self._handle_task_result, kind, status_result, task_id, video_info)
+
+        except Exception as e:
+            return self._generation_failed_result(e)
+
+    def _prepare_request(self, prompt, mirror_site, model, duration, resolution, aspect_ratio, fps, watermark=False, camera_fixed=False, api_key="", seed=-1,
+                         reference_image_1=None, reference_image_2=None, reference_image_3=None, reference_image_4=None):
+        """收集参考图片、解析镜像站并构建载荷，返回 ((api_url, api_format, api_key, payload, video_info), None) 或 (None, 错误结果)"""
         # 收集参考图片
         reference_images = []
         if reference_image_1 is not None:
@@ -3310,14 +6517,10 @@ class DoubaoSeedanceMultiRefVideoNode:
             reference_images.append(reference_image_4)
 
         if not reference_images:
-            blank_video = create_blank_video_object()
-            blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-            return (blank_video, "", "❌ 错误：至少需要提供一张参考图片", "", blank_video_path)
+            return None, blank_video_result("❌ 错误：至少需要提供一张参考图片")
 
         if len(reference_images) > 4:
-            blank_video = create_blank_video_object()
-            blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-            return (blank_video, "", "❌ 错误：最多支持4张参考图片", "", blank_video_path)
+            return None, blank_video_result("❌ 错误：最多支持4张参考图片")
 
         _log_info(f"🔍 多图参考视频生成: 参考图片数量={len(reference_images)}")
 
@@ -3337,17 +6540,13 @@ class DoubaoSeedanceMultiRefVideoNode:
             _log_info(f"🔑 自动使用镜像站API Key: {api_key[:8]}...")
 
         if not api_key.strip():
-            blank_video = create_blank_video_object()
-            blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-            return (blank_video, "", "❌ 错误：未提供API Key", "", blank_video_path)
+            return None, blank_video_result("❌ 错误：未提供API Key")
 
         try:
             # 多图参考支持火山引擎格式和Comfly官方格式
             if api_format not in ["volcengine", "comfly"]:
                 _log_warning(f"⚠️ 多图参考功能仅支持火山引擎和Comfly格式，当前格式: {api_format}")
-                blank_video = create_blank_video_object()
-                blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                return (blank_video, "", "❌ 错误：多图参考功能仅支持火山引擎官方、T8镜像站和Comfly镜像站", "", blank_video_path)
+                return None, blank_video_result("❌ 错误：多图参考功能仅支持火山引擎官方、T8镜像站和Comfly镜像站")
 
             # 构建统一的content数组格式（火山引擎和Comfly官方格式相同）
             _log_info(f"🔧 构建多图参考{api_format}格式payload")
@@ -3377,12 +6576,13 @@ class DoubaoSeedanceMultiRefVideoNode:
                 }
             ]
 
-            # 添加参考图片到content数组
-            for i, ref_image in enumerate(reference_images, 1):
+            # 添加参考图片到content数组（所有参考图片并行编码）
+            encoded_references = encode_images_for_upload(reference_images, stitch_batches=True,
+                                                          budget=get_payload_budget([mirror_site], model))
+            for i, (ref_image, image_data_url) in enumerate(zip(reference_images, encoded_references), 1):
                 _log_info(f"🔍 处理参考图片 {i}: {ref_image.shape}")
 
                 # 统一使用完整的Data URL格式
-                image_data_url = image_to_base64(ref_image, return_data_url=True)
                 if image_data_url:
                     image_content = {
                         "type": "image_url",
@@ -3406,156 +6606,59 @@ class DoubaoSeedanceMultiRefVideoNode:
             }
 
             _log_info(f"🔍 多图参考payload构建完成: 格式={api_format}, 模型={model}, content数量={len(content)}")
+            video_info = f"模型: {model}, 参考图片: {len(reference_images)}张, 时长: {duration}, 分辨率: {resolution}, 宽高比: {aspect_ratio}, 帧率: {fps}fps"
 
-            # 调用多图参考视频生成API（使用火山引擎格式端点）
-            response = call_multi_ref_video_api(api_url, api_key, payload, api_format, self.timeout)
+        except Exception as e:
+            return None, self._generation_failed_result(e)
 
-            if not response or response.status_code != 200:
-                blank_video = create_blank_video_object()
-                blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                return (blank_video, "", "❌ 错误：视频生成任务创建失败", "", blank_video_path)
+        return (api_url, api_format, api_key, payload, video_info), None
 
-            # 从响应中提取任务ID
-            try:
-                result = response.json()
-                task_id = None
-
-                # 火山引擎格式的任务ID提取
-                if "id" in result:
-                    task_id = result["id"]
-                elif "task_id" in result:
-                    task_id = result["task_id"]
-                elif "data" in result and isinstance(result["data"], dict):
-                    if "id" in result["data"]:
-                        task_id = result["data"]["id"]
-                    elif "task_id" in result["data"]:
-                        task_id = result["data"]["task_id"]
-
-                if not task_id:
-                    _log_error(f"❌ 无法从响应中提取任务ID: {result}")
-                    blank_video = create_blank_video_object()
-                    blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                    return (blank_video, "", "❌ 错误：无法获取任务ID", "", blank_video_path)
-
-                _log_info(f"🎬 多图参考视频任务创建成功: {task_id}")
+    def _handle_submit_response(self, response):
+        """从任务创建响应中提取任务ID，返回 (任务ID, None) 或 (None, 错误结果)"""
+        if not response or response.status_code != 200:
+            return None, blank_video_result("❌ 错误：视频生成任务创建失败")
 
-            except Exception as e:
-                _log_error(f"❌ 解析任务创建响应失败: {e}")
-                blank_video = create_blank_video_object()
-                blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                return (blank_video, "", f"❌ 错误：解析响应失败: {str(e)}", "", blank_video_path)
+        try:
+            result = response.json()
+            task_id = extract_video_task_id(result)
 
-            # 轮询任务状态
-            max_polls = 90  # 15分钟，每10秒轮询一次
-            poll_interval = 10
-
-            for poll_count in range(1, max_polls + 1):
-                _log_info(f"🔍 轮询任务状态 ({poll_count}/{max_polls})")
-
-                status_response = call_video_task_status(api_url, api_key, task_id, api_format)
-                status_result = None
-                if status_response and status_response.status_code == 200:
-                    status_result = status_response.json()
-                    _log_info(f"🔍 任务状态响应: {str(status_result)[:200]}...")
-
-                if status_result:
-                    status = status_result.get('status', 'unknown')
-                    _log_info(f"🔍 当前任务状态: '{status}' (类型: {type(status)})")
-
-                    if status.lower() in ["completed", "success", "finished", "succeeded"] or status in ["SUCCESS", "COMPLETED", "FINISHED", "SUCCEEDED"]:
-                        _log_info(f"✅ 多图参考视频生成成功")
-
-                        # 获取视频URL - 支持多种响应格式
-                        video_url = None
-
-                        # 格式1: data.content.video_url (Comfly多图参考格式)
-                        if 'data' in status_result and isinstance(status_result['data'], dict):
-                            if 'content' in status_result['data'] and isinstance(status_result['data']['content'], dict):
-                                if 'video_url' in status_result['data']['content']:
-                                    video_url = status_result['data']['content']['video_url']
-
-                        # 格式2: content.video_url (火山引擎多图参考格式)
-                        if not video_url and 'content' in status_result and isinstance(status_result['content'], dict):
-                            if 'video_url' in status_result['content']:
-                                video_url = status_result['content']['video_url']
-
-                        # 格式3: video_result数组格式
-                        if not video_url and 'video_result' in status_result and status_result['video_result']:
-                            video_result = status_result['video_result'][0] if isinstance(status_result['video_result'], list) else status_result['video_result']
-                            video_url = video_result.get('url')
-
-                        # 格式4: 直接video_url字段
-                        if not video_url and 'video_url' in status_result:
-                            video_url = status_result['video_url']
-
-                        # 格式4: result.video_url格式
-                        if not video_url and 'result' in status_result and status_result['result']:
-                            result = status_result['result']
-                            if isinstance(result, dict) and 'video_url' in result:
-                                video_url = result['video_url']
-                                _log_info(f"🔍 从result.video_url提取视频URL")
-
-                        if video_url:
-                            _log_info(f"🎬 获取到视频URL: {video_url}")
-
-                            # 下载并转换视频
-                            video_path = download_video_from_url(video_url)
-                            if video_path:
-                                _log_info(f"🎬 开始转换视频为ComfyUI对象...")
-                                video_obj = video_to_comfyui_video(video_path)
-                                if video_obj is not None:
-                                    video_info = f"模型: {model}, 参考图片: {len(reference_images)}张, 时长: {duration}, 分辨率: {resolution}, 宽高比: {aspect_ratio}, 帧率: {fps}fps, 任务ID: {task_id}"
-                                    return (video_obj, video_url, "✅ 多图参考视频生成成功", video_info, video_path)
-                                else:
-                                    _log_error("❌ 视频转换失败")
-                                    blank_video = create_blank_video_object()
-                                    blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                                    return (blank_video, video_url, "❌ 视频转换失败", "", blank_video_path)
-                            else:
-                                _log_error("❌ 视频下载失败")
-                                blank_video = create_blank_video_object()
-                                blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                                return (blank_video, video_url, "❌ 视频下载失败", "", blank_video_path)
-                        else:
-                            _log_error("❌ 未获取到视频URL")
-                            blank_video = create_blank_video_object()
-                            blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                            return (blank_video, "", "❌ 未获取到视频URL", "", blank_video_path)
-
-                    elif status.lower() in ["failed", "error"] or status in ["FAILED", "ERROR"]:
-                        fail_reason = status_result.get('fail_reason', '未知错误')
-                        _log_error(f"❌ 多图参考视频生成失败: {fail_reason}")
-                        blank_video = create_blank_video_object()
-                        blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-                        return (blank_video, "", f"❌ 视频生成失败: {fail_reason}", "", blank_video_path)
-
-                    elif status.lower() in ["running", "processing", "in_progress", "not_start", "queued"] or status in ["RUNNING", "PROCESSING", "IN_PROGRESS", "NOT_START", "QUEUED"]:
-                        _log_info(f"⏳ 任务进行中，状态: {status}")
-                        if poll_count < max_polls:
-                            time.sleep(poll_interval)
-                        continue
-                    else:
-                        _log_warning(f"⚠️ 未知任务状态: {status}")
-                        if poll_count < max_polls:
-                            time.sleep(poll_interval)
-                        continue
-                else:
-                    _log_warning(f"⚠️ 无法获取任务状态，响应: {status_response}")
-                    if poll_count < max_polls:
-                        time.sleep(poll_interval)
-                    continue
+            if not task_id:
+                _log_error(f"❌ 无法从响应中提取任务ID: {result}")
+                return None, blank_video_result("❌ 错误：无法获取任务ID")
 
-            # 超时处理
-            _log_error(f"❌ 多图参考视频生成超时")
-            blank_video = create_blank_video_object()
-            blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-            return (blank_video, "", "❌ 视频生成超时", "", blank_video_path)
+            _log_info(f"🎬 多图参考视频任务创建成功: {task_id}")
+            return task_id, None
 
         except Exception as e:
-            _log_error(f"❌ 多图参考视频生成异常: {e}")
-            blank_video = create_blank_video_object()
-            blank_video_path = getattr(blank_video, 'file_path', '') if blank_video else ''
-            return (blank_video, "", f"❌ 错误：{str(e)}", "", blank_video_path)
+            _log_error(f"❌ 解析任务创建响应失败: {e}")
+            return None, blank_video_result(f"❌ 错误：解析响应失败: {str(e)}")
+
+    def _handle_task_result(self, kind, status_result, task_id, video_info):
+        """根据轮询结果下载视频或返回失败信息"""
+        if kind == "succeeded":
+            _log_info(f"✅ 多图参考视频生成成功")
+
+            # 获取视频URL - 支持多种响应格式
+            video_url = extract_video_url(status_result)
+            if not video_url:
+                _log_error("❌ 未获取到视频URL")
+                return blank_video_result("❌ 未获取到视频URL")
+
+            _log_info(f"🎬 获取到视频URL: {video_url}")
+            return download_video_result(video_url, f"{video_info}, 任务ID: {task_id}", "✅ 多图参考视频生成成功")
+
+        if kind == "failed":
+            fail_reason = status_result.get('fail_reason', '未知错误')
+            _log_error(f"❌ 多图参考视频生成失败: {fail_reason}")
+            return blank_video_result(f"❌ 视频生成失败: {fail_reason}")
+
+        # 超时处理
+        _log_error(f"❌ 多图参考视频生成超时")
+        return blank_video_result("❌ 视频生成超时")
+
+    def _generation_failed_result(self, error):
+        _log_error(f"❌ 多图参考视频生成异常: {error}")
+        return blank_video_result(f"❌ 错误：{str(error)}")
 
 class VideoStitchingNode:
     """视频拼接节点 - 最多可以将8个视频拼接在一起"""
@@ -5530,7 +8633,7 @@ class GetLastFrameNode:
                 return (blank_image, f"❌ {error_msg}")
 
             _log_info(f"✅ 尾帧提取成功: {frame_path}")
-            return (image_tensor, frame_path)
+            return (validate_image_batch(image_tensor, owned=True), frame_path)
 
         except Exception as e:
             error_msg = f"提取视频尾帧失败: {str(e)}"
@@ -5742,6 +8845,7 @@ class DoubaoSeed16Node:
         
         if not mirror_options:
             mirror_options = ["comfly", "volcengine"]
+        mirror_options.append(AUTO_MIRROR)
         
         return {
             "required": {
@@ -5763,7 +8867,7 @@ class DoubaoSeed16Node:
 
     RETURN_TYPES = ("STRING", "STRING", "STRING")
     RETURN_NAMES = ("generated_text", "response_info", "usage_info")
-    FUNCTION = "generate_text"
+    FUNCTION = "generate_text_async" if ASYNC_NODE_EXECUTION else "generate_text"
     CATEGORY = "Ken-Chen/Doubao"
 
     def __init__(self):
@@ -5792,65 +8896,117 @@ class DoubaoSeed16Node:
             tuple: (生成的文本, 响应信息, 使用情况信息)
         """
         try:
-            _log_info(f"🤖 开始调用豆包大模型 {model} 进行文本生成...")
-            _log_info(f"📝 提示词: {prompt[:100]}...")
-            _log_info(f"🌐 使用镜像站: {mirror_site}")
+            response = None
+            # 自动模式下按健康度依次尝试候选镜像站，前一个失败时切换到下一个
+            for index, name in enumerate(resolve_mirror_candidates(mirror_site, "chat", model)):
+                request, error_result = self._prepare_request(prompt, name, model,
+                                                              candidate_api_key(name, api_key, mirror_site == AUTO_MIRROR),
+                                                              max_tokens, temperature, top_p, system_prompt, stream,
+                                                              presence_penalty, frequency_penalty)
+                if error_result:
+                    if index == 0:
+                        return error_result
+                    continue
 
-            # 获取镜像站配置
-            site_config = get_mirror_site_config(mirror_site)
-            api_url = site_config.get("url", "").strip()
-            api_format = site_config.get("api_format", "comfly")
+                # 调用API
+                api_url, candidate_key, request_data, api_format = request
+                response = self._call_doubao_api(api_url, candidate_key, request_data, stream, api_format)
+                if response is not None:
+                    break
+            return self._finish_generation(response, stream)
 
-            # 使用配置里的API格式；不再强制改写，避免端点和格式不一致
-            _log_info(f"🔧 API格式: {api_format}")
+        except Exception as e:
+            return self._generation_failed_result(e)
 
-            # 使用镜像站的API key（如果提供了的话）
-            if site_config.get("api_key") and not api_key.strip():
-                api_key = site_config.get("api_key")
-                _log_info(f"🔑 使用镜像站API密钥: {api_key[:10]}...")
+    async def generate_text_async(self, prompt, mirror_site="comfly", model="doubao-seed-1-6-250615", api_key="",
+                                  max_tokens=1000, temperature=0.7, top_p=0.9,
+                                  system_prompt="你是一个有帮助的AI助手，擅长文本生成和内容创作。",
+                                  stream=False, presence_penalty=0.0, frequency_penalty=0.0):
+        """generate_text的协程版本，等待API响应时不占用执行线程"""
+        try:
+            response = None
+            for index, name in enumerate(resolve_mirror_candidates(mirror_site, "chat", model)):
+                request, error_result = self._prepare_request(prompt, name, model,
+                                                              candidate_api_key(name, api_key, mirror_site == AUTO_MIRROR),
+                                                              max_tokens, temperature, top_p, system_prompt, stream,
+                                                              presence_penalty, frequency_penalty)
+                if error_result:
+                    if index == 0:
+                        return error_result
+                    continue
 
-            # 获取API密钥
-            if not api_key:
-                api_key = self._get_api_key()
-                if not api_key:
-                    error_msg = "未提供API密钥，请在节点中设置或配置环境变量DOUBAO_API_KEY"
-                    _log_error(error_msg)
-                    return ("", f"❌ {error_msg}", "")
+                api_url, candidate_key, request_data, api_format = request
+                response = await self._async_call_doubao_api(api_url, candidate_key, request_data, api_format)
+                if response is not None:
+                    break
+            return self._finish_generation(response, stream)
 
-            # 构建请求数据
-            request_data = {
-                "model": model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": max_tokens,
-                "temperature": temperature,
-                "top_p": top_p,
-                "stream": stream,
-                "presence_penalty": presence_penalty,
-                "frequency_penalty": frequency_penalty
-            }
+        except Exception as e:
+            return self._generation_failed_result(e)
 
-            # 调用API
-            response = self._call_doubao_api(api_url, api_key, request_data, stream, api_format)
-            
-            if response is None:
-                error_msg = "API调用失败"
+    def _prepare_request(self, prompt, mirror_site, model, api_key, max_tokens, temperature, top_p,
+                         system_prompt, stream, presence_penalty, frequency_penalty):
+        """解析镜像站并构建请求数据，返回 ((api_url, api_key, request_data, api_format), None) 或 (None, 错误结果)"""
+        _log_info(f"🤖 开始调用豆包大模型 {model} 进行文本生成...")
+        _log_info(f"📝 提示词: {prompt[:100]}...")
+        _log_info(f"🌐 使用镜像站: {mirror_site}")
+
+        # 获取镜像站配置
+        site_config = get_mirror_site_config(mirror_site)
+        api_url = site_config.get("url", "").strip()
+        api_format = site_config.get("api_format", "comfly")
+
+        # 使用配置里的API格式；不再强制改写，避免端点和格式不一致
+        _log_info(f"🔧 API格式: {api_format}")
+
+        # 使用镜像站的API key（如果提供了的话）
+        if site_config.get("api_key") and not api_key.strip():
+            api_key = site_config.get("api_key")
+            _log_info(f"🔑 使用镜像站API密钥: {api_key[:10]}...")
+
+        # 获取API密钥
+        if not api_key:
+            api_key = self._get_api_key()
+            if not api_key:
+                error_msg = "未提供API密钥，请在节点中设置或配置环境变量DOUBAO_API_KEY"
                 _log_error(error_msg)
-                return ("", f"❌ {error_msg}", "")
+                return None, ("", f"❌ {error_msg}", "")
+
+        # 构建请求数据
+        request_data = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "top_p": top_p,
+            "stream": stream,
+            "presence_penalty": presence_penalty,
+            "frequency_penalty": frequency_penalty
+        }
 
-            # 解析响应
-            generated_text, response_info, usage_info = self._parse_response(response, stream)
-            
-            _log_info(f"✅ 文本生成成功，长度: {len(generated_text)} 字符")
-            return (generated_text, response_info, usage_info)
+        return (api_url, api_key, request_data, api_format), None
 
-        except Exception as e:
-            error_msg = f"文本生成失败: {str(e)}"
+    def _finish_generation(self, response, stream=False):
+        """把解析后的API响应转换为节点输出"""
+        if response is None:
+            error_msg = "API调用失败"
             _log_error(error_msg)
             return ("", f"❌ {error_msg}", "")
 
+        # 解析响应
+        generated_text, response_info, usage_info = self._parse_response(response, stream)
+
+        _log_info(f"✅ 文本生成成功，长度: {len(generated_text)} 字符")
+        return (generated_text, response_info, usage_info)
+
+    def _generation_failed_result(self, error):
+        error_msg = f"文本生成失败: {str(error)}"
+        _log_error(error_msg)
+        return ("", f"❌ {error_msg}", "")
+
     def _get_api_key(self):
         """获取API密钥"""
         # 优先从环境变量获取
@@ -5875,57 +9031,8 @@ class DoubaoSeed16Node:
     def _call_doubao_api(self, api_url, api_key, request_data, stream=False, api_format="volcengine"):
         """调用豆包大模型API"""
         try:
-            import requests
-            import json
-
-            # 按格式构建端点
-            if api_format == "volcengine":
-                # 火山引擎官方: 基础是 /api/v3
-                # chat 走 /chat/completions
-                if api_url.endswith('/'):
-                    api_url = api_url + 'chat/completions'
-                elif api_url.endswith('/api/v3'):
-                    api_url = api_url + '/chat/completions'
-                elif api_url.endswith('/api/v3/'):
-                    api_url = api_url + 'chat/completions'
-                elif not api_url.endswith('/chat/completions'):
-                    api_url = api_url.rstrip('/') + '/chat/completions'
-            else:
-                # 其它镜像按其自身（如 comfly 的 /v1/chat/completions）
-                if not api_url.endswith('/chat/completions'):
-                    api_url = api_url.rstrip('/') + '/chat/completions'
-            
-            # 设置请求头
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-                "User-Agent": "ComfyUI-Doubao-Seed/2.0.0"
-            }
-
-            _log_info(f"🌐 调用API: {api_url}")
-            _log_info(f"📊 请求参数: model={request_data['model']}, max_tokens={request_data['max_tokens']}")
-            _log_info(f"🔧 API格式: {api_format}")
-
-            # 发送请求
-            response = requests.post(
-                api_url,
-                headers=headers,
-                json=request_data,
-                timeout=self.timeout
-            )
-
-            if response.status_code == 200:
-                _log_info("✅ API调用成功")
-                try:
-                    return response.json()
-                except json.JSONDecodeError as e:
-                    _log_error(f"❌ JSON解析失败: {e}")
-                    _log_error(f"响应内容: {response.text[:500]}...")
-                    return None
-            else:
-                _log_error(f"❌ API调用失败: {response.status_code}")
-                _log_error(f"响应内容: {response.text}")
-                return None
+            response = call_chat_api(api_url, api_key, request_data, api_format, timeout=self.timeout)
+            return self._handle_chat_response(response)
 
         except requests.exceptions.Timeout:
             _log_error("❌ API调用超时")
@@ -5937,6 +9044,31 @@ class DoubaoSeed16Node:
             _log_error(f"❌ API调用异常: {str(e)}")
             return None
 
+    async def _async_call_doubao_api(self, api_url, api_key, request_data, api_format="volcengine"):
+        """异步调用豆包大模型API"""
+        try:
+            response = await async_call_chat_api(api_url, api_key, request_data, api_format, timeout=self.timeout)
+            return self._handle_chat_response(response)
+
+        except Exception as e:
+            _log_error(f"❌ API调用异常: {str(e)}")
+            return None
+
+    def _handle_chat_response(self, response):
+        """检查HTTP响应并解析JSON，失败时返回None"""
+        if response.status_code == 200:
+            _log_info("✅ API调用成功")
+            try:
+                return response.json()
+            except ValueError as e:
+                _log_error(f"❌ JSON解析失败: {e}")
+                _log_error(f"响应内容: {response.text[:500]}...")
+                return None
+        else:
+            _log_error(f"❌ API调用失败: {response.status_code}")
+            _log_error(f"响应内容: {response.text}")
+            return None
+
     def _parse_response(self, response, stream=False):
         """解析API响应"""
         try:
@@ -5994,6 +9126,7 @@ class DoubaoComicBookNode:
         
         if not mirror_options:
             mirror_options = ["comfly", "volcengine"]
+        mirror_options.append(AUTO_MIRROR)
         
         return {
             "required": {
@@ -6169,7 +9302,7 @@ class DoubaoComicBookNode:
                 generation_info += "⚠️ 使用默认图像作为降级方案\n"
             else:
                 # 4. 组合所有图像为连环画批次（不拼接，按批次输出以便分页浏览）
-                final_comic = self._stack_images_as_batch(comic_images)
+                final_comic = validate_image_batch(self._stack_images_as_batch(comic_images), owned=True)
             
             _log_info(f"✅ 连环画创作完成，共生成 {len(comic_images)} 个场景")
             return (final_comic, story_structure, self._format_story_structure(scenes), generation_info)
@@ -6449,65 +9582,67 @@ JSON格式要求：
     def _generate_scene_image(self, scene, mirror_site, image_model, image_style, 
                              resolution, aspect_ratio, reference_images, reference_mode, watermark, api_key, scene_index=0):
         """生成场景图像"""
-        for attempt in range(self.max_retries):
-            try:
-                _log_info(f"🎨 尝试生成场景图像 (第 {attempt + 1}/{self.max_retries} 次)")
+        # 场景级重试与内部图像节点的请求重试共享同一个截止时间
+        policy = get_retry_policy(self.max_retries, self.timeout)
+        with retry_budget(policy):
+            for attempt in range(policy.max_attempts):
+                try:
+                    _log_info(f"🎨 尝试生成场景图像 (第 {attempt + 1}/{policy.max_attempts} 次)")
                 
-                # 构建图像生成提示词
-                image_prompt = f"{scene['description']}, {image_style} style, high quality, detailed"
+                    # 构建图像生成提示词
+                    image_prompt = f"{scene['description']}, {image_style} style, high quality, detailed"
                 
-                # 选择参考图片（循环使用多张参考图片）
-                selected_reference = None
-                if reference_images and len(reference_images) > 0:
-                    selected_reference = reference_images[scene_index % len(reference_images)]
-                    _log_info(f"🎨 使用参考图片 {scene_index % len(reference_images) + 1}/{len(reference_images)}")
+                    # 选择参考图片（循环使用多张参考图片）
+                    selected_reference = None
+                    if reference_images and len(reference_images) > 0:
+                        selected_reference = reference_images[scene_index % len(reference_images)]
+                        _log_info(f"🎨 使用参考图片 {scene_index % len(reference_images) + 1}/{len(reference_images)}")
                 
-                # 调用图像生成API
-                if reference_mode == "multi_fusion" and reference_images and len(reference_images) > 0:
-                    image_node = SeedReam4APINode()
-                    kwargs = {}
-                    for idx, img in enumerate(reference_images[:14]):
-                        kwargs[f"image{idx+1}"] = img
-                    generated_image, _, _ = image_node.generate_image(
-                        prompt=image_prompt,
-                        mirror_site=mirror_site,
-                        model=image_model,
-                        resolution=resolution,
-                        aspect_ratio=aspect_ratio,
-                        api_key=api_key,
-                        watermark=watermark,
-                        sequential_image_generation="disabled",
-                        max_images=1,
-                        **kwargs
-                    )
-                else:
-                    image_node = SeedReam4APISingleNode()
-                    generated_image, _, _ = image_node.generate_image(
-                        prompt=image_prompt,
-                        mirror_site=mirror_site,
-                        model=image_model,
-                        resolution=resolution,
-                        aspect_ratio=aspect_ratio,
-                        api_key=api_key,
-                        watermark=watermark,
-                        image=selected_reference
-                    )
+                    # 调用图像生成API
+                    if reference_mode == "multi_fusion" and reference_images and len(reference_images) > 0:
+                        image_node = SeedReam4APINode()
+                        kwargs = {}
+                        for idx, img in enumerate(reference_images[:14]):
+                            kwargs[f"image{idx+1}"] = img
+                        generated_image, _, _ = image_node.generate_image(
+                            prompt=image_prompt,
+                            mirror_site=mirror_site,
+                            model=image_model,
+                            resolution=resolution,
+                            aspect_ratio=aspect_ratio,
+                            api_key=api_key,
+                            watermark=watermark,
+                            sequential_image_generation="disabled",
+                            max_images=1,
+                            **kwargs
+                        )
+                    else:
+                        image_node = SeedReam4APISingleNode()
+                        generated_image, _, _ = image_node.generate_image(
+                            prompt=image_prompt,
+                            mirror_site=mirror_site,
+                            model=image_model,
+                            resolution=resolution,
+                            aspect_ratio=aspect_ratio,
+                            api_key=api_key,
+                            watermark=watermark,
+                            image=selected_reference
+                        )
                 
-                if generated_image is not None:
-                    _log_info("✅ 场景图像生成成功")
-                    return generated_image
-                else:
-                    _log_warning(f"第 {attempt + 1} 次尝试返回空图像")
+                    if generated_image is not None:
+                        _log_info("✅ 场景图像生成成功")
+                        return generated_image
+                    else:
+                        _log_warning(f"第 {attempt + 1} 次尝试返回空图像")
 
-            except Exception as e:
-                _log_error(f"第 {attempt + 1} 次场景图像生成失败: {str(e)}")
-                if attempt == self.max_retries - 1:
-                    _log_error("所有重试尝试都失败了")
-                    return None
-                else:
-                    _log_info(f"等待 {2 ** attempt} 秒后重试...")
-                    import time
-                    time.sleep(2 ** attempt)  # 指数退避
+                except Exception as e:
+                    _log_error(f"第 {attempt + 1} 次场景图像生成失败: {str(e)}")
+                    delay = policy.retry_delay(attempt)  # 指数退避
+                    if not policy.should_retry(attempt, delay):
+                        _log_error("所有重试尝试都失败了")
+                        return None
+                    _log_info(f"等待 {delay:.0f} 秒后重试...")
+                    time.sleep(delay)
 
         return None
 
@@ -7950,6 +11085,8 @@ NODE_CLASS_MAPPINGS = {
     "SeedReam4APINode": SeedReam4APINode,
     "SeedReam4APISingleNode": SeedReam4APISingleNode,
     "DoubaoSeedanceVideoNode": DoubaoSeedanceVideoNode,
+    "DoubaoSeedanceVideoSubmitNode": DoubaoSeedanceVideoSubmitNode,
+    "DoubaoSeedanceVideoAwaitNode": DoubaoSeedanceVideoAwaitNode,
     "DoubaoSeedanceContinuousVideoNode": DoubaoSeedanceContinuousVideoNode,
     "DoubaoSeedanceMultiRefVideoNode": DoubaoSeedanceMultiRefVideoNode,
     "DoubaoSeed16Node": DoubaoSeed16Node,
@@ -7965,6 +11102,8 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "SeedReam4APINode": "SeedReam4API (多图)",
     "SeedReam4APISingleNode": "SeedReam4API (单图)",
     "DoubaoSeedanceVideoNode": "Doubao-Seedance视频生成",
+    "DoubaoSeedanceVideoSubmitNode": "Doubao-Seedance视频任务提交",
+    "DoubaoSeedanceVideoAwaitNode": "Doubao-Seedance视频任务等待",
     "DoubaoSeedanceContinuousVideoNode": "Doubao-Seedance连续视频生成",
     "DoubaoSeedanceMultiRefVideoNode": "Doubao-Seedance多图参考视频生成",
     "DoubaoSeed16Node": "doubao-seed-1-6",
@@ -0,0 +1,24 @@
+# 测试直接导入插件目录下的 doubao_seed 模块（不经过ComfyUI加载）
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import doubao_seed  # noqa: E402
+
+
+@pytest.fixture
+def ds():
+    return doubao_seed
+
+
+@pytest.fixture
+def config_section(monkeypatch):
+    """在测试期间覆盖某个缓存的配置段：config_section("downloads", doubao_seed.DOWNLOAD_DEFAULTS, timeout=5)"""
+    def override(name, defaults, **values):
+        section = {**defaults, **values}
+        monkeypatch.setitem(doubao_seed._config_section_cache, name, section)
+        return section
+    return override
@@ -0,0 +1,88 @@
+import asyncio
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+
+@pytest.mark.parametrize("setting, expected", [(True, True), (False, False), ("true", True), ("False", False), (0, False)])
+def test_explicit_async_setting(ds, monkeypatch, setting, expected):
+    monkeypatch.setattr(ds, "get_seedream4_config", lambda: {"async_nodes": setting})
+    assert ds._resolve_async_node_execution() is expected
+
+
+def test_auto_setting_detects_async_executor(ds, monkeypatch):
+    monkeypatch.setattr(ds, "get_seedream4_config", lambda: {"async_nodes": "auto"})
+    monkeypatch.delitem(sys.modules, "execution", raising=False)
+    assert ds._resolve_async_node_execution() is False
+    monkeypatch.setitem(sys.modules, "execution", types.SimpleNamespace(_async_map_node_over_list=None))
+    assert ds._resolve_async_node_execution() is True
+
+
+def test_node_functions_follow_setting(ds):
+    for node in (ds.SeedReam4APINode, ds.SeedReam4APISingleNode, ds.DoubaoSeedanceVideoNode,
+                 ds.DoubaoSeedanceMultiRefVideoNode, ds.DoubaoSeed16Node):
+        assert node.FUNCTION.endswith("_async") == ds.ASYNC_NODE_EXECUTION
+        assert asyncio.iscoroutinefunction(getattr(node, node.FUNCTION)) == ds.ASYNC_NODE_EXECUTION
+
+
+def test_transport_loop_facades(ds):
+    async def where():
+        await asyncio.sleep(0)
+        return threading.current_thread().name, ds.current_retry_policy()
+
+    policy = ds.RetryPolicy(total_budget=60)
+    with ds.retry_budget(policy):
+        name, seen = ds.run_in_transport_loop(where(), timeout=5)
+    assert name == "DoubaoSeedTransportLoop" and seen is policy
+
+    name, _ = asyncio.run(ds.await_in_transport_loop(where()))
+    assert name == "DoubaoSeedTransportLoop"
+
+    async def nested():
+        return ds.run_in_transport_loop(where())
+
+    with pytest.raises(RuntimeError):
+        ds.run_in_transport_loop(nested(), timeout=5)
+
+
+class _Response:
+    status_code = 200
+
+
+@pytest.fixture
+def image_node(ds, monkeypatch):
+    calls = []
+
+    def prepare_request(self, **kwargs):
+        return ((["target"], {"prompt": kwargs["prompt"], "n": 1}), None)
+
+    async def call_api(targets, payload, timeout, max_retries, hedge):
+        calls.append(payload["prompt"])
+        await asyncio.sleep(0.3)  # 等待API时不占用执行线程
+        return _Response()
+
+    monkeypatch.setattr(ds.SeedReam4APINode, "_prepare_request", prepare_request)
+    monkeypatch.setattr(ds, "result_cache_key", lambda payload: None)
+    monkeypatch.setattr(ds, "async_call_image_api_with_retries", call_api)
+    monkeypatch.setattr(ds, "finish_image_generation",
+                        lambda response, response_format, output_dtype: (response.status_code, output_dtype))
+    node = ds.SeedReam4APINode.__new__(ds.SeedReam4APINode)
+    node.timeout, node.max_retries = 900, 3
+    return node, calls
+
+
+def test_async_image_nodes_run_concurrently(image_node):
+    node, calls = image_node
+
+    async def run_all():
+        return await asyncio.gather(*[node.generate_image_async(prompt=f"p{i}", output_dtype="float16")
+                                      for i in range(4)])
+
+    started = time.monotonic()
+    results = asyncio.run(run_all())
+    assert time.monotonic() - started < 0.3 * 2
+    assert results == [(200, "float16")] * 4
+    assert sorted(calls) == ["p0", "p1", "p2", "p3"]
@@ -0,0 +1,66 @@
+import io
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+
+def _lazy(image, format="PNG"):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def _noise(size, mode="RGB", seed=0):
+    channels = {"RGB": 3, "RGBA": 4}.get(mode)
+    shape = (size[1], size[0], channels) if channels else (size[1], size[0])
+    return Image.fromarray(np.random.default_rng(seed).integers(0, 256, shape, dtype=np.uint8), mode)
+
+
+@pytest.mark.parametrize("count", [1, 3])
+def test_decoded_batch_matches_pil2tensor(ds, count):
+    sources = [_noise((16, 12), seed=i) for i in range(count)]
+    batch = ds.decode_images_to_batch([_lazy(image) for image in sources])
+    expected = torch.cat([ds.pil2tensor(image) for image in sources])
+    assert batch.dtype == torch.float32 and tuple(batch.shape) == (count, 12, 16, 3)
+    assert torch.equal(batch, expected)
+
+
+def test_other_modes_and_sizes_are_converted(ds):
+    rgba, gray, larger = _noise((16, 12), "RGBA"), _noise((16, 12), "L"), _noise((32, 24), seed=3)
+    batch = ds.decode_images_to_batch([_lazy(rgba), _lazy(gray), _lazy(larger)])
+    assert tuple(batch.shape) == (3, 12, 16, 3)
+    assert torch.equal(batch[0], ds.pil2tensor(rgba)[0])
+    assert torch.equal(batch[1], ds.pil2tensor(gray)[0])
+    assert torch.allclose(batch[2], ds.pil2tensor(larger.resize((16, 12), Image.Resampling.LANCZOS))[0])
+
+
+def test_float16_batch_is_decoded_directly(ds):
+    source = _noise((16, 12))
+    batch = ds.decode_images_to_batch([_lazy(source)], torch.float16)
+    assert batch.dtype == torch.float16
+    assert torch.allclose(batch.float(), ds.pil2tensor(source)[0:1], atol=1e-3)
+
+
+def test_broken_image_becomes_white_and_marks_result_incomplete(ds):
+    good = _lazy(_noise((8, 8)))
+    buffer = io.BytesIO()
+    _noise((8, 8)).save(buffer, format="PNG")
+    broken = Image.open(io.BytesIO(buffer.getvalue()[:60]))
+    with ds.caching_results("key", expected=2):
+        batch = ds.decode_images_to_batch([good, broken])
+        scope = ds._result_cache_scope_var.get()
+        assert scope.incomplete is not None
+    assert torch.all(batch[1] == 1.0)
+    assert not torch.all(batch[0] == 1.0)
+
+
+def test_mixed_sizes_are_letterboxed_without_distortion(ds):
+    square = _noise((12, 12), seed=1)
+    wide = [_noise((16, 12), seed=seed) for seed in (2, 3)]
+    batch = ds.decode_images_to_batch([_lazy(square)] + [_lazy(image) for image in wide])
+    assert tuple(batch.shape) == (3, 12, 16, 3)  # 按多数图像的尺寸分配批次
+    assert torch.equal(batch[1], ds.pil2tensor(wide[0])[0])
+    assert torch.equal(batch[0, :, 2:14], ds.pil2tensor(square)[0])
+    assert torch.all(batch[0, :, :2] == 1.0) and torch.all(batch[0, :, 14:] == 1.0)
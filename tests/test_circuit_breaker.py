@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+
+def _expire(breaker):
+    """让打开状态的熔断器立即到达半开时间"""
+    breaker._opened_at -= breaker.reset_timeout
+
+
+def test_opens_after_consecutive_failures(ds):
+    breaker = ds.CircuitBreaker("mirror", failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == breaker.CLOSED and breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+    assert not breaker.allow_request() and not breaker.available()
+    assert 0 < breaker.retry_after() <= 30
+
+
+def test_success_resets_failure_count(ds):
+    breaker = ds.CircuitBreaker("mirror", failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == breaker.CLOSED
+
+
+def test_half_open_admits_limited_trials(ds):
+    breaker = ds.CircuitBreaker("mirror", failure_threshold=1, half_open_max_calls=1)
+    breaker.record_failure()
+    _expire(breaker)
+    assert breaker.state == breaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.release_trial()
+    assert breaker.allow_request()
+
+
+def test_half_open_trial_outcome(ds):
+    breaker = ds.CircuitBreaker("mirror", failure_threshold=3)
+    for _ in range(3):
+        breaker.record_failure()
+    _expire(breaker)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == breaker.OPEN
+
+    _expire(breaker)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED and breaker.allow_request()
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+@pytest.fixture
+def breakers(ds, monkeypatch, config_section):
+    monkeypatch.setattr(ds, "_circuit_breakers", {})
+    config_section("circuit_breaker", ds.CIRCUIT_BREAKER_DEFAULTS, failure_threshold=2)
+    return ds._circuit_breakers
+
+
+def test_request_outcomes_drive_per_endpoint_breaker(ds, breakers):
+    url = "https://mirror.example.com/v1/images/generations"
+    kind = ds.classify_endpoint("POST", url)
+    assert kind is not None
+    for status in (500, 429):
+        ds._acquire_circuit("POST", url)
+        ds._record_request_outcome("POST", url, 0.0, _Response(status))
+    with pytest.raises(ds.CircuitOpenError):
+        ds._acquire_circuit("POST", url)
+    assert not ds.circuit_allows(url, kind)
+    assert ds.circuit_allows("https://other.example.com/v1/images/generations", kind)
+
+
+def test_client_errors_do_not_open_breaker(ds, breakers):
+    url = "https://mirror.example.com/v1/images/generations"
+    for _ in range(5):
+        ds._acquire_circuit("POST", url)
+        ds._record_request_outcome("POST", url, 0.0, _Response(400))
+    assert ds._acquire_circuit("POST", url).state == ds.CircuitBreaker.CLOSED
+
+
+def test_non_api_requests_bypass_breaker(ds, breakers):
+    assert ds._acquire_circuit("GET", "https://cdn.example.com/out.png") is None
+
+
+class _Failure:
+    status_code = 500
+    text = "upstream error"
+    headers = {}
+
+
+@pytest.fixture
+def image_targets(ds, breakers, monkeypatch, config_section):
+    config_section("retry_policy", ds.RETRY_POLICY_DEFAULTS, backoff_base=0)
+    monkeypatch.setattr(ds.time, "sleep", lambda seconds: None)
+    calls = []
+
+    def call_image_api(api_format, api_url, api_key, payload, timeout):
+        calls.append(api_url)
+        return _Failure()
+
+    async def async_call_image_api(api_format, api_url, api_key, payload, timeout):
+        return call_image_api(api_format, api_url, api_key, payload, timeout)
+
+    monkeypatch.setattr(ds, "call_image_api", call_image_api)
+    monkeypatch.setattr(ds, "async_call_image_api", async_call_image_api)
+    targets = [ds.MirrorTarget(name, f"https://{name}.example.com/v1", "comfly", "sk") for name in ("a", "b")]
+    return targets, calls
+
+
+def _open(ds, target):
+    breaker = ds.get_circuit_breaker(target.api_url, "image")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_open_breaker_skip_does_not_use_an_attempt(ds, image_targets):
+    targets, calls = image_targets
+    _open(ds, targets[0])
+    response = ds.call_image_api_with_retries(targets, {}, timeout=30, max_retries=3)
+    assert response.status_code == 500
+    assert calls == [targets[1].api_url] * 3
+
+    calls.clear()
+    asyncio.run(ds.async_call_image_api_with_retries(targets, {}, timeout=30, max_retries=3))
+    assert calls == [targets[1].api_url] * 3
+
+
+def test_all_breakers_open_fails_fast(ds, image_targets):
+    targets, calls = image_targets
+    for target in targets:
+        _open(ds, target)
+    assert ds.call_image_api_with_retries(targets, {}, timeout=30, max_retries=3) is None
+    assert calls == []
@@ -0,0 +1,104 @@
+import json
+import os
+
+import pytest
+
+
+@pytest.fixture
+def make_cache(ds, tmp_path):
+    def make(max_bytes=100, ttl=0):
+        return ds.DiskLRUCache(str(tmp_path / "cache"), max_bytes, ttl)
+    return make
+
+
+def _index(cache):
+    with open(os.path.join(cache.directory, cache.INDEX_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_put_get_and_lru_eviction(make_cache):
+    cache = make_cache(max_bytes=100)
+    cache.put("a", b"x" * 40, {"n": 1})
+    cache.put("b", b"x" * 40)
+    assert cache.get("a")[1] == {"n": 1}  # a 变为最近使用
+    cache.put("c", b"x" * 40)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert sorted(os.listdir(cache.directory)) == ["a", "c", "index.json"]
+
+
+def test_oversized_entry_is_not_cached(make_cache):
+    cache = make_cache(max_bytes=10)
+    assert cache.put("big", b"x" * 11) is None
+    assert cache.get("big") is None
+
+
+def test_ttl_expiry(make_cache, monkeypatch, ds):
+    cache = make_cache(ttl=60)
+    cache.put("a", b"data")
+    now = ds.time.time()
+    monkeypatch.setattr(ds.time, "time", lambda: now + 61)
+    assert cache.get("a") is None
+    assert not os.path.exists(os.path.join(cache.directory, "a"))
+
+
+def test_hits_defer_index_writes(make_cache):
+    cache = make_cache()
+    cache.put("a", b"data")
+    before = _index(cache)["a"]["accessed"]
+    index_path = os.path.join(cache.directory, cache.INDEX_FILE)
+    os.remove(index_path)
+    for _ in range(5):
+        assert cache.get("a") is not None
+    assert not os.path.exists(index_path)
+    cache.flush()
+    assert _index(cache)["a"]["accessed"] > before
+
+
+def test_put_file_copies_source(make_cache, tmp_path):
+    cache = make_cache()
+    source = tmp_path / "output.mp4"
+    source.write_bytes(b"original")
+    path = cache.put_file("video", str(source))
+    assert os.stat(path).st_ino != os.stat(source).st_ino
+    source.write_bytes(b"edited!!")
+    with open(cache.get("video")[0], "rb") as f:
+        assert f.read() == b"original"
+
+
+@pytest.mark.parametrize("index_content", [None, "{not json", "[]"])
+def test_lost_index_is_rebuilt_from_directory(make_cache, index_content):
+    cache = make_cache(max_bytes=100)
+    cache.put("a", b"x" * 40)
+    cache.put("b", b"x" * 40)
+    index_path = os.path.join(cache.directory, cache.INDEX_FILE)
+    if index_content is None:
+        os.remove(index_path)
+    else:
+        with open(index_path, "w") as f:
+            f.write(index_content)
+
+    reopened = make_cache(max_bytes=100)
+    assert reopened.get("a") is not None
+    assert sorted(_index(reopened)) == ["a", "b"]
+    # 重建的条目计入容量，写入新条目时会被淘汰
+    reopened.put("c", b"x" * 40)
+    assert sorted(name for name in os.listdir(cache.directory) if name != "index.json") == ["a", "c"]
+
+
+def test_index_entries_without_files_are_dropped(make_cache):
+    cache = make_cache()
+    cache.put("a", b"data")
+    os.remove(os.path.join(cache.directory, "a"))
+    reopened = make_cache()
+    reopened.put("b", b"data")
+    assert list(_index(reopened)) == ["b"]
+
+
+def test_download_cache_round_trip(ds, config_section, monkeypatch, tmp_path):
+    config_section("download_cache", ds.DOWNLOAD_CACHE_DEFAULTS, directory=str(tmp_path / "downloads"))
+    monkeypatch.setattr(ds, "_download_cache", None)
+    url = "https://cdn.example/result.png?sig=1"
+    assert ds.read_download_cache(url) is None
+    ds.write_download_cache(url, b"png bytes")
+    assert ds.read_download_cache(url) == b"png bytes"
@@ -0,0 +1,99 @@
+import pytest
+import torch
+
+
+def _encoded(ds, size):
+    return ds.EncodedImage(b"x" * size, "image/png")
+
+
+def test_lru_eviction_by_bytes(ds):
+    cache = ds.EncodedImageCache()
+    cache.put("a", _encoded(ds, 40), max_bytes=100)
+    cache.put("b", _encoded(ds, 40), max_bytes=100)
+    assert cache.get("a") is not None  # a 变为最近使用
+    cache.put("c", _encoded(ds, 40), max_bytes=100)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache._bytes == 80
+
+
+def test_oversized_entry_is_not_cached(ds):
+    cache = ds.EncodedImageCache()
+    cache.put("big", _encoded(ds, 200), max_bytes=100)
+    assert cache.get("big") is None and cache._bytes == 0
+
+
+def test_replacing_entry_updates_size(ds):
+    cache = ds.EncodedImageCache()
+    cache.put("a", _encoded(ds, 60), max_bytes=100)
+    cache.put("a", _encoded(ds, 30), max_bytes=100)
+    assert cache._bytes == 30
+
+
+def test_content_key_tracks_data_shape_and_params(ds):
+    image = torch.rand(1, 8, 8, 3)
+    key = ds.tensor_content_key(image, 2048)
+    assert key == ds.tensor_content_key(image.clone(), 2048)
+    assert key != ds.tensor_content_key(image, 1024)
+    assert key != ds.tensor_content_key(image.reshape(1, 8, 3, 8), 2048)
+    changed = image.clone()
+    changed[0, 0, 0, 0] += 0.5
+    assert key != ds.tensor_content_key(changed, 2048)
+
+
+@pytest.fixture
+def cache(ds, monkeypatch, config_section):
+    config_section("encode_cache", ds.ENCODE_CACHE_DEFAULTS)
+    config_section("image_encoder", ds.IMAGE_ENCODER_DEFAULTS)
+    cache = ds.EncodedImageCache()
+    monkeypatch.setattr(ds, "ENCODED_IMAGE_CACHE", cache)
+    calls = []
+    encode_frame = ds.encode_frame
+
+    def counting_encode_frame(*args, **kwargs):
+        calls.append(args)
+        return encode_frame(*args, **kwargs)
+
+    monkeypatch.setattr(ds, "encode_frame", counting_encode_frame)
+    return calls
+
+
+def test_repeated_upload_encodes_once(ds, cache):
+    image = torch.rand(1, 32, 32, 3)
+    first = ds.encode_image_for_upload(image)
+    second = ds.encode_image_for_upload(image.clone())
+    assert second is first
+    assert len(cache) == 1
+    ds.encode_image_for_upload(image, max_size=16)
+    assert len(cache) == 2
+
+
+def test_disabled_cache_always_encodes(ds, cache, config_section):
+    config_section("encode_cache", ds.ENCODE_CACHE_DEFAULTS, enabled=False)
+    image = torch.rand(1, 32, 32, 3)
+    ds.encode_image_for_upload(image)
+    ds.encode_image_for_upload(image)
+    assert len(cache) == 2
+
+
+def test_cache_hit_skips_quantization(ds, cache, monkeypatch):
+    quantized = []
+    tensor_batch_to_uint8 = ds.tensor_batch_to_uint8
+
+    def counting(image_tensor):
+        quantized.append(tuple(image_tensor.shape))
+        return tensor_batch_to_uint8(image_tensor)
+
+    monkeypatch.setattr(ds, "tensor_batch_to_uint8", counting)
+    stitched = torch.rand(2, 16, 16, 3)
+    first = ds.encode_image_for_upload(stitched)
+    assert ds.encode_image_for_upload(stitched.clone()) is first
+    assert quantized == [(2, 16, 16, 3)]
+
+    frames = torch.rand(2, 16, 16, 3)
+    encoded = ds.encode_images_for_upload([frames])
+    quantized.clear()
+    mixed = torch.stack([frames[1], torch.rand(16, 16, 3), frames[0]])
+    again = ds.encode_images_for_upload([mixed])
+    assert quantized == [(1, 16, 16, 3)]
+    assert again[0] is encoded[1] and again[2] is encoded[0] and again[1] is not None
@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import pytest
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeMirrors:
+    """按镜像站地址模拟 (延迟, 结果) 的图像接口；结果为异常时抛出"""
+
+    def __init__(self, ds, **behaviour):
+        self.ds = ds
+        self.behaviour = behaviour
+        self.calls = []
+        self.cancelled = []
+
+    async def call(self, api_format, api_url, api_key, payload, timeout):
+        name = api_url.split("//")[1].split(".")[0]
+        self.calls.append(name)
+        delay, result = self.behaviour[name]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(name)
+            raise
+        if isinstance(result, Exception):
+            raise result
+        return _Response(result)
+
+    def target(self, name):
+        return self.ds.MirrorTarget(name, f"https://{name}.example.com/v1", "comfly", "sk")
+
+
+@pytest.fixture
+def mirrors(ds, monkeypatch, config_section):
+    config_section("hedging", ds.HEDGING_DEFAULTS, min_delay=0.1, default_delay=0.1)
+    monkeypatch.setattr(ds, "MIRROR_HEALTH", ds.MirrorHealthTracker())
+
+    def make(**behaviour):
+        fake = FakeMirrors(ds, **behaviour)
+        monkeypatch.setattr(ds, "async_call_image_api", fake.call)
+        return fake
+    return make
+
+
+def _hedge(ds, fake, payload=None):
+    return asyncio.run(ds.async_call_image_api_hedged(fake.target("primary"), fake.target("backup"), payload or {}))
+
+
+def test_fast_primary_sends_no_hedge(ds, mirrors):
+    fake = mirrors(primary=(0.01, 200), backup=(0.01, 200))
+    assert _hedge(ds, fake).status_code == 200
+    assert fake.calls == ["primary"]
+
+
+def test_slow_primary_is_hedged_and_cancelled(ds, mirrors):
+    fake = mirrors(primary=(5, 200), backup=(0.05, 200))
+    started = time.monotonic()
+    assert _hedge(ds, fake).status_code == 200
+    assert time.monotonic() - started < 1
+    assert fake.calls == ["primary", "backup"] and fake.cancelled == ["primary"]
+
+
+def test_failed_hedge_waits_for_primary(ds, mirrors):
+    fake = mirrors(primary=(0.4, 200), backup=(0.01, 500))
+    assert _hedge(ds, fake).status_code == 200
+
+    fake = mirrors(primary=(0.4, 200), backup=(0, ds.CircuitOpenError("backup open")))
+    assert _hedge(ds, fake).status_code == 200
+    assert fake.cancelled == []
+
+
+def test_both_failing_returns_last_failure(ds, mirrors):
+    fake = mirrors(primary=(0.3, 503), backup=(0.01, 500))
+    assert _hedge(ds, fake).status_code == 503
+
+    fake = mirrors(primary=(0.3, ConnectionError("reset")), backup=(0, ConnectionError("refused")))
+    with pytest.raises(ConnectionError):
+        _hedge(ds, fake)
+
+
+def test_hedge_delay_follows_primary_latency(ds, mirrors, config_section):
+    fake = mirrors()
+    primary = fake.target("primary")
+    assert ds.hedge_delay(primary) == 0.1
+    config_section("hedging", ds.HEDGING_DEFAULTS, min_delay=1, latency_percentile=50)
+    for latency in (2.0, 3.0, 30.0):
+        ds.MIRROR_HEALTH.record(ds._host_key(primary.api_url), "image", latency, True)
+    assert ds.hedge_delay(primary) == 3.0
@@ -0,0 +1,76 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.clients.add(self.client_address)
+        self.server.requests += 1
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def sessions(ds, monkeypatch):
+    monkeypatch.setattr(ds, "_http_sessions", {})
+    yield ds._http_sessions
+    ds.close_http_sessions()
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    server.clients = set()
+    server.requests = 0
+    server.status = 200
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def test_sessions_are_shared_per_host(ds, sessions):
+    first = ds.get_http_session("https://Mirror.example/v1/images")
+    assert ds.get_http_session("https://mirror.example/v1/videos") is first
+    assert ds.get_http_session("https://other.example/v1") is not first
+    assert ds.get_http_session("http://mirror.example/v1") is not first
+    assert set(sessions) == {"https://mirror.example", "https://other.example", "http://mirror.example"}
+
+
+def test_pool_size_follows_config(ds, sessions, monkeypatch):
+    monkeypatch.setattr(ds, "get_http_pool_config", lambda: dict(ds.HTTP_POOL_DEFAULTS, pool_maxsize=7))
+    adapter = ds.get_http_session("https://mirror.example").get_adapter("https://mirror.example")
+    assert isinstance(adapter, ds.SSLAdapter)
+    assert adapter._pool_maxsize == 7
+
+
+def test_requests_to_one_host_reuse_a_connection(ds, sessions, server):
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    for _ in range(5):
+        assert ds.get_http_session(url).get(url, timeout=5).text == "ok"
+    assert len(server.clients) == 1
+
+
+def test_close_http_sessions_clears_registry(ds, sessions):
+    ds.get_http_session("https://mirror.example")
+    ds.close_http_sessions()
+    assert ds._http_sessions == {}
+
+
+def test_pool_layer_does_not_retry_status_codes(ds, sessions, server):
+    server.status = 503
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    assert ds.get_http_session(url).get(url, timeout=5).status_code == 503
+    assert server.requests == 1  # 429/5xx的重试交给RetryPolicy，经过熔断器和限流器
+
+    retries = ds.get_http_session(url).get_adapter(url).max_retries
+    assert retries.connect == ds.RETRY_POLICY_DEFAULTS["pool_retries"]
+    assert not retries.status_forcelist and retries.read is False
@@ -0,0 +1,42 @@
+import numpy as np
+from PIL import Image
+
+
+def _noise(size=1024):
+    return np.random.default_rng(0).integers(0, 256, (size, size, 3), dtype=np.uint8)
+
+
+def _jpeg_config(ds):
+    return dict(ds.IMAGE_ENCODER_DEFAULTS, codec="jpeg")
+
+
+def test_encode_pil_image_searches_quality_to_fit_target(ds):
+    config = _jpeg_config(ds)
+    image = Image.fromarray(_noise(512))
+    full = ds._save_image(image, "jpeg", 90, config)
+    data, codec, quality = ds.encode_pil_image(image, "jpeg", 90, config, len(full) // 2)
+    assert codec == "jpeg"
+    assert len(data) <= len(full) // 2
+    assert ds._MIN_LOSSY_QUALITY <= quality < 90
+
+
+def test_downscaled_frame_restarts_quality_search(ds):
+    config = _jpeg_config(ds)
+    frame = _noise()
+    # 全尺寸在最低质量下也超出预算，缩小一档后可以用较高的质量满足
+    smaller = ds.fast_downscale(Image.fromarray(frame), 768)
+    target = len(ds._save_image(smaller, "jpeg", 80, config))
+    assert len(ds._save_image(Image.fromarray(frame), "jpeg", ds._MIN_LOSSY_QUALITY, config)) > target
+
+    encoded = ds.encode_frame(frame, max_size=2048, config=config, target_bytes=target)
+    assert len(encoded.data) <= target
+    # 以最低质量编码的大小远小于预算；重新搜索后应接近预算
+    floor_size = len(ds._save_image(smaller, "jpeg", ds._MIN_LOSSY_QUALITY, config))
+    assert len(encoded.data) > 1.5 * floor_size
+
+
+def test_small_png_is_kept_without_budget(ds):
+    config = dict(ds.IMAGE_ENCODER_DEFAULTS)
+    frame = np.full((64, 64, 3), 200, dtype=np.uint8)
+    encoded = ds.encode_frame(frame, config=config, target_bytes=0)
+    assert encoded.mime_type == "image/png"
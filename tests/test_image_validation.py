@@ -0,0 +1,63 @@
+import pytest
+import torch
+
+
+@pytest.mark.parametrize("shape", [(4, 5, 3), (2, 4, 5, 3), (2, 3, 4, 5)])
+def test_shapes_are_normalized_to_bhwc(ds, shape):
+    tensor = torch.rand(shape)
+    fixed = ds.validate_image_batch(tensor, "fast")
+    assert fixed.dim() == 4 and fixed.shape[-1] == 3 and fixed.shape[1:3] == (4, 5)
+
+
+@pytest.mark.parametrize("shape", [(1, 1, 2048), (4, 5), (1, 4, 5, 2)])
+def test_unfixable_shapes_give_blank(ds, shape):
+    assert tuple(ds.validate_image_batch(torch.rand(shape), "fast").shape) == (1, 1024, 1024, 3)
+
+
+def test_fast_check_fixes_owned_tensor_in_place(ds):
+    tensor = torch.rand(2, 4, 5, 3) * 3 - 1
+    tensor[0, 0, 0, 0] = float("inf")
+    fixed = ds.validate_image_batch(tensor, "fast", owned=True)
+    assert fixed.data_ptr() == tensor.data_ptr()
+    assert float(fixed.min()) == 0.0 and float(fixed.max()) == 1.0
+
+
+def test_caller_tensor_is_not_modified(ds):
+    tensor = torch.rand(2, 4, 5, 3) * 3 - 1
+    original = tensor.clone()
+    fixed = ds.validate_image_batch(tensor, "fast")
+    assert torch.equal(tensor, original)
+    assert float(fixed.min()) == 0.0 and float(fixed.max()) == 1.0
+    valid = torch.rand(2, 4, 5, 3)
+    assert ds.validate_image_batch(valid, "fast").data_ptr() == valid.data_ptr()
+
+
+def test_nan_is_fixed_per_pixel_and_keeps_batch(ds):
+    tensor = torch.rand(3, 4, 5, 3, dtype=torch.float16)
+    tensor[1, 2, 2, 0] = float("nan")
+    tensor[2, 0, 0, 0] = 2.0
+    fixed = ds.validate_image_batch(tensor, "fast")
+    assert fixed.shape == tensor.shape and fixed.dtype == torch.float16
+    assert not torch.isnan(fixed).any() and float(fixed[1, 2, 2, 0]) == 0.0
+    assert float(fixed[2, 0, 0, 0]) == 1.0
+    assert torch.equal(fixed[0], tensor[0])
+
+
+def test_uint8_is_scaled_to_float(ds):
+    tensor = torch.full((1, 2, 2, 3), 255, dtype=torch.uint8)
+    fixed = ds.validate_image_batch(tensor, "fast")
+    assert fixed.dtype == torch.float32 and torch.all(fixed == 1.0)
+
+
+def test_off_level_skips_pixel_checks(ds):
+    tensor = torch.full((1, 2, 2, 3), 5.0)
+    assert torch.all(ds.validate_image_batch(tensor, "off") == 5.0)
+    assert torch.all(ds.validate_image_batch(torch.rand(1, 2, 2, 3), "full") <= 1.0)
+
+
+def test_configured_level(ds, config_section):
+    config_section("output_validation", ds.VALIDATION_DEFAULTS, validation_level="OFF")
+    assert ds.get_validation_level() == "off"
+    assert torch.all(ds.validate_image_batch(torch.full((1, 2, 2, 3), 5.0)) == 5.0)
+    config_section("output_validation", ds.VALIDATION_DEFAULTS, validation_level="paranoid")
+    assert ds.get_validation_level() == "fast"
@@ -0,0 +1,67 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+
+def _image(ds, size):
+    return ds.EncodedImage(os.urandom(size), "image/jpeg")
+
+
+def _plain(obj):
+    """把EncodedImage替换为data URL后的等价载荷"""
+    return json.loads(json.dumps(obj, default=lambda value: value.data_url()))
+
+
+@pytest.fixture
+def payload(ds):
+    return {
+        "model": "seedream-4",
+        "prompt": "一只猫 \"quoted\" \n",
+        "image": [_image(ds, 100_000), "https://example.com/a.png", _image(ds, 7)],
+        "extra": {"n": 2, "watermark": False, "size": None, "nested": [1.5, {"k": "v"}]},
+    }
+
+
+def test_streamed_json_matches_eager_encoding(ds, payload):
+    body = b"".join(ds.iter_json_body(payload, chunk_size=3 * 1024))
+    assert json.loads(body) == _plain(payload)
+    assert ds.json_body_length(payload) == len(body)
+
+
+def test_image_data_is_encoded_in_bounded_chunks(ds, payload):
+    chunk_size = 3 * 1024
+    chunks = list(ds.iter_json_body(payload, chunk_size=chunk_size))
+    assert max(len(chunk) for chunk in chunks) <= chunk_size * 4 // 3
+    assert len(chunks) > 100_000 // chunk_size
+
+
+def test_body_stream_read_and_seek(ds, payload):
+    stream = ds.JsonBodyStream(payload)
+    expected = b"".join(ds.iter_json_body(payload))
+    assert len(stream) == len(expected)
+    head = stream.read(10)
+    rest = stream.read()
+    assert head + rest == expected and stream.tell() == len(expected)
+    assert stream.read(5) == b""
+
+    assert stream.seek(0) == 0
+    pieces = []
+    while True:
+        piece = stream.read(4096)
+        if not piece:
+            break
+        pieces.append(piece)
+    assert b"".join(pieces) == expected
+    stream.seek(1000)
+    assert stream.read(20) == expected[1000:1020]
+    with pytest.raises(OSError):
+        stream.seek(0, os.SEEK_END)
+
+
+def test_async_iteration_yields_whole_body(ds, payload):
+    async def collect():
+        return b"".join([chunk async for chunk in ds.JsonBodyStream(payload).aiter_chunks()])
+
+    assert json.loads(asyncio.run(collect())) == _plain(payload)
@@ -0,0 +1,65 @@
+import io
+import json
+
+import pytest
+
+
+@pytest.fixture
+def output(ds, monkeypatch):
+    monkeypatch.delenv("SEEDREAM4_LOG_LEVEL", raising=False)
+    level, formatter = ds.LOGGER.level, ds._log_handler.formatter
+    stream = io.StringIO()
+    previous = ds._log_handler.setStream(stream)
+    yield stream
+    ds._log_handler.setStream(previous)
+    ds._log_handler.setFormatter(formatter)
+    ds.LOGGER.setLevel(level)
+
+
+def test_text_format_is_unchanged(ds, output):
+    ds.configure_logging({"level": "info"})
+    ds._log_info("生成完成 %d 张", 2, task_id="t1", attempt=3)
+    ds._log_debug("不会输出")
+    assert output.getvalue() == "[SeedReam4API] 信息：生成完成 2 张 task_id=t1 attempt=3\n"
+
+
+def test_json_format(ds, output):
+    ds.configure_logging({"format": "json"})
+    ds._log_warning("镜像站熔断", host="mirror.example")
+    entry = json.loads(output.getvalue())
+    assert entry["level"] == "warning" and entry["message"] == "镜像站熔断"
+    assert entry["host"] == "mirror.example"
+
+
+def test_filtered_messages_are_never_built(ds, output):
+    ds.configure_logging({"level": "warning"})
+    calls = []
+
+    class Expensive:
+        def __str__(self):
+            calls.append("str")
+            return "x"
+
+    ds._log_info(lambda: calls.append("callable") or "x")
+    ds._log_info("payload %s", Expensive())
+    ds._log_debug("payload %s", Expensive())
+    assert calls == [] and output.getvalue() == ""
+
+    ds._log_error(lambda: "懒加载消息")
+    assert output.getvalue() == "[SeedReam4API] 错误：懒加载消息\n"
+
+
+def test_quiet_and_environment_override(ds, output, monkeypatch):
+    ds.configure_logging({"level": "debug", "quiet": True})
+    ds._log_info("静默")
+    assert output.getvalue() == ""
+
+    monkeypatch.setenv("SEEDREAM4_LOG_LEVEL", "DEBUG")
+    ds.configure_logging({"level": "error"})
+    ds._log_debug("调试")
+    assert "调试" in output.getvalue()
+
+    monkeypatch.setenv("SEEDREAM4_LOG_LEVEL", "off")
+    ds.configure_logging()
+    ds._log_error("不输出")
+    assert "不输出" not in output.getvalue()
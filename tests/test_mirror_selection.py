@@ -0,0 +1,82 @@
+import pytest
+
+
+MIRRORS = {
+    "fast": {"url": "https://fast.example.com", "models": ["seedream-4"], "api_key": "sk-fast"},
+    "slow": {"url": "https://slow.example.com", "models": ["seedream-4"]},
+    "flaky": {"url": "https://flaky.example.com", "models": ["seedream-4"]},
+    "other": {"url": "https://other.example.com", "models": ["gpt-image-1"]},
+}
+
+
+@pytest.fixture
+def mirrors(ds, monkeypatch, config_section):
+    config_section("mirror_health", ds.MIRROR_HEALTH_DEFAULTS)
+    monkeypatch.setattr(ds, "MIRROR_HEALTH", ds.MirrorHealthTracker())
+    monkeypatch.setattr(ds, "_circuit_breakers", {})
+    monkeypatch.setattr(ds, "get_seedream4_config", lambda: {"mirror_sites": MIRRORS})
+    return ds.MIRROR_HEALTH
+
+
+def _record(tracker, ds, name, latency, ok, times=3):
+    for _ in range(times):
+        tracker.record(ds._host_key(MIRRORS[name]["url"]), "image", latency, ok)
+
+
+def test_classify_endpoint(ds):
+    assert ds.classify_endpoint("POST", "https://m/v1/images/generations") == "image"
+    assert ds.classify_endpoint("POST", "https://m/v1/chat/completions") == "chat"
+    assert ds.classify_endpoint("POST", "https://m/v1/videos/generations") == "video"
+    assert ds.classify_endpoint("GET", "https://m/api/v3/contents/generations/tasks/t1") == "video_status"
+    assert ds.classify_endpoint("GET", "https://cdn.example.com/a.png") is None
+
+
+def test_percentile_nearest_rank(ds):
+    values = list(range(1, 11))
+    assert ds._percentile(values, 90) == 9
+    assert ds._percentile(values, 70) == 7
+    assert ds._percentile(values, 50) == 5
+    assert ds._percentile(values, 100) == 10
+    assert ds._percentile([], 90) is None
+
+
+def test_fixed_mirror_is_not_ranked(ds, mirrors):
+    assert ds.resolve_mirror_candidates("slow", "image", "seedream-4") == ["slow"]
+
+
+def test_auto_ranks_by_latency_then_unknown_then_unhealthy(ds, mirrors):
+    _record(mirrors, ds, "fast", 1.0, True)
+    _record(mirrors, ds, "flaky", 0.5, False)
+    ranked = ds.resolve_mirror_candidates(ds.AUTO_MIRROR, "image", "seedream-4")
+    assert ranked == ["fast", "slow", "flaky"]  # other 不支持该模型
+
+
+def test_auto_demotes_mirror_with_open_breaker(ds, mirrors, config_section):
+    config_section("circuit_breaker", ds.CIRCUIT_BREAKER_DEFAULTS, failure_threshold=1)
+    _record(mirrors, ds, "fast", 1.0, True)
+    _record(mirrors, ds, "slow", 5.0, True)
+    ds.get_circuit_breaker(MIRRORS["fast"]["url"], "image").record_failure()
+    assert ds.resolve_mirror_candidates(ds.AUTO_MIRROR, "image", "seedream-4") == ["slow", "flaky", "fast"]
+
+
+def test_auto_falls_back_to_all_mirrors_for_unknown_model(ds, mirrors):
+    ranked = ds.resolve_mirror_candidates(ds.AUTO_MIRROR, "image", "unlisted-model")
+    assert sorted(ranked) == sorted(MIRRORS)
+
+
+def test_failover_prepares_each_candidate_once(ds, mirrors):
+    prepared = []
+
+    def prepare_request(mirror_site, api_key, model):
+        prepared.append((mirror_site, api_key))
+        return {"mirror": mirror_site}, None
+
+    _record(mirrors, ds, "fast", 1.0, True)
+    _record(mirrors, ds, "slow", 2.0, True)
+    _record(mirrors, ds, "flaky", 3.0, True)
+    failover = ds.build_mirror_failover(
+        prepare_request, {"mirror_site": ds.AUTO_MIRROR, "api_key": "sk-node", "model": "seedream-4"}, "image")
+    used = [failover.request_for(attempt)[0]["mirror"] for attempt in range(5)]
+    assert used == ["fast", "slow", "flaky", "fast", "slow"]
+    # 镜像站配置里有自己的Key时优先使用，否则沿用节点填写的Key
+    assert prepared == [("fast", "sk-fast"), ("slow", "sk-node"), ("flaky", "sk-node")]
@@ -0,0 +1,60 @@
+import email.parser
+import email.policy
+import json
+
+import pytest
+
+
+URL = "https://upload.example.com/v1"
+
+
+def _parse(body):
+    raw = f"Content-Type: {body.content_type}\r\n\r\n".encode("ascii") + body.read()
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(raw)
+    parts = []
+    for part in message.iter_parts():
+        parts.append((part.get_param("name", header="content-disposition"),
+                      part.get_filename(), part.get_content_type(), part.get_payload(decode=True)))
+    return parts
+
+
+@pytest.fixture
+def images(ds):
+    return [ds.EncodedImage(b"\x89PNG\r\n--binary--\x00", "image/png"),
+            "https://example.com/ref.jpg",
+            ds.EncodedImage(b"\xff\xd8jpeg", "image/jpeg")]
+
+
+def test_multipart_body_carries_raw_image_bytes(ds, images):
+    body = ds.build_multipart_image_body(
+        {"model": "seedream-4", "prompt": "猫", "image": images, "watermark": False,
+         "size": None, "extra": {"a": 1}}, image_field="image[]")
+    parts = _parse(body)
+    assert len(body) == body.tell()  # Content-Length 与实际写出的字节数一致
+    fields = {name: payload.decode("utf-8") for name, filename, _, payload in parts if filename is None}
+    assert fields["model"] == "seedream-4" and fields["prompt"] == "猫"
+    assert fields["watermark"] == "false" and json.loads(fields["extra"]) == {"a": 1}
+    assert "size" not in fields
+    assert fields["image[]"] == "https://example.com/ref.jpg"
+    files = [(name, filename, mime, payload) for name, filename, mime, payload in parts if filename]
+    assert files == [("image[]", "image_1.png", "image/png", images[0].data),
+                     ("image[]", "image_3.jpeg", "image/jpeg", images[2].data)]
+
+
+def test_payload_without_encoded_images_stays_json(ds):
+    assert ds.build_multipart_image_body({"prompt": "p", "image": ["https://example.com/a.png"]}) is None
+    assert ds.build_multipart_image_body({"prompt": "p"}) is None
+
+
+def test_request_args_follow_mirror_upload_mode(ds, monkeypatch, images):
+    sites = {"mp": {"url": URL + "/", "image_upload": "multipart", "multipart_endpoint": "/images/edits"}}
+    monkeypatch.setattr(ds, "get_seedream4_config", lambda: {"mirror_sites": sites})
+    body = {"prompt": "p", "image": images}
+    endpoint, args = ds.image_request_args(URL, "sk", URL + "/images/generations", body)
+    assert endpoint == URL + "/images/edits"
+    assert args["headers"]["Content-Type"].startswith("multipart/form-data; boundary=")
+    assert isinstance(args["data"], ds.MultipartBodyStream) and "json_body" not in args
+
+    endpoint, args = ds.image_request_args("https://other.example.com/v1", "sk",
+                                           "https://other.example.com/v1/images/generations", body)
+    assert endpoint.endswith("/images/generations") and args["json_body"] is body
@@ -0,0 +1,30 @@
+import pytest
+
+
+@pytest.fixture
+def fallbacks(ds, monkeypatch):
+    used = []
+    monkeypatch.setattr(ds, "create_ssl_compatible_session", lambda: used.append("session"))
+    monkeypatch.setattr(ds.subprocess, "run", lambda *args, **kwargs: used.append("curl"))
+    return used
+
+
+@pytest.mark.parametrize("error", ["CircuitOpenError", "RateLimitTimeout", "RetryBudgetExceeded"])
+def test_transport_limits_skip_fallbacks(ds, monkeypatch, fallbacks, error):
+    def limited(*args, **kwargs):
+        raise getattr(ds, error)("limited")
+
+    monkeypatch.setattr(ds, "http_request", limited)
+    payload = {"model": "doubao-seedream-4-0-250828", "prompt": "cat", "size": "1024x1024"}
+    assert ds.call_openai_compatible_api("https://mirror.example/v1", "key", payload, timeout=5) is None
+    assert fallbacks == []
+
+
+def test_connection_error_still_uses_fallbacks(ds, monkeypatch, fallbacks):
+    def broken(*args, **kwargs):
+        raise ConnectionError("reset")
+
+    monkeypatch.setattr(ds, "http_request", broken)
+    payload = {"model": "doubao-seedream-4-0-250828", "prompt": "cat", "size": "1024x1024"}
+    ds.call_openai_compatible_api("https://mirror.example/v1", "key", payload, timeout=5)
+    assert fallbacks[0] == "session"
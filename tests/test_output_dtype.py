@@ -0,0 +1,43 @@
+from PIL import Image
+import torch
+
+
+def _images(count=2, size=(16, 8)):
+    return [Image.new("RGB", size, color=(255, 128, 0)) for _ in range(count)]
+
+
+def test_float32_output_is_plain_float_tensor(ds):
+    image, text, _ = ds.images_to_outputs(_images(), ["a", "b"], "float32")
+    assert type(image) is torch.Tensor
+    assert image.dtype == torch.float32
+    assert image.shape == (2, 8, 16, 3)
+    assert torch.allclose(image[0, 0, 0], torch.tensor([1.0, 128 / 255, 0.0]))
+    assert "2 image(s)" in text
+
+
+def test_float16_output_is_real_float16_tensor(ds):
+    image, text, _ = ds.images_to_outputs(_images(), ["a", "b"], "float16")
+    assert type(image) is torch.Tensor
+    assert image.dtype == torch.float16
+    assert image.is_floating_point()
+    assert float(image.max()) == 1.0
+    # 下游节点可以原地修改输出
+    image.mul_(0.5)
+    assert float(image.max()) == 0.5
+    assert "float32 would be" in text
+
+
+def test_unknown_output_dtype_falls_back_to_float32(ds):
+    image, _, _ = ds.images_to_outputs(_images(1), ["a"], "uint8")
+    assert image.dtype == torch.float32
+
+
+def test_validate_image_batch_clamps_and_replaces_nan(ds):
+    batch = torch.full((1, 4, 4, 3), 2.0, dtype=torch.float16)
+    fixed = ds.validate_image_batch(batch, "fast")
+    assert fixed.dtype == torch.float16 and float(fixed.max()) == 1.0
+
+    batch = torch.full((1, 4, 4, 3), 0.5)
+    batch[0, 0, 0, 0] = float("nan")
+    fixed = ds.validate_image_batch(batch, "fast")
+    assert fixed.shape == (1, 4, 4, 3) and float(fixed[0, 0, 0, 0]) == 0.0
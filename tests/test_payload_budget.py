@@ -0,0 +1,65 @@
+import io
+
+import pytest
+import torch
+from PIL import Image
+
+
+CONFIG = {
+    "payload_budget": {
+        "max_request_bytes": 8_000_000,
+        "models": {"seedream-4": {"max_image_side": 1536}},
+    },
+    "mirror_sites": {
+        "strict": {"payload_budget": {"max_request_bytes": 2_000_000, "max_image_bytes": 400_000,
+                                      "models": {"seedream-4": {"max_image_side": 1024}}}},
+        "loose": {"payload_budget": {"max_request_bytes": 20_000_000}},
+        "plain": {},
+    },
+}
+
+
+@pytest.fixture
+def config(ds, monkeypatch):
+    monkeypatch.setattr(ds, "get_seedream4_config", lambda: CONFIG)
+
+
+def test_defaults_when_nothing_configured(ds, monkeypatch):
+    monkeypatch.setattr(ds, "get_seedream4_config", lambda: {})
+    assert ds.get_payload_budget(["plain"], "seedream-4") == ds.PayloadBudget(**ds.PAYLOAD_BUDGET_DEFAULTS)
+
+
+def test_model_and_mirror_limits_only_tighten(ds, config):
+    assert ds.get_payload_budget(["plain"], "seedream-4") == ds.PayloadBudget(8_000_000, 0, 1536)
+    assert ds.get_payload_budget(["loose"], "other") == ds.PayloadBudget(8_000_000, 0, 2048)
+    assert ds.get_payload_budget(["loose", "strict"], "seedream-4") == ds.PayloadBudget(2_000_000, 400_000, 1024)
+
+
+def test_image_byte_target(ds):
+    reserve = ds._PAYLOAD_ENVELOPE_RESERVE
+    assert ds.image_byte_target(ds.PayloadBudget(0, 0, 2048), 3) == 0
+    assert ds.image_byte_target(ds.PayloadBudget(0, 500_000, 2048), 3) == 500_000
+    # base64 膨胀 4/3，扣除预留后在各图像间平分
+    budget = ds.PayloadBudget(reserve + 1_200_000, 0, 2048)
+    assert ds.image_byte_target(budget, 3) == 300_000
+    assert ds.image_byte_target(ds.PayloadBudget(reserve + 1_200_000, 100_000, 2048), 3) == 100_000
+
+
+def test_encoded_request_fits_budget(ds, config_section):
+    config_section("encode_cache", ds.ENCODE_CACHE_DEFAULTS, enabled=False)
+    config_section("image_encoder", ds.IMAGE_ENCODER_DEFAULTS)
+    images = [torch.rand(1, 1024, 1024, 3, generator=torch.Generator().manual_seed(i)) for i in range(3)]
+    unbounded = ds.encode_images_for_upload(images)
+    request_bytes = sum(len(item.data_url()) for item in unbounded)
+
+    budget = ds.PayloadBudget(ds._PAYLOAD_ENVELOPE_RESERVE + request_bytes // 3, 0, 2048)
+    encoded = ds.encode_images_for_upload(images, budget=budget)
+    assert all(item is not None for item in encoded)
+    assert sum(len(item.data_url()) for item in encoded) <= request_bytes // 3
+
+
+def test_max_image_side_caps_upload_size(ds, config_section):
+    config_section("encode_cache", ds.ENCODE_CACHE_DEFAULTS, enabled=False)
+    config_section("image_encoder", ds.IMAGE_ENCODER_DEFAULTS, codec="png")
+    encoded = ds.encode_images_for_upload([torch.rand(1, 64, 32, 3)], budget=ds.PayloadBudget(0, 0, 16))
+    assert Image.open(io.BytesIO(encoded[0].data)).size == (8, 16)
@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+
+class _Response:
+    def __init__(self, status_code, headers, chunks):
+        self.status_code = status_code
+        self.headers = headers
+        self._chunks = chunks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size=1):
+        return self._chunks(chunk_size)
+
+
+class FakeRangeServer:
+    """支持Range请求的假session；on_chunk(start, offset) 在每个分块发送前调用，可以抛出异常模拟断线"""
+
+    def __init__(self, content, ranged=True, on_chunk=None):
+        self.content = content
+        self.ranged = ranged
+        self.on_chunk = on_chunk
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        range_header = (headers or {}).get("Range")
+        self.requests.append(range_header)
+        total = len(self.content)
+        if not range_header or not self.ranged:
+            return _Response(200, {"Content-Length": str(total)}, self._chunks(0, total - 1))
+        start, _, end = range_header[len("bytes="):].partition("-")
+        start, end = int(start), min(int(end), total - 1)
+        headers = {"Content-Range": f"bytes {start}-{end}/{total}"}
+        return _Response(206, headers, self._chunks(start, end))
+
+    def _chunks(self, start, end):
+        def generate(chunk_size):
+            for offset in range(start, end + 1, chunk_size):
+                if self.on_chunk:
+                    self.on_chunk(start, offset)
+                yield self.content[offset:min(offset + chunk_size, end + 1)]
+        return generate
+
+
+@pytest.fixture
+def download(ds, config_section, monkeypatch, tmp_path):
+    config_section("downloads", ds.DOWNLOAD_DEFAULTS, chunk_size=1024, range_parts=4, min_part_bytes=4096,
+                   range_retries=1)
+    monkeypatch.setattr(ds.time, "sleep", lambda seconds: None)
+
+    def run(server):
+        monkeypatch.setattr(ds, "get_http_session", lambda url: server)
+        return ds.download_file("https://cdn.example/video.mp4", str(tmp_path / "video.mp4"))
+    return run
+
+
+def _content(size=64 * 1024):
+    return os.urandom(size)
+
+
+def test_ranged_download_assembles_file(download, tmp_path):
+    content = _content()
+    server = FakeRangeServer(content)
+    path = download(server)
+    assert open(path, "rb").read() == content
+    assert sum(1 for header in server.requests if header and header != "bytes=0-0") == 4
+    assert not os.path.exists(f"{path}.part") and not os.path.exists(f"{path}.part.json")
+
+
+def test_server_without_ranges_downloads_in_one_request(download):
+    content = _content(10000)
+    path = download(FakeRangeServer(content, ranged=False))
+    assert open(path, "rb").read() == content
+
+
+def test_dropped_connection_resumes_within_range(download):
+    content = _content()
+    failed = []
+
+    def drop_once(start, offset):
+        if start == 16 * 1024 and offset == start + 4096 and not failed:
+            failed.append(offset)
+            raise ConnectionError("reset")
+
+    server = FakeRangeServer(content, on_chunk=drop_once)
+    path = download(server)
+    assert open(path, "rb").read() == content
+    assert f"bytes={16 * 1024 + 4096}-{32 * 1024 - 1}" in server.requests
+
+
+def test_progress_is_saved_as_ranges_finish(download, tmp_path):
+    """不依赖结束时的保存：最后一段下载时，进度文件中已记录完成的分段，且记录的字节已写入文件"""
+    content = _content()
+    state_path = tmp_path / "video.mp4.part.json"
+    seen = []
+
+    def inspect(start, offset):
+        if start == 48 * 1024 and offset == start and not seen:
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                state = json.loads(state_path.read_text()) if state_path.exists() else None
+                if state and all(done == end - begin + 1 for begin, end, done in state["ranges"][:3]):
+                    break
+                time.sleep(0.01)
+            seen.append(state)
+
+    download(FakeRangeServer(content, on_chunk=inspect))
+    ranges = seen[0]["ranges"]
+    assert [done for _, _, done in ranges[:3]] == [16 * 1024] * 3
+
+
+def test_resume_after_hard_kill_skips_saved_ranges(ds, download, monkeypatch, tmp_path):
+    content = _content()
+    monkeypatch.setattr(ds, "_DOWNLOAD_STATE_INTERVAL", 0)
+    state_path = tmp_path / "video.mp4.part.json"
+    part_path = tmp_path / "video.mp4.part"
+    on_disk = {}
+
+    class Killed(BaseException):
+        """模拟进程被强制结束：不会被重试逻辑捕获"""
+
+    def kill(start, offset):
+        if start == 48 * 1024 and offset == start + 8192:
+            # 强制结束时磁盘上只剩下此刻的进度文件和已写出的数据（先读进度，再读数据）
+            on_disk["state"] = state_path.read_bytes()
+            on_disk["part"] = part_path.read_bytes()
+            raise Killed()
+
+    with pytest.raises(Killed):
+        download(FakeRangeServer(content, on_chunk=kill))
+    state_path.write_bytes(on_disk["state"])
+    part_path.write_bytes(on_disk["part"])
+
+    state = json.loads(on_disk["state"])
+    saved = sum(done for _, _, done in state["ranges"])
+    assert state["ranges"][3][2] > 0
+    for start, end, done in state["ranges"]:
+        assert on_disk["part"][start:start + done] == content[start:start + done]
+
+    resumed = FakeRangeServer(content)
+    path = download(resumed)
+    assert open(path, "rb").read() == content
+    requested = 0
+    for header in resumed.requests:
+        if header != "bytes=0-0":
+            first, _, last = header[len("bytes="):].partition("-")
+            requested += int(last) - int(first) + 1
+    assert requested == len(content) - saved
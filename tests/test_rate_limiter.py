@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+
+URL = "https://mirror.example.com/v1/images/generations"
+
+
+class _Response:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {"Retry-After": retry_after} if retry_after is not None else {}
+
+
+@pytest.fixture
+def limits(ds, config_section):
+    def configure(**values):
+        config_section("rate_limits", ds.RATE_LIMIT_DEFAULTS, **values)
+        return ds.RateLimiter()
+    return configure
+
+
+def test_token_bucket_burst_then_rate(ds):
+    bucket = ds.TokenBucket(rate=10, burst=2, max_in_flight=0)
+    now = time.monotonic()
+    for _ in range(2):
+        assert bucket.wait_time(now) == 0
+        bucket.take()
+    assert bucket.wait_time(now) == pytest.approx(0.1, abs=0.01)
+    assert bucket.wait_time(now + 0.1) == pytest.approx(0, abs=1e-6)
+
+
+def test_token_bucket_in_flight_limit(ds):
+    bucket = ds.TokenBucket(rate=0, burst=1, max_in_flight=1)
+    bucket.take()
+    assert bucket.wait_time(time.monotonic()) > 0
+    bucket.in_flight -= 1
+    assert bucket.wait_time(time.monotonic()) == 0
+
+
+def test_disabled_limiter_hands_out_no_buckets(ds, limits):
+    limiter = limits(enabled=False)
+    assert limiter.acquire("sk-test", URL) == ()
+    limiter.release(())
+
+
+def test_key_and_mirror_buckets_are_shared(ds, limits):
+    limiter = limits()
+    first = limiter.buckets_for("sk-a", URL)
+    assert len(first) == 2
+    assert first == limiter.buckets_for("sk-a", "https://mirror.example.com/v1/videos")
+    other_key = limiter.buckets_for("sk-b", URL)
+    assert other_key[0] is first[0] and other_key[1] is not first[1]
+    assert len(limiter.buckets_for("", URL)) == 1
+
+
+def test_requests_are_paced_to_rate(ds, limits):
+    limiter = limits(key_requests_per_second=20, key_burst=1, mirror_requests_per_second=0)
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.release(limiter.acquire("sk-test", URL))
+    assert time.monotonic() - started >= 0.14
+
+
+def test_in_flight_slots_block_until_released(ds, limits):
+    limiter = limits(key_requests_per_second=0, mirror_requests_per_second=0, key_max_in_flight=1)
+    held = limiter.acquire("sk-test", URL)
+    acquired = threading.Event()
+
+    def second():
+        limiter.release(limiter.acquire("sk-test", URL))
+        acquired.set()
+
+    thread = threading.Thread(target=second)
+    thread.start()
+    assert not acquired.wait(0.2)
+    limiter.release(held)
+    assert acquired.wait(2)
+    thread.join()
+
+
+def test_queue_timeout(ds, limits):
+    limiter = limits(key_requests_per_second=0, mirror_requests_per_second=0, key_max_in_flight=1,
+                     max_queue_wait=0.1)
+    limiter.acquire("sk-test", URL)
+    with pytest.raises(ds.RateLimitTimeout):
+        limiter.acquire("sk-test", URL)
+
+
+def test_queue_wait_bounded_by_retry_budget(ds, limits):
+    limiter = limits(key_requests_per_second=0, mirror_requests_per_second=0, key_max_in_flight=1)
+    limiter.acquire("sk-test", URL)
+    started = time.monotonic()
+    with ds.retry_budget(ds.RetryPolicy(total_budget=0.1)):
+        with pytest.raises(ds.RateLimitTimeout):
+            limiter.acquire("sk-test", URL)
+    assert time.monotonic() - started < 1
+
+
+def test_429_pauses_bucket(ds, limits):
+    limiter = limits(key_requests_per_second=0, mirror_requests_per_second=0)
+    buckets = limiter.acquire("sk-test", URL)
+    limiter.release(buckets, _Response(429, "30"))
+    now = time.monotonic()
+    assert all(29 <= bucket.wait_time(now) <= 30 for bucket in buckets)
+    assert all(bucket.in_flight == 0 for bucket in buckets)
+
+
+def test_async_acquire_is_first_come_first_served(ds, limits):
+    limiter = limits(key_requests_per_second=0, mirror_requests_per_second=0, key_max_in_flight=1)
+    order = []
+
+    async def request(index):
+        buckets = await limiter.async_acquire("sk-test", URL)
+        order.append(index)
+        await asyncio.sleep(0.01)
+        limiter.release(buckets)
+
+    async def main():
+        tasks = []
+        for index in range(4):
+            tasks.append(asyncio.ensure_future(request(index)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == [0, 1, 2, 3]
+
+
+def test_defaults_only_react_to_429(ds, limits):
+    limiter = limits()
+    buckets = [limiter.acquire("sk-test", URL) for _ in range(50)]
+    assert all(bucket.wait_time(time.monotonic()) == 0 for bucket in buckets[-1])
+    limiter.release(buckets[0], _Response(429, "5"))
+    assert all(bucket.wait_time(time.monotonic()) > 4 for bucket in buckets[0])
+
+
+def test_queued_waiters_are_woken_instead_of_polling(ds, limits):
+    limiter = limits(key_requests_per_second=0, mirror_requests_per_second=0, key_max_in_flight=1)
+    checks = []
+    try_acquire = limiter._try_acquire
+
+    def counting(waiter):
+        checks.append(waiter)
+        return try_acquire(waiter)
+
+    limiter._try_acquire = counting
+    held = limiter.acquire("sk-test", URL)
+    threads = [threading.Thread(target=lambda: limiter.release(limiter.acquire("sk-test", URL)))
+               for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.3)
+    limiter.release(held)
+    for thread in threads:
+        thread.join(2)
+    assert not any(thread.is_alive() for thread in threads)
+    assert len(checks) <= 1 + 10 * 3
@@ -0,0 +1,100 @@
+import base64
+import io
+import json
+
+from PIL import Image
+import pytest
+
+
+def _png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color=color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def result_cache(ds, config_section, monkeypatch, tmp_path):
+    config_section("result_cache", ds.RESULT_CACHE_DEFAULTS, enabled=True, directory=str(tmp_path))
+    monkeypatch.setattr(ds, "_result_cache", None)
+    return ds.get_result_cache()
+
+
+def _results(ds, *colors):
+    return [ds.open_result_image(_png_bytes(color)) for color in colors]
+
+
+class _FakeStream:
+    def __init__(self, events):
+        self.encoding = None
+        self._lines = []
+        for event in events:
+            self._lines += [f"data: {json.dumps(event)}", ""]
+
+    def iter_lines(self, decode_unicode=True):
+        return iter(self._lines)
+
+
+def test_complete_result_is_cached_and_replayed(ds, result_cache):
+    with ds.caching_results("key", 2):
+        ds.images_to_outputs(_results(ds, "red", "blue"), ["u1", "u2"])
+    cached = ds.load_cached_result("key")
+    assert cached is not None
+    assert cached[0].shape[0] == 2
+    assert cached[2] == "u1"
+
+
+def test_short_batch_is_not_cached(ds, result_cache):
+    with ds.caching_results("key", 2):
+        ds.images_to_outputs(_results(ds, "red"), ["u1"])
+    assert ds.load_cached_result("key") is None
+
+
+def test_result_marked_incomplete_is_not_cached(ds, result_cache):
+    with ds.caching_results("key", 1):
+        ds.mark_result_incomplete("test")
+        ds.images_to_outputs(_results(ds, "red"), ["u1"])
+    assert ds.load_cached_result("key") is None
+
+
+def test_stream_with_error_event_is_not_cached(ds, result_cache):
+    events = [
+        {"type": "image_generation.partial_succeeded", "image_index": 0,
+         "b64_json": base64.b64encode(_png_bytes("red")).decode()},
+        {"type": "image_generation.partial_failed", "error": {"message": "sensitive content"}},
+    ]
+    with ds.caching_results("key", 1):
+        image, _, _ = ds.collect_streamed_images(_FakeStream(events), "b64_json", 1)
+    assert image.shape[0] == 1
+    assert ds.load_cached_result("key") is None
+
+
+def test_caching_is_off_outside_scope(ds, result_cache):
+    ds.images_to_outputs(_results(ds, "red"), ["u1"])
+    assert result_cache.get("key") is None
+
+
+class _ImagesResponse:
+    status_code = 200
+
+    def __init__(self, *colors):
+        self._body = {"data": [{"b64_json": base64.b64encode(_png_bytes(color)).decode()} for color in colors]}
+        self.text = ""
+
+    def json(self):
+        return self._body
+
+
+def test_sequential_result_below_max_images_is_cached(ds, result_cache, monkeypatch):
+    payload = ds.build_seedream_payload("seedream", "story", "b64_json", "1024x1024", False, False, True,
+                                       4, 7, "auto")
+    calls = []
+
+    def call(targets, payload, timeout, max_retries, hedge):
+        calls.append(payload)
+        return _ImagesResponse("red", "blue")
+
+    monkeypatch.setattr(ds, "call_image_api_with_retries", call)
+    image, _, _ = ds.run_image_generation(([], payload), "b64_json")
+    assert image.shape[0] == 2
+    cached = ds.run_image_generation(([], payload), "b64_json")
+    assert cached[0].shape[0] == 2 and len(calls) == 1
@@ -0,0 +1,74 @@
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+
+def _png(value):
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), (value, value, value)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class _ImageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        if self.path.startswith("/missing"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = _png(int(self.path.strip("/").split(".")[0]))
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def base_url(ds, monkeypatch, config_section, tmp_path):
+    config_section("downloads", ds.DOWNLOAD_DEFAULTS, max_workers=4, timeout=5)
+    config_section("download_cache", ds.DOWNLOAD_CACHE_DEFAULTS, directory=str(tmp_path / "downloads"))
+    monkeypatch.setattr(ds, "_download_executor", None)
+    monkeypatch.setattr(ds, "_download_cache", None)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ImageHandler)
+    server.delay = 0.3
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    if ds._download_executor is not None:
+        ds._download_executor.shutdown()
+
+
+def test_downloads_run_concurrently_in_order(ds, base_url):
+    urls = [f"{base_url}/{value}.png" for value in (10, 20, 30, 40)]
+    started = time.monotonic()
+    results = ds.download_result_images(urls)
+    assert time.monotonic() - started < 4 * 0.3
+    assert [url for url, _ in results] == urls
+    assert [image.convert("RGB").getpixel((0, 0))[0] for _, image in results] == [10, 20, 30, 40]
+    assert all(image.source_bytes == _png(value) for (_, image), value in zip(results, (10, 20, 30, 40)))
+
+
+def test_failed_download_is_none(ds, base_url):
+    results = ds.download_result_images([f"{base_url}/10.png", f"{base_url}/missing.png"])
+    assert results[0][1] is not None and results[1][1] is None
+    assert ds.download_result_images([]) == []
+
+
+def test_repeated_url_is_served_from_download_cache(ds, base_url):
+    url = f"{base_url}/50.png"
+    ds.download_result_images([url])
+    started = time.monotonic()
+    (_, image), = ds.download_result_images([url])
+    assert time.monotonic() - started < 0.3
+    assert image.source_bytes == _png(50)
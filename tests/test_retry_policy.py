@@ -0,0 +1,84 @@
+import email.utils
+import time
+
+import pytest
+
+
+class _Response:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {"Retry-After": retry_after} if retry_after is not None else {}
+
+
+def test_attempt_limit_and_remaining_budget(ds):
+    policy = ds.RetryPolicy(max_attempts=3, total_budget=100, min_attempt_time=10)
+    assert policy.should_retry(0) and policy.should_retry(1)
+    assert not policy.should_retry(2)
+    assert not policy.should_retry(0, delay=95)  # 退避后剩余时间不足一次尝试
+
+
+def test_timeout_is_clamped_to_budget(ds):
+    policy = ds.RetryPolicy(total_budget=5, attempt_timeout=900)
+    assert policy.timeout_for_attempt(60) <= 5
+    assert ds.RetryPolicy(total_budget=1000, attempt_timeout=30).timeout_for_attempt(60) == 30
+    expired = ds.RetryPolicy(deadline=time.monotonic() - 1)
+    with pytest.raises(ds.RetryBudgetExceeded):
+        expired.timeout_for_attempt(60)
+
+
+def test_retry_delay_prefers_retry_after(ds):
+    policy = ds.RetryPolicy(backoff_base=1, backoff_max=60)
+    assert [policy.retry_delay(attempt) for attempt in range(4)] == [1, 2, 4, 8]
+    assert policy.retry_delay(10) == 60
+    assert policy.retry_delay(0, base_delay=2) == 2
+    assert policy.retry_delay(0, _Response(429, "7"), base_delay=2) == 7
+    assert policy.retry_delay(0, _Response(503, "3600")) == 60
+    assert policy.retry_delay(2, _Response(500, "7")) == 4  # 只有429/503遵守Retry-After
+
+
+def test_parse_retry_after_http_date(ds):
+    when = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= ds.parse_retry_after(_Response(429, when)) <= 30
+    assert ds.parse_retry_after(_Response(429, "soon")) is None
+    assert ds.parse_retry_after(None) is None
+
+
+def test_nested_layers_share_one_deadline(ds, config_section):
+    config_section("retry_policy", ds.RETRY_POLICY_DEFAULTS, total_budget=50, attempt_timeout=40)
+    assert ds.current_retry_policy() is None
+    outer = ds.get_retry_policy(max_attempts=2)
+    with ds.retry_budget(outer):
+        inner = ds.get_retry_policy(max_attempts=5, attempt_timeout=120)
+        assert inner.deadline == outer.deadline
+        assert inner.max_attempts == 5 and inner.attempt_timeout == 40
+        assert ds.budgeted_timeout(900) <= 40
+    assert ds.current_retry_policy() is None
+    assert ds.budgeted_timeout(900) == 900
+
+
+def test_attempts_rotate_and_skip_unavailable_candidates(ds):
+    unavailable = {"b"}
+    attempts = ds.RetryAttempts(ds.RetryPolicy(max_attempts=4), ["a", "b", "c"], lambda c: c not in unavailable)
+    assert list(attempts) == ["a", "c", "a", "c"]
+    assert attempts.following("a") == "c" and attempts.following("c") == "a"
+
+    # 产出后才发现不可用（如请求构建失败）时归还尝试次数
+    failed = set()
+    attempts = ds.RetryAttempts(ds.RetryPolicy(max_attempts=3), ["a", "b"], lambda c: c not in failed)
+    seen = []
+    for candidate in attempts:
+        seen.append(candidate)
+        if candidate == "a":
+            failed.add("a")
+            attempts.retract()
+    assert seen == ["a", "b", "b", "b"]
+
+
+def test_attempts_backoff(ds):
+    attempts = ds.RetryAttempts(ds.RetryPolicy(max_attempts=2, backoff_base=1), ["a"], base_delay=2)
+    iterator = iter(attempts)
+    next(iterator)
+    assert attempts.backoff() == 2
+    assert attempts.backoff(error=ds.RetryBudgetExceeded()) is None
+    next(iterator)
+    assert attempts.backoff(error=RuntimeError("boom")) is None
@@ -0,0 +1,76 @@
+import base64
+import io
+import json
+
+import pytest
+from PIL import Image
+
+
+class _FakeStream:
+    """按给定的原始行产出的事件流响应"""
+
+    def __init__(self, lines):
+        self.encoding = None
+        self._lines = lines
+
+    def iter_lines(self, decode_unicode=True):
+        return iter(self._lines)
+
+
+def _b64_png(value):
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), (value, value, value)).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def _event(event_type, **fields):
+    return [f"event: {event_type}", "data: " + json.dumps(dict(fields, type=event_type)), ""]
+
+
+def test_iter_sse_events_framing(ds):
+    stream = _FakeStream([
+        ": keep-alive", "",
+        "event: partial", "data: line one", "data:line two", "",
+        "data: {\"a\": 1}", "id: 7", "",
+        "",
+        "data: tail",
+    ])
+    assert list(ds.iter_sse_events(stream)) == [
+        ("partial", "line one\nline two"),
+        (None, '{"a": 1}'),
+        (None, "tail"),
+    ]
+    assert stream.encoding == "utf-8"
+
+
+@pytest.fixture(autouse=True)
+def downloads(ds, config_section):
+    config_section("result_cache", ds.RESULT_CACHE_DEFAULTS, enabled=False)
+    config_section("download_cache", ds.DOWNLOAD_CACHE_DEFAULTS, enabled=False)
+
+
+def test_images_are_assembled_by_image_index(ds):
+    lines = (_event("image_generation.partial_succeeded", image_index=1, b64_json=_b64_png(200))
+             + _event("image_generation.partial_succeeded", image_index=0, b64_json=_b64_png(100))
+             + _event("image_generation.completed", usage={"generated_images": 2})
+             + ["data: [DONE]", ""]
+             + _event("image_generation.partial_succeeded", image_index=2, b64_json=_b64_png(50)))
+    image, text, _ = ds.collect_streamed_images(_FakeStream(lines), "b64_json", expected=2)
+    assert tuple(image.shape) == (2, 4, 4, 3)
+    assert [round(float(image[i, 0, 0, 0]) * 255) for i in range(2)] == [100, 200]
+    assert text.startswith("Successfully generated 2 image(s)")
+
+
+def test_partial_failures_keep_successful_images(ds):
+    lines = (["data: not json", ""]
+             + _event("image_generation.partial_failed", image_index=0, error={"code": "sensitive"})
+             + _event("image_generation.partial_succeeded", image_index=1, b64_json=_b64_png(30))
+             + _event("image_generation.partial_succeeded", image_index=2, b64_json="!!not-base64!!"))
+    image, _, _ = ds.collect_streamed_images(_FakeStream(lines), "b64_json", expected=3)
+    assert tuple(image.shape) == (1, 4, 4, 3)
+
+
+def test_stream_with_only_failures_reports_error(ds):
+    lines = _event("image_generation.partial_failed", error={"message": "quota"})
+    _, text, url = ds.collect_streamed_images(_FakeStream(lines), "b64_json", expected=1)
+    assert text.startswith("流式生成失败") and "quota" in text and url == ""
@@ -0,0 +1,62 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class _EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.bodies.append(json.loads(body))
+        reply = json.dumps({"ok": True, "thread": threading.current_thread().name}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _EchoHandler)
+    server.bodies = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture(params=["httpx", "requests"])
+def backend(request, ds, config_section):
+    if request.param == "httpx" and not ds.HAS_HTTPX:
+        pytest.skip("httpx未安装")
+    config_section("transport", ds.TRANSPORT_DEFAULTS, backend=request.param)
+    return request.param
+
+
+def test_http_request_posts_json(ds, server, backend):
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/images/generations"
+    payload = {"prompt": "猫", "image": ["a" * 1000]}
+    response = ds.http_request("POST", url, headers={"Authorization": "Bearer k"}, json_body=payload, timeout=5)
+    assert response.status_code == 200 and response.json()["ok"]
+    assert server.bodies == [payload]
+    assert ds.use_async_transport() == (backend == "httpx")
+
+
+def test_async_http_request_from_another_event_loop(ds, server, backend):
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/videos"
+
+    async def send_many():
+        return await asyncio.gather(*[
+            ds.async_http_request("POST", url, json_body={"n": i}, timeout=5) for i in range(4)
+        ])
+
+    responses = asyncio.run(send_many())
+    assert all(response.status_code == 200 for response in responses)
+    assert sorted(body["n"] for body in server.bodies) == [0, 1, 2, 3]
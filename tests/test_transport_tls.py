@@ -0,0 +1,109 @@
+import asyncio
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+httpx = pytest.importorskip("httpx")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"
+
+    def do_GET(self):
+        self.server.reused.append(getattr(self.connection, "session_reused", None))
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(tls_dir=None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.reused = []
+    if tls_dir is not None:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(tls_dir / "cert.pem", tls_dir / "key.pem")
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def tls_server(tmp_path):
+    if shutil.which("openssl") is None:
+        pytest.skip("需要openssl命令生成测试证书")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=localhost", "-keyout", str(tmp_path / "key.pem"),
+                    "-out", str(tmp_path / "cert.pem")], check=True, capture_output=True)
+    server = _serve(tmp_path)
+    yield server
+    server.shutdown()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_httpx_connections_resume_tls_sessions(ds, tls_server):
+    context = ds._create_ssl_context()
+    url = f"https://localhost:{tls_server.server_address[1]}/"
+
+    async def fetch_on_new_connections():
+        for _ in range(3):
+            async with httpx.AsyncClient(verify=context) as client:
+                assert (await client.get(url)).text == "ok"
+
+    asyncio.run(fetch_on_new_connections())
+    assert tls_server.reused == [False, True, True]
+    assert list(context._tls_sessions) == ["localhost"]
+
+
+def test_requests_connections_resume_tls_sessions(ds, tls_server, monkeypatch):
+    monkeypatch.setattr(ds, "_shared_ssl_context", ds._create_ssl_context())
+    session = requests.Session()
+    session.mount("https://", ds.SSLAdapter())
+    url = f"https://localhost:{tls_server.server_address[1]}/"
+    for _ in range(3):
+        response = session.get(url, headers={"Connection": "close"}, verify=False, timeout=5)
+        assert response.text == "ok"
+    assert tls_server.reused == [False, True, True]
+
+
+def test_httpx_errors_map_to_requests_exceptions(ds):
+    request = httpx.Request("GET", "https://mirror.example/")
+    cases = [
+        (httpx.ConnectTimeout("t", request=request), requests.exceptions.ConnectTimeout),
+        (httpx.ReadTimeout("t", request=request), requests.exceptions.ReadTimeout),
+        (httpx.PoolTimeout("t", request=request), requests.exceptions.Timeout),
+        (httpx.ConnectError("refused", request=request), requests.exceptions.ConnectionError),
+        (httpx.RemoteProtocolError("eof", request=request), requests.exceptions.ConnectionError),
+    ]
+    for error, expected in cases:
+        assert isinstance(ds._as_requests_exception(error), expected)
+    other = ValueError("not a transport error")
+    assert ds._as_requests_exception(other) is other
+
+
+def test_httpx_backend_raises_requests_errors(ds, config_section):
+    config_section("transport", ds.TRANSPORT_DEFAULTS, backend="httpx")
+    with pytest.raises(requests.exceptions.ConnectionError):
+        ds.http_request("GET", f"http://127.0.0.1:{_free_port()}/", timeout=5)
+
+    # 对明文HTTP服务发起TLS握手失败，应表现为requests的SSLError
+    plain = _serve()
+    try:
+        with pytest.raises(requests.exceptions.SSLError):
+            ds.http_request("GET", f"https://127.0.0.1:{plain.server_address[1]}/", timeout=5)
+    finally:
+        plain.shutdown()
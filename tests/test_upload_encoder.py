@@ -0,0 +1,60 @@
+import base64
+import io
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+
+@pytest.fixture(autouse=True)
+def encoder(ds, monkeypatch, config_section):
+    config_section("encode_cache", ds.ENCODE_CACHE_DEFAULTS, enabled=False)
+    config_section("image_encoder", ds.IMAGE_ENCODER_DEFAULTS, codec="png")
+
+
+def _decode(encoded):
+    return np.array(Image.open(io.BytesIO(encoded.data)).convert("RGB"))
+
+
+def test_batch_quantization_layouts(ds):
+    image = torch.rand(2, 4, 5, 3)
+    batch = ds.tensor_batch_to_uint8(image)
+    assert batch.dtype == np.uint8 and batch.shape == (2, 4, 5, 3)
+    expected = (image.clamp(0, 1) * 255).round().to(torch.uint8).numpy()
+    assert np.array_equal(batch, expected)
+    assert ds.tensor_batch_to_uint8(image[0]).shape == (1, 4, 5, 3)
+    assert ds.tensor_batch_to_uint8(image.permute(0, 3, 1, 2)).shape == (2, 4, 5, 3)
+    assert ds.tensor_batch_to_uint8(torch.rand(1, 4, 5, 1)).shape == (1, 4, 5, 3)
+    assert ds.tensor_batch_to_uint8(torch.rand(1, 4, 5, 4)).shape == (1, 4, 5, 3)
+    assert ds.tensor_batch_to_uint8(torch.rand(4, 5)) is None
+
+
+def test_frames_are_encoded_in_input_order(ds):
+    colors = [0.0, 0.25, 0.5, 0.75, 1.0]
+    tensors = [torch.full((1, 8, 8, 3), value) for value in colors[:2]]
+    tensors.append(torch.stack([torch.full((8, 8, 3), value) for value in colors[2:]]))
+    encoded = ds.encode_images_for_upload(tensors)
+    assert [int(_decode(item)[0, 0, 0]) for item in encoded] == [round(v * 255) for v in colors]
+
+
+def test_stitched_batches_give_one_image_per_tensor(ds):
+    tensors = [torch.zeros(3, 8, 6, 3), None, torch.ones(1, 8, 6, 3)]
+    encoded = ds.encode_images_for_upload(tensors, stitch_batches=True)
+    assert encoded[1] is None
+    assert _decode(encoded[0]).shape == (8, 18, 3)
+    assert _decode(encoded[2]).shape == (8, 6, 3)
+
+
+def test_single_image_data_url(ds):
+    encoded = ds.encode_image_for_upload(torch.ones(1, 4, 4, 3))
+    assert encoded.mime_type == "image/png"
+    prefix, payload = encoded.data_url().split(",", 1)
+    assert prefix == "data:image/png;base64"
+    assert base64.b64decode(payload) == encoded.data
+    assert ds.encode_image_for_upload(None) is None
+
+
+def test_large_frames_are_downscaled(ds):
+    encoded = ds.encode_images_for_upload([torch.rand(1, 300, 200, 3)], max_size=150)
+    assert _decode(encoded[0]).shape == (150, 100, 3)
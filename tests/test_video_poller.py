@@ -0,0 +1,118 @@
+import asyncio
+import concurrent.futures
+import time
+
+import pytest
+
+
+URL = "https://mirror.example/v1"
+
+
+class FakeStatusService:
+    """状态接口：按脚本返回结果，记录每个任务的查询时间和最大并发查询数"""
+
+    def __init__(self):
+        self.outcomes = {}
+        self.checks = []
+        self.active = 0
+        self.max_active = 0
+
+    async def status(self, api_url, api_key, task_id, api_format):
+        self.checks.append((task_id, time.monotonic()))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.02)
+            outcome = self.outcomes.get(task_id, "running")
+            if callable(outcome):
+                outcome = outcome()
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        finally:
+            self.active -= 1
+
+    def checks_for(self, task_id):
+        return [at for name, at in self.checks if name == task_id]
+
+
+@pytest.fixture
+def service(ds, monkeypatch, config_section):
+    fake = FakeStatusService()
+    monkeypatch.setattr(ds, "async_call_video_task_status", fake.status)
+    monkeypatch.setattr(ds, "_classify_video_status_response",
+                        lambda response: (response, {"status": response}) if response in ("succeeded", "failed")
+                        else ("running", None))
+    config_section("video_polling", ds.VIDEO_POLLING_DEFAULTS, initial_interval=0.05, max_interval=0.2,
+                   backoff=2, max_concurrent_checks=2, eta_enabled=False)
+    return fake
+
+
+def _finish_after(seconds):
+    finish_at = time.monotonic() + seconds
+    return lambda: "succeeded" if time.monotonic() >= finish_at else "running"
+
+
+def test_result_kinds(ds, service):
+    poller = ds.VideoTaskPoller()
+    service.outcomes.update(ok="succeeded", bad="failed")
+    assert poller.track(URL, "k", "ok", "comfly", 5).result(5) == ("succeeded", {"status": "succeeded"})
+    assert poller.track(URL, "k", "bad", "comfly", 5).result(5) == ("failed", {"status": "failed"})
+    assert poller.track(URL, "k", "slow", "comfly", 0.3).result(5) == ("timeout", None)
+
+
+def test_same_task_is_polled_once_for_all_waiters(ds, service):
+    poller = ds.VideoTaskPoller()
+    service.outcomes["t1"] = _finish_after(0.3)
+    futures = [poller.track(URL, "k", "t1", "comfly", 5) for _ in range(3)]
+    results = [future.result(5) for future in futures]
+    assert all(result[0] == "succeeded" for result in results)
+    checks = service.checks_for("t1")
+    assert all(b - a >= 0.04 for a, b in zip(checks, checks[1:]))  # 没有重复的并发查询
+
+
+def test_interval_backs_off_to_max(ds, service):
+    poller = ds.VideoTaskPoller()
+    assert poller.track(URL, "k", "t1", "comfly", 1.0).result(5)[0] == "timeout"
+    checks = service.checks_for("t1")
+    gaps = [b - a for a, b in zip(checks, checks[1:])]
+    assert gaps[1] > gaps[0] * 1.5
+    assert max(gaps) < 0.2 + 0.1
+
+
+def test_status_errors_keep_polling(ds, service):
+    poller = ds.VideoTaskPoller()
+    outcomes = iter([RuntimeError("502"), RuntimeError("reset"), "succeeded"])
+    service.outcomes["t1"] = lambda: next(outcomes)
+    assert poller.track(URL, "k", "t1", "comfly", 5).result(5)[0] == "succeeded"
+    assert len(service.checks_for("t1")) == 3
+
+
+def test_concurrent_checks_are_bounded(ds, service):
+    poller = ds.VideoTaskPoller()
+    for index in range(6):
+        service.outcomes[f"t{index}"] = _finish_after(0.2)
+    futures = [poller.track(URL, "k", f"t{index}", "comfly", 5) for index in range(6)]
+    assert all(future.result(5)[0] == "succeeded" for future in futures)
+    assert service.max_active <= 2
+
+
+def test_cancelled_waiters_stop_polling(ds, service):
+    poller = ds.VideoTaskPoller()
+    future = poller.track(URL, "k", "t1", "comfly", 5)
+    time.sleep(0.1)
+    future.cancel()
+    time.sleep(0.3)
+    polled = len(service.checks_for("t1"))
+    time.sleep(0.3)
+    assert len(service.checks_for("t1")) == polled
+    assert not poller._tasks and poller._runner is None
+
+
+def test_retry_budget_bounds_wait(ds, service):
+    poller = ds.VideoTaskPoller()
+    started = time.monotonic()
+    with ds.retry_budget(ds.RetryPolicy(total_budget=0.3)):
+        future = poller.track(URL, "k", "t1", "comfly", 60)
+    assert future.result(5)[0] == "timeout"
+    assert time.monotonic() - started < 2
@@ -0,0 +1,120 @@
+import json
+import time
+
+import pytest
+
+
+class FakeTaskService:
+    """按任务的完成时间返回 running/succeeded 的状态接口，记录每次查询的时间"""
+
+    def __init__(self):
+        self.finish_at = {}
+        self.checks = []
+
+    async def status(self, api_url, api_key, task_id, api_format):
+        self.checks.append((task_id, time.time()))
+        return "done" if time.time() >= self.finish_at[task_id] else "running"
+
+    def checks_for(self, task_id):
+        return [at for name, at in self.checks if name == task_id]
+
+
+@pytest.fixture
+def service(ds, monkeypatch, config_section, tmp_path):
+    fake = FakeTaskService()
+    monkeypatch.setattr(ds, "async_call_video_task_status", fake.status)
+    monkeypatch.setattr(ds, "_classify_video_status_response",
+                        lambda response: ("succeeded", {"status": "succeeded"}) if response == "done"
+                        else ("running", None))
+    monkeypatch.setattr(ds, "_video_task_stats", ds.VideoTaskStats(str(tmp_path / "stats.json")))
+    config_section("video_polling", ds.VIDEO_POLLING_DEFAULTS, initial_interval=0.2, max_interval=0.4,
+                   backoff=2, dense_interval=0.05, dense_polls=6, eta_min_samples=3)
+    return fake
+
+
+def _run(ds, service, task_id, finish_in, profile=None, max_wait=10):
+    started = time.time()
+    service.finish_at[task_id] = started + finish_in
+    result = ds.VideoTaskPoller().track("https://mirror.example/v1", "key", task_id, "comfly", max_wait,
+                                        profile).result(timeout=max_wait + 5)
+    return result, [at - started for at in service.checks_for(task_id)]
+
+
+def test_video_task_profile_keys(ds):
+    volcengine = {"model": "seedance", "content": [
+        {"type": "text", "text": "a cat --rs 720p --dur 5"},
+        {"type": "image_url", "image_url": {"url": "x"}, "role": "first_frame"},
+    ]}
+    comfly = {"model": "seedance", "resolution": "1080p", "duration": "10", "images": ["a", "b"]}
+    assert ds.video_task_profile("https://ark.example/api/v3", volcengine).endswith("|seedance|720p|5|first_last_frame")
+    assert ds.video_task_profile("https://ai.example/v1", comfly).endswith("|seedance|1080p|10|multi_ref")
+    assert ds.video_task_profile("https://ai.example/v1", {"model": "m"}).endswith("|text_to_video")
+
+
+def test_stats_estimate_needs_min_samples(ds, tmp_path):
+    stats = ds.VideoTaskStats(str(tmp_path / "stats.json"))
+    for seconds in (60, 80):
+        stats.record("p", seconds, history=20)
+    assert stats.estimate("p", 3) is None
+    stats.record("p", 100, history=20)
+    median, spread = stats.estimate("p", 3)
+    assert median == 80 and spread == 20
+
+    # 只保留最近 history 条，并持久化到文件
+    for seconds in (10, 10, 10):
+        stats.record("p", seconds, history=3)
+    assert json.load(open(tmp_path / "stats.json"))["p"] == [10, 10, 10]
+    assert ds.VideoTaskStats(str(tmp_path / "stats.json")).estimate("p", 3)[0] == 10
+
+
+def test_without_history_polls_immediately_and_records_duration(ds, service):
+    result, checks = _run(ds, service, "fresh", 0.5, profile="p")
+    assert result[0] == "succeeded"
+    assert checks[0] < 0.1
+    time.sleep(0.1)  # 耗时在结果返回后写入
+    assert ds.get_video_task_stats()._load()["p"]
+
+
+def test_eta_delays_first_check_until_expected_finish(ds, service):
+    for seconds in (1.0, 1.0, 1.0):
+        ds.get_video_task_stats().record("p", seconds, history=20)
+    result, checks = _run(ds, service, "known", 1.0, profile="p")
+    assert result[0] == "succeeded"
+    assert 0.8 <= checks[0] <= 1.0  # 预估1.0s，波动范围取10%
+    assert checks[-1] - 1.0 < 0.15  # 预估完成时间附近密集查询
+
+
+def test_dense_window_is_capped_for_wide_spreads(ds, service):
+    for seconds in (0.5, 1.0, 1.5):
+        ds.get_video_task_stats().record("wide", seconds, history=20)
+    # 预估1.0s、波动0.5s：窗口 0.5s~2.0s，dense_polls=6 时间隔放宽到0.25s
+    result, checks = _run(ds, service, "wide", 1.95, profile="wide")
+    assert result[0] == "succeeded"
+    assert checks[0] >= 0.45
+    assert len(checks) <= 8
+
+
+def test_task_duration_prefers_provider_timestamps(ds):
+    submitted = 1_700_000_000.0
+    checked = submitted + 100
+    assert ds.video_task_duration({"created_at": submitted + 2, "updated_at": submitted + 80},
+                                  submitted, checked) == 78
+    assert ds.video_task_duration({"data": {"finish_time": (submitted + 90) * 1000}}, submitted, checked) == 90
+    # 没有或不合理的完成时间戳：扣除上一次查询间隔的一半
+    assert ds.video_task_duration({"status": "succeeded"}, submitted, checked, submitted + 60) == 80
+    assert ds.video_task_duration({"updated_at": submitted + 500}, submitted, checked, submitted + 60) == 80
+    assert ds.video_task_duration(None, submitted, checked) == 100
+
+
+def test_recorded_duration_uses_provider_completion_time(ds, service, monkeypatch):
+    def classify(response):
+        if response != "done":
+            return "running", None
+        finished = service.finish_at["stamped"]
+        return "succeeded", {"status": "succeeded", "created_at": finished - 0.3, "updated_at": finished}
+
+    monkeypatch.setattr(ds, "_classify_video_status_response", classify)
+    result, _ = _run(ds, service, "stamped", 0.3, profile="stamped")
+    assert result[0] == "succeeded"
+    time.sleep(0.1)  # 耗时在结果返回后写入
+    assert ds.get_video_task_stats()._load()["stamped"] == [pytest.approx(0.3)]
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+
+def _failover(ds, requests):
+    """候选镜像站依次使用给定的请求，None表示该镜像站的请求构建失败"""
+    names = [f"mirror{i}" for i in range(len(requests))]
+    prepared = dict(zip(names, requests))
+
+    def prepare(name):
+        if prepared[name] is None:
+            return None, ("", "", "请求构建失败")
+        return prepared[name], None
+
+    return ds.MirrorFailover(names, prepare)
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.text = str(body)
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+def _request(url):
+    payload = {"model": "seedance", "content": [{"type": "text", "text": "cat --rs 720p --dur 5"}]}
+    return (url, "volcengine", "key", payload, "info")
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(ds, monkeypatch, config_section):
+    monkeypatch.setattr(ds, "_circuit_breakers", {})
+    config_section("retry_policy", ds.RETRY_POLICY_DEFAULTS, backoff_base=0)
+    monkeypatch.setattr(ds.time, "sleep", lambda seconds: None)
+
+
+def test_submit_raises_when_no_request_can_be_built(ds):
+    failover = _failover(ds, [None, None])
+    with pytest.raises(RuntimeError, match="请求都构建失败"):
+        ds.submit_video_task_with_retries(failover, timeout=5, max_retries=2, call=lambda *args: None)
+    with pytest.raises(RuntimeError, match="请求都构建失败"):
+        asyncio.run(ds.async_submit_video_task_with_retries(failover, timeout=5, max_retries=2,
+                                                            call=lambda *args: None))
+
+
+def test_submit_rotates_mirrors_and_returns_matching_request(ds):
+    calls = []
+
+    def call(api_url, api_key, payload, api_format, timeout):
+        calls.append(api_url)
+        return FakeResponse(500 if api_url.endswith("a") else 200, {"id": "cgt-1"})
+
+    failover = _failover(ds, [_request("https://mirror.example/a"), _request("https://mirror.example/b")])
+    response, request = ds.submit_video_task_with_retries(failover, timeout=5, max_retries=3, call=call)
+    assert calls == ["https://mirror.example/a", "https://mirror.example/b"]
+    assert response.status_code == 200 and request[0] == "https://mirror.example/b"
+
+
+def test_video_job_from_submit(ds):
+    job = ds.VideoJob.from_submit(FakeResponse(200, {"id": "cgt-1"}), _request("https://ark.example/api/v3"))
+    assert job.task_id == "cgt-1" and job.error is None
+    assert job.profile.endswith("|seedance|720p|5|text_to_video")
+    assert "key" not in repr(job)
+
+    failed = ds.VideoJob.from_submit(FakeResponse(500, "boom"), _request("https://ark.example/api/v3"))
+    assert failed.task_id is None and failed.error is not None
+    assert failed.describe().startswith("提交失败")
+
+
+def test_continuous_segments_fail_over_between_mirrors(ds, monkeypatch):
+    sites = {name: {"url": f"https://{name}.example/api/v3", "api_key": f"key-{name}", "api_format": "volcengine"}
+             for name in ("first", "second")}
+    monkeypatch.setattr(ds, "get_seedream4_config", lambda: {"mirror_sites": sites})
+    calls = []
+
+    def call(api_url, api_key, payload, api_format, timeout):
+        calls.append(api_url)
+        if api_url.startswith("https://first."):
+            return FakeResponse(500, "down")
+        return FakeResponse(200, {"status": "succeeded", "content": {
+            "video_url": f"https://cdn.example/{len(calls)}.mp4", "last_frame_url": "https://cdn.example/last.png"}})
+
+    submit = ds.submit_video_task_with_retries
+    monkeypatch.setattr(ds, "submit_video_task_with_retries",
+                        lambda failover, timeout, max_retries: submit(failover, timeout, max_retries, call=call))
+    node = ds.DoubaoSeedanceContinuousVideoNode()
+    monkeypatch.setattr(node, "_download_and_convert_video", lambda url: None)
+    monkeypatch.setattr(node, "_download_last_frame_as_image", lambda url: ds.torch.zeros(1, 8, 8, 3))
+    monkeypatch.setattr(ds, "encode_image_for_upload", lambda image: "data:image/png;base64,")
+
+    result = node.generate_continuous_videos("base", "one\ntwo", 2, ds.AUTO_MIRROR,
+                                             "doubao-seedance-1-0-lite-t2v-250428",
+                                             "doubao-seedance-1-0-lite-i2v-250428", "5s", "720p", "16:9", 24,
+                                             merge_videos=False)
+    assert result[1] == "https://cdn.example/2.mp4\nhttps://cdn.example/4.mp4"
+    assert calls == ["https://first.example/api/v3", "https://second.example/api/v3"] * 2